@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR模型基准：特征提取（日志规模 10k/100k/1M）与在线预测（逐条 vs 批量）
+"""
+
+from corpus import SIZES, CorpusGenerator
+from harness import Suite, timed
+from search_engine.training_tab.ctr_model import CTRModel
+
+TRAIN_SAMPLES = 3000
+
+
+class CTRSuite(Suite):
+    name = "ctr"
+
+    def setup(self, size: str):
+        corpus = CorpusGenerator()
+        count = SIZES[size]
+        self.samples = list(corpus.ctr_log(count, doc_count=count))
+
+        # 预测基准只需要一个结构相同的已训练模型，少量样本、少量轮数即可
+        self.model = CTRModel()
+        self.model.epochs = 2
+        result = self.model.train(self.samples[:TRAIN_SAMPLES])
+        if not self.model.is_trained:
+            raise RuntimeError(f"CTR模型训练失败: {result.get('error')}")
+
+        features, _ = self.model.extract_features(self.samples[:1000])
+        scaled = self.model.scaler.transform(features)
+        self.batch_10 = scaled[:10]
+        self.batch_1000 = scaled
+        self.request = self.samples[:10]
+
+    @timed(number=1, repeat=3)
+    def time_extract_features(self):
+        self.model.extract_features(self.samples)
+
+    @timed(number=5, repeat=5)
+    def time_predict_request_per_item(self):
+        """排序时的现有路径：一个请求的10个结果逐条预测"""
+        for s in self.request:
+            self.model.predict_ctr(s['query'], s['doc_id'], s['position'], s['score'], s['summary'])
+
+    @timed(number=20, repeat=5)
+    def time_predict_batch_10(self):
+        self.model.model.predict_on_batch(self.batch_10)
+
+    @timed(number=5, repeat=5)
+    def time_predict_batch_1000(self):
+        self.model.model.predict_on_batch(self.batch_1000)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+倒排索引基准：建索引、增量添加、检索、摘要生成、保存/加载
+"""
+
+import os
+import tempfile
+import time
+from itertools import cycle
+
+from corpus import SIZES, CorpusGenerator
+from harness import Suite, timed, tracked
+from search_engine.index_tab.offline_index import InvertedIndex
+
+
+class IndexSuite(Suite):
+    name = "index"
+
+    def setup(self, size: str):
+        corpus = CorpusGenerator()
+        count = SIZES[size]
+
+        self.index = InvertedIndex()
+        start = time.perf_counter()
+        for doc_id, content in corpus.documents(count):
+            self.index.add_document(doc_id, content)
+        self.build_seconds = time.perf_counter() - start
+
+        self.new_docs = cycle(list(corpus.documents(1000, offset=count)))
+        self.added = 0
+        queries = corpus.queries(200)
+        self.queries = cycle(queries)
+        self.phrase_queries = cycle(q for q in queries if len(self.index.preprocess_text(q)) > 1)
+        self.boolean_queries = cycle(f"{a} AND {b}" for a, b in zip(queries[::2], queries[1::2]))
+
+        # 摘要生成的输入取真实检索结果（命中文档 + 查询词）
+        self.summary_inputs = []
+        for query in queries[:50]:
+            words = self.index.preprocess_text(query)
+            for doc_id, _, _ in self.index.search(query, top_k=5):
+                self.summary_inputs.append((doc_id, words))
+        self.summary_inputs = cycle(self.summary_inputs)
+
+        self.workdir = tempfile.mkdtemp(prefix="bench_index_")
+        self.index_file = os.path.join(self.workdir, "index.json")
+        self.index.save_to_file(self.index_file)
+
+    def teardown(self):
+        for name in os.listdir(self.workdir):
+            os.remove(os.path.join(self.workdir, name))
+        os.rmdir(self.workdir)
+
+    @tracked("seconds")
+    def track_build_seconds(self):
+        return self.build_seconds
+
+    @tracked("bytes")
+    def track_index_file_bytes(self):
+        return os.path.getsize(self.index_file)
+
+    @timed(number=200, repeat=5)
+    def time_add_document(self):
+        _, content = next(self.new_docs)
+        self.added += 1
+        self.index.add_document(f"bench_new_{self.added}", content)
+
+    @timed(number=50, repeat=5)
+    def time_search_tfidf(self):
+        self.index.search(next(self.queries), top_k=10)
+
+    @timed(number=50, repeat=5)
+    def time_search_phrase(self):
+        self.index.search(next(self.phrase_queries), top_k=10, mode="phrase")
+
+    @timed(number=50, repeat=5)
+    def time_search_boolean(self):
+        self.index.search(next(self.boolean_queries), top_k=10, mode="boolean")
+
+    @timed(number=500, repeat=5)
+    def time_generate_summary(self):
+        doc_id, words = next(self.summary_inputs)
+        self.index.generate_summary(doc_id, words)
+
+    @timed(number=1, repeat=3)
+    def time_save(self):
+        self.index.save_to_file(os.path.join(self.workdir, "index_save.json"))
+
+    @timed(number=1, repeat=3, warmup=0)
+    def time_load(self):
+        InvertedIndex().load_from_file(self.index_file)
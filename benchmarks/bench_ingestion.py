@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR日志写入基准：已有日志规模为 10k/100k/1M 条时的展示与点击记录耗时
+"""
+
+import os
+import random
+import tempfile
+
+from corpus import SIZES, CorpusGenerator
+from harness import Suite, timed
+from search_engine.data_service import DataService
+
+
+class IngestionSuite(Suite):
+    name = "ingestion"
+
+    def setup(self, size: str):
+        corpus = CorpusGenerator()
+        count = SIZES[size]
+        self.workdir = tempfile.mkdtemp(prefix="bench_ingestion_")
+
+        # 保存阈值设得足够大，计时中不触发落盘
+        self.service = DataService(auto_save_interval=10 ** 9, batch_size=10 ** 9)
+        self.service.data_file = os.path.join(self.workdir, "ctr_data.json")
+
+        # 直接装入已有日志：逐条走 record_impression 在1M规模下太慢，且不是这里要测的部分
+        samples = list(corpus.ctr_log(count, doc_count=count))
+        with self.service.lock:
+            self.service.ctr_data = samples
+            self.service._rebuild_ingest_state()
+
+        rng = random.Random(7)
+        self.click_targets = [(s['doc_id'], s['request_id']) for s in rng.sample(samples, 200)]
+        self.click_index = 0
+        self.queries = corpus.queries(200)
+        self.summaries = [s['summary'] for s in samples[:200]]
+        self.impressions = 0
+
+    def teardown(self):
+        for name in os.listdir(self.workdir):
+            os.remove(os.path.join(self.workdir, name))
+        os.rmdir(self.workdir)
+
+    @timed(number=200, repeat=5)
+    def time_record_impression(self):
+        i = self.impressions
+        self.impressions += 1
+        self.service.record_impression(self.queries[i % 200], f"doc_new_{i}", i % 10 + 1, 1.0,
+                                       self.summaries[i % 200], f"bench_req_{i // 10}")
+
+    @timed(number=20, repeat=5)
+    def time_record_click(self):
+        doc_id, request_id = self.click_targets[self.click_index % len(self.click_targets)]
+        self.click_index += 1
+        self.service.record_click(doc_id, request_id)
+
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试框架 - asv风格的套件、计时、JSON结果与回归比较
+
+套件写法：
+    class IndexSuite(Suite):
+        name = "index"
+
+        def setup(self, size):          # 每个规模调用一次，准备数据（不计时）
+            ...
+
+        @timed(number=100, repeat=5)    # 每个样本调用number次取平均，共repeat个样本
+        def time_search(self):
+            ...
+
+        @tracked("seconds")
+        def track_build_seconds(self):  # 直接返回一个数值（如setup中测得的构建耗时）
+            return self.build_seconds
+
+结果按 "套件.方法名[规模]" 标识，比较时以中位数为准。
+"""
+
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+def timed(number: int = 1, repeat: int = 5, warmup: int = 1, unit: str = "seconds"):
+    """为 time_* 方法设置计时参数"""
+    def decorator(func: Callable) -> Callable:
+        func.number = number
+        func.repeat = repeat
+        func.warmup = warmup
+        func.unit = unit
+        return func
+    return decorator
+
+
+def tracked(unit: str = ""):
+    """为 track_* 方法设置单位"""
+    def decorator(func: Callable) -> Callable:
+        func.unit = unit
+        return func
+    return decorator
+
+
+class Suite:
+    """基准套件基类"""
+
+    name = "suite"
+    sizes: List[str] = ['10k', '100k', '1m']
+
+    def setup(self, size: str):
+        pass
+
+    def teardown(self):
+        pass
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的打印输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(func: Callable, number: int, repeat: int, warmup: int) -> Dict[str, Any]:
+    """计时：返回每次调用耗时（秒）的统计"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()  # 避免GC停顿落在个别样本上
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    ordered = sorted(samples)
+    return {
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'max': ordered[-1],
+        'number': number,
+        'repeat': repeat,
+        'samples': samples
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境元数据，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def run_suite(suite_cls, sizes: List[str], quick: bool = False,
+              pattern: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    运行一个套件的全部基准
+
+    Args:
+        suite_cls: Suite子类
+        sizes: 要运行的规模
+        quick: 快速模式，每个基准只取1个样本（用于检查基准本身能否运行）
+        pattern: 只运行名称包含该子串的基准
+    """
+    results = []
+    methods = [name for name in sorted(dir(suite_cls)) if name.startswith(('time_', 'track_'))]
+    if pattern:
+        methods = [name for name in methods if pattern in f"{suite_cls.name}.{name}"]
+    if not methods:
+        return results
+
+    for size in sizes:
+        if size not in suite_cls.sizes:
+            continue
+        suite = suite_cls()
+        print(f"⏱️ {suite_cls.name}[{size}] 准备数据...", flush=True)
+        setup_start = time.perf_counter()
+        try:
+            with quiet():
+                suite.setup(size)
+        except Exception as e:
+            print(f"❌ {suite_cls.name}[{size}] 准备失败: {e}")
+            results.append({'name': f"{suite_cls.name}.setup", 'size': size, 'error': str(e)})
+            continue
+        print(f"   准备耗时 {time.perf_counter() - setup_start:.1f}s", flush=True)
+
+        for method_name in methods:
+            method = getattr(suite, method_name)
+            name = f"{suite_cls.name}.{method_name.split('_', 1)[1]}"
+            entry: Dict[str, Any] = {'name': name, 'size': size}
+            try:
+                with quiet():
+                    if method_name.startswith('track_'):
+                        entry.update({'type': 'track', 'value': method(), 'unit': getattr(method, 'unit', '')})
+                    else:
+                        repeat = 1 if quick else method.repeat
+                        warmup = 0 if quick else method.warmup
+                        entry.update({'type': 'time', 'unit': method.unit,
+                                      'stats': measure(method, method.number, repeat, warmup)})
+            except Exception as e:
+                entry['error'] = str(e)
+            results.append(entry)
+            print(f"   {format_entry(entry)}", flush=True)
+        suite.teardown()
+    return results
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f}ms"
+    return f"{seconds * 1e6:.1f}µs"
+
+
+def format_entry(entry: Dict[str, Any]) -> str:
+    label = f"{entry['name']}[{entry['size']}]"
+    if 'error' in entry:
+        return f"❌ {label}: {entry['error']}"
+    if entry['type'] == 'track':
+        return f"{label}: {entry['value']} {entry['unit']}".rstrip()
+    stats = entry['stats']
+    return f"{label}: median {format_seconds(stats['median'])} (min {format_seconds(stats['min'])}, ±{format_seconds(stats['stdev'])})"
+
+
+def save_results(path: str, results: List[Dict[str, Any]]):
+    """写入JSON结果"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+def _key_values(data: Dict[str, Any]) -> Dict[str, float]:
+    values = {}
+    for entry in data.get('results', []):
+        if 'error' in entry:
+            continue
+        key = f"{entry['name']}[{entry['size']}]"
+        values[key] = entry['stats']['median'] if entry['type'] == 'time' else entry['value']
+    return values
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    比较两次结果（中位数），返回每个共同基准的变化
+
+    Returns:
+        List[Dict]: name, baseline, current, ratio, status（regression/improvement/unchanged）
+    """
+    old, new = _key_values(baseline), _key_values(current)
+    rows = []
+    for key in sorted(set(old) & set(new)):
+        if old[key]:
+            ratio = new[key] / old[key]
+        else:
+            ratio = 1.0 if not new[key] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        rows.append({'name': key, 'baseline': old[key], 'current': new[key], 'ratio': ratio, 'status': status})
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    marks = {'regression': '🔺', 'improvement': '🟢', 'unchanged': '  '}
+    for row in rows:
+        print(f"{marks[row['status']]} {row['name']:<50} {row['baseline']:>12.6g} -> {row['current']:<12.6g} x{row['ratio']:.2f}")
+    regressions = sum(1 for row in rows if row['status'] == 'regression')
+    print(f"\n共比较 {len(rows)} 项，回归 {regressions} 项", file=sys.stderr if regressions else sys.stdout)
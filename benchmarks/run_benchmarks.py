@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试入口
+
+用法：
+    python benchmarks/run_benchmarks.py                          # 全部套件，10k规模
+    python benchmarks/run_benchmarks.py --sizes 10k 100k --suites index
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<旧提交>.json --fail-on-regression
+    python benchmarks/run_benchmarks.py --quick                  # 每个基准只跑一次，检查能否运行
+
+结果默认写入 benchmarks/results/<提交号>.json。
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from harness import compare, environment, print_comparison, run_suite, save_results  # noqa: E402
+
+SUITES = {
+    'index': ('bench_index', 'IndexSuite'),
+    'ingestion': ('bench_ingestion', 'IngestionSuite'),
+    'ctr': ('bench_ctr', 'CTRSuite'),
+}
+
+
+def load_suite(name: str):
+    module_name, class_name = SUITES[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索引擎基准测试")
+    parser.add_argument('--sizes', nargs='+', default=['10k'], choices=['10k', '100k', '1m'])
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=list(SUITES))
+    parser.add_argument('--bench', help="只运行名称包含该子串的基准，如 index.search")
+    parser.add_argument('--quick', action='store_true', help="每个基准只取一个样本")
+    parser.add_argument('--output', help="结果JSON路径，默认 benchmarks/results/<提交号>.json")
+    parser.add_argument('--compare', help="与该结果JSON比较")
+    parser.add_argument('--threshold', type=float, default=0.1, help="中位数变化超过该比例视为回归")
+    parser.add_argument('--fail-on-regression', action='store_true', help="存在回归时以非零状态退出")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{environment()['commit'] or 'local'}.json")
+    output = os.path.abspath(output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # 服务会在当前目录下读写 models/ 等相对路径，基准在临时目录中运行，不影响工作区数据
+    original_cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="search_bench_")
+    os.chdir(workdir)
+    results = []
+    try:
+        for name in args.suites:
+            try:
+                suite_cls = load_suite(name)
+            except ImportError as e:
+                print(f"⚠️ 跳过套件 {name}: 缺少依赖 {e}")
+                continue
+            results.extend(run_suite(suite_cls, args.sizes, quick=args.quick, pattern=args.bench))
+    finally:
+        os.chdir(original_cwd)
+
+    save_results(output, results)
+    print(f"\n✅ 结果已写入: {output}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(output, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        print(f"\n📊 与 {baseline.get('environment', {}).get('commit')} 比较（阈值 {args.threshold:.0%}）:")
+        print_comparison(rows)
+        if args.fail_on_regression and any(row['status'] == 'regression' for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步LLM客户端 - 基于asyncio + httpx的OpenAI兼容接口客户端
+
+所有请求都在客户端自有的后台事件循环中执行，Gradio等多线程调用方共享：
+1. 同一个HTTP连接池（连接数有上限，keep-alive复用）
+2. 信号量并发上限
+3. 单飞（single-flight）：相同提示词的并发请求只发一次HTTP请求
+4. 超时与带抖动的指数退避重试
+"""
+
+import asyncio
+import hashlib
+import json
+import queue
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Dict, Iterator, Optional
+
+import httpx
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMRequestError(Exception):
+    """LLM请求失败（重试耗尽或不可重试的错误）"""
+
+
+class AsyncLLMClient:
+    """OpenAI兼容 /chat/completions 接口的异步客户端"""
+
+    def __init__(self, base_url: str, api_key: str, model_name: str,
+                 max_tokens: int = 500, timeout: float = 30,
+                 max_connections: int = 8, max_concurrency: int = 8,
+                 max_retries: int = 2, retry_backoff: float = 0.5,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            base_url: 接口地址，如 https://api.deepseek.com/v1
+            api_key: API密钥
+            model_name: 模型名称
+            max_tokens: 最大生成token数
+            timeout: 单次请求超时（秒）
+            max_connections: 连接池最大连接数
+            max_concurrency: 最大并发请求数
+            max_retries: 最大重试次数
+            retry_backoff: 重试退避基数（秒）
+            transport: 自定义httpx传输层（测试用）
+        """
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._transport = transport
+
+        self._stats = {
+            'requests': 0,       # 调用方请求数
+            'http_requests': 0,  # 实际发出的HTTP请求数
+            'coalesced': 0,      # 被单飞合并的请求数
+            'retries': 0,
+            'failures': 0,
+            'in_flight': 0,
+            'peak_in_flight': 0
+        }
+        self._stats_lock = threading.Lock()
+
+        # 后台事件循环，连接池、信号量和单飞表都绑定在这个循环上
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    # ---------- 调用入口 ----------
+
+    def _submit(self, coro: Awaitable) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def generate(self, prompt: str, temperature: float = 0.7) -> str:
+        """同步生成回答（阻塞当前线程，HTTP在后台循环中执行）"""
+        return self._submit(self._generate(prompt, temperature)).result()
+
+    async def agenerate(self, prompt: str, temperature: float = 0.7) -> str:
+        """异步生成回答，可在任意事件循环中await"""
+        return await asyncio.wrap_future(self._submit(self._generate(prompt, temperature)))
+
+    def generate_stream(self, prompt: str, temperature: float = 0.7) -> Iterator[str]:
+        """同步流式生成，逐块产出文本"""
+        pieces: 'queue.Queue' = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for piece in self._stream(prompt, temperature):
+                    pieces.put(piece)
+            except Exception as e:
+                pieces.put(e)
+            finally:
+                pieces.put(done)
+
+        self._submit(pump())
+        while True:
+            item = pieces.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # ---------- 后台循环中的实现 ----------
+
+    def _ensure_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'Authorization': f'Bearer {self.api_key}'},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self._transport
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _bump(self, key: str, delta: int = 1):
+        with self._stats_lock:
+            self._stats[key] += delta
+            if key == 'in_flight':
+                self._stats['peak_in_flight'] = max(self._stats['peak_in_flight'], self._stats['in_flight'])
+
+    def _payload(self, prompt: str, temperature: float, stream: bool) -> Dict[str, Any]:
+        return {
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': temperature,
+            'max_tokens': self.max_tokens,
+            'stream': stream
+        }
+
+    async def _generate(self, prompt: str, temperature: float) -> str:
+        """单飞：相同提示词的并发请求共享同一个结果"""
+        self._ensure_client()
+        self._bump('requests')
+        key = hashlib.sha256(f"{self.model_name}\x1f{temperature}\x1f{prompt}".encode('utf-8')).hexdigest()
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._bump('coalesced')
+            return await asyncio.shield(pending)
+
+        future = self._loop.create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._request_with_retry(self._payload(prompt, temperature, stream=False))
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时取走异常，避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            if not future.done():
+                # 发起请求的调用方被取消（CancelledError不是Exception），合并的等待者同样需要结束
+                future.set_exception(LLMRequestError("合并的LLM请求已被取消"))
+                future.exception()
+
+    async def _backoff(self, attempt: int):
+        """带完全抖动的指数退避"""
+        self._bump('retries')
+        await asyncio.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+
+    async def _request_with_retry(self, payload: Dict[str, Any]) -> str:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._backoff(attempt - 1)
+            try:
+                async with self._semaphore:
+                    self._bump('in_flight')
+                    try:
+                        self._bump('http_requests')
+                        response = await self._client.post('/chat/completions', json=payload)
+                    finally:
+                        self._bump('in_flight', -1)
+
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = LLMRequestError(f"HTTP {response.status_code}")
+                    continue
+                if response.status_code >= 400:
+                    self._bump('failures')
+                    raise LLMRequestError(f"HTTP {response.status_code}: {response.text[:200]}")
+                return self._parse_response(response.json())
+
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_error = e
+
+        self._bump('failures')
+        raise LLMRequestError(f"LLM请求失败（已重试{self.max_retries}次）: {last_error}")
+
+    @staticmethod
+    def _parse_response(data: Dict[str, Any]) -> str:
+        choices = data.get('choices') or []
+        if not choices:
+            return "DeepSeek API返回空响应"
+        message = choices[0].get('message', {})
+        content = message.get('content') or "DeepSeek API返回空内容"
+        reasoning_content = message.get('reasoning_content')
+        if reasoning_content:
+            return f"推理过程:\n{reasoning_content}\n\n最终答案:\n{content}"
+        return content
+
+    async def _stream(self, prompt: str, temperature: float):
+        """解析SSE流式响应（连接建立前的错误会重试，开始输出后不再重试）"""
+        self._ensure_client()
+        self._bump('requests')
+        payload = self._payload(prompt, temperature, stream=True)
+        yielded = False
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._backoff(attempt - 1)
+            try:
+                async with self._semaphore:
+                    self._bump('in_flight')
+                    self._bump('http_requests')
+                    try:
+                        async with self._client.stream('POST', '/chat/completions', json=payload) as response:
+                            if response.status_code in RETRYABLE_STATUS_CODES:
+                                continue
+                            if response.status_code >= 400:
+                                await response.aread()
+                                raise LLMRequestError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+                            in_reasoning = False
+                            async for line in response.aiter_lines():
+                                if not line.startswith('data:'):
+                                    continue
+                                data = line[len('data:'):].strip()
+                                if data == '[DONE]':
+                                    break
+                                choices = json.loads(data).get('choices') or []
+                                if not choices:
+                                    continue
+                                delta = choices[0].get('delta', {})
+                                if delta.get('reasoning_content'):
+                                    if not in_reasoning:
+                                        in_reasoning = True
+                                        yield "推理过程:\n"
+                                    yielded = True
+                                    yield delta['reasoning_content']
+                                if delta.get('content'):
+                                    if in_reasoning:
+                                        in_reasoning = False
+                                        yield "\n\n最终答案:\n"
+                                    yielded = True
+                                    yield delta['content']
+                            return
+                    finally:
+                        self._bump('in_flight', -1)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if yielded:
+                    # 调用方已收到部分输出，重试会从头重复输出
+                    self._bump('failures')
+                    raise LLMRequestError(f"LLM流式输出中断: {e}") from e
+                continue
+
+        self._bump('failures')
+        raise LLMRequestError(f"LLM流式请求失败（已重试{self.max_retries}次）")
+
+    # ---------- 统计与关闭 ----------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取客户端统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'max_connections': self.max_connections,
+            'max_concurrency': self.max_concurrency
+        })
+        return stats
+
+    def close(self):
+        """关闭连接池并停止后台事件循环"""
+        async def shutdown():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        if self._loop.is_running():
+            self._submit(shutdown()).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界缓存模块 - LRU + TTL 淘汰
+
+特性：
+1. 条目数和字节数双重上限，超限时按最近最少使用淘汰
+2. 条目过期时间（TTL），读取时惰性删除，后台线程定期清扫
+3. 命中/未命中/淘汰/过期统计
+4. 可选SQLite持久化（写穿），重启后恢复未过期的热条目
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .memory_report import deep_sizeof
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数"""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class LRUTTLCache:
+    """线程安全的 LRU + TTL 有界缓存"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024,
+                 ttl: Optional[float] = 3600, persist_path: Optional[str] = None,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        """
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 最大总字节数（按sizeof估算）
+            ttl: 条目存活秒数，None表示不过期
+            persist_path: SQLite持久化文件路径，None表示仅内存
+            sizeof: 值大小估算函数
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries必须大于0")
+        if max_bytes <= 0:
+            raise ValueError("max_bytes必须大于0")
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._sizeof = sizeof
+
+        # key -> (value, 过期时间戳, 字节数)
+        self._entries: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_stop = threading.Event()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            self._open_db()
+            self._load_from_db()
+
+    # ---------- 基本操作 ----------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取条目，命中时移动到最近使用端"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入条目，必要时淘汰最久未使用的条目"""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return  # 单个值超过总上限，不缓存
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl is not None else float('inf')
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key, persist=False)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict_overflow()
+            self._db_write(key, value, expires_at)
+
+    def delete(self, key: str) -> bool:
+        """删除条目"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache_entries")
+                self._db.commit()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.time()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str, persist: bool = True):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        if persist and self._db is not None:
+            self._db.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _evict_overflow(self):
+        """按LRU顺序淘汰，直到条目数和字节数都不超限"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._stats['evictions'] += 1
+
+    # ---------- 过期清扫 ----------
+
+    def sweep_expired(self) -> int:
+        """删除所有已过期条目，返回删除数量"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key, persist=False)
+            self._stats['expirations'] += len(expired)
+            if self._db is not None and expired:
+                self._db.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+                self._db.commit()
+        return len(expired)
+
+    def start_sweeper(self, interval: float = 60):
+        """启动后台过期清扫线程"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._sweeper_stop.clear()
+
+        def sweep_loop():
+            while not self._sweeper_stop.wait(interval):
+                try:
+                    self.sweep_expired()
+                except Exception as e:
+                    print(f"❌ 缓存过期清扫失败: {e}")
+
+        self._sweeper = threading.Thread(target=sweep_loop, daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """停止后台清扫线程"""
+        self._sweeper_stop.set()
+        if self._sweeper:
+            self._sweeper.join(timeout=1)
+            self._sweeper = None
+
+    # ---------- 统计 ----------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats.update({
+                'size': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hit_ratio': stats['hits'] / lookups if lookups else 0.0,
+                'persistent': self._db is not None
+            })
+        return stats
+
+    def get_memory_usage(self) -> int:
+        """缓存条目（键、值、元数据）在内存中的估算字节数，比按sizeof估算的 bytes 更接近实际占用"""
+        with self._lock:
+            return deep_sizeof(self._entries)
+
+    # ---------- 持久化 ----------
+
+    def _open_db(self):
+        os.makedirs(os.path.dirname(self.persist_path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _db_write(self, key: str, value: Any, expires_at: float):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, time.time())
+            )
+            self._db.commit()
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            print(f"⚠️ 缓存条目持久化失败: {e}")
+
+    def _load_from_db(self):
+        """恢复未过期条目，按写入时间顺序重建LRU"""
+        now = time.time()
+        self._db.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, value, expires_at FROM cache_entries ORDER BY accessed_at"
+        ).fetchall()
+        for key, raw_value, expires_at in rows:
+            value = json.loads(raw_value)
+            size = self._sizeof(value)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+        self._evict_overflow()
+        if rows:
+            print(f"✅ 从持久化缓存恢复 {len(self._entries)} 条记录")
+
+    def close(self):
+        """停止清扫线程并关闭持久化连接"""
+        self.stop_sweeper()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
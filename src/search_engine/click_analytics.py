@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点击分析模块
+在写入路径上增量维护 位置×天、查询×天、文档×天 三个预聚合立方体（展示数、点击样本数），
+位置CTR曲线、热门查询、热门文档直接读取立方体，不再复制和遍历原始样本；
+需要校正时可从样本的列式投影一次性向量化重算
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+UNKNOWN_DAY = "unknown"
+
+# 立方体名称 -> 样本中的维度字段
+CUBE_DIMENSIONS = {
+    'position': 'position',
+    'query': 'query',
+    'doc': 'doc_id'
+}
+
+
+def sample_day(sample: Dict[str, Any]) -> str:
+    """样本所属日期（ISO时间戳的日期部分）"""
+    ts = sample.get('timestamp') or sample.get('request_time') or ""
+    return ts[:10] if len(ts) >= 10 else UNKNOWN_DAY
+
+
+class ClickAnalytics:
+    """点击分析立方体（非线程安全，由调用方加锁）
+
+    每个立方体为 {(维度值, 日期): [展示数, 点击样本数]}，点击样本数与原始样本中
+    clicked 字段之和一致（多次点击只计一次）。
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """清空所有立方体"""
+        self.cubes: Dict[str, Dict[Tuple[Any, str], List[int]]] = {
+            name: defaultdict(lambda: [0, 0]) for name in CUBE_DIMENSIONS
+        }
+        self.total_impressions = 0
+        self.total_clicks = 0
+
+    def add(self, sample: Dict[str, Any]):
+        """登记一条展示样本"""
+        day = sample_day(sample)
+        clicked = 1 if sample.get('clicked', 0) else 0
+        for name, field in CUBE_DIMENSIONS.items():
+            key = sample.get(field)
+            if key is None:
+                continue
+            cell = self.cubes[name][(key, day)]
+            cell[0] += 1
+            cell[1] += clicked
+        self.total_impressions += 1
+        self.total_clicks += clicked
+
+    def mark_click(self, sample: Dict[str, Any]):
+        """样本首次被点击"""
+        day = sample_day(sample)
+        for name, field in CUBE_DIMENSIONS.items():
+            key = sample.get(field)
+            cell = self.cubes[name].get((key, day)) if key is not None else None
+            if cell is not None:
+                cell[1] += 1
+        self.total_clicks += 1
+
+    def rebuild(self, samples: Iterable[Dict[str, Any]]):
+        """从样本的列式投影向量化重算全部立方体（只取用到的字段，不构造整表DataFrame）"""
+        columns = {'day': [], 'clicked': []}
+        columns.update({field: [] for field in CUBE_DIMENSIONS.values()})
+        for sample in samples:
+            columns['day'].append(sample_day(sample))
+            columns['clicked'].append(1 if sample.get('clicked', 0) else 0)
+            for field in CUBE_DIMENSIONS.values():
+                columns[field].append(sample.get(field))
+
+        self.reset()
+        frame = pd.DataFrame(columns)
+        if frame.empty:
+            return
+        self.total_impressions = len(frame)
+        self.total_clicks = int(frame['clicked'].sum())
+        for name, field in CUBE_DIMENSIONS.items():
+            grouped = frame.groupby([field, 'day'], sort=False)['clicked'].agg(['count', 'sum'])
+            cube = self.cubes[name]
+            for (key, day), count, clicks in zip(grouped.index, grouped['count'], grouped['sum']):
+                cube[(key, day)] = [int(count), int(clicks)]
+
+    # ---------- 查询 ----------
+
+    def days(self) -> List[str]:
+        """出现过的日期（升序）"""
+        return sorted({day for _, day in self.cubes['position']})
+
+    def rollup(self, cube: str, start_day: Optional[str] = None,
+               end_day: Optional[str] = None) -> Dict[Any, List[int]]:
+        """按日期范围（含两端）把立方体汇总到单一维度：{维度值: [展示数, 点击样本数]}"""
+        totals: Dict[Any, List[int]] = {}
+        for (key, day), (impressions, clicks) in self.cubes[cube].items():
+            if start_day is not None and day < start_day:
+                continue
+            if end_day is not None and day > end_day:
+                continue
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += impressions
+            entry[1] += clicks
+        return totals
+
+    def position_ctr(self, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """位置CTR曲线（按位置升序）"""
+        totals = self.rollup('position', start_day, end_day)
+        return [
+            {'position': position, 'impressions': impressions, 'clicks': clicks,
+             'ctr': clicks / impressions if impressions else 0.0}
+            for position, (impressions, clicks) in sorted(totals.items())
+        ]
+
+    def top(self, cube: str, n: int = 10, by: str = 'impressions', start_day: Optional[str] = None,
+            end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按展示数/点击数/CTR取前n个查询或文档"""
+        totals = self.rollup(cube, start_day, end_day)
+        rows = [
+            {'key': key, 'impressions': impressions, 'clicks': clicks,
+             'ctr': clicks / impressions if impressions else 0.0}
+            for key, (impressions, clicks) in totals.items()
+        ]
+        rows.sort(key=lambda row: (row[by], row['impressions']), reverse=True)
+        return rows[:n]
+
+    def daily_totals(self) -> List[Dict[str, Any]]:
+        """每日展示数、点击样本数和CTR"""
+        totals: Dict[str, List[int]] = {}
+        for (_, day), (impressions, clicks) in self.cubes['position'].items():
+            entry = totals.setdefault(day, [0, 0])
+            entry[0] += impressions
+            entry[1] += clicks
+        return [
+            {'day': day, 'impressions': impressions, 'clicks': clicks,
+             'ctr': clicks / impressions if impressions else 0.0}
+            for day, (impressions, clicks) in sorted(totals.items())
+        ]
+
+    @staticmethod
+    def _legacy_stats(totals: Dict[Any, List[int]], limit: Optional[int] = None) -> Dict[Tuple[str, str], Dict]:
+        """转换为 DataFrame.groupby(...).agg({'clicked': ['count', 'sum', 'mean']}).to_dict() 的形状"""
+        keys = sorted(totals)
+        if limit is not None:
+            keys = keys[:limit]
+        return {
+            ('clicked', 'count'): {key: totals[key][0] for key in keys},
+            ('clicked', 'sum'): {key: totals[key][1] for key in keys},
+            ('clicked', 'mean'): {key: round(totals[key][1] / totals[key][0], 4) for key in keys}
+        }
+
+    def analyze_click_patterns(self) -> Dict[str, Any]:
+        """与原 data_utils.analyze_click_patterns 返回结构一致的点击模式分析"""
+        if not self.total_impressions:
+            return {'error': '没有数据可分析'}
+        return {
+            'total_impressions': self.total_impressions,
+            'total_clicks': self.total_clicks,
+            'overall_ctr': self.total_clicks / self.total_impressions,
+            'position_analysis': self._legacy_stats(self.rollup('position')),
+            'query_analysis': self._legacy_stats(self.rollup('query'), limit=10),
+            'doc_analysis': self._legacy_stats(self.rollup('doc'), limit=10)
+        }
+
+    def get_stats(self) -> Dict[str, int]:
+        """立方体规模"""
+        return {f"{name}_cells": len(cube) for name, cube in self.cubes.items()}
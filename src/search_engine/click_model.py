@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点击模型模块 - 从CTR日志估计位置偏差（位置倾向性）
+
+位置模型（PBM）：P(点击 | q, d, k) = θ_k · γ_qd
+    θ_k  位置k被用户查看的概率（位置偏差）
+    γ_qd 文档d对查询q的相关性（被查看后点击的概率）
+
+用EM交替估计 θ 与 γ：展示先按 (查询-文档对, 位置) 聚合为单元格，E步/M步都是单元格上的整列
+NumPy运算（bincount按位置、按查询-文档对聚合），百万级展示几秒内完成。
+同一(查询, 文档)出现在不同位置时 θ 才可辨识，只在单一位置出现过的对只贡献 γ。输出按第1位归一化的倾向性 θ_k/θ_1，写入 models/position_propensities.json，
+训练（CTRModel.extract_features / 流式特征）和线上预测（predict_ctr）通过 position_decay
+读取同一张表；未估计过或样本不足的位置回退为 1/(position+1)。
+
+用法：
+    result = fit_pbm_from_samples(data_service.get_all_samples())
+    PropensityStore().save(result)
+    get_position_decay(3)          # 当前倾向性表中的位置3
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PROPENSITY_FILE = "models/position_propensities.json"
+MAX_POSITION = 50
+MIN_SUPPORT = 20
+
+
+def default_position_decay(position) -> float:
+    """未估计位置偏差时的位置衰减"""
+    return 1.0 / (position + 1)
+
+
+def position_decay(position, propensities: Optional[Dict[int, float]] = None) -> float:
+    """
+    位置衰减特征
+
+    Args:
+        position: 位置（从1开始）
+        propensities: 位置 -> 倾向性；为空时使用 1/(position+1)
+    """
+    return float(position_decay_array(np.array([position]), propensities)[0])
+
+
+def position_decay_array(positions: np.ndarray, propensities: Optional[Dict[int, float]] = None) -> np.ndarray:
+    """
+    向量化的位置衰减，形状与输入相同
+
+    倾向性以位置1为基准（1.0）：表中缺少的前导位置取1.0，表内缺失的位置在相邻位置之间线性插值，
+    表之外的位置按回退公式的比例从表中最后一个位置外推，保证单调衰减
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    if not propensities:
+        return 1.0 / (positions + 1)
+    known = sorted(propensities)
+    last = known[-1]
+    if known[0] > 1:
+        keys, values = [1] + known, [1.0] + [propensities[k] for k in known]
+    else:
+        keys, values = known, [propensities[k] for k in known]
+    table = np.interp(np.arange(last + 1), keys, values)
+    index = np.clip(positions, 0, last).astype(np.int64)
+    decay = table[index]
+    beyond = positions > last
+    decay[beyond] = table[last] * (last + 1) / (positions[beyond] + 1)
+    return decay
+
+
+def samples_to_arrays(samples: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CTR样本 -> (位置, 是否点击, 查询-文档对编号)"""
+    positions, clicks, queries, docs = [], [], [], []
+    for sample in samples:
+        position = sample.get('position')
+        if position is None:
+            continue
+        positions.append(int(position))
+        clicks.append(1 if sample.get('clicked', 0) else 0)
+        queries.append(str(sample.get('query', '')))
+        docs.append(str(sample.get('doc_id', '')))
+    if not positions:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+    pairs, _ = pd.MultiIndex.from_arrays([queries, docs]).factorize()
+    return np.asarray(positions, dtype=np.int64), np.asarray(clicks, dtype=np.float64), np.asarray(pairs, dtype=np.int64)
+
+
+def fit_pbm(positions: np.ndarray, clicks: np.ndarray, pairs: np.ndarray, max_iter: int = 100,
+            tol: float = 1e-5, max_position: int = MAX_POSITION, min_support: int = MIN_SUPPORT) -> Dict[str, Any]:
+    """
+    用EM拟合位置模型
+
+    Args:
+        positions: 每次展示的位置（从1开始）
+        clicks: 每次展示是否被点击（0/1）
+        pairs: 每次展示的查询-文档对编号（0..P-1）
+        max_iter: 最大迭代轮数
+        tol: θ 的最大变化小于该值时停止
+        max_position: 超过该位置的展示合并到该位置
+        min_support: 展示数少于该值的位置不写入倾向性表
+
+    Returns:
+        包含 propensities（按第1位归一化）、theta、support、迭代信息的字典
+    """
+    started = time.perf_counter()
+    positions = np.clip(np.asarray(positions, dtype=np.int64), 1, max_position)
+    clicks = np.asarray(clicks, dtype=np.float64)
+    pairs = np.asarray(pairs, dtype=np.int64)
+    if len(positions) == 0:
+        raise ValueError("没有展示数据")
+
+    num_positions = int(positions.max()) + 1
+    num_pairs = int(pairs.max()) + 1
+    position_counts = np.bincount(positions, minlength=num_positions).astype(np.float64)
+    pair_counts = np.bincount(pairs, minlength=num_pairs).astype(np.float64)
+
+    # 后验只取决于 (查询-文档对, 位置, 是否点击)，先按 (对, 位置) 聚合，每轮只在单元格上计算
+    cells, inverse = np.unique(pairs * num_positions + positions, return_inverse=True)
+    cell_pairs = cells // num_positions
+    cell_positions = cells % num_positions
+    cell_counts = np.bincount(inverse).astype(np.float64)
+    cell_clicks = np.bincount(inverse, weights=(clicks > 0).astype(np.float64))
+    cell_skips = cell_counts - cell_clicks
+
+    theta = np.full(num_positions, 0.5)
+    gamma = np.full(num_pairs, 0.5)
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        t = theta[cell_positions]
+        g = gamma[cell_pairs]
+        not_clicked = np.maximum(1.0 - t * g, 1e-12)
+        # E步：点击时必然已查看且相关；未点击时按后验分配
+        examined = cell_clicks + cell_skips * (t * (1.0 - g) / not_clicked)
+        relevant = cell_clicks + cell_skips * ((1.0 - t) * g / not_clicked)
+        # M步：按位置、按查询-文档对取后验均值（Beta(1,1)平滑，避免稀疏对取到0或1）
+        new_theta = (np.bincount(cell_positions, weights=examined, minlength=num_positions) + 1.0) / (position_counts + 2.0)
+        gamma = (np.bincount(cell_pairs, weights=relevant, minlength=num_pairs) + 1.0) / (pair_counts + 2.0)
+        delta = float(np.max(np.abs(new_theta[1:] - theta[1:])))
+        theta = new_theta
+        if delta < tol:
+            converged = True
+            break
+
+    p = np.clip(theta[cell_positions] * gamma[cell_pairs], 1e-12, 1 - 1e-12)
+    log_likelihood = float(np.sum(cell_clicks * np.log(p) + cell_skips * np.log(1 - p)))
+
+    supported = [k for k in range(1, num_positions) if position_counts[k] >= min_support]
+    base = theta[1] if position_counts[1] > 0 else theta[supported[0]] if supported else 1.0
+    return {
+        'model': 'pbm',
+        'propensities': {k: round(float(theta[k] / base), 6) for k in supported},
+        'theta': {k: float(theta[k]) for k in range(1, num_positions) if position_counts[k] > 0},
+        'support': {k: int(position_counts[k]) for k in range(1, num_positions) if position_counts[k] > 0},
+        'impressions': int(len(positions)),
+        'clicks': int(cell_clicks.sum()),
+        'pairs': num_pairs,
+        'iterations': iterations,
+        'converged': converged,
+        'log_likelihood': log_likelihood,
+        'elapsed_s': time.perf_counter() - started
+    }
+
+
+def fit_pbm_from_samples(samples: Iterable[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+    """从CTR样本拟合位置模型，参数同 fit_pbm"""
+    return fit_pbm(*samples_to_arrays(samples), **kwargs)
+
+
+class PropensityStore:
+    """位置倾向性表的持久化（JSON），按文件修改时间缓存"""
+
+    def __init__(self, path: str = DEFAULT_PROPENSITY_FILE):
+        self.path = path
+        self._cache: Dict[int, float] = {}
+        self._cache_mtime: Optional[float] = None
+
+    def save(self, result: Dict[str, Any]):
+        """写入拟合结果（先写临时文件再替换，读者不会读到半个文件）"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        payload = dict(result)
+        payload['fitted_at'] = datetime.now().isoformat()
+        for key in ('propensities', 'theta', 'support'):
+            payload[key] = {str(k): v for k, v in result.get(key, {}).items()}
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def load_result(self) -> Optional[Dict[str, Any]]:
+        """读取完整的拟合结果，文件不存在或损坏时返回None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_propensities(self) -> Dict[int, float]:
+        """当前倾向性表（位置 -> 倾向性），未拟合时为空"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._cache, self._cache_mtime = {}, None
+            return {}
+        if mtime != self._cache_mtime:
+            result = self.load_result() or {}
+            self._cache = {int(k): float(v) for k, v in result.get('propensities', {}).items()}
+            self._cache_mtime = mtime
+        return dict(self._cache)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._cache, self._cache_mtime = {}, None
+
+
+_default_store = PropensityStore()
+
+
+def get_propensities() -> Dict[int, float]:
+    """默认倾向性表"""
+    return _default_store.get_propensities()
+
+
+def save_propensities(result: Dict[str, Any]):
+    """写入默认倾向性表"""
+    _default_store.save(result)
+
+
+def get_position_decay(position) -> float:
+    """按默认倾向性表计算位置衰减（未拟合时为 1/(position+1)）"""
+    return position_decay(position, _default_store.get_propensities())
+
+
+def format_result(result: Dict[str, Any]) -> List[str]:
+    """拟合结果的文本摘要"""
+    lines = [
+        f"展示 {result['impressions']}，点击 {result['clicks']}，查询-文档对 {result['pairs']}",
+        f"迭代 {result['iterations']} 轮（{'已收敛' if result['converged'] else '未收敛'}），"
+        f"对数似然 {result['log_likelihood']:.1f}，耗时 {result['elapsed_s']:.2f}s"
+    ]
+    for k, value in sorted(result['propensities'].items(), key=lambda kv: int(kv[0])):
+        lines.append(f"位置{k}: 倾向性 {value:.4f}（展示 {result['support'][k]}，回退值 {default_position_decay(int(k)):.4f}）")
+    return lines
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="从CTR日志估计位置偏差")
+    parser.add_argument('--data', default="models/ctr_data.json", help="CTR样本文件")
+    parser.add_argument('--output', default=DEFAULT_PROPENSITY_FILE, help="倾向性表输出路径")
+    parser.add_argument('--max-iter', type=int, default=100)
+    parser.add_argument('--min-support', type=int, default=MIN_SUPPORT)
+    args = parser.parse_args()
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+    result = fit_pbm_from_samples(samples, max_iter=args.max_iter, min_support=args.min_support)
+    PropensityStore(args.output).save(result)
+    for line in format_result(result):
+        print(line)
+    print(f"✅ 倾向性表已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
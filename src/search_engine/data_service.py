@@ -1,10 +1,15 @@
 import threading
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 import jieba
 from .training_tab.ctr_config import CTRSampleConfig
+from .impression_dedup import DedupConfig, ImpressionDeduplicator
+from .click_analytics import ClickAnalytics
+from .click_model import get_position_decay
+from .memory_report import deep_sizeof, register_source as register_memory_source
+from .metrics import REGISTRY, counter_family, gauge_family, instrument, record_error
 from abc import ABC, abstractmethod
 import time
 import asyncio
@@ -49,9 +54,16 @@ class DataService(DataServiceInterface):
     - 批量保存：减少频繁的文件IO操作
     - 延迟保存：异步保存数据，不阻塞主线程
     - 数据缓存：内存缓存提高访问速度
+    - 增量健康检查：写入时维护重复/不完整/点击计数器，健康检查直接读取快照
+    - 展示去重：布隆过滤器 + 近期窗口精确集合，O(1)识别重复展示，可选丢弃
+    - 点击分析：写入时增量维护 位置/查询/文档×天 的预聚合立方体，分析接口不复制原始样本
     """
     
-    def __init__(self, auto_save_interval: int = 30, batch_size: int = 100):
+    # 健康检查要求的必要字段
+    HEALTH_REQUIRED_FIELDS = ['query', 'doc_id', 'position', 'score', 'request_id']
+    
+    def __init__(self, auto_save_interval: int = 30, batch_size: int = 100,
+                 dedup_config: Optional[DedupConfig] = None):
         self.ctr_data: List[Dict[str, Any]] = []
         self.lock = threading.Lock()
         self.data_file = "models/ctr_data.json"
@@ -71,8 +83,22 @@ class DataService(DataServiceInterface):
         self._stats_cache_time = 0
         self._cache_ttl = 10  # 缓存TTL（秒）
         
+        # 写入时维护的增量状态（由 self.lock 保护）
+        self._deduplicator = ImpressionDeduplicator(dedup_config)
+        self._health_counters = self._empty_health_counters()
+        self._query_stats: Dict[str, List[int]] = {}  # 查询 -> [展示数, 点击样本数]
+        self._doc_stats: Dict[str, List[int]] = {}    # 文档 -> [展示数, 点击样本数]
+        self._query_requests: Dict[str, set] = {}     # 查询 -> 不同request_id集合（查询补全的搜索次数）
+        self.analytics = ClickAnalytics()
+        
+        # 全量审计任务（仅在显式请求时运行）
+        self._audit_thread: Optional[threading.Thread] = None
+        self._audit_status: Dict[str, Any] = {'status': 'idle', 'progress': 0.0}
+        
         self._load_existing_data()
         self._start_auto_save_timer()
+        REGISTRY.register_collector("data_service", self._collect_metrics)
+        register_memory_source("data_service", self._memory_usage)
     
     def _start_auto_save_timer(self):
         """启动自动保存定时器"""
@@ -100,6 +126,7 @@ class DataService(DataServiceInterface):
         self.is_saving = True
         self.save_executor.submit(self._save_data_sync)
     
+    @instrument("data_service.save")
     def _save_data_sync(self):
         """同步保存数据到文件"""
         try:
@@ -125,6 +152,7 @@ class DataService(DataServiceInterface):
             print(f"✅ 数据保存成功: {len(data_to_save)}条记录")
             
         except Exception as e:
+            record_error("data_service.save")
             print(f"⚠️ 保存CTR数据失败: {e}")
         finally:
             self.is_saving = False
@@ -134,6 +162,88 @@ class DataService(DataServiceInterface):
         self._stats_cache = None
         self._stats_cache_time = 0
     
+    @staticmethod
+    def _empty_health_counters() -> Dict[str, int]:
+        """创建空的健康计数器"""
+        return {
+            'total_samples': 0,
+            'duplicate_samples': 0,
+            'incomplete_samples': 0,
+            'clicked_samples': 0
+        }
+    
+    @staticmethod
+    def _sample_key(sample: Dict[str, Any]) -> str:
+        """样本去重键: (request_id, doc_id, position)"""
+        return ImpressionDeduplicator.make_key(
+            sample.get('request_id'), sample.get('doc_id'), sample.get('position')
+        )
+    
+    @classmethod
+    def _count_sample(cls, counters: Dict[str, int], sample: Dict[str, Any], is_duplicate: bool):
+        """将单条样本计入健康计数器"""
+        counters['total_samples'] += 1
+        
+        if is_duplicate:
+            counters['duplicate_samples'] += 1
+        
+        if not all(field in sample for field in cls.HEALTH_REQUIRED_FIELDS):
+            counters['incomplete_samples'] += 1
+        
+        if sample.get('clicked', 0):
+            counters['clicked_samples'] += 1
+    
+    def _check_duplicate(self, sample: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """通过去重器检查样本（调用方需持有锁）"""
+        status, original = self._deduplicator.observe(self._sample_key(sample), sample)
+        if status != ImpressionDeduplicator.NEW:
+            print(f"⚠️ 发现重复记录: request_id={sample.get('request_id')}, "
+                  f"doc_id={sample.get('doc_id')}, position={sample.get('position')}")
+        return status, original
+    
+    def _track_sample(self, sample: Dict[str, Any], dedup_status: str):
+        """新增样本时增量更新健康计数器和查询/文档统计（调用方需持有锁）"""
+        # 只计入确认重复；布隆过滤器的疑似重复可能是误判，已单独记在去重统计中，
+        # 否则增量计数器会与按精确键复核的全量审计结果不一致
+        self._count_sample(self._health_counters, sample,
+                           dedup_status == ImpressionDeduplicator.DUPLICATE)
+        
+        clicked = 1 if sample.get('clicked', 0) else 0
+        for stats, key in ((self._query_stats, sample.get('query')),
+                           (self._doc_stats, sample.get('doc_id'))):
+            entry = stats.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += clicked
+        query = sample.get('query')
+        if query:
+            self._query_requests.setdefault(query, set()).add(sample.get('request_id'))
+        self.analytics.add(sample)
+    
+    def _ingest_sample(self, sample: Dict[str, Any]):
+        """登记一条不经丢弃判断的样本（加载/导入路径，调用方需持有锁）"""
+        status, _ = self._deduplicator.observe(self._sample_key(sample), sample)
+        self._track_sample(sample, status)
+    
+    def _mark_first_click(self, sample: Dict[str, Any]):
+        """样本首次被点击时更新增量计数（调用方需持有锁）"""
+        self._health_counters['clicked_samples'] += 1
+        for stats, key in ((self._query_stats, sample.get('query')),
+                           (self._doc_stats, sample.get('doc_id'))):
+            if key in stats:
+                stats[key][1] += 1
+        self.analytics.mark_click(sample)
+    
+    def _rebuild_ingest_state(self):
+        """根据当前数据重建去重器、健康计数器和查询/文档统计（调用方需持有锁）"""
+        self._deduplicator.reset()
+        self._health_counters = self._empty_health_counters()
+        self._query_stats = {}
+        self._doc_stats = {}
+        self._query_requests = {}
+        self.analytics.reset()
+        for sample in self.ctr_data:
+            self._ingest_sample(sample)
+    
     def _load_existing_data(self):
         """加载已存在的CTR数据"""
         try:
@@ -146,6 +256,7 @@ class DataService(DataServiceInterface):
         except Exception as e:
             print(f"⚠️ 加载CTR数据失败: {e}")
             self.ctr_data = []
+        self._rebuild_ingest_state()
     
     def record_impression(self, query: str, doc_id: str, position: int, 
                          score: float, summary: str, request_id: str) -> Dict[str, Any]:
@@ -155,16 +266,13 @@ class DataService(DataServiceInterface):
                 # 使用内部方法创建样本
                 sample = self._create_sample(query, doc_id, position, score, summary, request_id)
                 
-                # 检查重复记录
-                duplicate_count = sum(1 for d in self.ctr_data 
-                                    if d.get('request_id') == request_id.strip() and 
-                                       d.get('doc_id') == doc_id.strip() and 
-                                       d.get('position') == position)
-                
-                if duplicate_count > 0:
-                    print(f"⚠️ 发现重复记录: request_id={request_id}, doc_id={doc_id}, position={position}")
+                # 检查重复记录，确认重复且配置为丢弃时返回首条样本
+                status, original = self._check_duplicate(sample)
+                if self._deduplicator.should_drop(status):
+                    return original
                 
                 self.ctr_data.append(sample)
+                self._track_sample(sample, status)
                 self.pending_changes += 1
                 self._invalidate_cache()  # 新增数据时清除缓存
                 
@@ -201,6 +309,7 @@ class DataService(DataServiceInterface):
                             sample['clicked'] = 1
                             sample['click_time'] = datetime.now().isoformat()
                             sample['click_count'] = 1
+                            self._mark_first_click(sample)
                             updated_count += 1
                             print(f"✅ 首次点击: doc_id={doc_id_clean}, request_id={request_id_clean}")
                         else:
@@ -230,11 +339,49 @@ class DataService(DataServiceInterface):
         with self.lock:
             return [sample for sample in self.ctr_data if sample.get('request_id') == request_id]
     
+    def get_query_counts(self) -> Dict[str, int]:
+        """统计每个查询的搜索次数（不同request_id数，写入时增量维护），用于查询补全"""
+        with self.lock:
+            return {query: len(ids) for query, ids in self._query_requests.items()}
+    
     def get_all_samples(self) -> List[Dict[str, Any]]:
         """获取所有CTR样本"""
         with self.lock:
             return self.ctr_data.copy()
     
+    def get_click_patterns(self) -> Dict[str, Any]:
+        """点击模式分析（总体CTR、位置/查询/文档统计），读取预聚合立方体"""
+        with self.lock:
+            return self.analytics.analyze_click_patterns()
+    
+    def get_position_ctr(self, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """位置CTR曲线，日期格式 YYYY-MM-DD（含两端）"""
+        with self.lock:
+            return self.analytics.position_ctr(start_day, end_day)
+    
+    def get_top_queries(self, n: int = 10, by: str = 'impressions', start_day: Optional[str] = None,
+                        end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """热门查询，by 可选 impressions / clicks / ctr"""
+        with self.lock:
+            return self.analytics.top('query', n, by, start_day, end_day)
+    
+    def get_top_docs(self, n: int = 10, by: str = 'impressions', start_day: Optional[str] = None,
+                     end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """热门文档，by 可选 impressions / clicks / ctr"""
+        with self.lock:
+            return self.analytics.top('doc', n, by, start_day, end_day)
+    
+    def get_daily_click_stats(self) -> List[Dict[str, Any]]:
+        """每日展示数、点击样本数和CTR"""
+        with self.lock:
+            return self.analytics.daily_totals()
+    
+    def rebuild_click_analytics(self) -> Dict[str, int]:
+        """从当前样本向量化重算点击分析立方体（数据被外部修改后校正用）"""
+        with self.lock:
+            self.analytics.rebuild(self.ctr_data)
+            return self.analytics.get_stats()
+    
     def get_samples_dataframe(self, request_id: Optional[str] = None) -> pd.DataFrame:
         """获取CTR样本DataFrame"""
         with self.lock:
@@ -330,6 +477,7 @@ class DataService(DataServiceInterface):
         with self.lock:
             self.ctr_data = []
             self.pending_changes = 0
+            self._rebuild_ingest_state()
             self._save_data_async() # 清空后也保存一次
             print("✅ CTR数据已清空")
     
@@ -355,6 +503,8 @@ class DataService(DataServiceInterface):
             
             with self.lock:
                 self.ctr_data.extend(imported_data)
+                for sample in imported_data:
+                    self._ingest_sample(sample)
                 self.pending_changes += len(imported_data)
                 if self._should_save_now():
                     self._save_data_async()
@@ -374,6 +524,7 @@ class DataService(DataServiceInterface):
             'total_count': len(impressions),
             'success_count': 0,
             'error_count': 0,
+            'duplicate_count': 0,
             'errors': []
         }
         
@@ -399,7 +550,12 @@ class DataService(DataServiceInterface):
                             impression['request_id']
                         )
                         
-                        batch_samples.append(sample)
+                        status, _ = self._check_duplicate(sample)
+                        if self._deduplicator.should_drop(status):
+                            results['duplicate_count'] += 1
+                            continue
+                        
+                        batch_samples.append((sample, status))
                         results['success_count'] += 1
                         
                     except Exception as e:
@@ -408,7 +564,9 @@ class DataService(DataServiceInterface):
                 
                 # 批量添加到数据中
                 if batch_samples:
-                    self.ctr_data.extend(batch_samples)
+                    for sample, status in batch_samples:
+                        self.ctr_data.append(sample)
+                        self._track_sample(sample, status)
                     self.pending_changes += len(batch_samples)
                     self._invalidate_cache()
                     
@@ -453,11 +611,11 @@ class DataService(DataServiceInterface):
         if len(query_words) > 0:
             match_ratio = len(query_words.intersection(summary_words)) / len(query_words)
         
-        # 计算历史CTR
-        query_history = [d for d in self.ctr_data if d.get('query') == query.strip()]
-        doc_history = [d for d in self.ctr_data if d.get('doc_id') == doc_id.strip()]
-        query_ctr = sum(d.get('clicked', 0) for d in query_history) / len(query_history) if query_history else 0.1
-        doc_ctr = sum(d.get('clicked', 0) for d in doc_history) / len(doc_history) if doc_history else 0.1
+        # 计算历史CTR（读取写入时维护的查询/文档统计）
+        query_stats = self._query_stats.get(query.strip())
+        doc_stats = self._doc_stats.get(doc_id.strip())
+        query_ctr = query_stats[1] / query_stats[0] if query_stats else 0.1
+        doc_ctr = doc_stats[1] / doc_stats[0] if doc_stats else 0.1
         
         # 创建样本
         sample = {
@@ -479,7 +637,7 @@ class DataService(DataServiceInterface):
             'doc_length': len(summary) if summary else 0,
             'query_length': len(query.strip()),
             'summary_length': len(summary) if summary else 0,
-            'position_decay': round(1.0 / position, 4)
+            'position_decay': round(get_position_decay(position), 4)
         }
         
         # 验证样本完整性
@@ -523,6 +681,7 @@ class DataService(DataServiceInterface):
                                     sample['clicked'] = 1
                                     sample['click_time'] = datetime.now().isoformat()
                                     sample['click_count'] = 1
+                                    self._mark_first_click(sample)
                                     updated = True
                                     break
                                 else:
@@ -602,60 +761,161 @@ class DataService(DataServiceInterface):
         self._save_data_sync()
     
     def get_data_health_check(self) -> Dict[str, Any]:
-        """数据健康检查"""
+        """数据健康检查（读取写入时维护的计数器，不扫描全部样本）"""
         with self.lock:
-            try:
-                health_report = {
-                    'total_samples': len(self.ctr_data),
-                    'pending_changes': self.pending_changes,
-                    'cache_status': 'valid' if self._stats_cache else 'invalid',
-                    'data_issues': [],
-                    'recommendations': []
-                }
-                
-                if not self.ctr_data:
-                    health_report['data_issues'].append('没有数据')
-                    health_report['recommendations'].append('进行一些搜索实验生成数据')
-                    return health_report
-                
-                # 检查重复记录
-                seen_keys = set()
-                duplicates = 0
-                for sample in self.ctr_data:
-                    key = (sample.get('request_id'), sample.get('doc_id'), sample.get('position'))
-                    if key in seen_keys:
-                        duplicates += 1
-                    else:
-                        seen_keys.add(key)
-                
-                if duplicates > 0:
-                    health_report['data_issues'].append(f'发现{duplicates}条重复记录')
-                    health_report['recommendations'].append('考虑清理重复数据')
-                
-                # 检查数据完整性
-                incomplete_samples = 0
-                for sample in self.ctr_data:
-                    required_fields = ['query', 'doc_id', 'position', 'score', 'request_id']
-                    if not all(field in sample for field in required_fields):
-                        incomplete_samples += 1
-                
-                if incomplete_samples > 0:
-                    health_report['data_issues'].append(f'发现{incomplete_samples}条不完整记录')
-                    health_report['recommendations'].append('检查数据收集逻辑')
-                
-                # 检查点击率
-                total_clicks = sum(sample.get('clicked', 0) for sample in self.ctr_data)
-                click_rate = total_clicks / len(self.ctr_data) if self.ctr_data else 0
-                
-                if click_rate < 0.01:
-                    health_report['data_issues'].append(f'点击率过低: {click_rate:.2%}')
-                    health_report['recommendations'].append('检查点击事件记录是否正常')
-                
+            counters = dict(self._health_counters)
+            dedup_stats = self._deduplicator.get_stats()
+            pending_changes = self.pending_changes
+        
+        try:
+            total_samples = counters['total_samples']
+            health_report = {
+                'total_samples': total_samples,
+                'pending_changes': pending_changes,
+                'cache_status': 'valid' if self._stats_cache else 'invalid',
+                'counters': counters,
+                'dedup': dedup_stats,
+                'audit': self.get_audit_status(),
+                'data_issues': [],
+                'recommendations': []
+            }
+            
+            if total_samples == 0:
+                health_report['data_issues'].append('没有数据')
+                health_report['recommendations'].append('进行一些搜索实验生成数据')
                 return health_report
-                
-            except Exception as e:
-                return {
-                    'error': str(e),
-                    'total_samples': len(self.ctr_data),
-                    'pending_changes': self.pending_changes
-                } 
\ No newline at end of file
+            
+            # 检查重复记录
+            duplicates = counters['duplicate_samples']
+            if duplicates > 0:
+                health_report['data_issues'].append(f'发现{duplicates}条重复记录')
+                health_report['recommendations'].append('考虑清理重复数据')
+            
+            # 检查数据完整性
+            incomplete_samples = counters['incomplete_samples']
+            if incomplete_samples > 0:
+                health_report['data_issues'].append(f'发现{incomplete_samples}条不完整记录')
+                health_report['recommendations'].append('检查数据收集逻辑')
+            
+            # 检查点击率
+            click_rate = counters['clicked_samples'] / total_samples
+            if click_rate < 0.01:
+                health_report['data_issues'].append(f'点击率过低: {click_rate:.2%}')
+                health_report['recommendations'].append('检查点击事件记录是否正常')
+            
+            return health_report
+            
+        except Exception as e:
+            return {
+                'error': str(e),
+                'total_samples': counters.get('total_samples', 0),
+                'pending_changes': pending_changes
+            }
+    
+    def start_full_audit(self) -> Dict[str, Any]:
+        """启动后台全量审计任务，逐条复核全部样本并校正增量计数器
+        
+        Returns:
+            Dict[str, Any]: 当前审计任务状态
+        """
+        with self.lock:
+            if self._audit_thread is not None and self._audit_thread.is_alive():
+                return dict(self._audit_status)
+            
+            # 在锁内获取样本和计数器的一致快照，审计本身在锁外进行
+            samples = self.ctr_data.copy()
+            baseline = dict(self._health_counters)
+            self._audit_status = {
+                'status': 'running',
+                'progress': 0.0,
+                'processed': 0,
+                'total': len(samples),
+                'started_at': datetime.now().isoformat()
+            }
+            self._audit_thread = threading.Thread(
+                target=self._run_full_audit, args=(samples, baseline),
+                daemon=True, name="DataAuditor"
+            )
+            self._audit_thread.start()
+            return dict(self._audit_status)
+    
+    def _run_full_audit(self, samples: List[Dict[str, Any]], baseline: Dict[str, int]):
+        """执行全量审计（后台线程）"""
+        try:
+            audited = self._empty_health_counters()
+            seen_keys = set()
+            total = len(samples)
+            
+            for i, sample in enumerate(samples, 1):
+                key = self._sample_key(sample)
+                self._count_sample(audited, sample, key in seen_keys)
+                seen_keys.add(key)
+                if i % 1000 == 0 or i == total:
+                    self._audit_status.update({
+                        'processed': i,
+                        'progress': round(i / total, 4)
+                    })
+            
+            # 审计期间若无新写入，用审计结果校正增量计数器；
+            # 否则样本可能已被并发修改（如点击），只报告偏差不校正
+            drift = {name: audited[name] - baseline[name] for name in audited}
+            with self.lock:
+                reconciled = self._health_counters == baseline
+                if reconciled:
+                    self._health_counters = dict(audited)
+            
+            self._audit_status.update({
+                'status': 'completed',
+                'progress': 1.0,
+                'finished_at': datetime.now().isoformat(),
+                'result': audited,
+                'drift': drift,
+                'counters_consistent': not any(drift.values()),
+                'reconciled': reconciled
+            })
+            print(f"✅ 全量数据审计完成: {total}条记录")
+            
+        except Exception as e:
+            self._audit_status.update({'status': 'failed', 'error': str(e)})
+            print(f"❌ 全量数据审计失败: {e}")
+    
+    def get_dedup_stats(self) -> Dict[str, Any]:
+        """获取展示去重统计"""
+        with self.lock:
+            return self._deduplicator.get_stats()
+    
+    def _memory_usage(self) -> Dict[str, int]:
+        """内存统计回调"""
+        with self.lock:
+            return {
+                'ctr_log.samples': deep_sizeof(self.ctr_data),
+                'ctr_log.aggregates': deep_sizeof((self._query_stats, self._doc_stats, self._query_requests)),
+                'ctr_log.click_cubes': deep_sizeof(self.analytics.cubes),
+                'ctr_log.dedup': deep_sizeof(self._deduplicator)
+            }
+    
+    def _collect_metrics(self) -> List:
+        """指标采集回调：读取写入时维护的计数器，不遍历样本"""
+        with self.lock:
+            counters = dict(self._health_counters)
+            dedup = self._deduplicator.get_stats()
+            queries = len(self._query_stats)
+            samples = len(self.ctr_data)
+        return [
+            gauge_family('search_data_samples', 'CTR样本数', samples),
+            gauge_family('search_data_unique_queries', '不同查询数', queries),
+            gauge_family('search_data_pending_changes', '待保存的变更数（写入队列深度）', self.pending_changes),
+            gauge_family('search_data_saving', '是否正在保存', int(self.is_saving)),
+            gauge_family('search_data_last_save_age_seconds', '距上次保存的秒数', time.time() - self.last_save_time),
+            gauge_family('search_data_health_samples', '健康计数器', [
+                ({'kind': kind}, value) for kind, value in counters.items()
+            ]),
+            counter_family('search_data_dedup_checks', '展示去重检查次数', dedup['checked']),
+            counter_family('search_data_dedup_duplicates', '识别出的重复展示数', dedup['duplicates']),
+            counter_family('search_data_dedup_dropped', '丢弃的重复展示数', dedup['dropped']),
+            gauge_family('search_data_dedup_memory_bytes', '去重布隆过滤器内存', dedup['bloom_memory_bytes'])
+        ]
+    
+    def get_audit_status(self) -> Dict[str, Any]:
+        """获取全量审计任务状态（含进度）"""
+        return dict(self._audit_status)
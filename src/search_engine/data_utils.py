@@ -96,44 +96,20 @@ def validate_click_params(doc_id: str, request_id: str) -> List[str]:
 
 # 数据分析工具
 def analyze_click_patterns() -> Dict[str, Any]:
-    """分析点击模式"""
-    samples = get_ctr_samples()
-    if not samples:
-        return {'error': '没有数据可分析'}
-    
-    df = pd.DataFrame(samples)
-    
-    analysis = {
-        'total_impressions': len(df),
-        'total_clicks': df['clicked'].sum() if 'clicked' in df.columns else 0,
-        'overall_ctr': 0.0,
-        'position_analysis': {},
-        'query_analysis': {},
-        'doc_analysis': {}
-    }
-    
-    if analysis['total_impressions'] > 0:
-        analysis['overall_ctr'] = analysis['total_clicks'] / analysis['total_impressions']
-    
-    # 位置分析
-    if 'position' in df.columns and 'clicked' in df.columns:
-        position_stats = df.groupby('position').agg({
-            'clicked': ['count', 'sum', 'mean']
-        }).round(4)
-        analysis['position_analysis'] = position_stats.to_dict()
-    
-    # 查询分析
-    if 'query' in df.columns and 'clicked' in df.columns:
-        query_stats = df.groupby('query').agg({
-            'clicked': ['count', 'sum', 'mean']
-        }).round(4)
-        analysis['query_analysis'] = query_stats.head(10).to_dict()
-    
-    # 文档分析
-    if 'doc_id' in df.columns and 'clicked' in df.columns:
-        doc_stats = df.groupby('doc_id').agg({
-            'clicked': ['count', 'sum', 'mean']
-        }).round(4)
-        analysis['doc_analysis'] = doc_stats.head(10).to_dict()
-    
-    return analysis 
\ No newline at end of file
+    """分析点击模式（读取数据服务增量维护的预聚合立方体）"""
+    return get_data_service().get_click_patterns()
+
+
+def get_position_ctr_curve(start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+    """获取位置CTR曲线"""
+    return get_data_service().get_position_ctr(start_day, end_day)
+
+
+def get_top_queries(n: int = 10, by: str = 'impressions') -> List[Dict[str, Any]]:
+    """获取热门查询"""
+    return get_data_service().get_top_queries(n, by)
+
+
+def get_top_docs(n: int = 10, by: str = 'impressions') -> List[Dict[str, Any]]:
+    """获取热门文档"""
+    return get_data_service().get_top_docs(n, by)
@@ -1,10 +1,28 @@
+"""
+实验服务 - 实验与实验结果存储在SQLite（WAL模式）中
+
+- 实验数量少，内存中保留一份（self.experiments），每次变更写穿到 experiments 表
+- 实验结果先进入内存缓冲，攒满 batch_size 条或距上次落盘超过 flush_interval 秒时在一个事务中批量写入
+  （后台定时器按 flush_interval 落盘，一批结果之后没有新结果时也不会长期滞留在缓冲中）；
+  读取结果前先落盘，读到的总是最新数据；个别无法写入的结果被移出缓冲，不会阻塞后续批次
+- 写入结果的同一事务中增量更新 (实验, 算法) 汇总表和 (实验, 算法, 指标) 汇总表，
+  算法对比、实验摘要和实验列表只读汇总表，不随结果条数增长
+- 首次启动时如存在旧的 data/experiments.json，自动导入（原文件保留）
+"""
+
 import os
 import json
+import math
 import uuid
+import sqlite3
+import threading
+import time
+import atexit
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import pandas as pd
 from dataclasses import dataclass, asdict
+from .metrics import REGISTRY, gauge_family, instrument
 
 
 @dataclass
@@ -33,61 +51,230 @@ class ExperimentResult:
     timestamp: str
 
 
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS experiments ("
+    "id TEXT PRIMARY KEY, status TEXT NOT NULL, created_time TEXT NOT NULL, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS results ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, experiment_id TEXT NOT NULL, algorithm TEXT NOT NULL, "
+    "metrics TEXT NOT NULL, sample_count INTEGER NOT NULL, click_count INTEGER NOT NULL, "
+    "click_rate REAL NOT NULL, timestamp TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_results_experiment_time ON results (experiment_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_results_experiment_algorithm ON results (experiment_id, algorithm)",
+    "CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp)",
+    # 汇总表：与 results 在同一事务中增量更新
+    "CREATE TABLE IF NOT EXISTS algorithm_stats ("
+    "experiment_id TEXT NOT NULL, algorithm TEXT NOT NULL, result_count INTEGER NOT NULL, "
+    "total_samples INTEGER NOT NULL, total_clicks INTEGER NOT NULL, "
+    "PRIMARY KEY (experiment_id, algorithm))",
+    "CREATE TABLE IF NOT EXISTS metric_stats ("
+    "experiment_id TEXT NOT NULL, algorithm TEXT NOT NULL, metric TEXT NOT NULL, "
+    "value_sum REAL NOT NULL, value_count INTEGER NOT NULL, "
+    "PRIMARY KEY (experiment_id, algorithm, metric))",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+]
+
+
 class ExperimentService:
     """MLOps实验管理服务"""
     
-    def __init__(self, data_file: str = "data/experiments.json"):
+    def __init__(self, data_file: str = "data/experiments.json", db_file: Optional[str] = None,
+                 batch_size: int = 100, flush_interval: float = 1.0):
+        """
+        Args:
+            data_file: 旧版JSON数据文件，仅用于首次启动时导入
+            db_file: SQLite数据库文件，默认与data_file同名的 .db 文件
+            batch_size: 结果缓冲达到该条数时落盘，1表示每条立即落盘
+            flush_interval: 距上次落盘超过该秒数时落盘（记录结果时检查，后台定时器也按此间隔检查）
+        """
         self.data_file = data_file
+        self.db_file = db_file or os.path.splitext(data_file)[0] + ".db"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
         self.experiments = {}
-        self.results = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._rejected: List[Dict[str, Any]] = []  # 无法写入数据库、已移出缓冲的结果
+        self._last_flush = time.time()
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._closed = threading.Event()
         self._load_experiments()
+        self._start_flush_timer()
+        atexit.register(self.close)
+        REGISTRY.register_collector("experiment_service", self._collect_metrics)
     
     def _load_experiments(self):
-        """加载实验数据"""
+        """打开数据库，必要时从旧版JSON导入，并加载实验"""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.experiments = data.get('experiments', {})
-                    self.results = data.get('results', {})
-                print(f"✅ 实验数据加载成功: {len(self.experiments)}个实验")
-            else:
-                os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-                print("📝 创建新的实验数据文件")
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+    
+            self._migrate_json()
+    
+            rows = self._db.execute("SELECT id, data FROM experiments").fetchall()
+            self.experiments = {experiment_id: json.loads(data) for experiment_id, data in rows}
+            print(f"✅ 实验数据加载成功: {len(self.experiments)}个实验")
         except Exception as e:
             print(f"❌ 加载实验数据失败: {e}")
     
-    def _save_experiments(self):
-        """保存实验数据"""
-        try:
-            data = {
-                'experiments': self.experiments,
-                'results': self.results,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"❌ 保存实验数据失败: {e}")
+    def _migrate_json(self):
+        """首次启动时导入旧版 experiments.json（只导入一次，原文件保留）"""
+        if not os.path.exists(self.data_file):
+            return
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+            return
+        if self._db.execute("SELECT 1 FROM experiments LIMIT 1").fetchone():
+            return
+    
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        experiments = data.get('experiments', {})
+        results = list(data.get('results', {}).values())
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO experiments (id, status, created_time, data) VALUES (?, ?, ?, ?)",
+                [(experiment_id, experiment.get('status', 'draft'), experiment.get('created_time', ''),
+                  json.dumps(experiment, ensure_ascii=False)) for experiment_id, experiment in experiments.items()]
+            )
+            self._insert_results(results)
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                (datetime.now().isoformat(),)
+            )
+        print(f"✅ 已从 {self.data_file} 导入 {len(experiments)} 个实验、{len(results)} 条结果")
+    
+    def _save_experiment(self, experiment: Dict[str, Any]):
+        """写入单个实验"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO experiments (id, status, created_time, data) VALUES (?, ?, ?, ?)",
+                (experiment['id'], experiment['status'], experiment['created_time'],
+                 json.dumps(experiment, ensure_ascii=False))
+            )
+    
+    def _insert_results(self, results: List[Dict[str, Any]]):
+        """插入结果并增量更新汇总表（调用方负责事务）"""
+        self._db.executemany(
+            "INSERT INTO results (experiment_id, algorithm, metrics, sample_count, click_count, click_rate, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(r['experiment_id'], r['algorithm'], json.dumps(r['metrics'], ensure_ascii=False),
+              r['sample_count'], r['click_count'], r['click_rate'], r['timestamp']) for r in results]
+        )
+    
+        # 先在内存中按 (实验, 算法) 合并本批次，再逐组 upsert
+        algorithm_totals: Dict[Tuple[str, str], List[int]] = {}
+        metric_totals: Dict[Tuple[str, str, str], List[float]] = {}
+        for r in results:
+            entry = algorithm_totals.setdefault((r['experiment_id'], r['algorithm']), [0, 0, 0])
+            entry[0] += 1
+            entry[1] += r['sample_count']
+            entry[2] += r['click_count']
+            for metric, value in r['metrics'].items():
+                metric_entry = metric_totals.setdefault((r['experiment_id'], r['algorithm'], metric), [0.0, 0])
+                metric_entry[0] += value
+                metric_entry[1] += 1
+    
+        self._db.executemany(
+            "INSERT INTO algorithm_stats (experiment_id, algorithm, result_count, total_samples, total_clicks) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (experiment_id, algorithm) DO UPDATE SET "
+            "result_count = result_count + excluded.result_count, "
+            "total_samples = total_samples + excluded.total_samples, "
+            "total_clicks = total_clicks + excluded.total_clicks",
+            [(*key, *values) for key, values in algorithm_totals.items()]
+        )
+        self._db.executemany(
+            "INSERT INTO metric_stats (experiment_id, algorithm, metric, value_sum, value_count) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (experiment_id, algorithm, metric) DO UPDATE SET "
+            "value_sum = value_sum + excluded.value_sum, value_count = value_count + excluded.value_count",
+            [(*key, *values) for key, values in metric_totals.items()]
+        )
+    
+    @instrument("experiment.save")
+    def _write_batch(self, results: List[Dict[str, Any]]):
+        """在一个事务中写入一批结果"""
+        with self._db:
+            self._insert_results(results)
+    
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """逐条写入结果，返回数据库暂时不可用、需要重试的结果；无法写入的结果移出缓冲"""
+        retry = []
+        for row in rows:
+            try:
+                with self._db:
+                    self._insert_results([row])
+            except sqlite3.OperationalError:
+                retry.append(row)
+            except Exception as e:
+                self._rejected.append(row)
+                print(f"❌ 实验结果无法保存，已移出缓冲: {e}")
+        return retry
+    
+    def flush(self) -> int:
+        """把缓冲中的结果落盘，返回写入条数
+        
+        数据库暂时不可用（OperationalError）时保留缓冲，下次重试；
+        其他原因整批失败时逐条写入，写不进去的结果移出缓冲，不再阻塞后续批次。
+        """
+        # 失败已由 _write_batch 的 experiment.save 埋点计入错误数，这里不再重复记录
+        with self._lock:
+            if not self._pending or self._db is None:
+                return 0
+            pending = self._pending
+            rejected = len(self._rejected)
+            try:
+                self._write_batch(pending)
+                self._pending = []
+            except sqlite3.OperationalError as e:
+                print(f"❌ 保存实验结果失败，稍后重试: {e}")
+                return 0
+            except Exception as e:
+                print(f"❌ 批量保存实验结果失败，逐条写入: {e}")
+                self._pending = self._write_rows(pending)
+            self._last_flush = time.time()
+            return len(pending) - len(self._pending) - (len(self._rejected) - rejected)
+    
+    def _start_flush_timer(self):
+        """启动后台定时落盘"""
+        def auto_flush():
+            while not self._closed.wait(self.flush_interval):
+                if self._pending and time.time() - self._last_flush >= self.flush_interval:
+                    self.flush()
+    
+        timer_thread = threading.Thread(target=auto_flush, daemon=True)
+        timer_thread.start()
+    
+    def close(self):
+        """落盘缓冲中的结果并关闭数据库"""
+        self._closed.set()
+        with self._lock:
+            if self._db is None:
+                return
+            self.flush()
+            self._db.close()
+            self._db = None
     
     def create_experiment(self, config: ExperimentConfig) -> Optional[str]:
         """创建新实验"""
         try:
             experiment_id = f"exp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
-            
+    
             experiment_data = {
                 'id': experiment_id,
                 'config': asdict(config),
                 'created_time': datetime.now().isoformat(),
                 'status': 'draft'
             }
-            
+    
+            self._save_experiment(experiment_data)
             self.experiments[experiment_id] = experiment_data
-            self._save_experiments()
-            
+    
             print(f"✅ 实验创建成功: {experiment_id}")
             return experiment_id
-            
+    
         except Exception as e:
             print(f"❌ 创建实验失败: {e}")
             return None
@@ -98,23 +285,23 @@ class ExperimentService:
             if experiment_id not in self.experiments:
                 print(f"❌ 实验不存在: {experiment_id}")
                 return False
-            
+    
             experiment = self.experiments[experiment_id]
             if experiment['status'] != 'draft':
                 print(f"❌ 实验状态不允许启动: {experiment['status']}")
                 return False
-            
+    
             # 更新实验状态
             experiment['status'] = 'running'
             experiment['start_time'] = datetime.now().isoformat()
             experiment['end_time'] = (
                 datetime.now() + timedelta(days=experiment['config']['duration_days'])
             ).isoformat()
-            
-            self._save_experiments()
+    
+            self._save_experiment(experiment)
             print(f"✅ 实验启动成功: {experiment_id}")
             return True
-            
+    
         except Exception as e:
             print(f"❌ 启动实验失败: {e}")
             return False
@@ -125,171 +312,169 @@ class ExperimentService:
             if experiment_id not in self.experiments:
                 print(f"❌ 实验不存在: {experiment_id}")
                 return False
-            
+    
             experiment = self.experiments[experiment_id]
             if experiment['status'] != 'running':
                 print(f"❌ 实验状态不允许停止: {experiment['status']}")
                 return False
-            
+    
             # 更新实验状态
             experiment['status'] = 'completed'
             experiment['end_time'] = datetime.now().isoformat()
-            
-            self._save_experiments()
+    
+            self._save_experiment(experiment)
             print(f"✅ 实验停止成功: {experiment_id}")
             return True
-            
+    
         except Exception as e:
             print(f"❌ 停止实验失败: {e}")
             return False
     
-    def record_result(self, experiment_id: str, algorithm: str, metrics: Dict[str, float], 
+    def record_result(self, experiment_id: str, algorithm: str, metrics: Dict[str, float],
                      sample_count: int, click_count: int) -> bool:
-        """记录实验结果"""
+        """记录实验结果（进入写缓冲，按批次落盘）"""
         try:
             if experiment_id not in self.experiments:
                 print(f"❌ 实验不存在: {experiment_id}")
                 return False
-            
-            result_id = f"{experiment_id}_{algorithm}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
+    
+            # 指标值必须是有限数值，否则会破坏汇总表的累加
+            metric_values = {str(metric): float(value) for metric, value in metrics.items()}
+            invalid = [metric for metric, value in metric_values.items() if not math.isfinite(value)]
+            if invalid:
+                raise ValueError(f"指标值不是有限数值: {invalid}")
+            sample_count = int(sample_count)
+            click_count = int(click_count)
+    
             result = ExperimentResult(
                 experiment_id=experiment_id,
                 algorithm=algorithm,
-                metrics=metrics,
+                metrics=metric_values,
                 sample_count=sample_count,
                 click_count=click_count,
                 click_rate=click_count / sample_count if sample_count > 0 else 0.0,
                 timestamp=datetime.now().isoformat()
             )
-            
-            self.results[result_id] = asdict(result)
-            self._save_experiments()
-            
-            print(f"✅ 实验结果记录成功: {result_id}")
+    
+            # 不用 asdict：递归深拷贝是记录结果的主要开销
+            row = dict(vars(result))
+            with self._lock:
+                self._pending.append(row)
+                if len(self._pending) >= self.batch_size or time.time() - self._last_flush >= self.flush_interval:
+                    self.flush()
             return True
-            
+    
         except Exception as e:
             print(f"❌ 记录实验结果失败: {e}")
             return False
     
     def get_experiment_results(self, experiment_id: str) -> List[Dict[str, Any]]:
-        """获取实验结果"""
+        """获取实验结果（按时间排序）"""
         try:
-            results = []
-            for result_id, result_data in self.results.items():
-                if result_data['experiment_id'] == experiment_id:
-                    results.append(result_data)
-            
-            # 按时间排序
-            results.sort(key=lambda x: x['timestamp'])
-            return results
-            
+            with self._lock:
+                self.flush()
+                rows = self._db.execute(
+                    "SELECT experiment_id, algorithm, metrics, sample_count, click_count, click_rate, timestamp "
+                    "FROM results WHERE experiment_id = ? ORDER BY timestamp, id",
+                    (experiment_id,)
+                ).fetchall()
+            return [
+                {'experiment_id': row[0], 'algorithm': row[1], 'metrics': json.loads(row[2]),
+                 'sample_count': row[3], 'click_count': row[4], 'click_rate': row[5], 'timestamp': row[6]}
+                for row in rows
+            ]
+    
         except Exception as e:
             print(f"❌ 获取实验结果失败: {e}")
             return []
     
+    def _load_comparisons(self, experiment_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """从汇总表读取算法对比：{实验ID: {算法: 统计}}，experiment_id为None时读取全部实验"""
+        where, params = ("WHERE experiment_id = ?", (experiment_id,)) if experiment_id else ("", ())
+        with self._lock:
+            self.flush()
+            algorithm_rows = self._db.execute(
+                f"SELECT experiment_id, algorithm, result_count, total_samples, total_clicks "
+                f"FROM algorithm_stats {where}", params
+            ).fetchall()
+            metric_rows = self._db.execute(
+                f"SELECT experiment_id, algorithm, metric, value_sum, value_count FROM metric_stats {where}", params
+            ).fetchall()
+    
+        comparisons: Dict[str, Dict[str, Any]] = {}
+        for exp_id, algorithm, result_count, total_samples, total_clicks in algorithm_rows:
+            comparisons.setdefault(exp_id, {})[algorithm] = {
+                'avg_metrics': {},
+                'total_samples': total_samples,
+                'total_clicks': total_clicks,
+                'avg_click_rate': total_clicks / total_samples if total_samples > 0 else 0.0,
+                'result_count': result_count
+            }
+        for exp_id, algorithm, metric, value_sum, value_count in metric_rows:
+            stats = comparisons.get(exp_id, {}).get(algorithm)
+            if stats is not None:
+                stats['avg_metrics'][metric] = value_sum / value_count if value_count else 0.0
+        return comparisons
+    
     def compare_algorithms(self, experiment_id: str) -> Dict[str, Any]:
         """对比算法效果"""
         try:
-            results = self.get_experiment_results(experiment_id)
-            if not results:
-                return {}
-            
-            # 按算法分组
-            algorithm_results = {}
-            for result in results:
-                algorithm = result['algorithm']
-                if algorithm not in algorithm_results:
-                    algorithm_results[algorithm] = []
-                algorithm_results[algorithm].append(result)
-            
-            # 计算平均指标
-            comparison = {}
-            for algorithm, algo_results in algorithm_results.items():
-                if not algo_results:
-                    continue
-                
-                # 计算平均值
-                avg_metrics = {}
-                for metric in algo_results[0]['metrics'].keys():
-                    values = [r['metrics'][metric] for r in algo_results if metric in r['metrics']]
-                    avg_metrics[metric] = sum(values) / len(values) if values else 0.0
-                
-                # 计算总体统计
-                total_samples = sum(r['sample_count'] for r in algo_results)
-                total_clicks = sum(r['click_count'] for r in algo_results)
-                avg_click_rate = total_clicks / total_samples if total_samples > 0 else 0.0
-                
-                comparison[algorithm] = {
-                    'avg_metrics': avg_metrics,
-                    'total_samples': total_samples,
-                    'total_clicks': total_clicks,
-                    'avg_click_rate': avg_click_rate,
-                    'result_count': len(algo_results)
-                }
-            
-            return comparison
-            
+            return self._load_comparisons(experiment_id).get(experiment_id, {})
+    
         except Exception as e:
             print(f"❌ 对比算法效果失败: {e}")
             return {}
     
+    def _build_summary(self, experiment: Dict[str, Any], comparison: Dict[str, Any]) -> Dict[str, Any]:
+        """由实验记录和算法对比生成摘要"""
+        # 确定最佳算法
+        best_algorithm = None
+        best_click_rate = 0.0
+        for algorithm, stats in comparison.items():
+            if stats['avg_click_rate'] > best_click_rate:
+                best_click_rate = stats['avg_click_rate']
+                best_algorithm = algorithm
+    
+        return {
+            'experiment_id': experiment['id'],
+            'name': experiment['config']['name'],
+            'description': experiment['config']['description'],
+            'status': experiment['status'],
+            'start_time': experiment.get('start_time'),
+            'end_time': experiment.get('end_time'),
+            'total_results': sum(stats['result_count'] for stats in comparison.values()),
+            'algorithms_tested': len(comparison),
+            'best_algorithm': best_algorithm,
+            'best_click_rate': best_click_rate,
+            'comparison': comparison
+        }
+    
     def get_experiment_summary(self, experiment_id: str) -> Dict[str, Any]:
         """获取实验摘要"""
         try:
             if experiment_id not in self.experiments:
                 return {}
-            
-            experiment = self.experiments[experiment_id]
-            results = self.get_experiment_results(experiment_id)
-            comparison = self.compare_algorithms(experiment_id)
-            
-            # 计算实验统计
-            total_results = len(results)
-            algorithms_tested = len(comparison)
-            
-            # 确定最佳算法
-            best_algorithm = None
-            best_click_rate = 0.0
-            for algorithm, stats in comparison.items():
-                if stats['avg_click_rate'] > best_click_rate:
-                    best_click_rate = stats['avg_click_rate']
-                    best_algorithm = algorithm
-            
-            summary = {
-                'experiment_id': experiment_id,
-                'name': experiment['config']['name'],
-                'description': experiment['config']['description'],
-                'status': experiment['status'],
-                'start_time': experiment.get('start_time'),
-                'end_time': experiment.get('end_time'),
-                'total_results': total_results,
-                'algorithms_tested': algorithms_tested,
-                'best_algorithm': best_algorithm,
-                'best_click_rate': best_click_rate,
-                'comparison': comparison
-            }
-            
-            return summary
-            
+    
+            return self._build_summary(self.experiments[experiment_id], self.compare_algorithms(experiment_id))
+    
         except Exception as e:
             print(f"❌ 获取实验摘要失败: {e}")
             return {}
     
     def list_experiments(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
-        """列出实验"""
+        """列出实验（一次读取全部汇总，不逐个实验查询）"""
         try:
-            experiments = []
-            for exp_id, exp_data in self.experiments.items():
-                if status is None or exp_data['status'] == status:
-                    summary = self.get_experiment_summary(exp_id)
-                    experiments.append(summary)
-            
-            # 按创建时间排序
-            experiments.sort(key=lambda x: x.get('start_time', ''), reverse=True)
+            comparisons = self._load_comparisons()
+            experiments = [
+                self._build_summary(exp_data, comparisons.get(exp_id, {}))
+                for exp_id, exp_data in list(self.experiments.items())
+                if status is None or exp_data['status'] == status
+            ]
+    
+            # 按开始时间排序（未启动的实验排在最后）
+            experiments.sort(key=lambda x: x.get('start_time') or '', reverse=True)
             return experiments
-            
+    
         except Exception as e:
             print(f"❌ 列出实验失败: {e}")
             return []
@@ -300,83 +485,101 @@ class ExperimentService:
             if experiment_id not in self.experiments:
                 print(f"❌ 实验不存在: {experiment_id}")
                 return False
-            
-            # 删除实验
-            del self.experiments[experiment_id]
-            
-            # 删除相关结果
-            result_ids_to_delete = []
-            for result_id, result_data in self.results.items():
-                if result_data['experiment_id'] == experiment_id:
-                    result_ids_to_delete.append(result_id)
-            
-            for result_id in result_ids_to_delete:
-                del self.results[result_id]
-            
-            self._save_experiments()
+    
+            with self._lock:
+                self.flush()
+                with self._db:
+                    # 删除实验及相关结果、汇总
+                    for table, column in (('experiments', 'id'), ('results', 'experiment_id'),
+                                          ('algorithm_stats', 'experiment_id'), ('metric_stats', 'experiment_id')):
+                        self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", (experiment_id,))
+                del self.experiments[experiment_id]
+    
             print(f"✅ 实验删除成功: {experiment_id}")
             return True
-            
+    
         except Exception as e:
             print(f"❌ 删除实验失败: {e}")
             return False
     
+    def _result_counts(self) -> Dict[str, int]:
+        """按算法统计的结果条数（含未落盘的缓冲）"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT algorithm, SUM(result_count) FROM algorithm_stats GROUP BY algorithm"
+            ).fetchall() if self._db is not None else []
+            counts = {algorithm: int(count) for algorithm, count in rows}
+            for result in self._pending:
+                counts[result['algorithm']] = counts.get(result['algorithm'], 0) + 1
+        return counts
+    
     def get_experiment_stats(self) -> Dict[str, Any]:
         """获取实验统计信息"""
         try:
             total_experiments = len(self.experiments)
-            total_results = len(self.results)
-            
+    
             # 按状态统计
             status_counts = {}
             for exp_data in self.experiments.values():
                 status = exp_data['status']
                 status_counts[status] = status_counts.get(status, 0) + 1
-            
+    
             # 按算法统计
-            algorithm_counts = {}
-            for result_data in self.results.values():
-                algorithm = result_data['algorithm']
-                algorithm_counts[algorithm] = algorithm_counts.get(algorithm, 0) + 1
-            
+            algorithm_counts = self._result_counts()
+    
             stats = {
                 'total_experiments': total_experiments,
-                'total_results': total_results,
+                'total_results': sum(algorithm_counts.values()),
                 'status_distribution': status_counts,
                 'algorithm_distribution': algorithm_counts,
                 'last_updated': datetime.now().isoformat()
             }
-            
+    
             return stats
-            
+    
         except Exception as e:
             print(f"❌ 获取实验统计失败: {e}")
             return {}
     
+    def _collect_metrics(self) -> List:
+        """指标采集回调"""
+        status_counts = {}
+        for exp_data in list(self.experiments.values()):
+            status = exp_data.get('status', 'unknown')
+            status_counts[status] = status_counts.get(status, 0) + 1
+        return [
+            gauge_family('search_experiments', '实验数', [
+                ({'status': status}, count) for status, count in sorted(status_counts.items())
+            ]),
+            gauge_family('search_experiment_results', '实验结果记录数', sum(self._result_counts().values())),
+            gauge_family('search_experiment_pending_results', '未落盘的实验结果数', len(self._pending)),
+            gauge_family('search_experiment_rejected_results', '无法写入、已移出缓冲的实验结果数', len(self._rejected))
+        ]
+    
     def export_experiment_data(self, experiment_id: str, filepath: str) -> bool:
         """导出实验数据"""
         try:
             if experiment_id not in self.experiments:
                 print(f"❌ 实验不存在: {experiment_id}")
                 return False
-            
+    
             experiment = self.experiments[experiment_id]
             results = self.get_experiment_results(experiment_id)
             comparison = self.compare_algorithms(experiment_id)
-            
+    
             export_data = {
                 'experiment': experiment,
                 'results': results,
                 'comparison': comparison,
                 'export_time': datetime.now().isoformat()
             }
-            
+    
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(export_data, f, ensure_ascii=False, indent=2)
-            
+    
             print(f"✅ 实验数据导出成功: {filepath}")
             return True
-            
+    
         except Exception as e:
             print(f"❌ 导出实验数据失败: {e}")
-            return False 
\ No newline at end of file
+            return False
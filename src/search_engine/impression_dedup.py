@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+展示事件去重模块
+基于布隆过滤器 + 近期窗口精确集合，对 (request_id, doc_id, position) 做O(1)去重
+"""
+
+import math
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class DedupConfig:
+    """展示去重配置"""
+    drop_duplicates: bool = False        # 是否丢弃确认重复的展示（默认只计数）
+    expected_items: int = 100000         # 布隆过滤器初始容量
+    false_positive_rate: float = 0.001   # 布隆过滤器目标误判率
+    recent_window: int = 10000           # 近期窗口精确集合大小
+
+
+class BloomFilter:
+    """定长布隆过滤器（双重哈希）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        if capacity <= 0:
+            raise ValueError("容量必须大于0")
+        if not 0 < error_rate < 1:
+            raise ValueError("误判率必须在0和1之间")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        """计算key对应的比特位"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        """添加key"""
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """可扩展布隆过滤器：写满后追加容量翻倍、误判率减半的新过滤器，整体误判率有界"""
+
+    def __init__(self, initial_capacity: int, error_rate: float):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.filters: List[BloomFilter] = []
+        self._add_filter()
+
+    def _add_filter(self):
+        n = len(self.filters)
+        self.filters.append(BloomFilter(
+            self.initial_capacity * (2 ** n),
+            self.error_rate * (0.5 ** (n + 1))
+        ))
+
+    def add(self, key: str):
+        if self.filters[-1].is_full:
+            self._add_filter()
+        self.filters[-1].add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in f for f in self.filters)
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
+
+
+class ImpressionDeduplicator:
+    """展示事件去重器
+
+    判定规则：
+    - 布隆过滤器未命中：一定是新展示（快速路径）
+    - 命中且在近期窗口中：确认重复（重试风暴等）
+    - 命中但不在近期窗口：可能是久远的重复或误判，只计数，永不丢弃
+    """
+
+    NEW = 'new'
+    DUPLICATE = 'duplicate'
+    PROBABLE_DUPLICATE = 'probable_duplicate'
+
+    def __init__(self, config: Optional[DedupConfig] = None):
+        self.config = config if config is not None else DedupConfig()
+        self.reset()
+
+    def reset(self):
+        """清空去重状态"""
+        self.bloom = ScalableBloomFilter(self.config.expected_items, self.config.false_positive_rate)
+        self.recent: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.stats = {
+            'checked': 0,
+            'duplicates': 0,
+            'probable_duplicates': 0,
+            'dropped': 0
+        }
+
+    @staticmethod
+    def make_key(request_id: Any, doc_id: Any, position: Any) -> str:
+        """构建去重键"""
+        return f"{request_id}\x1f{doc_id}\x1f{position}"
+
+    def observe(self, key: str, sample: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """检查并登记一条展示
+
+        Args:
+            key: 去重键
+            sample: 展示样本
+
+        Returns:
+            Tuple[str, Optional[Dict]]: (判定结果, 确认重复时的首条样本)
+        """
+        self.stats['checked'] += 1
+
+        if key not in self.bloom:
+            self.bloom.add(key)
+            self._remember(key, sample)
+            return self.NEW, None
+
+        original = self.recent.get(key)
+        if original is not None:
+            self.recent.move_to_end(key)
+            self.stats['duplicates'] += 1
+            return self.DUPLICATE, original
+
+        self.stats['probable_duplicates'] += 1
+        self._remember(key, sample)
+        return self.PROBABLE_DUPLICATE, None
+
+    def should_drop(self, status: str) -> bool:
+        """是否应丢弃该展示（只丢弃确认重复）"""
+        if status == self.DUPLICATE and self.config.drop_duplicates:
+            self.stats['dropped'] += 1
+            return True
+        return False
+
+    def _remember(self, key: str, sample: Dict[str, Any]):
+        self.recent[key] = sample
+        if len(self.recent) > self.config.recent_window:
+            self.recent.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取去重统计"""
+        stats = dict(self.stats)
+        stats.update({
+            'drop_duplicates': self.config.drop_duplicates,
+            'recent_window_size': len(self.recent),
+            'bloom_filters': len(self.bloom.filters),
+            'bloom_memory_bytes': self.bloom.memory_bytes
+        })
+        return stats
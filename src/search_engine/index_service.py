@@ -6,15 +6,39 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import pandas as pd
 from .index_tab.index_service import InvertedIndexService
+from .index_tab.vector_index import VectorIndex, create_embedder, reciprocal_rank_fusion
+from .memory_report import deep_sizeof, register_source as register_memory_source
+from .metrics import REGISTRY, counter_family, gauge_family, instrument, record_error
 
 
 class IndexService:
     """索引服务：负责索引构建、文档管理、检索功能"""
     
-    def __init__(self, index_file: str = "models/index_data.json"):
+    VECTOR_IVF_MIN_DOCS = 2000  # 文档数达到该规模时构建IVF，检索只扫描最近的簇
+    VECTOR_N_PROBE = 8
+    VECTOR_ENCODE_BATCH = 256
+    
+    def __init__(self, index_file: str = "models/index_data.json",
+                 vector_embedder: Optional[str] = None, vector_dir: str = "models/vector_index"):
+        """
+        Args:
+            index_file: 倒排索引文件
+            vector_embedder: 向量化器（'hashing' 或本地模型名称/路径），None时读取
+                             SEARCH_VECTOR_EMBEDDER 环境变量，均未设置则不启用向量检索
+            vector_dir: 向量索引目录
+        """
         self.index_file = index_file
         self.index_service = InvertedIndexService(index_file)
+        self.vector_dir = vector_dir
+        self.embedder = None
+        self.vector_index: Optional[VectorIndex] = None
         self._ensure_index_exists()
+        
+        vector_embedder = vector_embedder or os.getenv("SEARCH_VECTOR_EMBEDDER")
+        if vector_embedder:
+            self.enable_vector_index(vector_embedder)
+        REGISTRY.register_collector("index_service", self._collect_metrics)
+        register_memory_source("index_service", self._memory_usage)
     
     def _ensure_index_exists(self):
         """确保索引存在，如果不存在则构建"""
@@ -65,18 +89,105 @@ class IndexService:
             print(f"❌ 构建索引时发生错误: {e}")
             return False
     
+    def enable_vector_index(self, embedder_name: str = "hashing", rebuild: bool = False) -> bool:
+        """启用向量检索：加载已有向量索引，文档或向量化器不一致时重新构建"""
+        try:
+            self.embedder = create_embedder(embedder_name)
+            documents = self.get_all_documents()
+            
+            if not rebuild and os.path.exists(os.path.join(self.vector_dir, "ids.json")):
+                vector_index = VectorIndex.load(self.vector_dir)
+                if (vector_index.meta.get('embedder') == self.embedder.name
+                        and set(vector_index.ids) == set(documents)):
+                    self.vector_index = vector_index
+                    print(f"✅ 向量索引加载成功: {len(vector_index)} 个文档")
+                    return True
+            
+            self.vector_index = VectorIndex(self.embedder.dim)
+            self.vector_index.meta['embedder'] = self.embedder.name
+            self._add_vectors(documents)
+            if len(self.vector_index) >= self.VECTOR_IVF_MIN_DOCS:
+                self.vector_index.build_ivf()
+            self.vector_index.save(self.vector_dir)
+            print(f"✅ 向量索引构建完成: {len(self.vector_index)} 个文档")
+            return True
+        except Exception as e:
+            print(f"❌ 启用向量检索失败: {e}")
+            self.vector_index = None
+            return False
+    
+    def _add_vectors(self, documents: Dict[str, str]):
+        """分批向量化并写入向量索引"""
+        if self.vector_index is None or not documents:
+            return
+        items = list(documents.items())
+        for start in range(0, len(items), self.VECTOR_ENCODE_BATCH):
+            batch = items[start:start + self.VECTOR_ENCODE_BATCH]
+            vectors = self.embedder.encode([content for _, content in batch])
+            self.vector_index.add([doc_id for doc_id, _ in batch], vectors)
+    
+    def vector_search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """向量检索 (doc_id, 相似度)，未启用向量检索时返回空列表"""
+        if self.vector_index is None or not query.strip():
+            return []
+        query_vector = self.embedder.encode([query.strip()])[0]
+        n_probe = self.VECTOR_N_PROBE if self.vector_index.centroids is not None else None
+        return self.vector_index.search(query_vector, top_k=top_k, n_probe=n_probe)
+    
+    def hybrid_search(self, query: str, top_k: int = 10, candidates: int = 50,
+                      rrf_k: int = 60) -> List[Tuple[str, float, str]]:
+        """混合检索：词法检索与向量检索结果按RRF融合，返回 (doc_id, 融合分数, 摘要)
+        
+        未启用向量检索时没有可融合的结果，直接返回词法检索结果 (doc_id, TF-IDF分数, 摘要)
+        """
+        if self.vector_index is None:
+            return self.search(query, top_k=top_k)
+        lexical = self.search(query, top_k=candidates)
+        vector = self.vector_search(query, top_k=candidates)
+        summaries = {doc_id: summary for doc_id, _, summary in lexical}
+        
+        fused = reciprocal_rank_fusion(
+            [[doc_id for doc_id, _, _ in lexical], [doc_id for doc_id, _ in vector]], k=rrf_k
+        )
+        return [
+            (doc_id, score, summaries.get(doc_id) or self.get_document_preview(doc_id))
+            for doc_id, score in fused[:top_k]
+        ]
+    
     def get_document(self, doc_id: str) -> Optional[str]:
         """获取文档内容"""
         return self.index_service.get_document(doc_id)
     
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
-        """搜索文档"""
-        return self.index_service.search(query, top_k)
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Optional[str]]:
+        """批量获取文档内容，不存在的文档为None"""
+        return self.index_service.get_documents(doc_ids)
+    
+    def search(self, query: str, top_k: int = 20, mode: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """搜索文档，mode 为 tfidf/phrase/proximity/boolean"""
+        return self.index_service.search(query, top_k, mode)
+    
+    def search_passages(self, query: str, top_k: int = 5) -> List[Tuple[str, str, float, str]]:
+        """检索段落 (段落ID, 文档ID, 分数, 段落文本)"""
+        return self.index_service.search_passages(query, top_k)
     
+    def suggest(self, prefix: str, top_k: int = 10) -> List[Tuple[str, float, str]]:
+        """查询补全 (补全文本, 权重, 来源)，历史查询优先，词典词项补齐"""
+        return self.index_service.suggest(prefix, top_k)
+    
+    def record_query(self, query: str, weight: float = 1.0):
+        """记录一次搜索查询，增量更新查询补全"""
+        self.index_service.record_query(query, weight)
+    
+    def load_query_log(self, query_counts: Dict[str, float]):
+        """根据查询日志统计重建查询补全"""
+        self.index_service.load_query_log(query_counts)
+    
+    @instrument("index.retrieve")
     def retrieve(self, query: str, top_k: int = 20) -> List[str]:
         """检索文档ID列表"""
         return self.index_service.search_doc_ids(query, top_k)
     
+    @instrument("index.rank")
     def rank(self, query: str, doc_ids: List[str], top_k: int = 10, sort_mode: str = "tfidf") -> List[Tuple[str, float, str]]:
         """对文档进行排序，支持TF-IDF和CTR排序模式"""
         if not doc_ids:
@@ -125,6 +236,7 @@ class IndexService:
                 
             except Exception as e:
                 print(f"❌ CTR排序失败，回退到TF-IDF排序: {e}")
+                record_error("index.rank")
                 # 回退到TF-IDF排序
                 sorted_results = sorted(filtered_results, key=lambda x: x[1], reverse=True)
                 return sorted_results[:top_k]
@@ -206,11 +318,8 @@ class IndexService:
     
     def get_documents_batch(self, doc_ids: list) -> Dict[str, str]:
         """批量获取文档内容"""
-        results = {}
-        for doc_id in doc_ids:
-            content = self.get_document(doc_id)
-            results[doc_id] = content if content else "文档不存在"
-        return results
+        return {doc_id: content if content else "文档不存在"
+                for doc_id, content in self.get_documents(doc_ids).items()}
     
     def get_stats(self) -> Dict[str, Any]:
         """获取索引统计信息"""
@@ -221,6 +330,11 @@ class IndexService:
                 'total_terms': stats.get('total_terms', 0),
                 'average_doc_length': stats.get('average_doc_length', 0),
                 'index_size': stats.get('index_size', 0),
+                'total_passages': stats.get('total_passages', 0),
+                'vector_documents': len(self.vector_index) if self.vector_index is not None else 0,
+                'query_cache': stats.get('query_cache', {}),
+                'suggest_terms': stats.get('suggest_terms', 0),
+                'suggest_queries': stats.get('suggest_queries', 0),
                 'index_file': self.index_file,
                 'index_exists': os.path.exists(self.index_file)
             }
@@ -235,17 +349,68 @@ class IndexService:
                 'index_exists': os.path.exists(self.index_file)
             }
     
+    def _memory_usage(self) -> Dict[str, int]:
+        """内存统计回调"""
+        usage = self.index_service.get_memory_usage()
+        if self.vector_index is not None:
+            usage['index.vectors'] = deep_sizeof(self.vector_index)
+        return usage
+    
+    def _collect_metrics(self) -> List:
+        """指标采集回调"""
+        stats = self.index_service.get_stats()
+        cache = stats.get('query_cache', {})
+        families = [
+            gauge_family('search_index_documents', '索引文档数', stats.get('total_documents', 0)),
+            gauge_family('search_index_terms', '索引词项数', stats.get('total_terms', 0)),
+            gauge_family('search_index_passages', '段落索引的段落数', stats.get('total_passages', 0)),
+            gauge_family('search_index_vector_documents', '向量索引文档数',
+                         len(self.vector_index) if self.vector_index is not None else 0),
+            gauge_family('search_index_generation', '索引版本号（内容变化时递增）', stats.get('index_generation', 0)),
+            gauge_family('search_index_file_bytes', '索引文件大小',
+                         os.path.getsize(self.index_file) if os.path.exists(self.index_file) else 0),
+            gauge_family('search_suggest_entries', '查询补全条目数', [
+                ({'source': 'term'}, stats.get('suggest_terms', 0)),
+                ({'source': 'query'}, stats.get('suggest_queries', 0))
+            ])
+        ]
+        if 'position_bytes' in stats:
+            families.append(gauge_family('search_index_position_bytes', '位置倒排压缩后字节数',
+                                         stats['position_bytes']))
+        if cache:
+            families.extend([
+                counter_family('search_query_cache_requests', '查询结果缓存查找次数', [
+                    ({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])
+                ]),
+                counter_family('search_query_cache_evictions', '查询结果缓存淘汰数（LRU与过期）',
+                               cache['evictions'] + cache['expirations']),
+                gauge_family('search_query_cache_hit_ratio', '查询结果缓存命中率', cache['hit_ratio']),
+                gauge_family('search_query_cache_entries', '查询结果缓存条目数', cache['size']),
+                gauge_family('search_query_cache_bytes', '查询结果缓存字节数', cache['bytes'])
+            ])
+        return families
+    
     def add_document(self, doc_id: str, content: str) -> bool:
         """添加文档到索引"""
-        return self.index_service.add_document(doc_id, content)
+        success = self.index_service.add_document(doc_id, content)
+        if success:
+            self._add_vectors({doc_id: content})
+        return success
     
     def delete_document(self, doc_id: str) -> bool:
         """从索引中删除文档"""
+        if self.vector_index is not None:
+            self.vector_index.remove(doc_id)
         return self.index_service.delete_document(doc_id)
     
     def batch_add_documents(self, documents: Dict[str, str]) -> int:
-        """批量添加文档"""
-        return self.index_service.batch_add_documents(documents)
+        """批量添加文档（只为成功加入倒排索引的文档写入向量）"""
+        added = {
+            doc_id: content for doc_id, content in documents.items()
+            if self.index_service.add_document(doc_id, content)
+        }
+        self._add_vectors(added)
+        return len(added)
     
     def get_all_documents(self) -> Dict[str, str]:
         """获取所有文档"""
@@ -253,15 +418,25 @@ class IndexService:
     
     def clear_index(self) -> bool:
         """清空索引"""
+        if self.vector_index is not None:
+            name = self.vector_index.meta.get('embedder', '')
+            self.vector_index = VectorIndex(self.embedder.dim)
+            self.vector_index.meta['embedder'] = name
         return self.index_service.clear_index()
     
+    @instrument("index.save")
     def save_index(self, filepath: Optional[str] = None) -> bool:
         """保存索引"""
+        if self.vector_index is not None:
+            self.vector_index.save(self.vector_dir)
         return self.index_service.save_index(filepath)
     
     def load_index(self, filepath: str) -> bool:
-        """加载索引"""
-        return self.index_service.load_index(filepath)
+        """加载索引，已启用向量检索时按新文档集重新加载或重建向量索引"""
+        success = self.index_service.load_index(filepath)
+        if success and self.vector_index is not None:
+            self.enable_vector_index(self.embedder.name)
+        return success
     
     def export_documents(self) -> Tuple[Optional[str], str]:
         """导出所有文档"""
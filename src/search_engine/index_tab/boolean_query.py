@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布尔查询模块 - 查询解析与倒排表求交
+
+语法：
+    机器学习 AND (深度 OR 神经网络) NOT 图像
+    +必须词 -排除词 可选词 "短语 查询"
+
+- 相邻子句组成一组：+ 为必须、- 或 NOT 为排除，其余为可选；有必须子句时可选子句只参与打分
+- AND / OR 连接组，AND 优先级高于 OR，括号改变优先级
+- 未加引号的词经分词后为多个词项时按 AND 处理；引号内为短语，要求词项按相对位置相邻出现
+
+查询编译为执行树，对按文档ID排序的倒排数组求值：AND 从最短的倒排表开始，
+用倍增（galloping）查找在更长的表中定位，限制性强的查询只访问倒排表中很小的一部分。
+"""
+
+import re
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import List, Optional, Sequence
+
+from .positions import count_phrase_matches
+
+_TOKEN_PATTERN = re.compile(r'[+\-]?"[^"]*"?|[()]|[^\s()"]+')
+_OPERATORS = {'AND', 'OR', 'NOT'}
+
+
+class QuerySyntaxError(ValueError):
+    """查询语法错误"""
+
+
+# ---------- 有序数组求交/求差 ----------
+
+def gallop(values: Sequence, target, lo: int = 0) -> int:
+    """从lo开始按1,2,4...倍增步长跳跃，再在最后一段二分，返回第一个 >= target 的下标"""
+    n = len(values)
+    step = 1
+    hi = lo
+    while hi < n and values[hi] < target:
+        lo = hi + 1
+        hi += step
+        step <<= 1
+    return bisect_left(values, target, lo, min(hi, n))
+
+
+def intersect_sorted(lists: List[Sequence]) -> List:
+    """多个有序数组求交：从最短的开始，依次在更长的数组中倍增查找"""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = list(lists[0])
+    for other in lists[1:]:
+        if not result:
+            break
+        matched = []
+        j = 0
+        for value in result:
+            j = gallop(other, value, j)
+            if j >= len(other):
+                break
+            if other[j] == value:
+                matched.append(value)
+        result = matched
+    return result
+
+
+def difference_sorted(values: Sequence, excluded: Sequence) -> List:
+    """有序数组求差"""
+    if not excluded:
+        return list(values)
+    result = []
+    j = 0
+    for value in values:
+        j = gallop(excluded, value, j)
+        if j >= len(excluded) or excluded[j] != value:
+            result.append(value)
+    return result
+
+
+def union_sorted(lists: List[Sequence]) -> List:
+    """多个有序数组求并"""
+    if len(lists) == 1:
+        return list(lists[0])
+    return sorted(set().union(*lists))
+
+
+# ---------- 执行树 ----------
+
+class QueryNode(ABC):
+    """执行树节点"""
+
+    @abstractmethod
+    def estimate(self, index) -> int:
+        """结果数上界，用于安排求交顺序"""
+        pass
+
+    @abstractmethod
+    def evaluate(self, index) -> List[str]:
+        """返回按文档ID排序的匹配文档"""
+        pass
+
+    def scoring_terms(self) -> List[str]:
+        """参与打分的词项（排除子句中的词项不计）"""
+        return []
+
+
+class TermNode(QueryNode):
+    def __init__(self, term: str):
+        self.term = term
+
+    def estimate(self, index) -> int:
+        return index.doc_freq.get(self.term, 0)
+
+    def evaluate(self, index) -> List[str]:
+        return index.get_sorted_postings(self.term)
+
+    def scoring_terms(self) -> List[str]:
+        return [self.term]
+
+    def __repr__(self):
+        return f"Term({self.term})"
+
+
+class PhraseNode(QueryNode):
+    def __init__(self, terms: List[str], gaps: List[int]):
+        self.terms = terms
+        self.gaps = gaps
+
+    def estimate(self, index) -> int:
+        return min(index.doc_freq.get(term, 0) for term in self.terms)
+
+    def evaluate(self, index) -> List[str]:
+        candidates = intersect_sorted([index.get_sorted_postings(term) for term in set(self.terms)])
+        if not index.positional:
+            return candidates
+        return [doc_id for doc_id in candidates
+                if count_phrase_matches([index.get_positions(t, doc_id) for t in self.terms], self.gaps)]
+
+    def scoring_terms(self) -> List[str]:
+        return list(self.terms)
+
+    def __repr__(self):
+        return f"Phrase({' '.join(self.terms)})"
+
+
+class AndNode(QueryNode):
+    def __init__(self, required: List[QueryNode], excluded: Optional[List[QueryNode]] = None,
+                 optional: Optional[List[QueryNode]] = None):
+        self.required = required
+        self.excluded = excluded or []
+        self.optional = optional or []  # 只参与打分
+
+    def estimate(self, index) -> int:
+        if not self.required:
+            return len(index.documents)
+        return min(child.estimate(index) for child in self.required)
+
+    def evaluate(self, index) -> List[str]:
+        if self.required:
+            # 先求值结果最少的子节点，结果为空时提前结束
+            result = None
+            for child in sorted(self.required, key=lambda c: c.estimate(index)):
+                docs = child.evaluate(index)
+                result = docs if result is None else intersect_sorted([result, docs])
+                if not result:
+                    return []
+        else:
+            result = index.get_sorted_doc_ids()
+        for child in self.excluded:
+            result = difference_sorted(result, child.evaluate(index))
+        return result
+
+    def scoring_terms(self) -> List[str]:
+        return [t for child in self.required + self.optional for t in child.scoring_terms()]
+
+    def __repr__(self):
+        return f"And(+{self.required} -{self.excluded} ?{self.optional})"
+
+
+class OrNode(QueryNode):
+    def __init__(self, children: List[QueryNode], excluded: Optional[List[QueryNode]] = None):
+        self.children = children
+        self.excluded = excluded or []
+
+    def estimate(self, index) -> int:
+        return sum(child.estimate(index) for child in self.children)
+
+    def evaluate(self, index) -> List[str]:
+        result = union_sorted([child.evaluate(index) for child in self.children])
+        for child in self.excluded:
+            result = difference_sorted(result, child.evaluate(index))
+        return result
+
+    def scoring_terms(self) -> List[str]:
+        return [t for child in self.children for t in child.scoring_terms()]
+
+    def __repr__(self):
+        return f"Or({self.children} -{self.excluded})"
+
+
+# ---------- 解析 ----------
+
+class BooleanQueryParser:
+    """布尔查询解析器，词项预处理与索引一致"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def parse(self, query: str) -> Optional[QueryNode]:
+        """解析查询，查询中没有可检索的词项时返回None"""
+        self.tokens = _TOKEN_PATTERN.findall(query)
+        self.pos = 0
+        node = self._or_expr()
+        if self.pos < len(self.tokens):
+            raise QuerySyntaxError(f"无法解析的查询片段: {' '.join(self.tokens[self.pos:])}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _or_expr(self) -> Optional[QueryNode]:
+        children = [self._and_expr()]
+        while self._peek() == 'OR':
+            self.pos += 1
+            children.append(self._and_expr())
+        children = [c for c in children if c is not None]
+        if len(children) <= 1:
+            return children[0] if children else None
+        return OrNode(children)
+
+    def _and_expr(self) -> Optional[QueryNode]:
+        children = [self._group()]
+        while self._peek() == 'AND':
+            self.pos += 1
+            children.append(self._group())
+        children = [c for c in children if c is not None]
+        if len(children) <= 1:
+            return children[0] if children else None
+        # "a AND NOT b" 中的纯排除组并入排除列表，避免先展开全集
+        required, excluded = [], []
+        for child in children:
+            if isinstance(child, AndNode) and not child.required and not child.optional:
+                excluded.extend(child.excluded)
+            else:
+                required.append(child)
+        return AndNode(required, excluded)
+
+    def _group(self) -> Optional[QueryNode]:
+        """相邻子句组：+必须、-/NOT排除、其余可选"""
+        required, excluded, optional = [], [], []
+        while True:
+            token = self._peek()
+            if token is None or token in ('AND', 'OR', ')'):
+                break
+            modifier = ''
+            if token == 'NOT':
+                modifier = '-'
+                self.pos += 1
+                token = self._peek()
+                if token is None or token in _OPERATORS or token == ')':
+                    raise QuerySyntaxError("NOT 后缺少查询词")
+            elif token[0] in '+-':
+                modifier = token[0]
+                if len(token) > 1:
+                    self.tokens[self.pos] = token[1:]
+                else:
+                    self.pos += 1  # 单独的 +/- 修饰随后的子句，如 -(a OR b)
+                    token = self._peek()
+                    if token is None or token in _OPERATORS or token == ')':
+                        raise QuerySyntaxError(f"{modifier} 后缺少查询词")
+
+            node = self._primary()
+            if node is None:
+                continue
+            {'+': required, '-': excluded, '': optional}[modifier].append(node)
+
+        if not (required or excluded or optional):
+            return None
+        if required or (excluded and not optional):
+            return AndNode(required, excluded, optional)
+        if len(optional) == 1 and not excluded:
+            return optional[0]
+        return OrNode(optional, excluded)
+
+    def _primary(self) -> Optional[QueryNode]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        if token == '(':
+            node = self._or_expr()
+            if self._peek() != ')':
+                raise QuerySyntaxError("括号不匹配")
+            self.pos += 1
+            return node
+        if token.startswith('"'):
+            return self._phrase(token.strip('"'))
+        return self._word(token)
+
+    def _word(self, text: str) -> Optional[QueryNode]:
+        """未加引号的词：分出多个词项时全部必须出现"""
+        terms = list(dict.fromkeys(self.index.preprocess_text(text)))
+        if not terms:
+            return None
+        if len(terms) == 1:
+            return TermNode(terms[0])
+        return AndNode([TermNode(term) for term in terms])
+
+    def _phrase(self, text: str) -> Optional[QueryNode]:
+        tokens = self.index.tokenize_with_offsets(text)
+        if not tokens:
+            return None
+        if len(tokens) == 1:
+            return TermNode(tokens[0][0])
+        first = tokens[0][1]
+        return PhraseNode([word for word, _ in tokens], [start - first for _, start in tokens])
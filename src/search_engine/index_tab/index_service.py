@@ -7,9 +7,15 @@
 
 import json
 import os
+from functools import partial
 from typing import List, Dict, Tuple, Optional, Any
 from abc import ABC, abstractmethod
 from .offline_index import InvertedIndex
+from .passage_index import PassageIndex
+from .suggest_index import SuggestIndex
+from ..cache import LRUTTLCache
+from ..memory_report import deep_sizeof
+from ..tracing import span
 
 class IndexServiceInterface(ABC):
     """倒排索引服务接口"""
@@ -55,19 +61,66 @@ class IndexServiceInterface(ABC):
         pass
 
 class InvertedIndexService(IndexServiceInterface):
-    """倒排索引服务实现"""
+    """倒排索引服务实现
     
-    def __init__(self, index_file: str = "models/index_data.json"):
+    检索结果按 (索引版本, 打分器, top_k, 规范化查询词) 缓存。文档增删、清空和加载时
+    递增索引版本，旧版本的缓存条目不会再被命中，随LRU/TTL自然淘汰。
+    """
+    
+    def __init__(self, index_file: str = "models/index_data.json",
+                 cache_max_entries: int = 1000, cache_ttl: float = 300):
         """
         初始化倒排索引服务
         
         Args:
             index_file: 索引文件路径
+            cache_max_entries: 查询结果缓存最大条目数
+            cache_ttl: 查询结果缓存有效期（秒）
         """
         self.index = InvertedIndex()
+        self.passage_index = PassageIndex(self.index.preprocess_text)
+        self.suggest_index = SuggestIndex()
         self.index_file = index_file
+        self.generation = 0
+        self.result_cache = LRUTTLCache(max_entries=cache_max_entries, ttl=cache_ttl)
         self._load_or_create_index()
     
+    def _bump_generation(self):
+        """索引内容变化，使已缓存的检索结果失效"""
+        self.generation += 1
+    
+    def _cache_key(self, scorer: str, top_k: int, terms: List[str]) -> str:
+        return "\x1f".join([str(self.generation), scorer, str(top_k)] + terms)
+    
+    def _cached_search(self, scorer: str, query: str, top_k: int, search_fn) -> List[Tuple]:
+        """按规范化查询词缓存检索结果"""
+        if scorer in ("phrase", "proximity"):
+            # 位置相关的打分依赖词项在查询中的相对偏移，偏移也是缓存键的一部分
+            tokens = self.index.tokenize_with_offsets(query)
+            terms = [f"{word}@{start - tokens[0][1]}" for word, start in tokens]
+        elif scorer == "boolean":
+            # 布尔查询的运算符和括号决定结果，按原查询（合并空白）缓存
+            terms = query.split()
+        else:
+            terms = self.index.preprocess_text(query)
+        if not terms:
+            return []
+        key = self._cache_key(scorer, top_k, terms)
+        with span("query_cache", scorer=scorer) as cache_span:
+            results = self.result_cache.get(key)
+            cache_span.set_attribute('hit', results is not None)
+        if results is None:
+            results = search_fn(query, top_k=top_k)
+            self.result_cache.set(key, results)
+        return list(results)
+    
+    def _rebuild_passage_index(self):
+        """根据文档索引重建段落索引（段落索引不单独持久化）"""
+        self.passage_index = PassageIndex(self.index.preprocess_text)
+        for doc_id, content in self.index.get_all_documents().items():
+            self.passage_index.add_document(doc_id, content)
+        self.suggest_index.rebuild_terms(self.index.doc_freq)
+    
     def _load_or_create_index(self):
         """加载或创建索引"""
         try:
@@ -97,7 +150,10 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否添加成功
         """
         try:
-            self.index.add_document(doc_id, content)
+            terms = self.index.add_document(doc_id, content)
+            self.passage_index.add_document(doc_id, content)
+            self.suggest_index.update_terms(self.index.doc_freq, terms)
+            self._bump_generation()
             return True
         except Exception as e:
             print(f"添加文档失败: {e}")
@@ -114,8 +170,12 @@ class InvertedIndexService(IndexServiceInterface):
             bool: 是否删除成功
         """
         try:
+            content = self.index.documents.get(doc_id)
             success = self.index.delete_document(doc_id)
+            self.passage_index.delete_document(doc_id)
             if success:
+                self.suggest_index.update_terms(self.index.doc_freq, set(self.index.preprocess_text(content)))
+                self._bump_generation()
                 print(f"文档 '{doc_id}' 删除成功")
             else:
                 print(f"文档 '{doc_id}' 不存在")
@@ -124,13 +184,14 @@ class InvertedIndexService(IndexServiceInterface):
             print(f"删除文档失败: {e}")
             return False
     
-    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float, str]]:
+    def search(self, query: str, top_k: int = 20, mode: str = "tfidf") -> List[Tuple[str, float, str]]:
         """
         搜索文档
         
         Args:
             query: 查询字符串
             top_k: 返回结果数量
+            mode: 打分模式 tfidf/phrase/proximity/boolean
             
         Returns:
             List[Tuple[str, float, str]]: 搜索结果列表 (doc_id, score, summary)
@@ -138,11 +199,55 @@ class InvertedIndexService(IndexServiceInterface):
         try:
             if not query.strip():
                 return []
-            return self.index.search(query.strip(), top_k=top_k)
+            return self._cached_search(mode, query.strip(), top_k, partial(self.index.search, mode=mode))
         except Exception as e:
             print(f"搜索失败: {e}")
             return []
     
+    def search_passages(self, query: str, top_k: int = 5) -> List[Tuple[str, str, float, str]]:
+        """
+        检索段落（用于RAG上下文）
+        
+        Args:
+            query: 查询字符串
+            top_k: 返回段落数量
+            
+        Returns:
+            List[Tuple[str, str, float, str]]: (段落ID, 文档ID, BM25分数, 段落文本)
+        """
+        try:
+            if not query.strip():
+                return []
+            return self._cached_search("bm25_passage", query.strip(), top_k, self.passage_index.search)
+        except Exception as e:
+            print(f"段落检索失败: {e}")
+            return []
+    
+    def suggest(self, prefix: str, top_k: int = 10) -> List[Tuple[str, float, str]]:
+        """
+        查询补全
+        
+        Args:
+            prefix: 已输入的查询前缀
+            top_k: 返回数量
+        
+        Returns:
+            List[Tuple[str, float, str]]: (补全文本, 权重, 来源 'query'/'term')
+        """
+        try:
+            return self.suggest_index.suggest(prefix, top_k)
+        except Exception as e:
+            print(f"查询补全失败: {e}")
+            return []
+    
+    def record_query(self, query: str, weight: float = 1.0):
+        """记录一次搜索查询，用于查询补全"""
+        self.suggest_index.record_query(query, weight)
+    
+    def load_query_log(self, query_counts: Dict[str, float]):
+        """根据查询日志统计（查询 -> 搜索次数）重建查询补全"""
+        self.suggest_index.rebuild_queries(query_counts)
+    
     def get_document(self, doc_id: str) -> Optional[str]:
         """
         获取文档内容
@@ -159,6 +264,23 @@ class InvertedIndexService(IndexServiceInterface):
             print(f"获取文档失败: {e}")
             return None
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        批量获取文档内容
+        
+        Args:
+            doc_ids: 文档ID列表
+            
+        Returns:
+            Dict[str, Optional[str]]: {文档ID: 内容}，不存在的文档为None
+        """
+        try:
+            found = self.index.get_documents(doc_ids)
+            return {doc_id: found.get(doc_id) for doc_id in doc_ids}
+        except Exception as e:
+            print(f"批量获取文档失败: {e}")
+            return {doc_id: None for doc_id in doc_ids}
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         获取索引统计信息
@@ -167,7 +289,12 @@ class InvertedIndexService(IndexServiceInterface):
             Dict[str, Any]: 统计信息
         """
         try:
-            return self.index.get_index_stats()
+            stats = self.index.get_index_stats()
+            stats.update(self.passage_index.get_stats())
+            stats.update(self.suggest_index.get_stats())
+            stats['index_generation'] = self.generation
+            stats['query_cache'] = self.result_cache.get_stats()
+            return stats
         except Exception as e:
             print(f"获取统计信息失败: {e}")
             return {
@@ -176,6 +303,14 @@ class InvertedIndexService(IndexServiceInterface):
                 'average_doc_length': 0
             }
     
+    def get_memory_usage(self) -> Dict[str, int]:
+        """倒排索引、段落索引、补全索引和查询结果缓存的估算内存占用（字节）"""
+        usage = self.index.get_memory_usage()
+        usage['index.passages'] = deep_sizeof(self.passage_index)
+        usage['index.suggest'] = deep_sizeof(self.suggest_index)
+        usage['index.query_cache'] = self.result_cache.get_memory_usage()
+        return usage
+    
     def save_index(self, filepath: Optional[str] = None) -> bool:
         """
         保存索引到文件
@@ -208,6 +343,8 @@ class InvertedIndexService(IndexServiceInterface):
         """
         try:
             self.index.load_from_file(filepath)
+            self._rebuild_passage_index()
+            self._bump_generation()
             return True
         except Exception as e:
             print(f"加载索引失败: {e}")
@@ -222,6 +359,9 @@ class InvertedIndexService(IndexServiceInterface):
         """
         try:
             self.index = InvertedIndex()
+            self.passage_index = PassageIndex(self.index.preprocess_text)
+            self.suggest_index.terms.clear()  # 历史查询与索引内容无关，保留
+            self._bump_generation()
             return True
         except Exception as e:
             print(f"清空索引失败: {e}")
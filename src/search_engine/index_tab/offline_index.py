@@ -9,21 +9,41 @@ import jieba
 import re
 import json
 import math
+import base64
 from typing import List, Dict, Tuple, Set
 from collections import defaultdict, Counter
 import pandas as pd
 from datetime import datetime
 import os
+from .positions import (
+    encode_positions, decode_positions, count_phrase_matches, min_cover_span, best_window
+)
+from .boolean_query import BooleanQueryParser
+from ..memory_report import deep_sizeof
+from ..metrics import instrument
+from ..tracing import span
+
+# 检索打分模式：tfidf 词袋；phrase 短语（词项按查询中的相对位置相邻出现）；proximity 邻近度加权；
+# boolean 布尔查询（AND/OR/NOT、+必须、-排除、"短语"），只对匹配文档打分
+SEARCH_MODES = ("tfidf", "phrase", "proximity", "boolean")
 
 class InvertedIndex:
     """倒排索引类"""
     
-    def __init__(self):
+    def __init__(self, positional: bool = True):
+        """
+        Args:
+            positional: 是否维护位置倒排（短语/邻近检索和摘要定位需要）
+        """
         self.index = defaultdict(set)  # 词项 -> 文档ID集合
         self.doc_lengths = {}          # 文档ID -> 文档长度
         self.documents = {}            # 文档ID -> 文档内容
         self.term_freq = defaultdict(dict)  # 词项 -> {文档ID: 词频}
         self.doc_freq = defaultdict(int)    # 词项 -> 文档频率
+        self.positional = positional
+        self.positions = defaultdict(dict)  # 词项 -> {文档ID: 字符偏移列表的差分变长编码}
+        self._sorted_postings = {}          # 词项 -> 按文档ID排序的倒排数组（按需构建，写入时失效）
+        self._sorted_doc_ids = None
         
         # 停用词
         self.stop_words = {
@@ -40,13 +60,19 @@ class InvertedIndex:
         
         return words
     
-    def add_document(self, doc_id: str, content: str):
-        """添加文档到索引"""
+    def tokenize_with_offsets(self, text: str) -> List[Tuple[str, int]]:
+        """与preprocess_text相同的预处理，同时返回每个词项在原文中的字符偏移"""
+        return [(word, start) for word, start, _ in jieba.tokenize(text.lower())
+                if len(word) > 1 and word not in self.stop_words]
+    
+    def add_document(self, doc_id: str, content: str) -> List[str]:
+        """添加文档到索引，返回文档包含的词项"""
         # 保存原始文档
         self.documents[doc_id] = content
         
         # 预处理文本
-        words = self.preprocess_text(content)
+        tokens = self.tokenize_with_offsets(content)
+        words = [word for word, _ in tokens]
         
         # 计算文档长度
         self.doc_lengths[doc_id] = len(words)
@@ -62,6 +88,22 @@ class InvertedIndex:
         # 更新文档频率
         for word in word_freq:
             self.doc_freq[word] = len(self.index[word])
+            self._sorted_postings.pop(word, None)
+        self._sorted_doc_ids = None
+        
+        # 更新位置倒排
+        if self.positional:
+            self._add_positions(doc_id, tokens)
+        
+        return list(word_freq)
+    
+    def _add_positions(self, doc_id: str, tokens: List[Tuple[str, int]]):
+        """写入文档的位置倒排"""
+        offsets = defaultdict(list)
+        for word, start in tokens:
+            offsets[word].append(start)
+        for word, word_offsets in offsets.items():
+            self.positions[word][doc_id] = encode_positions(word_offsets)
     
     def delete_document(self, doc_id: str) -> bool:
         """删除文档从索引"""
@@ -74,7 +116,14 @@ class InvertedIndex:
         word_freq = Counter(words)
         
         # 从倒排索引中移除文档
+        self._sorted_doc_ids = None
         for word in word_freq:
+            self._sorted_postings.pop(word, None)
+            word_positions = self.positions.get(word)
+            if word_positions is not None:
+                word_positions.pop(doc_id, None)
+                if not word_positions:
+                    del self.positions[word]
             if word in self.index:
                 self.index[word].discard(doc_id)
                 # 如果词项没有文档了，删除该词项
@@ -99,31 +148,50 @@ class InvertedIndex:
         
         return True
     
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float, str]]:
-        """搜索文档"""
+    @instrument("inverted_index.search")
+    def search(self, query: str, top_k: int = 5, mode: str = "tfidf") -> List[Tuple[str, float, str]]:
+        """
+        搜索文档
+        
+        Args:
+            query: 查询字符串
+            top_k: 返回结果数量
+            mode: 打分模式，见 SEARCH_MODES；phrase/proximity 需要位置倒排
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"未知的检索模式: {mode}")
+        if mode == "boolean":
+            return self._boolean_search(query, top_k)
+        
         # 预处理查询
-        query_words = self.preprocess_text(query)
+        with span("tokenize"):
+            query_tokens = self.tokenize_with_offsets(query)
+        query_words = [word for word, _ in query_tokens]
         
         if not query_words:
             return []
         
         # 计算TF-IDF分数
-        scores = {}
-        total_docs = len(self.documents)
-        
-        for doc_id in self.documents:
-            score = 0
-            for word in query_words:
-                if word in self.index and doc_id in self.index[word]:
-                    # TF
-                    tf = self.term_freq[word][doc_id] / self.doc_lengths[doc_id]
-                    # IDF
-                    idf = math.log(total_docs / self.doc_freq[word])
-                    # TF-IDF
-                    score += tf * idf
+        with span("score", mode=mode):
+            scores = {}
+            total_docs = len(self.documents)
             
-            if score > 0:
-                scores[doc_id] = score
+            for doc_id in self.documents:
+                score = 0
+                for word in query_words:
+                    if word in self.index and doc_id in self.index[word]:
+                        # TF
+                        tf = self.term_freq[word][doc_id] / self.doc_lengths[doc_id]
+                        # IDF
+                        idf = math.log(total_docs / self.doc_freq[word])
+                        # TF-IDF
+                        score += tf * idf
+                
+                if score > 0:
+                    scores[doc_id] = score
+            
+            if mode != "tfidf" and self.positional:
+                scores = self._positional_scores(scores, query_tokens, mode)
         
         # 排序并返回结果
         sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -136,10 +204,89 @@ class InvertedIndex:
         
         return results
     
+    def get_sorted_postings(self, word: str) -> List[str]:
+        """获取词项按文档ID排序的倒排数组"""
+        postings = self._sorted_postings.get(word)
+        if postings is None:
+            postings = sorted(self.index.get(word, ()))
+            self._sorted_postings[word] = postings
+        return postings
+    
+    def get_sorted_doc_ids(self) -> List[str]:
+        """获取按ID排序的全部文档（纯排除查询的全集）"""
+        if self._sorted_doc_ids is None:
+            self._sorted_doc_ids = sorted(self.documents)
+        return self._sorted_doc_ids
+    
+    def _boolean_search(self, query: str, top_k: int) -> List[Tuple[str, float, str]]:
+        """布尔查询：执行树求出匹配文档，只对匹配文档计算TF-IDF"""
+        node = BooleanQueryParser(self).parse(query)
+        if node is None:
+            return []
+        
+        matched = node.evaluate(self)
+        query_words = list(dict.fromkeys(node.scoring_terms()))
+        total_docs = len(self.documents)
+        scored = []
+        for doc_id in matched:
+            score = 0
+            for word in query_words:
+                tf = self.term_freq.get(word, {}).get(doc_id)
+                if tf:
+                    score += tf / self.doc_lengths[doc_id] * math.log(total_docs / self.doc_freq[word])
+            scored.append((doc_id, score))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        
+        return [(doc_id, score, self.generate_summary(doc_id, query_words)) for doc_id, score in scored[:top_k]]
+    
+    def get_positions(self, word: str, doc_id: str) -> List[int]:
+        """获取词项在文档中的字符偏移列表"""
+        word_positions = self.positions.get(word)
+        if not word_positions or doc_id not in word_positions:
+            return []
+        return decode_positions(word_positions[doc_id])
+    
+    def _positional_scores(self, scores: Dict[str, float], query_tokens: List[Tuple[str, int]],
+                           mode: str) -> Dict[str, float]:
+        """
+        基于位置倒排调整TF-IDF分数
+        
+        phrase: 只保留词项按查询中的相对偏移连续出现的文档，分数乘以 1 + ln(1 + 出现次数)
+        proximity: 分数乘以 1 + 覆盖率 × 紧凑度，紧凑度为查询跨度与文档中最小覆盖窗口之比
+        """
+        first_offset = query_tokens[0][1]
+        gaps = [start - first_offset for _, start in query_tokens]
+        words = [word for word, _ in query_tokens]
+        distinct = list(dict.fromkeys(words))
+        query_span = query_tokens[-1][1] + len(query_tokens[-1][0]) - first_offset
+        
+        adjusted = {}
+        for doc_id, score in scores.items():
+            if mode == "phrase":
+                matches = count_phrase_matches([self.get_positions(w, doc_id) for w in words], gaps)
+                if matches:
+                    adjusted[doc_id] = score * (1 + math.log1p(matches))
+                continue
+            
+            present = [(w, self.get_positions(w, doc_id)) for w in distinct]
+            present = [(w, positions) for w, positions in present if positions]
+            if len(present) < 2:
+                adjusted[doc_id] = score
+                continue
+            span = min_cover_span([positions for _, positions in present], [len(w) for w, _ in present])
+            coverage = len(present) / len(distinct)
+            adjusted[doc_id] = score * (1 + coverage * min(1.0, query_span / span))
+        return adjusted
+    
+    @instrument("inverted_index.generate_summary")
     def generate_summary(self, doc_id: str, query_words: List[str], max_length: int = 200) -> str:
         """生成文档摘要"""
         content = self.documents[doc_id]
         
+        if self.positional:
+            return self.highlight_keywords(self._positional_window(content, doc_id, query_words, max_length),
+                                           query_words)
+        
         # 找到包含最多查询词的文本窗口
         best_window = ""
         best_score = 0
@@ -167,6 +314,25 @@ class InvertedIndex:
         
         return highlighted_summary
     
+    def _positional_window(self, content: str, doc_id: str, query_words: List[str], max_length: int) -> str:
+        """按位置倒排选取命中查询词最多的窗口，窗口起点尽量对齐到句首"""
+        if len(content) <= max_length:
+            return content
+        
+        occurrences = sorted(
+            (start, word) for word in set(query_words) for start in self.get_positions(word, doc_id)
+        )
+        if not occurrences:
+            return content[:max_length]
+        
+        first, last = best_window(occurrences, max_length)
+        start = max(0, first - (max_length - (last - first)) // 2)
+        boundary = max(content.rfind(mark, start, first) for mark in "。！？；\n")
+        if boundary >= 0:
+            start = boundary + 1
+        start = min(start, len(content) - max_length)
+        return content[start:start + max_length].strip()
+    
     def highlight_keywords(self, text: str, keywords: List[str]) -> str:
         """高亮关键词"""
         highlighted_text = text
@@ -182,6 +348,10 @@ class InvertedIndex:
         """获取文档内容"""
         return self.documents.get(doc_id, "")
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, str]:
+        """批量获取文档内容（不存在的文档不返回）"""
+        return {doc_id: self.documents[doc_id] for doc_id in doc_ids if doc_id in self.documents}
+    
     def get_all_documents(self) -> Dict[str, str]:
         """获取所有文档"""
         return self.documents.copy()
@@ -196,11 +366,31 @@ class InvertedIndex:
         else:
             average_doc_length = 0
         
-        return {
+        stats = {
             'total_documents': total_documents,
             'total_terms': total_terms,
-            'average_doc_length': average_doc_length
+            'average_doc_length': average_doc_length,
+            'positional': self.positional
+        }
+        if self.positional:
+            stats['position_bytes'] = sum(
+                len(data) for word_positions in self.positions.values() for data in word_positions.values()
+            )
+        return stats
+    
+    def get_memory_usage(self) -> Dict[str, int]:
+        """各数据结构的估算内存占用（字节）"""
+        usage = {
+            'index.postings': deep_sizeof(self.index),
+            'index.term_freq': deep_sizeof(self.term_freq),
+            'index.doc_freq': deep_sizeof(self.doc_freq),
+            'index.documents': deep_sizeof(self.documents),
+            'index.doc_lengths': deep_sizeof(self.doc_lengths),
+            'index.sorted_postings': deep_sizeof(self._sorted_postings)
         }
+        if self.positional:
+            usage['index.positions'] = deep_sizeof(self.positions)
+        return usage
     
     def save_to_file(self, filename: str):
         """保存索引到文件"""
@@ -211,6 +401,11 @@ class InvertedIndex:
             'term_freq': {k: dict(v) for k, v in self.term_freq.items()},
             'doc_freq': dict(self.doc_freq)
         }
+        if self.positional:
+            data['positions'] = {
+                word: {doc_id: base64.b64encode(encoded).decode('ascii') for doc_id, encoded in word_positions.items()}
+                for word, word_positions in self.positions.items()
+            }
         
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
@@ -225,6 +420,8 @@ class InvertedIndex:
         self.index = defaultdict(set)
         for k, v in data['index'].items():
             self.index[k] = set(v)
+        self._sorted_postings = {}
+        self._sorted_doc_ids = None
         
         self.doc_lengths = data['doc_lengths']
         self.documents = data['documents']
@@ -237,6 +434,18 @@ class InvertedIndex:
         for k, v in data['doc_freq'].items():
             self.doc_freq[k] = v
         
+        self.positions = defaultdict(dict)
+        if self.positional:
+            if 'positions' in data:
+                for word, word_positions in data['positions'].items():
+                    self.positions[word] = {doc_id: base64.b64decode(encoded)
+                                            for doc_id, encoded in word_positions.items()}
+            else:
+                # 旧格式索引没有位置信息，按文档重新计算
+                for doc_id, content in self.documents.items():
+                    self._add_positions(doc_id, self.tokenize_with_offsets(content))
+                print("⚠️ 索引文件不含位置信息，已重建位置倒排")
+        
         print(f"✅ 索引已从文件加载: {filename}")
 
 class SampleCollector:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+段落索引模块 - 面向RAG的段落级BM25检索
+
+文档切分为有重叠的段落（优先在句子边界处断开），每个段落有独立的倒排表和BM25统计，
+检索直接返回最相关的段落而不是整篇文档。
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Tuple
+
+_SENTENCE_END = re.compile(r'[。！？!?；;\n]')
+
+
+class PassageIndex:
+    """段落级倒排索引（BM25）"""
+
+    def __init__(self, tokenize: Callable[[str], List[str]], chunk_chars: int = 200,
+                 overlap_chars: int = 50, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            tokenize: 分词函数，与文档索引共用同一套预处理
+            chunk_chars: 段落最大字符数
+            overlap_chars: 相邻段落重叠字符数
+            k1: BM25词频饱和参数
+            b: BM25长度归一化参数
+        """
+        if overlap_chars >= chunk_chars:
+            raise ValueError("重叠字符数必须小于段落字符数")
+
+        self.tokenize = tokenize
+        self.chunk_chars = chunk_chars
+        self.overlap_chars = overlap_chars
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self):
+        """清空索引"""
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # 词项 -> {段落ID: 词频}
+        self.chunks: Dict[str, Tuple[str, int, int, str]] = {}          # 段落ID -> (文档ID, 起始, 结束, 文本)
+        self.chunk_lengths: Dict[str, int] = {}                           # 段落ID -> 词数
+        self.doc_chunks: Dict[str, List[str]] = {}                        # 文档ID -> 段落ID列表
+        self.total_length = 0
+
+    def split(self, content: str) -> List[Tuple[int, int]]:
+        """切分段落，返回 (起始, 结束) 字符区间列表"""
+        spans = []
+        start = 0
+        length = len(content)
+        while start < length:
+            end = min(start + self.chunk_chars, length)
+            if end < length:
+                # 在窗口后半段寻找最后一个句子结束符，避免把句子切断
+                boundary = None
+                for match in _SENTENCE_END.finditer(content, start + self.chunk_chars // 2, end):
+                    boundary = match.end()
+                if boundary:
+                    end = boundary
+            spans.append((start, end))
+            if end >= length:
+                break
+            next_start = max(end - self.overlap_chars, start + 1)
+            # 重叠区内有句子边界时从边界之后开始，避免段落以半句开头
+            match = _SENTENCE_END.search(content, next_start, end)
+            if match and match.end() < end:
+                next_start = match.end()
+            start = next_start
+        return spans
+
+    def add_document(self, doc_id: str, content: str):
+        """添加（或替换）文档的段落"""
+        if doc_id in self.doc_chunks:
+            self.delete_document(doc_id)
+
+        chunk_ids = []
+        for n, (start, end) in enumerate(self.split(content)):
+            chunk_id = f"{doc_id}#{n}"
+            text = content[start:end].strip()
+            term_freq = Counter(self.tokenize(text))
+
+            self.chunks[chunk_id] = (doc_id, start, end, text)
+            self.chunk_lengths[chunk_id] = sum(term_freq.values())
+            self.total_length += self.chunk_lengths[chunk_id]
+            for term, freq in term_freq.items():
+                self.postings[term][chunk_id] = freq
+            chunk_ids.append(chunk_id)
+
+        self.doc_chunks[doc_id] = chunk_ids
+
+    def delete_document(self, doc_id: str) -> bool:
+        """删除文档的所有段落"""
+        chunk_ids = self.doc_chunks.pop(doc_id, None)
+        if chunk_ids is None:
+            return False
+
+        for chunk_id in chunk_ids:
+            _, _, _, text = self.chunks.pop(chunk_id)
+            self.total_length -= self.chunk_lengths.pop(chunk_id)
+            for term in set(self.tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+        return True
+
+    def search(self, query: str, top_k: int = 5,
+               max_per_doc: int = 2) -> List[Tuple[str, str, float, str]]:
+        """
+        BM25检索段落
+
+        同一文档中与更高分段落重叠的段落会被跳过，避免重复内容进入上下文。
+
+        Args:
+            query: 查询字符串
+            top_k: 返回段落数
+            max_per_doc: 每篇文档最多返回的段落数
+
+        Returns:
+            List[Tuple[str, str, float, str]]: (段落ID, 文档ID, 分数, 段落文本)
+        """
+        terms = self.tokenize(query)
+        total_chunks = len(self.chunks)
+        if not terms or not total_chunks:
+            return []
+
+        avg_length = self.total_length / total_chunks or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        results = []
+        taken: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for chunk_id, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
+            doc_id, start, end, text = self.chunks[chunk_id]
+            spans = taken[doc_id]
+            if len(spans) >= max_per_doc or any(start < e and s < end for s, e in spans):
+                continue
+            spans.append((start, end))
+            results.append((chunk_id, doc_id, score, text))
+            if len(results) >= top_k:
+                break
+        return results
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取段落索引统计"""
+        total_chunks = len(self.chunks)
+        return {
+            'total_passages': total_chunks,
+            'total_passage_terms': len(self.postings),
+            'average_passage_length': self.total_length / total_chunks if total_chunks else 0
+        }
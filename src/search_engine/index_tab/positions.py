@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+位置倒排模块 - 位置列表压缩与短语/邻近匹配
+
+位置取词项在原文中的字符偏移：短语匹配比较偏移差，邻近度用覆盖窗口的字符跨度，
+生成摘要时直接按偏移截取原文，不需要重新分词。
+
+位置列表按升序差分后用LEB128变长整数编码，常见的小差值只占1~2字节。
+"""
+
+import heapq
+from typing import Dict, List, Sequence, Tuple
+
+
+def encode_positions(positions: Sequence[int]) -> bytes:
+    """升序位置列表 -> 差分变长编码"""
+    out = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_positions(data: bytes) -> List[int]:
+    """差分变长编码 -> 升序位置列表"""
+    positions = []
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        positions.append(previous)
+        value = shift = 0
+    return positions
+
+
+def count_phrase_matches(position_lists: Sequence[Sequence[int]], gaps: Sequence[int]) -> int:
+    """
+    统计短语出现次数
+
+    Args:
+        position_lists: 短语中每个词项在文档中的位置列表
+        gaps: 每个词项相对短语首词的偏移（来自查询本身的字符偏移）
+    """
+    if not position_lists or any(not positions for positions in position_lists):
+        return 0
+    rest = [set(positions) for positions in position_lists[1:]]
+    return sum(
+        1 for start in position_lists[0]
+        if all(start + gap in positions for gap, positions in zip(gaps[1:], rest))
+    )
+
+
+def min_cover_span(position_lists: Sequence[Sequence[int]], lengths: Sequence[int]) -> int:
+    """
+    每个列表至少取一个位置时的最小覆盖跨度（字符数），多路归并求解
+
+    Args:
+        position_lists: 各词项的升序位置列表（均非空）
+        lengths: 各词项的字符长度
+    """
+    heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    current_end = max(positions[0] + lengths[i] for i, positions in enumerate(position_lists))
+    best = current_end - heap[0][0]
+
+    while True:
+        start, i, j = heapq.heappop(heap)
+        best = min(best, current_end - start)
+        if j + 1 >= len(position_lists[i]):
+            return best
+        following = position_lists[i][j + 1]
+        current_end = max(current_end, following + lengths[i])
+        heapq.heappush(heap, (following, i, j + 1))
+
+
+def best_window(occurrences: Sequence[Tuple[int, str]], width: int) -> Tuple[int, int]:
+    """
+    在宽度限制内选择包含最多不同词项（其次最多次数）的窗口
+
+    Args:
+        occurrences: 按偏移升序的 (偏移, 词项)
+        width: 窗口最大字符数
+
+    Returns:
+        Tuple[int, int]: 窗口内首个和最后一个命中的 (起始偏移, 结束偏移)
+    """
+    counts: Dict[str, int] = {}
+    best_key, best_span = (-1, -1), (0, 0)
+    right = 0
+    for left, (start, _) in enumerate(occurrences):
+        while right < len(occurrences) and \
+                occurrences[right][0] + len(occurrences[right][1]) - start <= width:
+            term = occurrences[right][1]
+            counts[term] = counts.get(term, 0) + 1
+            right += 1
+        if right > left:
+            key = (len(counts), right - left)
+            if key > best_key:
+                last_offset, last_term = occurrences[right - 1]
+                best_key, best_span = key, (start, last_offset + len(last_term))
+            term = occurrences[left][1]
+            counts[term] -= 1
+            if not counts[term]:
+                del counts[term]
+        else:
+            right = left + 1  # 单个词项超过窗口宽度
+    return best_span
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询补全模块 - 带权前缀树
+
+1. 词项补全：词典中的词项，权重为文档频率，随文档增删增量更新
+2. 查询补全：历史查询，权重为搜索次数，来自CTR日志并随每次搜索增量更新
+
+每个节点缓存子树内权重最高的若干补全。更新某个键只使其路径上的缓存失效，
+下一次查询时按需重算，热门前缀的补全直接读取缓存。
+"""
+
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+
+class _Node:
+    __slots__ = ('children', 'key', 'weight', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.key: Optional[str] = None  # 以该节点结尾的完整键
+        self.weight = 0.0
+        self.top: Optional[List[Tuple[float, str]]] = None  # 子树top补全缓存，None表示失效
+
+
+class CompletionTrie:
+    """带权前缀树，支持增量更新和top-k前缀补全"""
+
+    def __init__(self, cache_k: int = 10):
+        """
+        Args:
+            cache_k: 每个节点缓存的补全数量，查询的top_k不超过该值时直接读取缓存
+        """
+        self.cache_k = cache_k
+        self.root = _Node()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, key: str) -> bool:
+        node = self._find(key)
+        return node is not None and node.key is not None
+
+    def _find(self, prefix: str) -> Optional[_Node]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def clear(self):
+        """清空前缀树"""
+        self.root = _Node()
+        self.size = 0
+
+    def weight(self, key: str) -> float:
+        """获取键的权重，不存在时返回0"""
+        node = self._find(key)
+        return node.weight if node is not None and node.key is not None else 0.0
+
+    def set(self, key: str, weight: float):
+        """设置键的权重，权重不大于0时删除该键"""
+        if not key:
+            return
+        if weight <= 0:
+            self.remove(key)
+            return
+
+        node = self.root
+        node.top = None
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            node.top = None
+        if node.key is None:
+            self.size += 1
+        node.key = key
+        node.weight = float(weight)
+
+    def add(self, key: str, delta: float = 1.0):
+        """累加键的权重"""
+        self.set(key, self.weight(key) + delta)
+
+    def remove(self, key: str) -> bool:
+        """删除键，并剪掉不再有键的空分支"""
+        path = [self.root]
+        for char in key:
+            child = path[-1].children.get(char)
+            if child is None:
+                return False
+            path.append(child)
+        if path[-1].key is None:
+            return False
+
+        path[-1].key = None
+        path[-1].weight = 0.0
+        self.size -= 1
+        for node in path:
+            node.top = None
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.key is not None or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+        return True
+
+    def _top(self, node: _Node) -> List[Tuple[float, str]]:
+        """计算（或读取缓存）子树内权重最高的cache_k个补全"""
+        if node.top is None:
+            candidates = [(node.weight, node.key)] if node.key is not None else []
+            for child in node.children.values():
+                candidates.extend(self._top(child))
+            node.top = heapq.nlargest(self.cache_k, candidates, key=lambda c: (c[0], c[1]))
+        return node.top
+
+    def complete(self, prefix: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        前缀补全
+
+        Args:
+            prefix: 前缀
+            top_k: 返回数量
+
+        Returns:
+            List[Tuple[str, float]]: (补全文本, 权重)，按权重降序
+        """
+        node = self._find(prefix)
+        if node is None or top_k <= 0:
+            return []
+        if top_k <= self.cache_k:
+            return [(key, weight) for weight, key in self._top(node)[:top_k]]
+
+        # 超过缓存容量时遍历整个子树
+        candidates = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.key is not None:
+                candidates.append((current.weight, current.key))
+            stack.extend(current.children.values())
+        return [(key, weight) for weight, key in heapq.nlargest(top_k, candidates)]
+
+
+class SuggestIndex:
+    """查询补全索引：历史查询优先，不足时用词典词项补齐"""
+
+    def __init__(self, cache_k: int = 10):
+        self.terms = CompletionTrie(cache_k)
+        self.queries = CompletionTrie(cache_k)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    # ---------- 词项 ----------
+
+    def update_terms(self, doc_freq: Dict[str, int], terms):
+        """按最新文档频率更新一批词项（频率为0的词项会被删除）"""
+        for term in terms:
+            self.terms.set(term, doc_freq.get(term, 0))
+
+    def rebuild_terms(self, doc_freq: Dict[str, int]):
+        """根据完整的文档频率表重建词项补全"""
+        self.terms.clear()
+        for term, freq in doc_freq.items():
+            self.terms.set(term, freq)
+
+    # ---------- 历史查询 ----------
+
+    def record_query(self, query: str, weight: float = 1.0):
+        """记录一次查询"""
+        query = self.normalize(query)
+        if query:
+            self.queries.add(query, weight)
+
+    def rebuild_queries(self, query_counts: Dict[str, float]):
+        """根据查询日志统计重建查询补全"""
+        self.queries.clear()
+        for query, count in query_counts.items():
+            self.record_query(query, count)
+
+    # ---------- 补全 ----------
+
+    def suggest(self, prefix: str, top_k: int = 10) -> List[Tuple[str, float, str]]:
+        """
+        前缀补全
+
+        Returns:
+            List[Tuple[str, float, str]]: (补全文本, 权重, 来源 'query'/'term')
+        """
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+
+        results = [(text, weight, 'query') for text, weight in self.queries.complete(prefix, top_k)]
+        if len(results) < top_k:
+            seen = {text for text, _, _ in results}
+            for text, weight in self.terms.complete(prefix, top_k):
+                if text not in seen:
+                    results.append((text, weight, 'term'))
+                    if len(results) >= top_k:
+                        break
+        return results
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'suggest_terms': len(self.terms),
+            'suggest_queries': len(self.queries)
+        }
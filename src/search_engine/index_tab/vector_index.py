@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量索引模块 - 本地稠密向量检索
+
+组成：
+1. 向量化器：哈希向量化器（确定性、无需模型，用于测试和离线环境）或本地 sentence-transformers 模型
+2. 向量矩阵：float32/float16，保存为 .npy 后以内存映射方式加载
+3. 精确检索：分块矩阵乘 + argpartition 取 top-k
+4. IVF：球面 k-means 粗量化，查询只扫描最近的 n_probe 个簇，检索复杂度次线性
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import jieba
+import numpy as np
+
+
+class HashingEmbedder:
+    """哈希向量化器：词和字符二元组经哈希映射到固定维度并带符号累加，L2归一化"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        text = text.lower()
+        words = [w for w in jieba.lcut(text) if w.strip()]
+        chars = [c for c in text if not c.isspace()]
+        return words + [a + b for a, b in zip(chars, chars[1:])]
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                value = int.from_bytes(digest, 'little')
+                vectors[i, value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """本地 sentence-transformers 模型向量化器（可选依赖）"""
+
+    def __init__(self, model_name_or_path: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name_or_path)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name_or_path
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(list(texts), normalize_embeddings=True, show_progress_bar=False),
+            dtype=np.float32
+        )
+
+
+def create_embedder(name: str = "hashing"):
+    """创建向量化器：'hashing' 或 'hashing-<维度>' 使用哈希向量化器，其他值视为本地模型名称或路径"""
+    if name.startswith("hashing"):
+        dim = int(name.split("-", 1)[1]) if "-" in name else 256
+        return HashingEmbedder(dim)
+    try:
+        return SentenceTransformerEmbedder(name)
+    except Exception as e:
+        print(f"⚠️ 向量模型加载失败，使用哈希向量化器: {e}")
+        return HashingEmbedder()
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回分数最高的k个下标（按分数降序）"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _append_rows(storage: Optional[np.ndarray], used: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    向容量倍增的缓冲追加行，逐条追加N行的总复制量为O(N)
+
+    Args:
+        storage: 当前缓冲（None表示尚未分配，例如刚加载或压缩后）
+        used: 当前有效数据（storage的前缀视图，或加载得到的只读/内存映射数组）
+        rows: 追加的行
+
+    Returns:
+        (缓冲, 有效数据视图)
+    """
+    n, total = len(used), len(used) + len(rows)
+    if storage is None or len(storage) < total:
+        capacity = max(total, 2 * (len(storage) if storage is not None else n), 16)
+        grown = np.empty((capacity,) + rows.shape[1:], dtype=rows.dtype)
+        grown[:n] = used
+        storage = grown
+    storage[n:total] = rows
+    return storage, storage[:total]
+
+
+class VectorIndex:
+    """稠密向量索引（精确检索 + IVF）"""
+
+    def __init__(self, dim: int, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype必须是float32或float16")
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.vectors = np.zeros((0, dim), dtype=self.dtype)
+        self._vector_storage: Optional[np.ndarray] = None  # self.vectors 所在的可增长缓冲
+        self._valid_storage: Optional[np.ndarray] = None
+        self._assignment_storage: Optional[np.ndarray] = None
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.valid = np.zeros(0, dtype=bool)  # 删除/替换的行标记为无效，重建时压缩
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None  # 行 -> 簇
+        self.lists: List[np.ndarray] = []
+        self.meta: Dict[str, str] = {}  # 附加信息（如向量化器名称），随索引持久化
+
+    def __len__(self) -> int:
+        return len(self.id_to_row)
+
+    # ---------- 写入 ----------
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """添加向量，已存在的ID先删除再追加"""
+        vectors = np.asarray(vectors, dtype=self.dtype).reshape(-1, self.dim)
+        for doc_id in ids:
+            self.remove(doc_id)
+
+        start = len(self.ids)
+        # 内存映射/只读矩阵在首次写入时复制进可增长缓冲
+        self._vector_storage, self.vectors = _append_rows(self._vector_storage, self.vectors, vectors)
+        self._valid_storage, self.valid = _append_rows(self._valid_storage, self.valid,
+                                                       np.ones(len(ids), dtype=bool))
+        for offset, doc_id in enumerate(ids):
+            self.ids.append(doc_id)
+            self.id_to_row[doc_id] = start + offset
+
+        if self.centroids is not None:
+            new_assignments = self._nearest_centroids(vectors.astype(np.float32), 1)[:, 0]
+            self._assignment_storage, self.assignments = _append_rows(
+                self._assignment_storage, self.assignments, new_assignments.astype(np.int64))
+            for cluster in np.unique(new_assignments):
+                rows = start + np.flatnonzero(new_assignments == cluster)
+                self.lists[cluster] = np.concatenate([self.lists[cluster], rows])
+
+    def remove(self, doc_id: str) -> bool:
+        """删除向量（标记为无效）"""
+        row = self.id_to_row.pop(doc_id, None)
+        if row is None:
+            return False
+        self.valid[row] = False
+        return True
+
+    def compact(self):
+        """压缩掉无效行（会使IVF失效，需要重新构建）"""
+        keep = np.flatnonzero(self.valid)
+        self.vectors = np.array(self.vectors[keep])
+        self.ids = [self.ids[i] for i in keep]
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.valid = np.ones(len(self.ids), dtype=bool)
+        self._vector_storage = self._valid_storage = self._assignment_storage = None
+        self.centroids, self.assignments, self.lists = None, None, []
+
+    # ---------- IVF ----------
+
+    def _nearest_centroids(self, queries: np.ndarray, n_probe: int) -> np.ndarray:
+        scores = queries @ self.centroids.T
+        return np.stack([_top_k(row, n_probe) for row in scores])
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        """球面k-means粗量化，默认簇数为 sqrt(N)"""
+        if np.any(~self.valid):
+            self.compact()
+        n = len(self.ids)
+        if n == 0:
+            return
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+
+        data = np.asarray(self.vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(n, n_lists, replace=False)].copy()
+        assignments = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = data[assignments == cluster]
+                if len(members):
+                    center = members.sum(axis=0)
+                    centroids[cluster] = center / max(np.linalg.norm(center), 1e-12)
+                else:
+                    centroids[cluster] = data[rng.integers(n)]  # 空簇重新随机初始化
+
+        self.centroids = centroids
+        self.assignments = np.argmax(data @ centroids.T, axis=1)
+        self._assignment_storage = None
+        self.lists = [np.flatnonzero(self.assignments == c) for c in range(n_lists)]
+
+    # ---------- 检索 ----------
+
+    def search(self, query: np.ndarray, top_k: int = 10, n_probe: Optional[int] = None,
+               batch_rows: int = 65536) -> List[Tuple[str, float]]:
+        """
+        检索最相似的向量（内积，向量已归一化即余弦相似度）
+
+        Args:
+            query: 查询向量
+            top_k: 返回数量
+            n_probe: IVF扫描的簇数；为None或未构建IVF时精确检索
+            batch_rows: 精确检索时每批扫描的行数
+
+        Returns:
+            List[Tuple[str, float]]: (文档ID, 相似度)
+        """
+        if not self.id_to_row:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+        if n_probe and self.centroids is not None:
+            clusters = self._nearest_centroids(query[None, :], min(n_probe, len(self.lists)))[0]
+            rows = np.concatenate([self.lists[c] for c in clusters])
+            rows = rows[self.valid[rows]]
+            scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+            best = _top_k(scores, top_k)
+            return [(self.ids[rows[i]], float(scores[i])) for i in best]
+
+        # 精确检索：分块矩阵乘，每块保留top-k后合并
+        best_rows, best_scores = [], []
+        for start in range(0, len(self.ids), batch_rows):
+            block = np.asarray(self.vectors[start:start + batch_rows], dtype=np.float32)
+            scores = block @ query
+            scores[~self.valid[start:start + batch_rows]] = -np.inf
+            top = _top_k(scores, top_k)
+            best_rows.append(top + start)
+            best_scores.append(scores[top])
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        best = [i for i in _top_k(scores, top_k) if np.isfinite(scores[i])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in best]
+
+    # ---------- 持久化 ----------
+
+    def save(self, directory: str):
+        """保存向量矩阵、ID列表和IVF
+
+        向量和IVF写入带版本号的新文件，ids.json 记录文件名并最后原子替换作为提交点：
+        self.vectors 可能正是旧文件的内存映射，不能原地覆盖；中途崩溃时 ids.json 仍指向完整的旧文件。
+        """
+        if np.any(~self.valid):
+            n_lists = len(self.centroids) if self.centroids is not None else 0
+            self.compact()
+            if n_lists:
+                self.build_ivf(n_lists)
+        os.makedirs(directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:8]
+        files = {'vectors_file': f"vectors-{generation}.npy"}
+        np.save(os.path.join(directory, files['vectors_file']), np.asarray(self.vectors))
+        if self.centroids is not None:
+            files['ivf_file'] = f"ivf-{generation}.npz"
+            np.savez(os.path.join(directory, files['ivf_file']), centroids=self.centroids, assignments=self.assignments)
+
+        ids_path = os.path.join(directory, "ids.json")
+        with open(f"{ids_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'dtype': self.dtype.name, 'meta': self.meta, 'ids': self.ids, **files},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{ids_path}.tmp", ids_path)
+
+        # 清理旧版本文件（已打开的内存映射不受删除影响）
+        for name in os.listdir(directory):
+            if name.endswith(('.npy', '.npz')) and name not in files.values():
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'VectorIndex':
+        """加载索引，向量矩阵默认以只读内存映射方式打开"""
+        with open(os.path.join(directory, "ids.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        index = cls(meta['dim'], meta['dtype'])
+        index.vectors = np.load(os.path.join(directory, meta.get('vectors_file', "vectors.npy")),
+                                mmap_mode='r' if mmap else None)
+        index.ids = meta['ids']
+        index.meta = meta.get('meta', {})
+        index.id_to_row = {doc_id: row for row, doc_id in enumerate(index.ids)}
+        index.valid = np.ones(len(index.ids), dtype=bool)
+        if len(index.vectors) != len(index.ids):
+            raise ValueError(f"向量索引文件不一致: {len(index.vectors)}行向量, {len(index.ids)}个ID")
+
+        # 旧格式没有记录文件名，使用固定的 ivf.npz
+        ivf_file = meta.get('ivf_file', None if 'vectors_file' in meta else "ivf.npz")
+        ivf_path = os.path.join(directory, ivf_file) if ivf_file else None
+        if ivf_path and os.path.exists(ivf_path):
+            data = np.load(ivf_path)
+            index.centroids = data['centroids']
+            index.assignments = data['assignments']
+            index.lists = [np.flatnonzero(index.assignments == c) for c in range(len(index.centroids))]
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank_i(d))"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存统计模块 - 按子系统估算主要数据结构持有的字节数，并跟踪随时间的增长
+
+用法：
+    register_source("index", index_service._memory_usage)   # 回调返回 {组件名: 字节数}
+    report = measure()                                       # 采集一次并写入历史
+    growth()                                                 # 各组件相对首次/上次采集的增长
+
+- deep_sizeof 递归估算对象图大小：容器元素超过 sample_size 时随机抽样，
+  按样本平均大小外推，百万级倒排表也只需遍历几千个对象；同一对象在一次估算中只计一次，
+  不同结构之间共享的对象（如文档ID字符串）会在各自结构中分别计入
+- 可选开启 tracemalloc，按代码行对比基线快照，定位增长来自哪里
+- 最近一次采集结果以 search_memory_bytes{component} 暴露到指标注册表
+
+配置（环境变量）：
+    SEARCH_MEMORY_INTERVAL_S   后台定期采集间隔（秒），默认0（只在手动采集时记录）
+    SEARCH_TRACEMALLOC         为1时随服务启动 tracemalloc，默认关闭
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .metrics import REGISTRY, gauge_family
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_SAMPLE_SIZE = 100
+MAX_DEPTH = 32
+
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+# 不深入遍历的对象：函数、类、模块等归属于代码而不是数据
+_OPAQUE_TYPES = (type, type(sys), type(len), type(lambda: None), type(threading.Lock()))
+
+
+class _SizeEstimator:
+    """一次 deep_sizeof 估算的状态（已计入的对象、抽样随机数）"""
+
+    def __init__(self, sample_size: int, seed: int):
+        self.sample_size = sample_size
+        self.rng = random.Random(seed)
+        self.seen = set()
+
+    def pick(self, items, count: int):
+        if self.sample_size <= 0 or count <= self.sample_size:
+            return items, 1.0
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        return self.rng.sample(items, self.sample_size), count / self.sample_size
+
+    def size(self, o: Any, depth: int = 0) -> float:
+        if id(o) in self.seen:
+            return 0
+        self.seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            return sys.getsizeof(o) if o.base is None else sys.getsizeof(o) + o.nbytes
+        total = sys.getsizeof(o)
+        if isinstance(o, _ATOMIC_TYPES) or isinstance(o, _OPAQUE_TYPES) or depth >= MAX_DEPTH:
+            return total
+        if isinstance(o, dict):
+            items, scale = self.pick(o.items(), len(o))
+            return total + scale * sum(self.size(k, depth + 1) + self.size(v, depth + 1) for k, v in items)
+        if isinstance(o, (list, tuple, set, frozenset, deque)):
+            items, scale = self.pick(o, len(o))
+            return total + scale * sum(self.size(item, depth + 1) for item in items)
+        if hasattr(o, '__dict__'):
+            total += self.size(vars(o), depth + 1)
+        for slot in getattr(type(o), '__slots__', ()):
+            if hasattr(o, slot):
+                total += self.size(getattr(o, slot), depth + 1)
+        return total
+
+
+def deep_sizeof(obj: Any, sample_size: int = DEFAULT_SAMPLE_SIZE, seed: int = 0) -> int:
+    """
+    估算对象及其引用的对象占用的字节数
+
+    Args:
+        obj: 被估算对象
+        sample_size: 容器元素超过该数量时抽样估算，<=0 表示精确遍历
+        seed: 抽样随机种子（固定种子使同一结构的多次估算可比）
+    """
+    return int(_SizeEstimator(sample_size, seed).size(obj))
+
+
+def keras_model_bytes(model) -> int:
+    """Keras模型权重和优化器状态的字节数（按变量形状和类型计算，不复制张量）"""
+    if model is None:
+        return 0
+    variables = list(model.weights)
+    optimizer = getattr(model, 'optimizer', None)
+    if optimizer is not None:
+        variables.extend(getattr(optimizer, 'variables', []))
+    return int(sum(np.prod(tuple(v.shape), dtype=np.int64) * np.dtype(v.dtype).itemsize for v in variables))
+
+
+class MemoryAccountant:
+    """汇总各子系统的内存估算，保存采集历史"""
+
+    def __init__(self, history_size: int = 120):
+        self._sources: Dict[str, Callable[[], Dict[str, int]]] = {}
+        self._history: deque = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_stop = threading.Event()
+        self._tracemalloc_baseline = None
+
+    def register_source(self, key: str, source: Callable[[], Dict[str, int]]):
+        """注册子系统回调，返回 {组件名: 字节数}；同一key重复注册时替换"""
+        with self._lock:
+            self._sources[key] = source
+
+    def unregister_source(self, key: str):
+        with self._lock:
+            self._sources.pop(key, None)
+
+    def measure(self) -> Dict[str, Any]:
+        """采集一次所有子系统的内存估算并写入历史"""
+        with self._lock:
+            sources = list(self._sources.items())
+        started = time.perf_counter()
+        components: Dict[str, int] = {}
+        errors: Dict[str, str] = {}
+        for key, source in sources:
+            try:
+                for name, value in source().items():
+                    components[name] = int(value)
+            except Exception as e:
+                errors[key] = str(e)
+        report = {
+            'timestamp': time.time(),
+            'components': components,
+            'total_bytes': sum(components.values()),
+            'process_rss_bytes': psutil.Process().memory_info().rss if psutil is not None else None,
+            'tracemalloc_bytes': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+            'errors': errors,
+            'elapsed_ms': (time.perf_counter() - started) * 1000
+        }
+        with self._lock:
+            self._history.append(report)
+        return report
+
+    def get_history(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._history)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+    def growth(self) -> List[Dict[str, Any]]:
+        """各组件相对首次和上次采集的增长，按首次以来增长量降序"""
+        history = self.get_history()
+        if not history:
+            return []
+        first, previous, last = history[0], history[-2] if len(history) > 1 else history[0], history[-1]
+        minutes = (last['timestamp'] - first['timestamp']) / 60
+        rows = []
+        for name, current in last['components'].items():
+            initial = first['components'].get(name, current)
+            rows.append({
+                'component': name,
+                'bytes': current,
+                'delta_last': current - previous['components'].get(name, current),
+                'delta_total': current - initial,
+                'bytes_per_min': (current - initial) / minutes if minutes > 0 else 0.0
+            })
+        return sorted(rows, key=lambda row: (row['delta_total'], row['bytes']), reverse=True)
+
+    def clear_history(self):
+        with self._lock:
+            self._history.clear()
+
+    # ---------- 后台采集 ----------
+
+    def start_sampler(self, interval: float):
+        """后台定期采集"""
+        if self._sampler is not None:
+            return
+        self._sampler_stop.clear()
+
+        def sample_loop():
+            while not self._sampler_stop.wait(interval):
+                self.measure()
+
+        self._sampler = threading.Thread(target=sample_loop, name="MemoryAccountant", daemon=True)
+        self._sampler.start()
+
+    def stop_sampler(self):
+        if self._sampler is not None:
+            self._sampler_stop.set()
+            self._sampler.join(timeout=5)
+            self._sampler = None
+
+    # ---------- tracemalloc ----------
+
+    def start_tracemalloc(self, nframes: int = 1):
+        """开启tracemalloc并记录基线快照（开启后分配有明显额外开销）"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+        self._tracemalloc_baseline = tracemalloc.take_snapshot()
+
+    def stop_tracemalloc(self):
+        self._tracemalloc_baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def tracemalloc_top(self, n: int = 15) -> List[Dict[str, Any]]:
+        """相对基线快照增长最多的代码行"""
+        if not tracemalloc.is_tracing() or self._tracemalloc_baseline is None:
+            return []
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        baseline = self._tracemalloc_baseline.filter_traces(filters)
+        rows = []
+        for stat in snapshot.compare_to(baseline, 'lineno')[:n]:
+            frame = stat.traceback[0]
+            rows.append({
+                'location': f"{frame.filename}:{frame.lineno}",
+                'size_diff': stat.size_diff,
+                'size': stat.size,
+                'count_diff': stat.count_diff
+            })
+        return rows
+
+    def _collect_metrics(self) -> List:
+        """指标采集回调（只导出最近一次采集结果，抓取时不重新估算）"""
+        report = self.latest()
+        if report is None:
+            return []
+        return [
+            gauge_family('search_memory_bytes', '各组件估算内存占用（字节）',
+                         [({'component': name}, value) for name, value in sorted(report['components'].items())])
+        ]
+
+
+ACCOUNTANT = MemoryAccountant()
+REGISTRY.register_collector("memory", ACCOUNTANT._collect_metrics)
+
+
+def register_source(key: str, source: Callable[[], Dict[str, int]]):
+    ACCOUNTANT.register_source(key, source)
+
+
+def measure() -> Dict[str, Any]:
+    return ACCOUNTANT.measure()
+
+
+def growth() -> List[Dict[str, Any]]:
+    return ACCOUNTANT.growth()
+
+
+def get_history() -> List[Dict[str, Any]]:
+    return ACCOUNTANT.get_history()
+
+
+def start_from_env():
+    """按环境变量启动后台采集和tracemalloc"""
+    interval = float(os.getenv("SEARCH_MEMORY_INTERVAL_S", "0"))
+    if interval > 0:
+        ACCOUNTANT.start_sampler(interval)
+    if os.getenv("SEARCH_TRACEMALLOC", "0").lower() in ("1", "true", "yes", "on"):
+        ACCOUNTANT.start_tracemalloc()
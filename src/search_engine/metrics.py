@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内指标模块 - 搜索链路各阶段的延迟直方图与RED指标
+
+1. HDR风格对数-线性分桶：按2的幂分段、每段再线性细分64个子桶，相对误差约1.5%，
+   覆盖1微秒到数小时，桶数固定，记录为O(1)
+2. 写路径无锁：每个线程写自己的分片，读取时合并，只有线程首次写入登记分片时加锁
+3. RED：请求数（Rate）、错误数（Errors）、延迟分位数（Duration）
+4. 埋点的阶段在有活动trace时同时记录为span（见 tracing）
+5. 指标注册表：阶段直方图、计数器、仪表盘，以及各服务注册的采集回调（抓取时读取服务状态，
+   不占用服务的写路径），由 metrics_exporter 以OpenMetrics文本格式对外暴露
+
+用法：
+    @instrument("index.retrieve")
+    def retrieve(...): ...
+
+    with track("rag.generate"):
+        ...
+
+    record_error("model.predict_ctr")  # 被吞掉的异常也计入错误数
+
+    REGISTRY.register_collector("data_service", collect_fn)  # collect_fn 返回 MetricFamily 列表
+"""
+
+import functools
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .tracing import span
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS          # 小于128微秒的值每微秒一个桶
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1          # 之后每个2的幂区间64个子桶
+MAX_EXPONENT = 40                                # 约12天（微秒）
+BUCKET_COUNT = SUB_BUCKET_COUNT + MAX_EXPONENT * SUB_BUCKET_HALF
+
+# 对外暴露的直方图分桶上界（秒）
+EXPORT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 一个指标族：samples 为 (名称后缀, 标签, 值) 列表
+MetricFamily = namedtuple('MetricFamily', ['name', 'type', 'help', 'samples'])
+
+
+def bucket_index(micros: int) -> int:
+    """微秒值 -> 桶下标"""
+    if micros < SUB_BUCKET_COUNT:
+        return max(micros, 0)
+    exponent = micros.bit_length() - SUB_BUCKET_BITS
+    if exponent > MAX_EXPONENT:
+        return BUCKET_COUNT - 1
+    return SUB_BUCKET_COUNT + (exponent - 1) * SUB_BUCKET_HALF + ((micros >> exponent) - SUB_BUCKET_HALF)
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """桶下标 -> 该桶覆盖的 [下界, 上界] 微秒值"""
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+    exponent = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    mantissa = SUB_BUCKET_HALF + (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF
+    return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+
+class _Shard:
+    """单个线程的计数分片（只被所属线程写入）"""
+
+    __slots__ = ('counts', 'total', 'sum_micros', 'max_micros', 'errors')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.sum_micros = 0
+        self.max_micros = 0
+        self.errors = 0
+
+
+class LatencyHistogram:
+    """线程分片的延迟直方图，附带请求数和错误数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.created_at = time.time()
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def reset(self):
+        """清空统计（正在写入旧分片的记录会丢弃）"""
+        with self._shards_lock:
+            self._shards = []
+            self._local = threading.local()
+            self.created_at = time.time()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def record(self, seconds: float, error: bool = False):
+        """记录一次请求耗时（秒）"""
+        micros = int(seconds * 1_000_000)
+        shard = self._shard()
+        shard.counts[bucket_index(micros)] += 1
+        shard.total += 1
+        shard.sum_micros += micros
+        if micros > shard.max_micros:
+            shard.max_micros = micros
+        if error:
+            shard.errors += 1
+
+    def record_error(self):
+        """只记录错误（请求本身已被计时）"""
+        self._shard().errors += 1
+
+    def merged_counts(self) -> List[int]:
+        """合并所有分片的桶计数"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged = [0] * BUCKET_COUNT
+        for shard in shards:
+            for i, count in enumerate(shard.counts):
+                if count:
+                    merged[i] += count
+        return merged
+
+    @staticmethod
+    def percentiles_from_counts(counts: List[int], quantiles: List[float]) -> List[float]:
+        """按桶计数计算分位数（毫秒，取桶中点）"""
+        total = sum(counts)
+        if not total:
+            return [0.0 for _ in quantiles]
+        targets = sorted((max(1, int(round(q * total))), i) for i, q in enumerate(quantiles))
+        results = [0.0] * len(quantiles)
+        cumulative = 0
+        t = 0
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            cumulative += count
+            while t < len(targets) and cumulative >= targets[t][0]:
+                low, high = bucket_bounds(index)
+                results[targets[t][1]] = (low + high) / 2 / 1000
+                t += 1
+            if t >= len(targets):
+                break
+        return results
+
+    def export_buckets(self, bounds: Iterable[float] = EXPORT_BUCKETS) -> Dict[str, Any]:
+        """
+        按给定上界（秒）累计计数，用于直方图对外暴露
+        
+        内部桶整体落在上界以内才计入该上界，跨越上界的桶计入下一个上界（误差不超过桶宽约1.5%）
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        counts = self.merged_counts()
+        cumulative = []
+        total = index = 0
+        for bound in bounds:
+            limit = bound * 1_000_000
+            while index < BUCKET_COUNT and bucket_bounds(index)[1] <= limit:
+                total += counts[index]
+                index += 1
+            cumulative.append((bound, total))
+        return {
+            'buckets': cumulative,
+            'count': sum(s.total for s in shards),
+            'sum': sum(s.sum_micros for s in shards) / 1_000_000,
+            'errors': sum(s.errors for s in shards),
+            'created': self.created_at
+        }
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """获取当前统计快照"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        total = sum(s.total for s in shards)
+        errors = sum(s.errors for s in shards)
+        sum_micros = sum(s.sum_micros for s in shards)
+        p50, p95, p99 = self.percentiles_from_counts(self.merged_counts(), [0.5, 0.95, 0.99])
+        elapsed = max(time.time() - self.created_at, 1e-9)
+        return {
+            'stage': self.name,
+            'requests': total,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'rate_per_sec': total / elapsed,
+            'mean_ms': sum_micros / total / 1000 if total else 0.0,
+            'p50_ms': p50,
+            'p95_ms': p95,
+            'p99_ms': p99,
+            'max_ms': max((s.max_micros for s in shards), default=0) / 1000
+        }
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    """单调递增计数器，可带标签"""
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self._values.items())
+        return MetricFamily(self.name, 'counter', self.help,
+                            [('_total', dict(key), value) for key, value in values])
+
+
+class Gauge:
+    """可增可减的瞬时值，可带标签"""
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def collect(self) -> MetricFamily:
+        with self._lock:
+            values = list(self._values.items())
+        return MetricFamily(self.name, 'gauge', self.help, [('', dict(key), value) for key, value in values])
+
+
+def gauge_family(name: str, help: str, values) -> MetricFamily:
+    """
+    构造仪表盘指标族（供采集回调使用）
+    
+    Args:
+        values: 单个数值，或 [(标签字典, 数值)] 列表
+    """
+    if isinstance(values, (int, float)):
+        values = [({}, values)]
+    return MetricFamily(name, 'gauge', help, [('', labels, float(value)) for labels, value in values])
+
+
+def counter_family(name: str, help: str, values) -> MetricFamily:
+    """构造计数器指标族（供采集回调使用，值为服务内部维护的累计数）"""
+    if isinstance(values, (int, float)):
+        values = [({}, values)]
+    return MetricFamily(name, 'counter', help, [('_total', labels, float(value)) for labels, value in values])
+
+
+class MetricsRegistry:
+    """指标注册表：所有服务共享，抓取时统一收集"""
+
+    STAGE_HISTOGRAM = 'search_stage_latency_seconds'
+
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[MetricFamily]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        """获取（或创建）阶段直方图"""
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram(stage))
+        return histogram
+
+    def _get_or_create(self, cls, name: str, help: str):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        """获取（或创建）计数器"""
+        return self._get_or_create(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        """获取（或创建）仪表盘"""
+        return self._get_or_create(Gauge, name, help)
+
+    def register_collector(self, key: str, collector: Callable[[], Iterable[MetricFamily]]):
+        """注册采集回调，同一key重复注册时替换（服务重建后只保留最新实例）"""
+        with self._lock:
+            self._collectors[key] = collector
+
+    def unregister_collector(self, key: str):
+        with self._lock:
+            self._collectors.pop(key, None)
+
+    def _stage_families(self) -> List[MetricFamily]:
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        latency, errors = [], []
+        for stage, histogram in histograms:
+            exported = histogram.export_buckets()
+            labels = {'stage': stage}
+            for bound, count in exported['buckets']:
+                latency.append(('_bucket', dict(labels, le=bound), count))
+            latency.append(('_bucket', dict(labels, le=float('inf')), exported['count']))
+            latency.append(('_count', labels, exported['count']))
+            latency.append(('_sum', labels, exported['sum']))
+            errors.append(('_total', labels, exported['errors']))
+        return [
+            MetricFamily(self.STAGE_HISTOGRAM, 'histogram', '搜索链路各阶段耗时', latency),
+            MetricFamily('search_stage_errors', 'counter', '搜索链路各阶段错误数', errors)
+        ]
+
+    def collect(self) -> List[MetricFamily]:
+        """收集所有指标族；单个采集回调失败不影响其它指标"""
+        families = self._stage_families()
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        families.extend(metric.collect() for metric in metrics)
+        for key, collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"⚠️ 指标采集失败 {key}: {e}")
+        return families
+
+    def snapshot(self, stages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """获取各阶段统计快照（按阶段名排序）"""
+        with self._lock:
+            histograms = dict(self._histograms)
+        names = stages if stages is not None else sorted(histograms)
+        return [histograms[name].snapshot() for name in names if name in histograms]
+
+    def reset(self):
+        """清空阶段统计和计数器（采集回调读取的服务状态不受影响）"""
+        with self._lock:
+            histograms = list(self._histograms.values())
+            metrics = list(self._metrics.values())
+        for histogram in histograms:
+            histogram.reset()
+        for metric in metrics:
+            metric.reset()
+
+
+# 全局注册表
+REGISTRY = MetricsRegistry()
+
+
+def get_histogram(stage: str) -> LatencyHistogram:
+    """获取（或创建）阶段直方图"""
+    return REGISTRY.histogram(stage)
+
+
+class track:
+    """计时上下文管理器：退出时记录耗时，异常退出计为错误"""
+
+    __slots__ = ('histogram', 'start', 'span')
+
+    def __init__(self, stage: str):
+        self.histogram = get_histogram(stage)
+        self.span = span(stage)
+
+    def __enter__(self):
+        self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter() - self.start, error=exc_type is not None)
+        self.span.__exit__(exc_type, exc, tb)
+        return False
+
+
+def instrument(stage: str) -> Callable:
+    """计时装饰器"""
+    def decorator(func: Callable) -> Callable:
+        histogram = get_histogram(stage)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                start = time.perf_counter()
+                error = True
+                try:
+                    result = func(*args, **kwargs)
+                    error = False
+                    return result
+                finally:
+                    histogram.record(time.perf_counter() - start, error=error)
+        return wrapper
+    return decorator
+
+
+def record_error(stage: str):
+    """记录被调用方内部处理掉的错误"""
+    get_histogram(stage).record_error()
+
+
+def snapshot(stages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """获取各阶段统计快照（按阶段名排序）"""
+    return REGISTRY.snapshot(stages)
+
+
+def reset():
+    """清空所有阶段的统计"""
+    REGISTRY.reset()
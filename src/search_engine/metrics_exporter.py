@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标暴露模块 - 以OpenMetrics/Prometheus文本格式提供指标注册表的HTTP抓取端点
+
+用法：
+    server = start_metrics_server(port=9464)   # GET http://127.0.0.1:9464/metrics
+    ...
+    stop_metrics_server()
+
+Prometheus 抓取时会在Accept头中声明 application/openmetrics-text，此时返回OpenMetrics格式，
+否则返回 Prometheus 0.0.4 文本格式（curl 直接查看时更常见）。
+
+配置（环境变量）：
+    SEARCH_METRICS_HOST   监听地址，默认127.0.0.1（只在本机暴露）
+    SEARCH_METRICS_PORT   监听端口，默认9464
+"""
+
+import math
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from .metrics import REGISTRY, MetricsRegistry
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def sanitize_name(name: str) -> str:
+    """指标名/标签名只允许字母、数字、下划线和冒号，且不能以数字开头"""
+    name = _INVALID_NAME_CHARS.sub('_', name)
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        if key == 'le':
+            value = '+Inf' if math.isinf(value) else repr(float(value))
+        parts.append(f'{sanitize_name(key)}="{_escape(str(value))}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render(registry: MetricsRegistry = REGISTRY, openmetrics: bool = True) -> str:
+    """
+    渲染注册表中的全部指标
+
+    Args:
+        registry: 指标注册表
+        openmetrics: True为OpenMetrics格式（以 # EOF 结尾），False为Prometheus 0.0.4文本格式
+    """
+    lines = []
+    seen = set()
+    for family in registry.collect():
+        name = sanitize_name(family.name)
+        if name in seen:
+            # 同名指标族只保留第一个，重复的族会导致抓取失败
+            continue
+        seen.add(name)
+        # OpenMetrics中计数器族名不带_total；旧格式中HELP/TYPE要写样本的完整名称
+        header_name = f"{name}_total" if family.type == 'counter' and not openmetrics else name
+        lines.append(f"# HELP {header_name} {_escape(family.help)}")
+        lines.append(f"# TYPE {header_name} {family.type}")
+        for suffix, labels, value in family.samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    if openmetrics:
+        lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics 抓取端点"""
+
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404, explain="只提供 /metrics")  # 状态行只能用latin-1，说明放在响应体
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        try:
+            body = render(self.registry, openmetrics=openmetrics).encode('utf-8')
+        except Exception as e:
+            self.send_error(500, explain=f"指标渲染失败: {e}")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 抓取请求很频繁，不打印访问日志
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None,
+                         registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    在后台线程启动指标HTTP服务（重复调用返回已启动的服务）
+
+    Args:
+        port: 监听端口，None时读取 SEARCH_METRICS_PORT；0表示由系统分配
+        host: 监听地址，None时读取 SEARCH_METRICS_HOST
+        registry: 指标注册表
+
+    Returns:
+        ThreadingHTTPServer: 服务实例，实际端口为 server.server_port
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        if port is None:
+            port = int(os.getenv("SEARCH_METRICS_PORT", "9464"))
+        if host is None:
+            host = os.getenv("SEARCH_METRICS_HOST", "127.0.0.1")
+        handler = type('BoundMetricsHandler', (MetricsHandler,), {'registry': registry})
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsServer", daemon=True).start()
+        _server = server
+        print(f"📈 指标端点已启动: http://{host}:{server.server_port}/metrics")
+        return server
+
+
+def stop_metrics_server():
+    """停止指标HTTP服务"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
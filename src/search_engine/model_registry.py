@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型注册表 - 版本化管理CTR模型产物
+
+目录结构：
+    models/registry/
+        <version>/
+            model.h5              Keras模型权重
+            model_scaler.pkl      标准化器与训练状态
+            feature_schema.json   特征名称、维度与位置倾向性表
+            metrics.json          训练指标
+            manifest.json         版本信息与内容哈希
+        CURRENT                   当前服务版本
+        deployments.json          部署历史（用于回滚）
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .training_tab.ctr_model import CTRModel
+from .training_tab.ctr_data_pipeline import FEATURE_NAMES
+
+MODEL_FILENAME = "model.h5"
+MANIFEST_FILENAME = "manifest.json"
+
+
+class ModelRegistry:
+    """模型注册表：发布、校验、加载模型版本，并记录当前服务版本和部署历史"""
+
+    def __init__(self, root_dir: str = "models/registry"):
+        self.root_dir = root_dir
+        self.current_file = os.path.join(root_dir, "CURRENT")
+        self.deployments_file = os.path.join(root_dir, "deployments.json")
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root_dir, version)
+
+    @staticmethod
+    def _write_json_atomic(path: str, data: Any):
+        """写入临时文件后原子替换"""
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, path)
+
+    @staticmethod
+    def _hash_files(directory: str) -> Dict[str, str]:
+        """计算目录下各产物文件的sha256"""
+        hashes = {}
+        for name in sorted(os.listdir(directory)):
+            if name == MANIFEST_FILENAME:
+                continue
+            digest = hashlib.sha256()
+            with open(os.path.join(directory, name), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            hashes[name] = digest.hexdigest()
+        return hashes
+
+    @staticmethod
+    def _content_hash(file_hashes: Dict[str, str]) -> str:
+        combined = "\n".join(f"{name}:{digest}" for name, digest in sorted(file_hashes.items()))
+        return hashlib.sha256(combined.encode('utf-8')).hexdigest()
+
+    def publish(self, ctr_model: CTRModel, metrics: Optional[Dict[str, Any]] = None,
+                version: Optional[str] = None) -> str:
+        """
+        发布模型版本
+
+        产物先写入临时目录，完整写完后整体重命名，读者不会看到写了一半的版本。
+
+        Args:
+            ctr_model: 已训练的CTR模型
+            metrics: 训练指标
+            version: 版本号，默认按时间生成
+
+        Returns:
+            str: 版本号
+        """
+        if not ctr_model.is_trained or ctr_model.model is None:
+            raise ValueError("模型未训练，无法发布")
+
+        version = version or f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        final_dir = self._version_dir(version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"模型版本已存在: {version}")
+
+        temp_dir = os.path.join(self.root_dir, f".tmp_{version}")
+        os.makedirs(temp_dir, exist_ok=True)
+        try:
+            ctr_model.save_model(os.path.join(temp_dir, MODEL_FILENAME))
+
+            with open(os.path.join(temp_dir, "feature_schema.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'feature_names': FEATURE_NAMES,
+                    'feature_dim': ctr_model.feature_dim,
+                    'position_propensities': {str(k): v for k, v in ctr_model.position_propensities.items()}
+                }, f, ensure_ascii=False, indent=2)
+
+            with open(os.path.join(temp_dir, "metrics.json"), 'w', encoding='utf-8') as f:
+                json.dump(metrics or {}, f, ensure_ascii=False, indent=2, default=str)
+
+            file_hashes = self._hash_files(temp_dir)
+            manifest = {
+                'version': version,
+                'created_at': datetime.now().isoformat(),
+                'model_type': 'CTR_WideDeep',
+                'trained_until': ctr_model.trained_until,
+                'files': file_hashes,
+                'content_hash': self._content_hash(file_hashes)
+            }
+            with open(os.path.join(temp_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            os.replace(temp_dir, final_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        print(f"✅ 模型版本已发布: {version}")
+        return version
+
+    def get_manifest(self, version: str) -> Optional[Dict[str, Any]]:
+        """获取版本信息"""
+        manifest_path = os.path.join(self._version_dir(version), MANIFEST_FILENAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_metrics(self, version: str) -> Dict[str, Any]:
+        """获取版本训练指标"""
+        metrics_path = os.path.join(self._version_dir(version), "metrics.json")
+        if not os.path.exists(metrics_path):
+            return {}
+        with open(metrics_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """列出所有版本（按创建时间排序）"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        manifests = []
+        for name in os.listdir(self.root_dir):
+            if name.startswith('.') or not os.path.isdir(self._version_dir(name)):
+                continue
+            manifest = self.get_manifest(name)
+            if manifest:
+                manifests.append(manifest)
+        manifests.sort(key=lambda m: m.get('created_at', ''))
+        return manifests
+
+    def verify(self, version: str) -> bool:
+        """校验版本产物与manifest中的内容哈希一致"""
+        manifest = self.get_manifest(version)
+        if manifest is None:
+            return False
+        file_hashes = self._hash_files(self._version_dir(version))
+        return self._content_hash(file_hashes) == manifest.get('content_hash')
+
+    def load(self, version: str) -> CTRModel:
+        """
+        加载模型版本到新的CTRModel实例
+
+        Raises:
+            ValueError: 版本不存在、哈希校验失败或加载失败
+        """
+        if not self.verify(version):
+            raise ValueError(f"模型版本不存在或内容哈希校验失败: {version}")
+
+        ctr_model = CTRModel()
+        if not ctr_model.load_model(os.path.join(self._version_dir(version), MODEL_FILENAME)):
+            raise ValueError(f"模型版本加载失败: {version}")
+        return ctr_model
+
+    def get_current_version(self) -> Optional[str]:
+        """获取当前服务版本"""
+        if not os.path.exists(self.current_file):
+            return None
+        with open(self.current_file, 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+        return version or None
+
+    def set_current_version(self, version: Optional[str]):
+        """设置当前服务版本并记录部署历史，version为None时清除"""
+        os.makedirs(self.root_dir, exist_ok=True)
+        if version is None:
+            if os.path.exists(self.current_file):
+                os.remove(self.current_file)
+            return
+
+        temp_file = self.current_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(temp_file, self.current_file)
+
+        deployments = self.get_deployments()
+        deployments.append({'version': version, 'deployed_at': datetime.now().isoformat()})
+        self._write_json_atomic(self.deployments_file, deployments)
+
+    def get_deployments(self) -> List[Dict[str, Any]]:
+        """获取部署历史"""
+        if not os.path.exists(self.deployments_file):
+            return []
+        with open(self.deployments_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get_previous_version(self) -> Optional[str]:
+        """获取当前版本之前最近一次部署的不同版本（回滚目标）"""
+        current = self.get_current_version()
+        for entry in reversed(self.get_deployments()):
+            if entry['version'] != current and self.get_manifest(entry['version']):
+                return entry['version']
+        return None
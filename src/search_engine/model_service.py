@@ -1,80 +1,216 @@
 import os
 import json
 import pickle
+import threading
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import pandas as pd
-from .training_tab.ctr_model import CTRModel
-from .training_tab.ctr_config import CTRSampleConfig
+from .training_tab.ctr_model import CTRModel, sample_updated_at
+from .training_tab.ctr_config import CTRSampleConfig, CTRTrainingConfig
+from .model_registry import ModelRegistry
+from .click_model import fit_pbm_from_samples, format_result, position_decay, save_propensities
+from .memory_report import deep_sizeof, keras_model_bytes, register_source as register_memory_source
+from .metrics import REGISTRY, gauge_family, instrument, record_error
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from search_engine.data_service import DataService
 
 
 class ModelService:
-    """模型服务：负责模型训练、配置管理、模型文件等"""
+    """模型服务：负责模型训练、配置管理、模型文件等
     
-    def __init__(self, model_file: str = "models/ctr_model.pkl"):
+    训练总是在模型副本上进行，完成后整体替换 self.ctr_model 引用，
+    在线预测不会读到训练中途的模型状态。
+    
+    训练结果发布到模型注册表（models/registry/<version>/），部署新版本时
+    先在后台加载并预热，再原子替换服务模型；上一个模型保留在内存中用于即时回滚。
+    """
+    
+    TRAIN_MODES = ("full", "incremental", "streaming")
+    
+    def __init__(self, model_file: str = "models/ctr_model.pkl",
+                 registry_dir: str = "models/registry"):
         self.model_file = model_file
+        self.registry = ModelRegistry(registry_dir)
         self.ctr_model = CTRModel()
+        self.current_version: Optional[str] = None
+        self._previous_model: Optional[tuple] = None  # (版本号, CTRModel)
+        self._train_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._deploy_thread: Optional[threading.Thread] = None
+        self._deploy_status: Dict[str, Any] = {'status': 'idle'}
         self._load_model()
+        REGISTRY.register_collector("model_service", self._collect_metrics)
+        register_memory_source("model_service", self._memory_usage)
+    
+    @staticmethod
+    def _weights_path(filepath: str) -> str:
+        """CTRModel以.h5保存权重，兼容旧的.pkl路径配置"""
+        return os.path.splitext(filepath)[0] + '.h5'
     
     def _load_model(self):
-        """加载模型"""
-        if self.ctr_model.load_model(self.model_file):
+        """加载模型：优先注册表当前版本，其次旧的单文件路径，最后CTRModel默认路径"""
+        version = self.registry.get_current_version()
+        if version:
+            try:
+                self.ctr_model = self.registry.load(version)
+                self.current_version = version
+                print(f"✅ CTR模型加载成功: 版本 {version}")
+                return
+            except Exception as e:
+                print(f"⚠️ 注册表模型版本加载失败，尝试旧模型文件: {e}")
+        
+        if self.ctr_model.load_model(self._weights_path(self.model_file)) or self.ctr_model.load_model():
             print(f"✅ CTR模型加载成功: {self.model_file}")
         else:
             print(f"⚠️ CTR模型未找到，将使用未训练状态: {self.model_file}")
     
-    def train_model(self, data_service: 'DataService') -> Dict[str, Any]:
-        """训练CTR模型"""
+    def _swap_model(self, ctr_model: CTRModel, version: Optional[str]):
+        """原子替换服务模型，保留上一个模型用于回滚"""
+        with self._swap_lock:
+            self._previous_model = (self.current_version, self.ctr_model)
+            self.ctr_model = ctr_model
+            self.current_version = version
+            # version为None（旧模型文件或未发布的模型）时清除CURRENT，重启后不会加载刚被替换掉的版本
+            self.registry.set_current_version(version)
+    
+    def _publish_and_swap(self, candidate: CTRModel, result: Dict[str, Any]):
+        """发布训练结果到注册表并替换服务模型"""
+        metrics = {k: v for k, v in result.items() if isinstance(v, (bool, int, float, str))}
+        version = None
         try:
-            print("🚀 开始训练CTR模型...")
-            
-            # 获取训练数据
-            samples = data_service.get_all_samples()
-            if not samples:
-                return {
-                    'success': False,
-                    'error': '没有CTR数据用于训练'
-                }
-            
-            # 训练模型
-            result = self.ctr_model.train(samples)
-            
-            if result.get('success', False):
-                # 保存模型
-                self.save_model()
-                print("✅ 模型训练完成并保存")
-            else:
-                print(f"❌ 模型训练失败: {result.get('error', '未知错误')}")
-            
-            return result
-            
+            version = self.registry.publish(candidate, metrics)
+        except Exception as e:
+            print(f"⚠️ 模型版本发布失败，仅更新内存模型: {e}")
+        self._swap_model(candidate, version)
+        result['version'] = version
+    
+    @instrument("model.train")
+    def train_model(self, data_service: 'DataService', mode: str = "full") -> Dict[str, Any]:
+        """训练CTR模型
+        
+        Args:
+            data_service: 数据服务
+            mode: 训练模式，full=全量重新训练，incremental=基于上次检查点增量训练，
+                  streaming=从磁盘流式读取全部样本训练（内存有界）
+        """
+        if mode not in self.TRAIN_MODES:
+            return {
+                'success': False,
+                'error': f'不支持的训练模式: {mode}'
+            }
+        
+        if not self._train_lock.acquire(blocking=False):
+            return {
+                'success': False,
+                'error': '已有训练任务正在进行'
+            }
+        
+        try:
+            if mode == "incremental" and self.ctr_model.is_trained:
+                return self._train_incremental(data_service)
+            if mode == "streaming":
+                return self._train_streaming(data_service)
+            return self._train_full(data_service)
         except Exception as e:
             error_msg = f"训练过程中发生错误: {str(e)}"
+            record_error("model.train")
             print(f"❌ {error_msg}")
             return {
                 'success': False,
                 'error': error_msg
             }
+        finally:
+            self._train_lock.release()
+    
+    def _train_full(self, data_service: 'DataService') -> Dict[str, Any]:
+        """全量训练：在新模型上从头训练，成功后替换服务模型"""
+        print("🚀 开始训练CTR模型...")
+        
+        # 获取训练数据
+        samples = data_service.get_all_samples()
+        if not samples:
+            return {
+                'success': False,
+                'error': '没有CTR数据用于训练'
+            }
+        
+        # 训练模型
+        candidate = CTRModel()
+        result = candidate.train(samples)
+        
+        if result.get('success', False):
+            self._publish_and_swap(candidate, result)
+            print("✅ 模型训练完成并保存")
+        else:
+            print(f"❌ 模型训练失败: {result.get('error', '未知错误')}")
+        
+        return result
+    
+    def _train_streaming(self, data_service: 'DataService') -> Dict[str, Any]:
+        """流式训练：先落盘最新数据，再分块读取文件训练，成功后替换服务模型"""
+        print("🚀 开始流式训练CTR模型...")
+        data_service.force_save()
+        
+        candidate = CTRModel()
+        result = candidate.train_streaming(
+            data_service.data_file, chunk_size=CTRTrainingConfig.STREAMING_CHUNK_SIZE
+        )
+        
+        if result.get('success', False):
+            self._publish_and_swap(candidate, result)
+            print("✅ 流式训练完成并保存")
+        else:
+            print(f"❌ 流式训练失败: {result.get('error', '未知错误')}")
+        
+        return result
+    
+    def _train_incremental(self, data_service: 'DataService') -> Dict[str, Any]:
+        """增量训练：从当前模型热启动，只训练检查点之后的新样本，成功后替换服务模型"""
+        serving_model = self.ctr_model
+        checkpoint = serving_model.trained_until
+        
+        new_samples = [
+            sample for sample in data_service.get_all_samples()
+            if sample_updated_at(sample) > checkpoint
+        ]
+        print(f"🚀 开始增量训练CTR模型: 检查点={checkpoint or '无'}, 新样本{len(new_samples)}条")
+        
+        if not new_samples:
+            return {
+                'success': False,
+                'error': '检查点之后没有新的CTR数据'
+            }
+        
+        candidate = serving_model.clone()
+        result = candidate.train_incremental(new_samples)
+        
+        if result.get('success', False):
+            self._publish_and_swap(candidate, result)
+            print(f"✅ 增量训练完成: {result['eval_set']} loss {result['loss_before']} -> {result['loss_after']}")
+        else:
+            print(f"❌ 增量训练失败: {result.get('error', '未知错误')}")
+        
+        return result
     
+    @instrument("model.save")
     def save_model(self, filepath: Optional[str] = None) -> bool:
         """保存模型"""
         try:
-            save_path = filepath or self.model_file
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            save_path = self._weights_path(filepath or self.model_file)
+            os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
             
             # 保存模型
             self.ctr_model.save_model(save_path)
             
             # 保存模型信息
-            info_path = save_path.replace('.pkl', '_info.json')
+            info_path = save_path.replace('.h5', '_info.json')
             model_info = {
                 'model_file': save_path,
                 'save_time': datetime.now().isoformat(),
-                'model_type': 'CTR_LogisticRegression',
-                'feature_count': 0,  # 简化处理
+                'model_type': 'CTR_WideDeep',
+                'model_version': self.current_version,
+                'feature_count': self.ctr_model.feature_dim,
                 'training_samples': 0  # 简化处理
             }
             
@@ -85,14 +221,17 @@ class ModelService:
             return True
             
         except Exception as e:
+            record_error("model.save")
             print(f"❌ 保存模型失败: {e}")
             return False
     
     def load_model(self, filepath: Optional[str] = None) -> bool:
-        """加载模型"""
+        """加载模型（加载到新实例后整体替换服务模型）"""
         try:
-            load_path = filepath or self.model_file
-            if self.ctr_model.load_model(load_path):
+            load_path = self._weights_path(filepath or self.model_file)
+            candidate = CTRModel()
+            if candidate.load_model(load_path):
+                self._swap_model(candidate, None)
                 print(f"✅ 模型加载成功: {load_path}")
                 return True
             else:
@@ -102,10 +241,128 @@ class ModelService:
             print(f"❌ 加载模型时发生错误: {e}")
             return False
     
+    def deploy_version(self, version: str, background: bool = True) -> bool:
+        """部署注册表中的模型版本
+        
+        新版本先在后台加载、校验内容哈希并预热，完成后原子替换服务模型，
+        部署期间在线预测继续使用旧模型。
+        
+        Args:
+            version: 模型版本号
+            background: 是否在后台线程中部署
+        
+        Returns:
+            bool: 部署是否已启动（后台）或已完成（同步）
+        """
+        if self.registry.get_manifest(version) is None:
+            print(f"❌ 模型版本不存在: {version}")
+            return False
+        
+        if self._deploy_thread and self._deploy_thread.is_alive():
+            print("⚠️ 已有模型部署正在进行")
+            return False
+        
+        if not background:
+            return self._deploy(version)
+        
+        self._deploy_thread = threading.Thread(target=self._deploy, args=(version,), daemon=True)
+        self._deploy_thread.start()
+        return True
+    
+    def _deploy(self, version: str) -> bool:
+        """加载、预热并替换模型版本"""
+        self._deploy_status = {
+            'status': 'loading',
+            'version': version,
+            'started_at': datetime.now().isoformat()
+        }
+        try:
+            candidate = self.registry.load(version)
+            
+            # 预热：首次预测会构建计算图，避免切换后第一个请求承担这部分延迟
+            self._deploy_status['status'] = 'warming_up'
+            candidate.predict_ctr("预热查询", "warmup_doc", 1, 0.5, "预热摘要")
+            
+            self._swap_model(candidate, version)
+            self._deploy_status.update({
+                'status': 'deployed',
+                'finished_at': datetime.now().isoformat()
+            })
+            print(f"✅ 模型版本部署成功: {version}")
+            return True
+        except Exception as e:
+            self._deploy_status.update({
+                'status': 'failed',
+                'error': str(e),
+                'finished_at': datetime.now().isoformat()
+            })
+            print(f"❌ 模型版本部署失败: {e}")
+            return False
+    
+    def get_deploy_status(self) -> Dict[str, Any]:
+        """获取最近一次部署的状态"""
+        status = dict(self._deploy_status)
+        status['current_version'] = self.current_version
+        return status
+    
+    def rollback(self) -> bool:
+        """回滚到上一个模型
+        
+        上一个模型仍在内存中时立即切换；进程重启后则从部署历史中找到上一个版本同步加载。
+        """
+        previous = self._previous_model
+        if previous is not None:
+            version, ctr_model = previous
+            self._swap_model(ctr_model, version)
+            print(f"✅ 模型已回滚到: {version or '旧模型文件'}")
+            return True
+        
+        version = self.registry.get_previous_version()
+        if version is None:
+            print("❌ 没有可回滚的模型版本")
+            return False
+        return self.deploy_version(version, background=False)
+    
+    def _memory_usage(self) -> Dict[str, int]:
+        """内存统计回调：Keras模型按权重和优化器状态计算，回滚保留的上一个模型单独列出"""
+        usage = {
+            'model.keras': keras_model_bytes(self.ctr_model.model),
+            'model.scaler': deep_sizeof(self.ctr_model.scaler),
+            'model.history': deep_sizeof(self.ctr_model.history_stats)
+        }
+        previous = self._previous_model
+        if previous is not None:
+            usage['model.previous'] = keras_model_bytes(previous[1].model) + deep_sizeof(previous[1].scaler)
+        return usage
+    
+    def _collect_metrics(self) -> List:
+        """指标采集回调"""
+        return [
+            gauge_family('search_model_trained', '服务模型是否已训练', int(self.ctr_model.is_trained)),
+            gauge_family('search_model_info', '当前服务的模型版本', [
+                ({'version': self.current_version or 'none'}, 1)
+            ]),
+            gauge_family('search_model_training', '是否有训练任务正在进行', int(self._train_lock.locked())),
+            gauge_family('search_model_deploy_status', '最近一次部署状态', [
+                ({'status': self._deploy_status.get('status', 'idle')}, 1)
+            ]),
+            gauge_family('search_model_rollback_available', '内存中是否保留上一个模型', int(self._previous_model is not None))
+        ]
+    
+    def list_model_versions(self) -> List[Dict[str, Any]]:
+        """列出注册表中的模型版本"""
+        versions = self.registry.list_versions()
+        for manifest in versions:
+            manifest['is_current'] = manifest['version'] == self.current_version
+        return versions
+    
+    @instrument("model.predict_ctr")
     def predict_ctr(self, features: Dict[str, Any]) -> float:
         """预测CTR"""
         try:
-            if not self.ctr_model.is_trained:
+            # 只读取一次模型引用，训练替换模型时不会读到混合状态
+            ctr_model = self.ctr_model
+            if not ctr_model.is_trained:
                 return 0.1  # 默认CTR
             
             # 使用CTRModel的predict_ctr方法
@@ -115,11 +372,12 @@ class ModelService:
             score = features.get('score', 0.0)
             summary = features.get('summary', '')
             
-            ctr_score = self.ctr_model.predict_ctr(query, doc_id, position, score, summary)
+            ctr_score = ctr_model.predict_ctr(query, doc_id, position, score, summary)
             return float(ctr_score)
             
         except Exception as e:
             print(f"❌ CTR预测失败: {e}")
+            record_error("model.predict_ctr")
             return 0.1
     
     def _prepare_features(self, features: Dict[str, Any]) -> Optional[List[float]]:
@@ -138,7 +396,7 @@ class ModelService:
             
             # 位置衰减
             position = features.get('position', 1)
-            feature_vector.append(1.0 / (position + 1))
+            feature_vector.append(position_decay(position, self.ctr_model.position_propensities))
             
             return feature_vector
             
@@ -149,25 +407,40 @@ class ModelService:
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型信息"""
         try:
-            info_path = self.model_file.replace('.pkl', '_info.json')
+            ctr_model = self.ctr_model
+            version = self.current_version
+            manifest = self.registry.get_manifest(version) if version else None
+            weights_path = self._weights_path(self.model_file)
+            info_path = weights_path.replace('.h5', '_info.json')
             
-            if os.path.exists(info_path):
+            if manifest:
+                model_info = {
+                    'model_file': os.path.join(self.registry.root_dir, version),
+                    'save_time': manifest.get('created_at'),
+                    'model_type': manifest.get('model_type', 'CTR_WideDeep'),
+                    'feature_count': ctr_model.feature_dim,
+                    'training_samples': self.registry.get_metrics(version).get('train_samples', 0)
+                }
+            elif os.path.exists(info_path):
                 with open(info_path, 'r', encoding='utf-8') as f:
                     model_info = json.load(f)
             else:
                 model_info = {
-                    'model_file': self.model_file,
+                    'model_file': weights_path,
                     'save_time': None,
-                    'model_type': 'CTR_LogisticRegression',
+                    'model_type': 'CTR_WideDeep',
                     'feature_count': 0,
                     'training_samples': 0
                 }
             
             # 添加当前状态
+            model_file = model_info['model_file']
             model_info.update({
-                'is_trained': self.ctr_model.is_trained,
-                'model_exists': os.path.exists(self.model_file),
-                'last_modified': datetime.fromtimestamp(os.path.getmtime(self.model_file)).isoformat() if os.path.exists(self.model_file) else None
+                'is_trained': ctr_model.is_trained,
+                'current_version': version,
+                'manifest': manifest,
+                'model_exists': os.path.exists(model_file),
+                'last_modified': datetime.fromtimestamp(os.path.getmtime(model_file)).isoformat() if os.path.exists(model_file) else None
             })
             
             return model_info
@@ -224,19 +497,11 @@ class ModelService:
                 print("❌ 模型未训练，无法导出")
                 return False
             
-            os.makedirs(os.path.dirname(export_path), exist_ok=True)
-            
-            # 复制模型文件
-            import shutil
-            shutil.copy2(self.model_file, export_path)
-            
-            # 复制模型信息
-            info_src = self.model_file.replace('.pkl', '_info.json')
-            info_dst = export_path.replace('.pkl', '_info.json')
-            if os.path.exists(info_src):
-                shutil.copy2(info_src, info_dst)
+            # 导出当前服务模型（权重 + 标准化器 + 模型信息）
+            if not self.save_model(export_path):
+                return False
             
-            print(f"✅ 模型导出成功: {export_path}")
+            print(f"✅ 模型导出成功: {self._weights_path(export_path)}")
             return True
             
         except Exception as e:
@@ -244,26 +509,23 @@ class ModelService:
             return False
     
     def import_model(self, import_path: str) -> bool:
-        """导入模型"""
+        """导入模型：发布为注册表新版本并在后台部署，导入期间不影响在线预测"""
         try:
-            if not os.path.exists(import_path):
-                print(f"❌ 模型文件不存在: {import_path}")
+            weights_path = self._weights_path(import_path)
+            if not os.path.exists(weights_path):
+                print(f"❌ 模型文件不存在: {weights_path}")
                 return False
             
-            # 复制模型文件
-            import shutil
-            shutil.copy2(import_path, self.model_file)
-            
-            # 复制模型信息
-            info_src = import_path.replace('.pkl', '_info.json')
-            info_dst = self.model_file.replace('.pkl', '_info.json')
-            if os.path.exists(info_src):
-                shutil.copy2(info_src, info_dst)
+            candidate = CTRModel()
+            if not candidate.load_model(weights_path):
+                print(f"❌ 模型文件加载失败: {weights_path}")
+                return False
             
-            # 重新加载模型
-            self._load_model()
+            version = self.registry.publish(candidate, {'imported_from': weights_path})
+            if not self.deploy_version(version, background=True):
+                return False
             
-            print(f"✅ 模型导入成功: {import_path}")
+            print(f"✅ 模型导入成功: {import_path}，版本 {version} 正在部署")
             return True
             
         except Exception as e:
@@ -273,17 +535,23 @@ class ModelService:
     def delete_model(self) -> bool:
         """删除模型"""
         try:
-            if os.path.exists(self.model_file):
-                os.remove(self.model_file)
-                print(f"✅ 模型文件删除成功: {self.model_file}")
+            weights_path = self._weights_path(self.model_file)
+            for path in (weights_path, weights_path.replace('.h5', '_scaler.pkl')):
+                if os.path.exists(path):
+                    os.remove(path)
+                    print(f"✅ 模型文件删除成功: {path}")
             
-            info_path = self.model_file.replace('.pkl', '_info.json')
+            info_path = weights_path.replace('.h5', '_info.json')
             if os.path.exists(info_path):
                 os.remove(info_path)
                 print(f"✅ 模型信息文件删除成功: {info_path}")
             
-            # 重置模型
-            self.ctr_model = CTRModel()
+            # 重置模型；注册表中的版本保留，仅取消当前服务版本
+            self.registry.set_current_version(None)
+            with self._swap_lock:
+                self._previous_model = None
+                self.ctr_model = CTRModel()
+                self.current_version = None
             
             return True
             
@@ -291,6 +559,31 @@ class ModelService:
             print(f"❌ 删除模型失败: {e}")
             return False
     
+    @instrument("model.fit_click_model")
+    def fit_click_model(self, data_service: 'DataService') -> Dict[str, Any]:
+        """从CTR日志估计位置倾向性并写入倾向性表，下次训练起生效"""
+        try:
+            samples = data_service.get_all_samples()
+            if not samples:
+                return {
+                    'success': False,
+                    'error': '没有CTR数据用于估计位置偏差'
+                }
+            
+            result = fit_pbm_from_samples(samples)
+            save_propensities(result)
+            for line in format_result(result):
+                print(line)
+            print("✅ 位置倾向性表已更新")
+            result['success'] = True
+            return result
+        except Exception as e:
+            record_error("model.fit_click_model")
+            return {
+                'success': False,
+                'error': f'估计位置偏差失败: {str(e)}'
+            }
+    
     def validate_training_data(self, data_service) -> Dict[str, Any]:
         """验证训练数据"""
         try:
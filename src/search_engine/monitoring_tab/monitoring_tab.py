@@ -1,5 +1,21 @@
 import gradio as gr
+import tracemalloc
 from datetime import datetime
+from html import escape
+from .. import metrics
+from .. import tracing
+from .. import profiler
+from .. import memory_report
+
+# 搜索链路各阶段（按调用顺序）
+SEARCH_STAGES = {
+    'index.retrieve': '召回',
+    'inverted_index.search': '倒排检索',
+    'inverted_index.generate_summary': '摘要生成',
+    'index.rank': '排序',
+    'model.predict_ctr': 'CTR预测',
+    'rag.enhance_search_results': 'RAG回答'
+}
 
 def run_data_quality_check():
     """运行数据质量检查"""
@@ -45,6 +61,248 @@ def handle_reset_click():
     except Exception as e:
         return f"<p style='color: red;'>系统重置失败: {str(e)}</p>"
 
+def render_stage_metrics() -> str:
+    """渲染各阶段的RED指标表（来自真实请求的进程内直方图）"""
+    snapshots = {snap['stage']: snap for snap in metrics.snapshot()}
+    stages = list(SEARCH_STAGES) + sorted(name for name in snapshots if name not in SEARCH_STAGES)
+    
+    rows = []
+    for stage in stages:
+        snap = snapshots.get(stage)
+        label = SEARCH_STAGES.get(stage, stage)
+        if not snap or not snap['requests']:
+            rows.append(f"<tr><td>{label}</td><td colspan='7' style='color: #999;'>暂无请求</td></tr>")
+            continue
+        error_color = '#dc3545' if snap['errors'] else '#333'
+        rows.append(
+            f"<tr><td>{label}</td><td>{snap['requests']}</td><td>{snap['rate_per_sec']:.2f}</td>"
+            f"<td style='color: {error_color};'>{snap['errors']} ({snap['error_rate']:.1%})</td>"
+            f"<td>{snap['p50_ms']:.2f}</td><td>{snap['p95_ms']:.2f}</td><td>{snap['p99_ms']:.2f}</td>"
+            f"<td>{snap['max_ms']:.2f}</td></tr>"
+        )
+    
+    return f"""
+    <table style="width: 100%; border-collapse: collapse; font-size: 13px;">
+        <thead>
+            <tr style="background-color: #e9ecef;">
+                <th>阶段</th><th>请求数</th><th>QPS</th><th>错误</th>
+                <th>p50 (ms)</th><th>p95 (ms)</th><th>p99 (ms)</th><th>最大 (ms)</th>
+            </tr>
+        </thead>
+        <tbody>{''.join(rows)}</tbody>
+    </table>
+    """
+
+def render_service_metrics() -> str:
+    """渲染各服务注册的计数器和仪表盘（阶段直方图见 render_stage_metrics）"""
+    rows = []
+    for family in metrics.REGISTRY.collect():
+        if family.type == 'histogram' or family.name == 'search_stage_errors':
+            continue
+        for suffix, labels, value in family.samples:
+            label_text = ', '.join(f"{k}={v}" for k, v in labels.items())
+            value_text = f"{value:.3f}" if isinstance(value, float) and not value.is_integer() else f"{value:.0f}"
+            rows.append(
+                f"<tr><td><code>{family.name}{suffix}</code></td><td>{escape(label_text)}</td>"
+                f"<td style='text-align: right;'>{value_text}</td><td style='color: #666;'>{escape(family.help)}</td></tr>"
+            )
+    if not rows:
+        return "<p style='color: #999;'>暂无服务指标</p>"
+    return f"""
+    <table style="width: 100%; border-collapse: collapse; font-size: 13px;">
+        <thead>
+            <tr style="background-color: #e9ecef;"><th>指标</th><th>标签</th><th>值</th><th>说明</th></tr>
+        </thead>
+        <tbody>{''.join(rows)}</tbody>
+    </table>
+    """
+
+def render_trace_waterfall(trace: dict) -> str:
+    """渲染单个trace的瀑布图：条形位置和宽度按相对根span的起止时间"""
+    total = max(trace['duration_ms'], 1e-6)
+    started = datetime.fromtimestamp(trace['started_at']).strftime('%H:%M:%S')
+    query = escape(str(trace['attributes'].get('query', '')))
+    status = "❌" if trace['error'] else "✅"
+    
+    rows = []
+    for s in [{'name': trace['name'], 'depth': -1, 'start_ms': 0.0, 'duration_ms': trace['duration_ms'],
+               'error': trace['error'], 'attributes': {}}] + trace['spans']:
+        left = min(s['start_ms'] / total * 100, 100)
+        width = max(min(s['duration_ms'] / total * 100, 100 - left), 0.3)
+        color = '#dc3545' if s['error'] else ('#6c757d' if s['depth'] < 0 else '#17a2b8')
+        attributes = ' '.join(f"{k}={v}" for k, v in s['attributes'].items())
+        rows.append(
+            f"<tr><td style='padding-left: {(s['depth'] + 1) * 14 + 4}px; white-space: nowrap;' "
+            f"title='{escape(attributes)}'>{escape(s['name'])}</td>"
+            f"<td style='text-align: right; white-space: nowrap;'>{s['duration_ms']:.2f}</td>"
+            f"<td style='width: 60%;'><div style='position: relative; height: 12px;'>"
+            f"<div style='position: absolute; left: {left:.2f}%; width: {width:.2f}%; height: 100%; "
+            f"background-color: {color}; border-radius: 2px;'></div></div></td></tr>"
+        )
+    dropped = f"<span style='color: #999;'>（丢弃 {trace['dropped_spans']} 个span）</span>" \
+        if trace['dropped_spans'] else ""
+    return f"""
+    <div style="margin-bottom: 12px;">
+        <div style="font-size: 13px; margin-bottom: 4px;">
+            {status} <code>{escape(trace['request_id'])}</code> {started}
+            查询: <strong>{query}</strong> 总耗时: <strong>{trace['duration_ms']:.2f} ms</strong> {dropped}
+        </div>
+        <table style="width: 100%; border-collapse: collapse; font-size: 12px;">{''.join(rows)}</table>
+    </div>
+    """
+
+def render_traces(request_id: str = "") -> str:
+    """渲染请求追踪：指定request_id时只显示该请求，否则显示最近的慢请求和采样请求"""
+    request_id = (request_id or "").strip()
+    if request_id:
+        found = tracing.get_trace(request_id)
+        if found is None:
+            return f"<p style='color: #dc3545;'>❌ 未找到请求 {escape(request_id)} 的追踪（未采样或已被淘汰）</p>"
+        return render_trace_waterfall(found)
+    
+    config = tracing.get_config()
+    slow = tracing.get_slow_traces(5)
+    recent = tracing.get_recent_traces(10)
+    slow_html = ''.join(render_trace_waterfall(t) for t in slow) or "<p style='color: #999;'>暂无慢请求</p>"
+    recent_html = ''.join(render_trace_waterfall(t) for t in recent) or "<p style='color: #999;'>暂无请求</p>"
+    return f"""
+    <div style="padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
+        <h4 style="margin: 0 0 10px 0;">🧭 请求追踪</h4>
+        <p style="font-size: 13px; color: #666;">
+            采样率: {config['sample_rate']:.0%} | 慢请求阈值: {config['slow_threshold_ms']:.0f} ms
+        </p>
+        <h5 style="margin: 10px 0; color: #dc3545;">🐢 慢请求</h5>
+        {slow_html}
+        <h5 style="margin: 10px 0; color: #007bff;">🕒 最近请求</h5>
+        {recent_html}
+    </div>
+    """
+
+def render_profile(dump: bool = False) -> str:
+    """渲染采样分析器状态和当前窗口的热点函数；dump=True 时先写出当前窗口的折叠栈文件"""
+    top = profiler.top_functions(20)
+    dumped = profiler.dump_profile() if dump else None
+    status = profiler.get_status()
+    state = "🟢 运行中" if status['running'] else "⚪ 已停止"
+    rows = [
+        f"<tr><td><code>{escape(item['function'])}</code></td>"
+        f"<td style='text-align: right;'>{item['self']} ({item['self_ratio']:.1%})</td>"
+        f"<td style='text-align: right;'>{item['total']} ({item['total_ratio']:.1%})</td></tr>"
+        for item in top
+    ]
+    table = f"""
+    <table style="width: 100%; border-collapse: collapse; font-size: 12px;">
+        <thead>
+            <tr style="background-color: #e9ecef;"><th>函数</th><th>自身样本</th><th>含子调用</th></tr>
+        </thead>
+        <tbody>{''.join(rows)}</tbody>
+    </table>
+    """ if rows else "<p style='color: #999;'>当前窗口暂无样本</p>"
+    dumped_html = f"<p style='color: #28a745;'>✅ 已写出: <code>{escape(dumped)}</code></p>" if dumped else ""
+    files = ''.join(f"<li><code>{escape(path)}</code></li>" for path in reversed(status['files']))
+    return f"""
+    <div style="padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
+        <h4 style="margin: 0 0 10px 0;">🔥 采样分析</h4>
+        <p style="font-size: 13px; color: #666;">
+            {state} | 采样间隔: {status['interval_ms']:.0f} ms | 窗口: {status['window_s']:.0f} s
+            （已过 {status['window_age_s']:.0f} s） | 累计采样: {status['samples']} | 采样开销: {status['overhead_ratio']:.2%}
+        </p>
+        {dumped_html}
+        <h5 style="margin: 10px 0;">当前窗口热点函数</h5>
+        {table}
+        <h5 style="margin: 10px 0;">折叠栈文件（可用 flamegraph.pl / speedscope 渲染）</h5>
+        <ul style="font-size: 12px;">{files or "<li style='color: #999;'>暂无</li>"}</ul>
+    </div>
+    """
+
+def toggle_profiler(enabled: bool) -> str:
+    """开关采样分析器"""
+    if enabled:
+        profiler.start_profiler()
+    else:
+        profiler.stop_profiler()
+    return render_profile()
+
+def _format_bytes(value) -> str:
+    sign = '-' if value < 0 else ''
+    value = abs(value)
+    for unit in ('B', 'KB', 'MB'):
+        if value < 1024:
+            return f"{sign}{value:.0f} {unit}" if unit == 'B' else f"{sign}{value:.1f} {unit}"
+        value /= 1024
+    return f"{sign}{value:.2f} GB"
+
+def render_memory() -> str:
+    """采集一次各子系统内存估算，渲染占用和随时间的增长；tracemalloc开启时附上增长最多的代码行"""
+    report = memory_report.measure()
+    history = memory_report.get_history()
+    rows = []
+    for row in memory_report.growth():
+        delta_color = '#dc3545' if row['delta_total'] > 0 else '#333'
+        rows.append(
+            f"<tr><td><code>{escape(row['component'])}</code></td>"
+            f"<td style='text-align: right;'>{_format_bytes(row['bytes'])}</td>"
+            f"<td style='text-align: right;'>{_format_bytes(row['delta_last'])}</td>"
+            f"<td style='text-align: right; color: {delta_color};'>{_format_bytes(row['delta_total'])}</td>"
+            f"<td style='text-align: right;'>{_format_bytes(row['bytes_per_min'])}/min</td></tr>"
+        )
+    table = f"""
+    <table style="width: 100%; border-collapse: collapse; font-size: 13px;">
+        <thead>
+            <tr style="background-color: #e9ecef;">
+                <th>组件</th><th>估算占用</th><th>较上次</th><th>较首次</th><th>增长速率</th>
+            </tr>
+        </thead>
+        <tbody>{''.join(rows)}</tbody>
+    </table>
+    """ if rows else "<p style='color: #999;'>暂无已注册的组件</p>"
+    
+    rss = _format_bytes(report['process_rss_bytes']) if report['process_rss_bytes'] is not None else "未知（需安装psutil）"
+    errors = ''.join(f"<li>{escape(key)}: {escape(message)}</li>" for key, message in report['errors'].items())
+    errors_html = f"<ul style='color: #dc3545; font-size: 12px;'>{errors}</ul>" if errors else ""
+    
+    top = memory_report.ACCOUNTANT.tracemalloc_top(10)
+    if top:
+        trace_rows = ''.join(
+            f"<tr><td><code>{escape(item['location'])}</code></td>"
+            f"<td style='text-align: right;'>{_format_bytes(item['size_diff'])}</td>"
+            f"<td style='text-align: right;'>{_format_bytes(item['size'])}</td>"
+            f"<td style='text-align: right;'>{item['count_diff']:+d}</td></tr>"
+            for item in top
+        )
+        tracemalloc_html = f"""
+        <table style="width: 100%; border-collapse: collapse; font-size: 12px;">
+            <thead>
+                <tr style="background-color: #e9ecef;"><th>代码行</th><th>较基线增长</th><th>当前</th><th>对象数变化</th></tr>
+            </thead>
+            <tbody>{trace_rows}</tbody>
+        </table>
+        """
+    else:
+        tracemalloc_html = "<p style='color: #999;'>tracemalloc未开启（勾选左侧开关或设置 SEARCH_TRACEMALLOC=1）</p>"
+    
+    return f"""
+    <div style="padding: 15px; background-color: #f8f9fa; border-radius: 8px;">
+        <h4 style="margin: 0 0 10px 0;">🧠 内存统计</h4>
+        <p style="font-size: 13px; color: #666;">
+            组件合计: {_format_bytes(report['total_bytes'])} | 进程RSS: {rss} |
+            采集 {len(history)} 次，本次耗时 {report['elapsed_ms']:.0f} ms（抽样估算，共享对象在各组件中分别计入）
+        </p>
+        {errors_html}
+        {table}
+        <h5 style="margin: 10px 0;">🔬 tracemalloc 增长最多的代码行</h5>
+        {tracemalloc_html}
+    </div>
+    """
+
+def toggle_tracemalloc(enabled: bool) -> str:
+    """开关tracemalloc（开启时记录基线快照）"""
+    if enabled:
+        memory_report.ACCOUNTANT.start_tracemalloc()
+    else:
+        memory_report.ACCOUNTANT.stop_tracemalloc()
+    return render_memory()
+
 def build_monitoring_tab(data_service=None, index_service=None, model_service=None):
     with gr.Blocks() as monitoring_tab:
         gr.Markdown("""### 🛡️ 第四部分：系统监控""")
@@ -55,9 +313,19 @@ def build_monitoring_tab(data_service=None, index_service=None, model_service=No
                 data_quality_btn = gr.Button("🔍 数据质量检查", variant="secondary")
                 performance_btn = gr.Button("⚡ 性能监控", variant="secondary")
                 model_status_btn = gr.Button("🤖 模型状态", variant="secondary")
+                trace_btn = gr.Button("🧭 请求追踪", variant="secondary")
+                trace_request_id = gr.Textbox(label="request_id（留空查看最近请求）", lines=1)
+                profile_btn = gr.Button("🔥 采样分析", variant="secondary")
+                profile_dump_btn = gr.Button("💾 导出折叠栈", variant="secondary")
+                profile_toggle = gr.Checkbox(label="🔥 开启采样分析器", value=profiler.is_profiling())
+                memory_btn = gr.Button("🧠 内存统计", variant="secondary")
+                tracemalloc_toggle = gr.Checkbox(label="🔬 开启tracemalloc（有额外开销）", value=tracemalloc.is_tracing())
                 
             with gr.Column(scale=3):
                 monitoring_output = gr.HTML(value="<p>点击按钮查看系统监控信息...</p>", label="监控结果")
+                auto_refresh = gr.Checkbox(label="⏱️ 性能监控每5秒自动刷新", value=False)
+        
+        refresh_timer = gr.Timer(value=5, active=False)
         
         # 绑定事件
         def show_system_status():
@@ -152,30 +420,18 @@ def build_monitoring_tab(data_service=None, index_service=None, model_service=No
             return html
         
         def show_performance():
-            html = """
+            html = f"""
             <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px;">
                 <h4 style="margin: 0 0 15px 0; color: #333;">⚡ 性能监控</h4>
                 
                 <div style="margin-bottom: 15px;">
-                    <h5 style="margin: 0 0 10px 0; color: #007bff;">🔍 搜索性能</h5>
-                    <ul style="margin: 0; padding-left: 20px;">
-                        <li><strong>平均响应时间:</strong> < 100ms</li>
-                        <li><strong>索引加载时间:</strong> < 1s</li>
-                        <li><strong>内存使用:</strong> 正常</li>
-                    </ul>
+                    <h5 style="margin: 0 0 10px 0; color: #007bff;">🔍 搜索链路延迟（真实请求，更新于 {datetime.now().strftime('%H:%M:%S')}）</h5>
+                    {render_stage_metrics()}
                 </div>
                 
                 <div style="margin-bottom: 15px;">
-                    <h5 style="margin: 0 0 10px 0; color: #28a745;">📊 数据处理性能</h5>
-                    <ul style="margin: 0; padding-left: 20px;">
-                        <li><strong>CTR记录速度:</strong> 实时</li>
-                        <li><strong>数据持久化:</strong> 自动</li>
-                        <li><strong>并发处理:</strong> 支持</li>
-                    </ul>
-                </div>
-                
-                <div style="background-color: #d4edda; color: #155724; padding: 10px; border-radius: 4px; border: 1px solid #c3e6cb;">
-                    <strong>✅ 性能表现良好</strong> - 系统运行流畅，响应及时
+                    <h5 style="margin: 0 0 10px 0; color: #28a745;">📊 服务指标（与 /metrics 端点同源）</h5>
+                    {render_service_metrics()}
                 </div>
             </div>
             """
@@ -218,6 +474,14 @@ def build_monitoring_tab(data_service=None, index_service=None, model_service=No
         system_status_btn.click(fn=show_system_status, outputs=monitoring_output)
         data_quality_btn.click(fn=check_data_quality, outputs=monitoring_output)
         performance_btn.click(fn=show_performance, outputs=monitoring_output)
+        auto_refresh.change(fn=lambda enabled: gr.Timer(active=enabled), inputs=auto_refresh, outputs=refresh_timer)
+        refresh_timer.tick(fn=show_performance, outputs=monitoring_output)
         model_status_btn.click(fn=show_model_status, outputs=monitoring_output)
+        trace_btn.click(fn=render_traces, inputs=trace_request_id, outputs=monitoring_output)
+        profile_btn.click(fn=render_profile, outputs=monitoring_output)
+        profile_dump_btn.click(fn=lambda: render_profile(dump=True), outputs=monitoring_output)
+        profile_toggle.change(fn=toggle_profiler, inputs=profile_toggle, outputs=monitoring_output)
+        memory_btn.click(fn=render_memory, outputs=monitoring_output)
+        tracemalloc_toggle.change(fn=toggle_tracemalloc, inputs=tracemalloc_toggle, outputs=monitoring_output)
         
     return monitoring_tab 
\ No newline at end of file
@@ -7,6 +7,9 @@ from .search_tab import build_search_tab
 from .training_tab import build_training_tab
 from .monitoring_tab import build_monitoring_tab
 from .service_manager import service_manager
+from .metrics_exporter import start_metrics_server
+from .profiler import start_from_env as start_profiler_from_env
+from .memory_report import start_from_env as start_memory_report_from_env
 
 class SearchUI:
     def __init__(self):
@@ -60,6 +63,15 @@ class SearchUI:
         else:
             print(f"🤖 模型服务状态: 运行中 (未训练)")
         
+        try:
+            start_metrics_server()
+        except Exception as e:
+            print(f"⚠️ 指标端点启动失败: {e}")
+        
+        if start_profiler_from_env():
+            print("🔥 采样分析器已启动 (SEARCH_PROFILER=1)")
+        start_memory_report_from_env()
+        
         try:
             self.interface.launch(share=False, inbrowser=True, server_port=port)
         except Exception as e:
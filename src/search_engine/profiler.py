@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采样分析器 - 后台线程周期性读取所有线程的调用栈，聚合为折叠栈（collapsed stacks）
+
+用法：
+    start_profiler()                 # 或设置环境变量 SEARCH_PROFILER=1，启动时自动开启
+    ...
+    path = dump_profile()            # 写出当前窗口的折叠栈文件
+    stop_profiler()
+
+- 基于 sys._current_frames() 定时采样，不使用 sys.setprofile/settrace，被测代码没有逐调用开销；
+  开销只来自采样线程本身，随采样间隔线性变化，状态中给出实测的采样耗时占比
+- 每个样本记为一条 "线程名;外层函数;...;内层函数" 栈，按时间窗口聚合，
+  窗口结束时写出 <输出目录>/profile_<时间>.collapsed，每行 "栈 样本数"，
+  可直接交给 flamegraph.pl、speedscope 或 inferno 渲染火焰图
+- 栈帧格式为 "函数名 (文件:函数起始行)"，同一函数的不同行合并
+
+配置（环境变量或 start_profiler 参数）：
+    SEARCH_PROFILER              为1时随服务启动采样，默认关闭
+    SEARCH_PROFILER_INTERVAL_MS  采样间隔（毫秒），默认10
+    SEARCH_PROFILER_WINDOW_S     聚合窗口（秒），默认60
+    SEARCH_PROFILER_DIR          输出目录，默认 profiles
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .metrics import REGISTRY, counter_family, gauge_family
+
+MAX_STACK_DEPTH = 128
+
+
+def _env_enabled() -> bool:
+    return os.getenv("SEARCH_PROFILER", "0").lower() in ("1", "true", "yes", "on")
+
+
+class SamplingProfiler:
+    """栈采样分析器"""
+
+    def __init__(self, interval: float = 0.01, window: float = 60.0, output_dir: str = "profiles"):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            window: 聚合窗口（秒），窗口结束时写出折叠栈文件；<=0 表示只在停止或手动导出时写出
+            output_dir: 折叠栈文件输出目录
+        """
+        self.interval = interval
+        self.window = window
+        self.output_dir = output_dir
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frame_names: Dict[Any, str] = {}
+        self._window_start = time.time()
+        self._started_at: Optional[float] = None
+        self._samples = 0
+        self._sampling_seconds = 0.0
+        self._files: List[str] = []
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动采样线程（已在运行时不做任何事）"""
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._started_at = time.time()
+        self._window_start = self._started_at
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[str]:
+        """停止采样，写出当前窗口，返回文件路径（窗口内没有样本时为None）"""
+        if not self.is_running():
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.dump()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            self.sample(exclude={own_id})
+            self._sampling_seconds += time.perf_counter() - started
+            if self.window > 0 and time.time() - self._window_start >= self.window:
+                self.dump()
+
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            filename = code.co_filename
+            marker = filename.rfind('site-packages' + os.sep)
+            if marker >= 0:
+                filename = filename[marker + len('site-packages') + 1:]
+            else:
+                filename = os.path.basename(filename)
+            name = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._frame_names[code] = name
+        return name
+
+    def sample(self, exclude=()):
+        """采集一次所有线程的调用栈"""
+        names = {t.ident: t.name for t in threading.enumerate()}
+        collected = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude:
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                frames.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            # 线程名中的分号会破坏折叠格式
+            frames.append(names.get(thread_id, f"thread-{thread_id}").replace(';', ':'))
+            collected.append(';'.join(reversed(frames)))
+        with self._lock:
+            self._stacks.update(collected)
+            self._samples += 1
+
+    def collapsed(self) -> List[str]:
+        """当前窗口的折叠栈行，按样本数降序"""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return [f"{stack} {count}" for stack, count in stacks]
+
+    def top_functions(self, n: int = 20) -> List[Dict[str, Any]]:
+        """
+        当前窗口的热点函数
+
+        self: 位于栈顶的样本数（函数自身耗时）；total: 出现在栈中的样本数（含子调用）
+        """
+        with self._lock:
+            stacks = list(self._stacks.items())
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        total = 0
+        for stack, count in stacks:
+            frames = stack.split(';')[1:]
+            total += count
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+        return [
+            {'function': frame, 'self': count, 'total': total_counts[frame],
+             'self_ratio': count / total if total else 0.0,
+             'total_ratio': total_counts[frame] / total if total else 0.0}
+            for frame, count in self_counts.most_common(n)
+        ]
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """写出当前窗口的折叠栈并开始新窗口，返回文件路径"""
+        with self._lock:
+            stacks = self._stacks
+            self._stacks = Counter()
+            window_start = self._window_start
+            self._window_start = time.time()
+        if not stacks:
+            return None
+        if path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.fromtimestamp(window_start).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            path = os.path.join(self.output_dir, f"profile_{stamp}.collapsed")
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except Exception as e:
+            print(f"❌ 写出采样结果失败: {e}")
+            return None
+        self._files.append(path)
+        return path
+
+    def get_status(self) -> Dict[str, Any]:
+        """运行状态"""
+        running = self.is_running()
+        elapsed = time.time() - self._started_at if running and self._started_at else 0.0
+        with self._lock:
+            window_samples = sum(self._stacks.values())
+        return {
+            'running': running,
+            'interval_ms': self.interval * 1000,
+            'window_s': self.window,
+            'output_dir': self.output_dir,
+            'samples': self._samples,
+            'window_stacks': window_samples,
+            'window_age_s': time.time() - self._window_start if running else 0.0,
+            'overhead_ratio': self._sampling_seconds / elapsed if elapsed > 0 else 0.0,
+            'files': list(self._files[-10:])
+        }
+
+    def _collect_metrics(self) -> List:
+        """指标采集回调"""
+        status = self.get_status()
+        return [
+            gauge_family('search_profiler_running', '采样分析器是否运行', int(status['running'])),
+            counter_family('search_profiler_samples', '采样分析器累计采样次数', status['samples']),
+            gauge_family('search_profiler_overhead_ratio', '采样线程耗时占墙钟时间的比例', status['overhead_ratio'])
+        ]
+
+
+PROFILER = SamplingProfiler(
+    interval=float(os.getenv("SEARCH_PROFILER_INTERVAL_MS", "10")) / 1000,
+    window=float(os.getenv("SEARCH_PROFILER_WINDOW_S", "60")),
+    output_dir=os.getenv("SEARCH_PROFILER_DIR", "profiles")
+)
+REGISTRY.register_collector("profiler", PROFILER._collect_metrics)
+
+
+def start_profiler(interval_ms: Optional[float] = None, window_s: Optional[float] = None,
+                   output_dir: Optional[str] = None) -> SamplingProfiler:
+    """启动全局采样分析器，未指定的参数沿用当前配置"""
+    if interval_ms is not None:
+        PROFILER.interval = interval_ms / 1000
+    if window_s is not None:
+        PROFILER.window = window_s
+    if output_dir is not None:
+        PROFILER.output_dir = output_dir
+    PROFILER.start()
+    return PROFILER
+
+
+def stop_profiler() -> Optional[str]:
+    """停止全局采样分析器，返回最后一个窗口的文件路径"""
+    return PROFILER.stop()
+
+
+def dump_profile() -> Optional[str]:
+    """立即写出全局采样分析器的当前窗口"""
+    return PROFILER.dump()
+
+
+def is_profiling() -> bool:
+    return PROFILER.is_running()
+
+
+def get_status() -> Dict[str, Any]:
+    return PROFILER.get_status()
+
+
+def top_functions(n: int = 20) -> List[Dict[str, Any]]:
+    return PROFILER.top_functions(n)
+
+
+def start_from_env() -> bool:
+    """SEARCH_PROFILER=1 时启动采样，返回是否已启动"""
+    if _env_enabled():
+        PROFILER.start()
+    return PROFILER.is_running()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RAG上下文构建模块 - 按token预算打包最相关的段落
+
+流程：
+1. 批量获取候选文档全文
+2. 按句子边界切分为段落，按查询词覆盖度和文档相关度打分
+3. 以段落token数为重量、相关度为价值做0/1背包，在token预算内选出总价值最高的段落
+4. 按文档排名和段落原始顺序拼接上下文
+"""
+
+import math
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import jieba
+
+# DeepSeek官方给出的换算：1个中文字符约0.6个token，1个英文字符约0.3个token
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef\u3000-\u303f]')
+PASSAGE_SEPARATOR = "\n...\n"
+
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;\n])')
+
+
+class TokenEstimator:
+    """token数估算器
+
+    配置了分词器（transformers可用且能加载）时使用真实分词结果，
+    否则按字符类别换算。结果按文本缓存，同一段落重复估算不再计算。
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = None, cache_size: int = 8192):
+        self.tokenizer = self._load_tokenizer(tokenizer_name) if tokenizer_name else None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _load_tokenizer(tokenizer_name: str):
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(tokenizer_name)
+        except Exception as e:
+            print(f"⚠️ 分词器加载失败，使用字符换算估算token: {e}")
+            return None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        cjk_chars = len(_CJK_PATTERN.findall(text))
+        other_chars = len(text) - cjk_chars
+        return math.ceil(cjk_chars * CJK_TOKENS_PER_CHAR + other_chars * OTHER_TOKENS_PER_CHAR)
+
+    def cache_info(self):
+        return self.count.cache_info()
+
+
+def split_passages(text: str, max_chars: int = 300) -> List[str]:
+    """按句子边界切分段落，每段不超过max_chars（超长句子按长度硬切）"""
+    passages: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if len(current) + len(sentence) > max_chars and current:
+            passages.append(current)
+            current = ""
+        current += sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+def query_terms(query: str) -> List[str]:
+    """提取查询词（去掉单字符和空白）"""
+    return list(dict.fromkeys(w for w in jieba.lcut(query.lower()) if len(w.strip()) > 1))
+
+
+def knapsack_select(weights: Sequence[int], values: Sequence[float], capacity: int,
+                    granularity: int = 1) -> List[int]:
+    """0/1背包：在容量内选择总价值最高的物品，返回选中下标
+
+    Args:
+        weights: 物品重量（token数）
+        values: 物品价值（相关度）
+        capacity: 背包容量（token预算）
+        granularity: 重量量化粒度，预算较大时降低DP表规模（重量向上取整，不会超预算）
+    """
+    granularity = max(1, granularity)
+    cap = capacity // granularity
+    if cap <= 0:
+        return []
+    scaled = [math.ceil(w / granularity) for w in weights]
+
+    best = [0.0] * (cap + 1)
+    keep = [[False] * (cap + 1) for _ in weights]
+    for i, (w, v) in enumerate(zip(scaled, values)):
+        if w > cap:
+            continue
+        for c in range(cap, w - 1, -1):
+            if best[c - w] + v > best[c]:
+                best[c] = best[c - w] + v
+                keep[i][c] = True
+
+    selected = []
+    c = cap
+    for i in range(len(weights) - 1, -1, -1):
+        if keep[i][c]:
+            selected.append(i)
+            c -= scaled[i]
+    return sorted(selected)
+
+
+class ContextPacker:
+    """按token预算选择最相关段落的上下文构建器"""
+
+    def __init__(self, estimator: Optional[TokenEstimator] = None, passage_chars: int = 300,
+                 max_candidates: int = 64, dp_cells: int = 512):
+        """
+        Args:
+            estimator: token估算器
+            passage_chars: 段落最大字符数
+            max_candidates: 参与背包选择的最多段落数（按相关度预筛）
+            dp_cells: 背包DP表的最大容量格数
+        """
+        self.estimator = estimator or TokenEstimator()
+        self.passage_chars = passage_chars
+        self.max_candidates = max_candidates
+        self.dp_cells = dp_cells
+
+    @staticmethod
+    def _header(rank: int, doc_id: str, score: float) -> str:
+        return f"文档{rank} (ID: {doc_id}, 相关度: {score:.4f}):\n"
+
+    def _score_passage(self, terms: List[str], passage: str, doc_weight: float, index: int) -> float:
+        """段落价值 = 查询词覆盖度（词频饱和）与文档相关度的加权和，文档首段略有加成"""
+        text = passage.lower()
+        if terms:
+            coverage = sum(tf / (tf + 1.0) for tf in (text.count(t) for t in terms)) / len(terms)
+        else:
+            coverage = 0.0
+        lead_bonus = 0.05 if index == 0 else 0.0
+        return 0.7 * coverage + 0.3 * doc_weight + lead_bonus
+
+    def pack(self, query: str, search_results: List[Tuple],
+             fetch_documents: Optional[Callable[[List[str]], Dict[str, Optional[str]]]],
+             max_tokens: int) -> str:
+        """
+        按文档构建上下文：获取全文后切分段落再选择
+
+        Args:
+            query: 用户查询
+            search_results: 检索结果 (doc_id, score, summary, ...)
+            fetch_documents: 批量获取全文的函数，返回 {doc_id: 内容}；为None时只使用摘要
+            max_tokens: 上下文token预算
+        """
+        docs = [(str(r[0]), float(r[1]), r[-1]) for r in search_results if len(r) >= 3]
+        if not docs:
+            return ""
+
+        contents = fetch_documents([doc_id for doc_id, _, _ in docs]) if fetch_documents else {}
+        max_score = max(score for _, score, _ in docs) or 1.0
+        terms = query_terms(query)
+
+        passages = []  # (文档排名, 段落序号, 段落, 价值)
+        for rank, (doc_id, score, summary) in enumerate(docs):
+            content = contents.get(doc_id) or summary
+            for index, passage in enumerate(split_passages(content, self.passage_chars)):
+                passages.append((rank, index, passage,
+                                 self._score_passage(terms, passage, score / max_score, index)))
+
+        return self._select_and_render([(doc_id, score) for doc_id, score, _ in docs], passages, max_tokens)
+
+    def pack_passages(self, query: str, passages: List[Tuple[str, float, str, int]],
+                      max_tokens: int) -> str:
+        """
+        按段落构建上下文：直接使用段落索引的检索结果
+
+        Args:
+            query: 用户查询
+            passages: 段落检索结果 (doc_id, score, 段落文本, 段落在文档中的序号)
+            max_tokens: 上下文token预算
+        """
+        if not passages:
+            return ""
+
+        # 文档按其最佳段落的分数排序
+        docs: List[Tuple[str, float]] = []
+        doc_rank: Dict[str, int] = {}
+        for doc_id, score, _, _ in sorted(passages, key=lambda p: p[1], reverse=True):
+            if doc_id not in doc_rank:
+                doc_rank[doc_id] = len(docs)
+                docs.append((doc_id, score))
+
+        max_score = max(score for _, score, _, _ in passages) or 1.0
+        terms = query_terms(query)
+        candidates = [
+            (doc_rank[doc_id], order, text, self._score_passage(terms, text, score / max_score, order))
+            for doc_id, score, text, order in passages
+        ]
+        return self._select_and_render(docs, candidates, max_tokens)
+
+    def _select_and_render(self, docs: List[Tuple[str, float]],
+                           passages: List[Tuple[int, int, str, float]], max_tokens: int) -> str:
+        """在预算内做背包选择并按文档排名、段落顺序拼接"""
+        # 先为每篇文档的标题行预留预算
+        headers = [self._header(rank, doc_id, score) for rank, (doc_id, score) in enumerate(docs, 1)]
+        budget = max_tokens - sum(self.estimator.count(h) for h in headers)
+
+        # 段落间分隔符的开销计入每个段落的重量
+        separator_tokens = self.estimator.count(PASSAGE_SEPARATOR)
+        candidates = sorted(passages, key=lambda c: c[3], reverse=True)[:self.max_candidates]
+        weights = [self.estimator.count(c[2]) + separator_tokens for c in candidates]
+
+        granularity = math.ceil(budget / self.dp_cells) if budget > self.dp_cells else 1
+        chosen = knapsack_select(weights, [c[3] for c in candidates], budget, granularity)
+        selected = sorted((candidates[i] for i in chosen), key=lambda c: (c[0], c[1]))
+
+        context_parts = []
+        for rank, header in enumerate(headers):
+            texts = [c[2] for c in selected if c[0] == rank]
+            if texts:
+                context_parts.append(header + PASSAGE_SEPARATOR.join(texts) + "\n")
+        return "\n".join(context_parts)
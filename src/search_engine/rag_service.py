@@ -7,12 +7,18 @@ RAG服务模块 - 检索增强生成
 
 import os
 import json
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Iterator
 from dataclasses import dataclass
 import time
+import asyncio
 import hashlib
 from datetime import datetime
 from openai.types.chat import ChatCompletionMessageParam
+from .cache import LRUTTLCache
+from .async_llm_client import AsyncLLMClient
+from .rag_context import ContextPacker, TokenEstimator
+from .memory_report import register_source as register_memory_source
+from .metrics import REGISTRY, counter_family, gauge_family, get_histogram, instrument, record_error
 
 @dataclass
 class RAGConfig:
@@ -22,15 +28,35 @@ class RAGConfig:
     llm_provider: str = "deepseek"  # mock, openai, deepseek, local
     model_name: str = "deepseek-reasoner"
     max_context_tokens: int = 3000
+    context_passage_chars: int = 300  # 上下文段落最大字符数
+    passage_retrieval: bool = True  # 直接从段落索引检索上下文段落
+    passage_top_k: int = 8  # 段落检索数量
+    tokenizer_name: Optional[str] = None  # transformers分词器名称或路径，None时按字符换算估算token
     top_k_docs: int = 3
     temperature: float = 0.7
     max_response_tokens: int = 500
     cache_enabled: bool = True
     cache_ttl: int = 3600  # 缓存1小时
+    cache_max_entries: int = 1000  # 最多缓存条目数
+    cache_max_bytes: int = 16 * 1024 * 1024  # 缓存回答总字节上限
+    cache_sweep_interval: int = 60  # 后台过期清扫间隔（秒）
+    cache_persist_path: Optional[str] = None  # SQLite持久化路径，None表示仅内存
     # DeepSeek 特定配置
     deepseek_api_key: Optional[str] = None
     deepseek_base_url: str = "https://api.deepseek.com/v1"
     deepseek_timeout: int = 30
+    # 异步客户端：共享连接池、并发上限、相同提示词单飞合并、带抖动重试
+    llm_async: bool = True
+    llm_max_connections: int = 8
+    llm_max_concurrency: int = 8
+    llm_max_retries: int = 2
+    llm_retry_backoff: float = 0.5
+    stream_chunk_chars: int = 8  # 缓存回答/模拟回答按流式回放时每块字符数
+
+def iter_text_chunks(text: str, chunk_chars: int = 8) -> Iterator[str]:
+    """把完整文本切成小块，按流式接口回放"""
+    for start in range(0, len(text), max(1, chunk_chars)):
+        yield text[start:start + chunk_chars]
 
 class MockLLMClient:
     """模拟LLM客户端，用于测试"""
@@ -49,6 +75,10 @@ class MockLLMClient:
             return "深度学习是机器学习的一个分支，使用多层神经网络来模拟人脑的学习过程。"
         else:
             return "基于检索到的相关文档，我可以为您提供相关信息。请查看下方的具体文档内容以获取详细信息。"
+    
+    def generate_stream(self, prompt: str, temperature: float = 0.7) -> Iterator[str]:
+        """模拟流式生成回答"""
+        yield from iter_text_chunks(self.generate(prompt, temperature))
 
 class DeepSeekLLMClient:
     """DeepSeek LLM客户端"""
@@ -121,6 +151,48 @@ class DeepSeekLLMClient:
         except Exception as e:
             print(f"❌ DeepSeek API调用失败: {e}")
             return f"DeepSeek API调用失败: {str(e)}"
+    
+    def generate_stream(self, prompt: str, temperature: float = 0.7) -> Iterator[str]:
+        """使用DeepSeek流式生成回答，收到一块就产出一块"""
+        if not self.client:
+            raise RuntimeError("DeepSeek客户端未初始化")
+        
+        messages: List[ChatCompletionMessageParam] = [
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.config.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=self.config.max_response_tokens,
+                stream=True
+            )
+            
+            in_reasoning = False
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                
+                # 推理内容（DeepSeek特有属性）先于最终答案到达
+                reasoning_content = getattr(delta, 'reasoning_content', None)
+                if reasoning_content:
+                    if not in_reasoning:
+                        in_reasoning = True
+                        yield "推理过程:\n"
+                    yield reasoning_content
+                
+                if delta.content:
+                    if in_reasoning:
+                        in_reasoning = False
+                        yield "\n\n最终答案:\n"
+                    yield delta.content
+                    
+        except Exception as e:
+            print(f"❌ DeepSeek API流式调用失败: {e}")
+            yield f"DeepSeek API调用失败: {str(e)}"
 
 class RAGService:
     """RAG服务：负责检索增强生成"""
@@ -128,11 +200,27 @@ class RAGService:
     def __init__(self, config: Optional[RAGConfig] = None, index_service=None):
         self.config = config if config is not None else RAGConfig()
         self.index_service = index_service
-        self.cache = {} if self.config.cache_enabled else None
-        self.cache_timestamps = {} if self.config.cache_enabled else None
+        self.cache = self._init_cache() if self.config.cache_enabled else None
+        self.context_packer = ContextPacker(
+            TokenEstimator(self.config.tokenizer_name),
+            passage_chars=self.config.context_passage_chars
+        )
         
         # 初始化LLM客户端
         self.llm_client = self._init_llm_client()
+        REGISTRY.register_collector("rag_service", self._collect_metrics)
+        register_memory_source("rag_service", self._memory_usage)
+    
+    def _init_cache(self) -> LRUTTLCache:
+        """初始化有界回答缓存"""
+        cache = LRUTTLCache(
+            max_entries=self.config.cache_max_entries,
+            max_bytes=self.config.cache_max_bytes,
+            ttl=self.config.cache_ttl,
+            persist_path=self.config.cache_persist_path
+        )
+        cache.start_sweeper(self.config.cache_sweep_interval)
+        return cache
     
     def _init_llm_client(self):
         """初始化LLM客户端"""
@@ -140,6 +228,8 @@ class RAGService:
             return MockLLMClient(self.config.model_name)
         elif self.config.llm_provider == "deepseek":
             try:
+                if self.config.llm_async:
+                    return self._init_async_client()
                 return DeepSeekLLMClient(self.config)
             except Exception as e:
                 print(f"⚠️ DeepSeek客户端初始化失败: {e}，使用模拟客户端")
@@ -155,6 +245,66 @@ class RAGService:
             print(f"⚠️ 不支持的LLM提供商: {self.config.llm_provider}，使用模拟客户端")
             return MockLLMClient("mock-model")
     
+    def _init_async_client(self) -> AsyncLLMClient:
+        """初始化DeepSeek异步客户端"""
+        api_key = self.config.deepseek_api_key or os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            raise ValueError("DeepSeek API密钥未配置，请设置DEEPSEEK_API_KEY环境变量或在配置中指定")
+        
+        client = AsyncLLMClient(
+            base_url=self.config.deepseek_base_url,
+            api_key=api_key,
+            model_name=self.config.model_name,
+            max_tokens=self.config.max_response_tokens,
+            timeout=self.config.deepseek_timeout,
+            max_connections=self.config.llm_max_connections,
+            max_concurrency=self.config.llm_max_concurrency,
+            max_retries=self.config.llm_max_retries,
+            retry_backoff=self.config.llm_retry_backoff
+        )
+        print("✅ DeepSeek异步客户端初始化成功")
+        return client
+    
+    async def aenhance_search_results(self, query: str, search_results: List[Tuple],
+                                      top_k: Optional[int] = None) -> str:
+        """异步生成RAG回答
+        
+        LLM客户端支持异步接口时直接await，否则在线程池中执行同步调用。
+        """
+        if not self.config.enabled:
+            return "RAG功能已禁用"
+        
+        if not search_results:
+            return "未找到相关文档，无法生成回答。"
+        
+        top_k = top_k if top_k is not None else self.config.top_k_docs
+        
+        try:
+            if self.config.cache_enabled:
+                cached_answer = self._get_cached_answer(query, search_results[:top_k])
+                if cached_answer:
+                    return cached_answer
+            
+            context = self.build_context(search_results[:top_k], query=query)
+            prompt = self.build_prompt(query, context)
+            
+            if hasattr(self.llm_client, 'agenerate'):
+                answer = await self.llm_client.agenerate(prompt, self.config.temperature)
+            else:
+                answer = await asyncio.to_thread(self.llm_client.generate, prompt, self.config.temperature)
+            answer = answer.strip()
+            
+            if self.config.cache_enabled:
+                self._cache_answer(query, search_results[:top_k], answer)
+            
+            return answer
+            
+        except Exception as e:
+            print(f"❌ RAG处理失败: {e}")
+            record_error("rag.enhance_search_results")
+            return f"RAG功能暂时不可用，请查看下方检索结果。错误信息: {str(e)}"
+    
+    @instrument("rag.enhance_search_results")
     def enhance_search_results(self, query: str, search_results: List[Tuple], top_k: Optional[int] = None) -> str:
         """基于搜索结果生成RAG回答"""
         if not self.config.enabled:
@@ -174,7 +324,7 @@ class RAGService:
                     return cached_answer
             
             # 构建上下文
-            context = self.build_context(search_results[:top_k])
+            context = self.build_context(search_results[:top_k], query=query)
             
             # 生成回答
             answer = self.generate_answer(query, context)
@@ -187,47 +337,88 @@ class RAGService:
             
         except Exception as e:
             print(f"❌ RAG处理失败: {e}")
+            record_error("rag.enhance_search_results")
             return f"RAG功能暂时不可用，请查看下方检索结果。错误信息: {str(e)}"
     
-    def build_context(self, search_results: List[Tuple], max_tokens: Optional[int] = None) -> str:
-        """构建上下文信息"""
-        max_tokens = max_tokens if max_tokens is not None else self.config.max_context_tokens
-        context_parts = []
-        current_tokens = 0
+    def enhance_search_results_stream(self, query: str, search_results: List[Tuple],
+                                      top_k: Optional[int] = None) -> Iterator[str]:
+        """流式生成RAG回答，逐块产出文本
         
-        for i, result in enumerate(search_results):
-            if len(result) >= 3:
-                doc_id, score, summary = result[0], result[1], result[2]
-            else:
-                continue
+        命中缓存时按块回放缓存的回答；生成完成后把完整回答写入缓存。
+        从第一次取值到生成结束的耗时计入 rag.enhance_search_results，首块耗时计入 rag.first_token。
+        生成器跨多次取值执行，不用 instrument/track（上下文变量不能跨 yield 保持）。
+        """
+        start = time.perf_counter()
+        first_token = True
+        try:
+            for piece in self._stream_answer(query, search_results, top_k):
+                if first_token:
+                    get_histogram("rag.first_token").record(time.perf_counter() - start)
+                    first_token = False
+                yield piece
+        finally:
+            get_histogram("rag.enhance_search_results").record(time.perf_counter() - start)
+    
+    def _stream_answer(self, query: str, search_results: List[Tuple],
+                       top_k: Optional[int] = None) -> Iterator[str]:
+        """流式生成RAG回答（不计时）"""
+        if not self.config.enabled:
+            yield "RAG功能已禁用"
+            return
+        
+        if not search_results:
+            yield "未找到相关文档，无法生成回答。"
+            return
+        
+        top_k = top_k if top_k is not None else self.config.top_k_docs
+        
+        try:
+            if self.config.cache_enabled:
+                cached_answer = self._get_cached_answer(query, search_results[:top_k])
+                if cached_answer:
+                    yield from iter_text_chunks(cached_answer, self.config.stream_chunk_chars)
+                    return
             
-            # 获取完整文档内容
-            if self.index_service:
-                full_content = self.index_service.get_document(doc_id)
-                if not full_content:
-                    full_content = summary  # 降级使用摘要
-            else:
-                full_content = summary
+            context = self.build_context(search_results[:top_k], query=query)
+            prompt = self.build_prompt(query, context)
             
-            # 计算token数量（简化估算：1个token约等于4个字符）
-            estimated_tokens = len(full_content) // 4
+            parts = []
+            for piece in self.llm_client.generate_stream(prompt, self.config.temperature):
+                parts.append(piece)
+                yield piece
             
-            if current_tokens + estimated_tokens <= max_tokens:
-                context_parts.append(f"文档{i+1} (ID: {doc_id}, 相关度: {score:.4f}):\n{full_content}\n")
-                current_tokens += estimated_tokens
-            else:
-                # 如果超出token限制，截取部分内容
-                remaining_tokens = max_tokens - current_tokens
-                if remaining_tokens > 100:  # 至少保留100个token
-                    truncated_content = full_content[:remaining_tokens * 4] + "..."
-                    context_parts.append(f"文档{i+1} (ID: {doc_id}, 相关度: {score:.4f}):\n{truncated_content}\n")
-                break
+            answer = "".join(parts).strip()
+            if self.config.cache_enabled and answer:
+                self._cache_answer(query, search_results[:top_k], answer)
+                
+        except Exception as e:
+            print(f"❌ RAG流式处理失败: {e}")
+            record_error("rag.enhance_search_results")
+            yield f"RAG功能暂时不可用，请查看下方检索结果。错误信息: {str(e)}"
+    
+    def build_context(self, search_results: List[Tuple], max_tokens: Optional[int] = None, query: str = "") -> str:
+        """构建上下文信息
         
-        return "\n".join(context_parts)
+        优先使用段落索引检索到的段落；否则批量获取候选文档全文并切分段落。
+        段落按与查询的相关度在token预算内做背包选择，只把最相关的段落放入提示词。
+        """
+        max_tokens = max_tokens if max_tokens is not None else self.config.max_context_tokens
+        
+        # 优先从段落索引直接检索段落，无结果时回退为按检索文档切分
+        if query and self.config.passage_retrieval and hasattr(self.index_service, 'search_passages'):
+            passages = [
+                (doc_id, score, text, int(chunk_id.rsplit('#', 1)[1]))
+                for chunk_id, doc_id, score, text in self.index_service.search_passages(query, self.config.passage_top_k)
+            ]
+            if passages:
+                return self.context_packer.pack_passages(query, passages, max_tokens)
+        
+        fetch_documents = self.index_service.get_documents if self.index_service else None
+        return self.context_packer.pack(query, search_results, fetch_documents, max_tokens)
     
-    def generate_answer(self, query: str, context: str) -> str:
-        """生成回答"""
-        prompt = f"""
+    def build_prompt(self, query: str, context: str) -> str:
+        """构建生成提示词"""
+        return f"""
 基于以下检索到的文档内容，回答用户的问题。
 
 用户问题: {query}
@@ -243,6 +434,10 @@ class RAGService:
 
 回答:
 """
+    
+    def generate_answer(self, query: str, context: str) -> str:
+        """生成回答"""
+        prompt = self.build_prompt(query, context)
         
         try:
             # 调用LLM生成回答
@@ -264,38 +459,52 @@ class RAGService:
         if not self.config.cache_enabled or self.cache is None:
             return None
         
+        # 过期条目由缓存在读取时删除，并由后台线程定期清扫
         cache_key = self._get_cache_key(query, search_results)
-        cached_data = self.cache.get(cache_key)
-        
-        if cached_data and self.cache_timestamps is not None:
-            # 检查缓存是否过期
-            timestamp = self.cache_timestamps.get(cache_key, 0)
-            if time.time() - timestamp < self.config.cache_ttl:
-                return cached_data
-            else:
-                # 删除过期缓存
-                if self.cache is not None:
-                    del self.cache[cache_key]
-                if self.cache_timestamps is not None:
-                    del self.cache_timestamps[cache_key]
-        
-        return None
+        return self.cache.get(cache_key)
     
     def _cache_answer(self, query: str, search_results: List[Tuple], answer: str):
         """缓存回答"""
-        if not self.config.cache_enabled or self.cache is None or self.cache_timestamps is None:
+        if not self.config.cache_enabled or self.cache is None:
             return
         
         cache_key = self._get_cache_key(query, search_results)
-        self.cache[cache_key] = answer
-        self.cache_timestamps[cache_key] = time.time()
+        self.cache.set(cache_key, answer)
     
     def clear_cache(self):
         """清空缓存"""
-        if self.cache:
+        if self.cache is not None:
             self.cache.clear()
-        if self.cache_timestamps:
-            self.cache_timestamps.clear()
+    
+    def _memory_usage(self) -> Dict[str, int]:
+        """内存统计回调"""
+        return {'rag.cache': self.cache.get_memory_usage() if self.cache is not None else 0}
+    
+    def _collect_metrics(self) -> List:
+        """指标采集回调"""
+        families = [gauge_family('search_rag_enabled', 'RAG是否启用', int(self.config.enabled))]
+        if self.cache is not None:
+            cache = self.cache.get_stats()
+            families.extend([
+                counter_family('search_rag_cache_requests', 'RAG回答缓存查找次数', [
+                    ({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])
+                ]),
+                counter_family('search_rag_cache_evictions', 'RAG回答缓存淘汰数（LRU与过期）',
+                               cache['evictions'] + cache['expirations']),
+                gauge_family('search_rag_cache_hit_ratio', 'RAG回答缓存命中率', cache['hit_ratio']),
+                gauge_family('search_rag_cache_entries', 'RAG回答缓存条目数', cache['size']),
+                gauge_family('search_rag_cache_bytes', 'RAG回答缓存字节数', cache['bytes'])
+            ])
+        if hasattr(self.llm_client, 'get_stats'):
+            llm = self.llm_client.get_stats()
+            families.extend([
+                gauge_family('search_llm_in_flight', '进行中的LLM请求数（并发队列深度）', llm['in_flight']),
+                gauge_family('search_llm_peak_in_flight', 'LLM并发请求峰值', llm['peak_in_flight']),
+                counter_family('search_llm_requests', 'LLM调用次数', [
+                    ({'kind': kind}, llm[kind]) for kind in ('requests', 'http_requests', 'coalesced', 'retries', 'failures')
+                ])
+            ])
+        return families
     
     def get_stats(self) -> Dict[str, Any]:
         """获取RAG服务统计信息"""
@@ -304,7 +513,9 @@ class RAGService:
             'llm_provider': self.config.llm_provider,
             'model_name': self.config.model_name,
             'cache_enabled': self.config.cache_enabled,
-            'cache_size': len(self.cache) if self.cache else 0,
+            'cache_size': len(self.cache) if self.cache is not None else 0,
+            'cache': self.cache.get_stats() if self.cache is not None else None,
+            'llm_client': self.llm_client.get_stats() if hasattr(self.llm_client, 'get_stats') else None,
             'config': {
                 'max_context_tokens': self.config.max_context_tokens,
                 'top_k_docs': self.config.top_k_docs,
@@ -11,8 +11,10 @@ from ..data_utils import (
     validate_click_params
 )
 from ..rag_service import get_rag_service
+from .. import tracing
 import re
-from typing import TYPE_CHECKING
+import html
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
 if TYPE_CHECKING:
     from search_engine.index_service import IndexService
     from search_engine.data_service import DataService
@@ -20,16 +22,37 @@ if TYPE_CHECKING:
 # 全局变量用于存储当前request_id
 current_request_id = None
 
-def perform_search(index_service: 'IndexService', data_service: 'DataService', query: str, sort_mode: str = "ctr"):
-    """执行搜索，支持RAG功能"""
+# 生成RAG回答的排序模式
+RAG_SORT_MODE = "tfidf"
+
+def perform_search(index_service: 'IndexService', data_service: 'DataService', query: str, sort_mode: str = "ctr",
+                   with_rag: bool = True, defer_trace: bool = False):
+    """执行搜索，支持RAG功能
+    
+    with_rag=False 时不在搜索路径中同步生成RAG回答，由调用方另行流式生成。
+    request_id 在入口生成，同时作为本次请求的追踪ID；defer_trace=True 时返回后trace暂不完成，
+    由 stream_rag_answer 把流式RAG阶段追加到同一个trace中（或 tracing.finish_deferred 直接完成）。
+    """
     if not query or not query.strip():
         return [], pd.DataFrame(), "", ""
+    request_id = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}"
+    with tracing.trace(request_id, "perform_search", defer_finish=defer_trace,
+                       query=query.strip(), sort_mode=sort_mode):
+        return _perform_search(index_service, data_service, query.strip(), sort_mode, with_rag, request_id)
+
+def _perform_search(index_service: 'IndexService', data_service: 'DataService', query_clean: str,
+                    sort_mode: str, with_rag: bool, request_id: str):
+    """执行搜索（在追踪上下文中）"""
     try:
-        query_clean = query.strip()
-        doc_ids = index_service.retrieve(query_clean, top_k=20)
-        
-        # 调用rank方法时传递sort_mode参数
-        ranked = index_service.rank(query_clean, doc_ids, top_k=10, sort_mode=sort_mode)
+        if sort_mode == "hybrid":
+            # 混合检索：词法与向量检索结果RRF融合
+            with tracing.span("hybrid_search"):
+                ranked = index_service.hybrid_search(query_clean, top_k=10)
+        else:
+            doc_ids = index_service.retrieve(query_clean, top_k=20)
+            
+            # 调用rank方法时传递sort_mode参数
+            ranked = index_service.rank(query_clean, doc_ids, top_k=10, sort_mode=sort_mode)
         
         # 现在ranked已经是正确排序的结果，不需要再次排序
         final = ranked
@@ -37,37 +60,40 @@ def perform_search(index_service: 'IndexService', data_service: 'DataService', q
         if not final:
             return [], pd.DataFrame(), "", ""
         
-        request_id = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}"
-        docs_info = []
-        for position, result in enumerate(final, 1):
-            doc_id, tfidf_score, summary = parse_result_tuple(result)
-            
-            # 使用新的工具函数并添加参数验证
-            validation_errors = validate_search_params(query_clean, doc_id, position, tfidf_score)
-            if validation_errors:
-                print(f"⚠️ 搜索参数验证失败: {validation_errors}")
-                continue
-            
-            # 记录展示事件
-            record_search_impression(query_clean, doc_id, position, tfidf_score, summary, request_id)
-            
-            # 添加CTR分数到文档信息中（如果有的话）
-            doc_info = {
-                'doc_id': doc_id,
-                'tfidf_score': tfidf_score,
-                'summary': summary,
-                'position': position
-            }
-            
-            # 如果结果包含CTR分数（4元组），则添加到信息中
-            if len(result) == 4:
-                doc_info['ctr_score'] = result[2]
-            
-            docs_info.append(doc_info)
+        # 有结果的查询计入查询补全热度
+        index_service.record_query(query_clean)
+        
+        with tracing.span("impression_logging", results=len(final)):
+            docs_info = []
+            for position, result in enumerate(final, 1):
+                doc_id, tfidf_score, summary = parse_result_tuple(result)
+                
+                # 使用新的工具函数并添加参数验证
+                validation_errors = validate_search_params(query_clean, doc_id, position, tfidf_score)
+                if validation_errors:
+                    print(f"⚠️ 搜索参数验证失败: {validation_errors}")
+                    continue
+                
+                # 记录展示事件
+                record_search_impression(query_clean, doc_id, position, tfidf_score, summary, request_id)
+                
+                # 添加CTR分数到文档信息中（如果有的话）
+                doc_info = {
+                    'doc_id': doc_id,
+                    'tfidf_score': tfidf_score,
+                    'summary': summary,
+                    'position': position
+                }
+                
+                # 如果结果包含CTR分数（4元组），则添加到信息中
+                if len(result) == 4:
+                    doc_info['ctr_score'] = result[2]
+                
+                docs_info.append(doc_info)
         
         # RAG处理：只在TF-IDF模式下启用
         rag_answer = ""
-        if sort_mode == "tfidf_":
+        if with_rag and sort_mode == RAG_SORT_MODE:
             try:
                 rag_service = get_rag_service(index_service)
                 rag_answer = rag_service.enhance_search_results(query_clean, final, top_k=3)
@@ -77,9 +103,12 @@ def perform_search(index_service: 'IndexService', data_service: 'DataService', q
                 rag_answer = f"RAG功能暂时不可用: {str(e)}"
         
         # 获取CTR数据框
-        return docs_info, get_ctr_dataframe(request_id), request_id, rag_answer
+        with tracing.span("ctr_dataframe"):
+            ctr_df = get_ctr_dataframe(request_id)
+        return docs_info, ctr_df, request_id, rag_answer
     except Exception as e:
         print(f"❌ 搜索失败: {e}")
+        tracing.mark_error()
         return [], pd.DataFrame(), "", ""
 
 def apply_sorting_mode(results: list, sort_mode: str) -> list:
@@ -177,18 +206,67 @@ def show_fulltext(search_engine, doc_id):
 def strip_html_tags(text):
     return re.sub(r'<[^>]+>', '', text)
 
+def render_rag_answer(answer: str, streaming: bool = False) -> str:
+    """渲染RAG回答卡片，流式生成中显示光标"""
+    cursor = "▌" if streaming else ""
+    return f"""
+                <div style="background-color: #e3f2fd; padding: 15px; border-radius: 8px; border-left: 4px solid #2196f3; margin: 10px 0;">
+                    <h4 style="margin: 0 0 10px 0; color: #1976d2;">🤖 智能回答</h4>
+                    <p style="margin: 0; line-height: 1.6; color: #333; white-space: pre-wrap;">{html.escape(answer)}{cursor}</p>
+                </div>
+                """
+
+def stream_rag_answer(index_service: 'IndexService', query: str, docs_info: List[Dict[str, Any]],
+                      request_id: str) -> Iterator[str]:
+    """流式生成RAG回答，逐次产出累积的回答文本
+    
+    生成过程记录为同一request_id追踪中的 rag.stream 阶段，结束时完成该trace。
+    """
+    with tracing.resumed_span(request_id, "rag.stream", docs=len(docs_info)) as rag_span:
+        rag_answer = ""
+        try:
+            rag_service = get_rag_service(index_service)
+            results = [(d['doc_id'], d['tfidf_score'], d['summary']) for d in docs_info]
+            for piece in rag_service.enhance_search_results_stream(query, results, top_k=3):
+                rag_answer += piece
+                yield rag_answer
+            print(f"🤖 RAG回答生成成功，长度: {len(rag_answer)}")
+        except Exception as e:
+            print(f"❌ RAG处理失败: {e}")
+            rag_span.mark_error()
+            yield f"RAG功能暂时不可用: {str(e)}"
+        rag_span.set_attribute('answer_chars', len(rag_answer))
+
+def update_suggestions(index_service: 'IndexService', prefix: str, top_k: int = 8):
+    """根据输入前缀更新查询补全候选"""
+    suggestions = index_service.suggest(prefix, top_k) if prefix and prefix.strip() else []
+    choices = [text for text, _, _ in suggestions]
+    return gr.update(choices=choices, value=None, visible=bool(choices))
+
 def build_search_tab(index_service, data_service):
+    # 用CTR日志中的历史查询初始化查询补全，之后每次搜索增量更新
+    try:
+        index_service.load_query_log(data_service.get_query_counts())
+    except Exception as e:
+        print(f"⚠️ 加载查询补全日志失败: {e}")
+    
     with gr.Blocks() as search_tab:
         gr.Markdown("""### 🔍 第二部分：在线召回排序""")
+        # 只有启用向量检索时才提供混合检索
+        if index_service.vector_index is not None:
+            sort_choices, sort_info = ["tfidf", "ctr", "hybrid"], "选择排序算法进行对比实验：TF-IDF/CTR/混合检索（词法+向量RRF融合）"
+        else:
+            sort_choices, sort_info = ["tfidf", "ctr"], "选择排序算法进行对比实验：TF-IDF/CTR（启用向量检索后可选混合检索）"
         sort_mode = gr.Dropdown(
-            choices=["tfidf", "ctr"],
+            choices=sort_choices,
             value="ctr",
             label="排序算法",
-            info="选择排序算法进行对比实验：TF-IDF/CTR"
+            info=sort_info
         )
         with gr.Row():
             with gr.Column(scale=3):
                 query_input = gr.Textbox(label="实验查询", placeholder="输入测试查询进行检索实验...", lines=1)
+                query_suggestions = gr.Radio(choices=[], label="💡 查询补全", visible=False)
                 with gr.Row():
                     search_btn = gr.Button("🔬 执行检索", variant="primary")
                     search_stats_btn = gr.Button("📊 搜索统计")
@@ -218,9 +296,14 @@ def build_search_tab(index_service, data_service):
         request_id_state = gr.State("")
         with gr.Accordion("🧪 测试用例", open=False):
             gr.Markdown("""推荐测试查询：人工智能、机器学习、深度学习等""")
-        # 检索按钮事件
+        # 检索按钮事件：先立即返回检索结果，再流式输出RAG回答
         def update_results_with_rag(query, sort_mode):
-            docs_info, df, request_id, rag_answer = perform_search(index_service, data_service, query, sort_mode)
+            if sort_mode == "hybrid" and index_service.vector_index is None:
+                gr.Warning("向量检索未启用，混合检索已回退为TF-IDF排序")
+                sort_mode = "tfidf"
+            stream_rag = sort_mode == RAG_SORT_MODE
+            docs_info, df, request_id, _ = perform_search(index_service, data_service, query, sort_mode,
+                                                          with_rag=False, defer_trace=stream_rag)
             
             # 转换为 DataFrame 展示格式，根据排序模式显示不同的列
             formatted_results = []
@@ -249,6 +332,9 @@ def build_search_tab(index_service, data_service):
                 # 创建CTR模式的DataFrame
                 df_display = pd.DataFrame(formatted_results, columns=("文档ID", "TF-IDF分数", "CTR分数", "摘要"))
                 mode_text = "CTR智能排序"
+            elif sort_mode == "hybrid":
+                df_display = pd.DataFrame(formatted_results, columns=("文档ID", "RRF融合分数", "文档长度", "摘要"))
+                mode_text = "混合检索排序"
             else:
                 # 创建TF-IDF模式的DataFrame
                 df_display = pd.DataFrame(formatted_results, columns=("文档ID", "TF-IDF分数", "文档长度", "摘要"))
@@ -258,17 +344,19 @@ def build_search_tab(index_service, data_service):
             print(f"🔍 当前排序模式: {mode_text}")
             
             # 根据排序模式决定是否显示RAG回答
-            # TODO deepseek的接入，暂时不需要
-            if sort_mode == "tfidf——" and rag_answer:
-                rag_html = f"""
-                <div style="background-color: #e3f2fd; padding: 15px; border-radius: 8px; border-left: 4px solid #2196f3; margin: 10px 0;">
-                    <h4 style="margin: 0 0 10px 0; color: #1976d2;">🤖 智能回答</h4>
-                    <p style="margin: 0; line-height: 1.6; color: #333;">{rag_answer}</p>
-                </div>
-                """
-                return df_display, df, request_id, rag_html, gr.update(visible=True)
-            else:
-                return df_display, df, request_id, "", gr.update(visible=False)
+            if not stream_rag or not docs_info:
+                tracing.finish_deferred(request_id)
+                yield df_display, df, request_id, "", gr.update(visible=False)
+                return
+            
+            # 检索结果先渲染，首个token到达前显示占位
+            yield df_display, df, request_id, render_rag_answer("", streaming=True), gr.update(visible=True)
+            
+            rag_answer = ""
+            for rag_answer in stream_rag_answer(index_service, query.strip(), docs_info, request_id):
+                yield df_display, df, request_id, render_rag_answer(rag_answer, streaming=True), gr.update(visible=True)
+            
+            yield df_display, df, request_id, render_rag_answer(rag_answer), gr.update(visible=True)
         
         search_btn.click(
             fn=update_results_with_rag,
@@ -294,6 +382,22 @@ def build_search_tab(index_service, data_service):
             inputs=request_id_state,
             outputs=sample_output
         )
+        query_input.input(
+            fn=lambda prefix: update_suggestions(index_service, prefix),
+            inputs=query_input,
+            outputs=query_suggestions,
+            show_progress="hidden"
+        )
+        # 选中补全后填入查询框并直接检索
+        query_suggestions.input(
+            fn=lambda choice: choice,
+            inputs=query_suggestions,
+            outputs=query_input
+        ).then(
+            fn=update_results_with_rag,
+            inputs=[query_input, sort_mode],
+            outputs=[results_df, sample_output, request_id_state, rag_answer, rag_answer]
+        )
         # 绑定 DataFrame 行点击事件
         def on_row_select(evt: gr.SelectData, df, request_id):
             if evt is None or evt.index is None:
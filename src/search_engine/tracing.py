@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求追踪模块 - 按request_id记录搜索请求各阶段的span树
+
+用法：
+    with trace(request_id, "perform_search", query=query):
+        with span("impression_logging"):
+            ...
+
+- span用上下文管理器包裹，单调时钟计时，父子关系通过contextvars在调用链中传递
+  （协程自动继承；提交到线程池时需用 contextvars.copy_context().run 传递）；
+  当前没有活动trace时span为空操作
+- metrics.instrument 埋点的阶段自动成为span
+- 完成的trace按采样率写入环形缓冲区；耗时超过阈值的慢请求不受采样影响，单独保留
+- 请求在离开trace作用域后仍有后续阶段（如流式RAG回答）时，用 trace(..., defer_finish=True)
+  暂不完成，再用 resumed_span(request_id, ...) 追加span并完成trace；resumed_span不依赖上下文变量，
+  可以跨生成器的 yield 使用
+
+配置（环境变量或 configure()）：
+    SEARCH_TRACE_SAMPLE_RATE   采样率，默认1.0
+    SEARCH_TRACE_SLOW_MS       慢请求阈值（毫秒），默认500
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+MAX_SPANS_PER_TRACE = 500
+MAX_DEFERRED_TRACES = 100
+
+_config = {
+    'sample_rate': float(os.getenv("SEARCH_TRACE_SAMPLE_RATE", "1.0")),
+    'slow_threshold_ms': float(os.getenv("SEARCH_TRACE_SLOW_MS", "500")),
+}
+_recent: deque = deque(maxlen=200)
+_slow: deque = deque(maxlen=50)
+_deferred: 'OrderedDict[str, Trace]' = OrderedDict()  # 等待 resumed_span 完成的trace
+_buffer_lock = threading.Lock()
+
+# (当前trace, 当前span下标)，-1 表示根
+_current: ContextVar = ContextVar('search_trace_current', default=None)
+
+
+class Trace:
+    """一次请求的追踪记录"""
+
+    __slots__ = ('request_id', 'name', 'attributes', 'started_at', 'start', 'duration_ms',
+                 'spans', 'dropped_spans', 'error')
+
+    def __init__(self, request_id: str, name: str, attributes: Dict[str, Any]):
+        self.request_id = request_id
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        self.error = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'attributes': dict(self.attributes),
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'error': self.error,
+            'dropped_spans': self.dropped_spans,
+            'spans': [dict(s) for s in self.spans]
+        }
+
+
+class span:
+    """span上下文管理器，没有活动trace时不做任何记录"""
+
+    __slots__ = ('name', 'attributes', 'context', 'token', 'record', 'start')
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.context = None
+        self.record = None
+
+    def __enter__(self):
+        self.context = _current.get()
+        if self.context is None:
+            return self
+        current_trace, parent = self.context
+        if len(current_trace.spans) >= MAX_SPANS_PER_TRACE:
+            current_trace.dropped_spans += 1
+            self.context = None
+            return self
+        self.start = time.perf_counter()
+        self.record = {
+            'name': self.name,
+            'parent': parent,
+            'depth': current_trace.spans[parent]['depth'] + 1 if parent >= 0 else 0,
+            'start_ms': (self.start - current_trace.start) * 1000,
+            'duration_ms': 0.0,
+            'error': False,
+            'attributes': self.attributes
+        }
+        current_trace.spans.append(self.record)
+        self.token = _current.set((current_trace, len(current_trace.spans) - 1))
+        return self
+
+    def set_attribute(self, key: str, value: Any):
+        if self.record is not None:
+            self.record['attributes'][key] = value
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.context is None:
+            return False
+        self.record['duration_ms'] = (time.perf_counter() - self.start) * 1000
+        self.record['error'] = exc_type is not None
+        _current.reset(self.token)
+        return False
+
+
+class trace:
+    """根span：开始一次请求的追踪，结束时按采样率和慢请求阈值写入缓冲区
+
+    defer_finish=True 时退出作用域不完成trace，等待 resumed_span 追加后续阶段
+    """
+
+    def __init__(self, request_id: str, name: str = "request", defer_finish: bool = False, **attributes):
+        self.trace = Trace(request_id, name, attributes)
+        self.defer_finish = defer_finish
+        self.token = None
+
+    def __enter__(self) -> Trace:
+        self.trace.start = time.perf_counter()
+        self.token = _current.set((self.trace, -1))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.duration_ms = (time.perf_counter() - self.trace.start) * 1000
+        self.trace.error = self.trace.error or exc_type is not None
+        _current.reset(self.token)
+        if self.defer_finish:
+            _defer(self.trace)
+        else:
+            _finish(self.trace)
+        return False
+
+
+class resumed_span:
+    """在 defer_finish 的trace上追加一个根级span，结束时完成整个trace
+
+    不依赖上下文变量，可以在生成器中跨 yield 使用；没有对应的待完成trace时为空操作
+    """
+
+    def __init__(self, request_id: str, name: str, **attributes):
+        with _buffer_lock:
+            self.trace = _deferred.pop(request_id, None)
+        self.record = None
+        if self.trace is None:
+            return
+        if len(self.trace.spans) >= MAX_SPANS_PER_TRACE:
+            self.trace.dropped_spans += 1
+            return
+        self.record = {
+            'name': name,
+            'parent': -1,
+            'depth': 0,
+            'start_ms': (time.perf_counter() - self.trace.start) * 1000,
+            'duration_ms': 0.0,
+            'error': False,
+            'attributes': attributes
+        }
+        self.trace.spans.append(self.record)
+
+    def set_attribute(self, key: str, value: Any):
+        if self.record is not None:
+            self.record['attributes'][key] = value
+
+    def mark_error(self):
+        """把span和trace标记为失败（用于内部处理掉的异常）"""
+        if self.record is not None:
+            self.record['error'] = True
+        if self.trace is not None:
+            self.trace.error = True
+
+    def finish(self):
+        """结束span并完成trace（重复调用无效）"""
+        if self.trace is None:
+            return
+        now = time.perf_counter()
+        if self.record is not None:
+            self.record['duration_ms'] = (now - self.trace.start) * 1000 - self.record['start_ms']
+        self.trace.duration_ms = (now - self.trace.start) * 1000
+        _finish(self.trace)
+        self.trace = None
+
+    def __enter__(self) -> 'resumed_span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 生成器被提前关闭（GeneratorExit）不算失败
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.mark_error()
+        self.finish()
+        return False
+
+
+def finish_deferred(request_id: str):
+    """完成一个不再追加span的待完成trace（耗时截止到离开trace作用域），没有时为空操作"""
+    with _buffer_lock:
+        deferred = _deferred.pop(request_id, None)
+    if deferred is not None:
+        _finish(deferred)
+
+
+def _defer(deferred: Trace):
+    """登记待完成的trace，超出上限时直接完成最早的一个"""
+    with _buffer_lock:
+        _deferred[deferred.request_id] = deferred
+        evicted = _deferred.popitem(last=False)[1] if len(_deferred) > MAX_DEFERRED_TRACES else None
+    if evicted is not None:
+        _finish(evicted)
+
+
+def _finish(finished: Trace):
+    sampled = random.random() < _config['sample_rate']
+    slow = finished.duration_ms >= _config['slow_threshold_ms']
+    if not (sampled or slow):
+        return
+    with _buffer_lock:
+        if sampled:
+            _recent.append(finished)
+        if slow:
+            _slow.append(finished)
+
+
+def mark_error():
+    """把当前trace标记为失败（用于被调用方内部处理掉的异常）"""
+    context = _current.get()
+    if context is not None:
+        context[0].error = True
+
+
+def current_request_id() -> Optional[str]:
+    """当前活动trace的request_id"""
+    context = _current.get()
+    return context[0].request_id if context else None
+
+
+def configure(sample_rate: Optional[float] = None, slow_threshold_ms: Optional[float] = None,
+              capacity: Optional[int] = None, slow_capacity: Optional[int] = None):
+    """调整采样率、慢请求阈值和缓冲区容量"""
+    global _recent, _slow
+    if sample_rate is not None:
+        _config['sample_rate'] = max(0.0, min(1.0, sample_rate))
+    if slow_threshold_ms is not None:
+        _config['slow_threshold_ms'] = slow_threshold_ms
+    with _buffer_lock:
+        if capacity is not None:
+            _recent = deque(_recent, maxlen=capacity)
+        if slow_capacity is not None:
+            _slow = deque(_slow, maxlen=slow_capacity)
+
+
+def get_config() -> Dict[str, Any]:
+    with _buffer_lock:
+        return dict(_config, capacity=_recent.maxlen, slow_capacity=_slow.maxlen)
+
+
+def get_recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """最近采样的trace（新的在前）"""
+    with _buffer_lock:
+        traces = list(_recent)[-limit:]
+    return [t.to_dict() for t in reversed(traces)]
+
+
+def get_slow_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """最近的慢请求trace（新的在前）"""
+    with _buffer_lock:
+        traces = list(_slow)[-limit:]
+    return [t.to_dict() for t in reversed(traces)]
+
+
+def get_trace(request_id: str) -> Optional[Dict[str, Any]]:
+    """按request_id查找trace"""
+    with _buffer_lock:
+        for candidate in reversed(list(_recent) + list(_slow)):
+            if candidate.request_id == request_id:
+                return candidate.to_dict()
+    return None
+
+
+def clear():
+    """清空缓冲区"""
+    with _buffer_lock:
+        _recent.clear()
+        _slow.clear()
+        _deferred.clear()
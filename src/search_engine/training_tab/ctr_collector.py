@@ -15,6 +15,7 @@ from ..search_tab.search_interface import CTRInterface
 from typing import List, Dict, Any
 from datetime import datetime
 from .ctr_config import CTRSampleConfig, ctr_sample_config
+from ..click_model import get_position_decay
 
 class CTRCollector(CTRInterface):
     """CTR收集器实现类"""
@@ -75,7 +76,7 @@ class CTRCollector(CTRInterface):
             'doc_length': len(summary),
             'query_length': len(query),
             'summary_length': len(summary),
-            'position_decay': 1.0 / (position + 1)
+            'position_decay': get_position_decay(position)
         })
         
         # 验证样本完整性
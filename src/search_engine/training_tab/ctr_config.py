@@ -142,6 +142,15 @@ class CTRTrainingConfig:
     TEST_SIZE = 0.2   # 测试集比例
     RANDOM_STATE = 42 # 随机种子
     
+    # 增量训练参数
+    INCREMENTAL_MIN_SAMPLES = 5  # 增量训练最少新样本数
+    INCREMENTAL_EPOCHS = 5       # 增量训练轮数
+    INCREMENTAL_VALIDATION_SPLIT = 0.2  # 增量训练留出评估的新样本比例（按请求ID哈希划分）
+    
+    # 流式训练参数
+    STREAMING_CHUNK_SIZE = 10000       # 每块读取的样本数
+    STREAMING_VALIDATION_SPLIT = 0.3   # 验证集比例（按请求ID哈希划分）
+    
     # 模型参数
     MODEL_PARAMS = {
         'C': 1.0,           # 正则化强度
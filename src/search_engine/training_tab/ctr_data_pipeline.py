@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR流式训练数据管道 - 大规模点击日志的内存有界训练输入
+
+流程：
+1. 分块流式读取磁盘上的CTR样本（JSON数组或JSON Lines）
+2. 逐块提取特征，跨块维护查询/文档历史点击统计
+3. 第一遍：用 StandardScaler.partial_fit 流式统计均值方差，特征写入磁盘缓存
+4. 第二遍：从内存映射的特征缓存构建 tf.data.Dataset（并行标准化 + 预取）
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import jieba
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import StandardScaler
+
+from ..click_model import position_decay
+
+# 特征顺序与 CTRModel.extract_features / predict_ctr 保持一致
+FEATURE_NAMES = [
+    'position', 'doc_length', 'query_length', 'summary_length', 'match_score',
+    'query_ctr', 'doc_ctr', 'position_decay', 'query_word_count',
+    'summary_word_count', 'time_feature', 'score'
+]
+FEATURE_DIM = len(FEATURE_NAMES)
+# 缓存行布局: 12维特征 + 标签 + 验证集标记
+CACHE_ROW_DIM = FEATURE_DIM + 2
+# 没有历史数据的查询/文档使用的默认CTR
+DEFAULT_HISTORY_CTR = 0.1
+
+
+def new_history_stats() -> Dict[str, Dict[str, List[int]]]:
+    """创建空的历史点击统计：{'query': {查询: [展示数, 点击数]}, 'doc': {文档ID: [展示数, 点击数]}}"""
+    return {'query': {}, 'doc': {}}
+
+
+def history_ctr(stats: Dict[str, List[int]], key: str) -> float:
+    """从历史点击统计中读取CTR，没有历史时返回默认值"""
+    entry = stats.get(key)
+    return entry[1] / entry[0] if entry else DEFAULT_HISTORY_CTR
+
+
+def update_history(history: Dict[str, Dict[str, List[int]]], query: str, doc_id: str, clicked: int):
+    """把一条样本累加到查询/文档历史点击统计"""
+    for stats, key in ((history['query'], query), (history['doc'], doc_id)):
+        entry = stats.setdefault(key, [0, 0])
+        entry[0] += 1
+        entry[1] += clicked
+
+
+def sample_updated_at(sample: Dict[str, Any]) -> str:
+    """
+    获取样本最后更新时间（展示时间与点击时间中的最大值）
+
+    展示之后才到达的点击也会更新样本标签，增量训练需要据此判断样本是否为新数据
+    """
+    return max(
+        str(sample.get('timestamp') or ''),
+        str(sample.get('click_time') or ''),
+        str(sample.get('last_click_time') or '')
+    )
+
+
+def iter_ctr_samples(filepath: str, chunk_size: int = 10000,
+                     read_size: int = 1 << 20) -> Iterator[List[Dict[str, Any]]]:
+    """
+    流式读取CTR样本文件，按块产出样本列表
+
+    Args:
+        filepath: 数据文件路径，支持JSON数组（DataService格式）和JSON Lines
+        chunk_size: 每块样本数
+        read_size: 每次从磁盘读取的字符数
+
+    Yields:
+        每块最多chunk_size条样本
+    """
+    decoder = json.JSONDecoder()
+    chunk: List[Dict[str, Any]] = []
+    buffer = ""
+    pos = 0
+    eof = False
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        while True:
+            # 跳过空白、数组括号和分隔符
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+
+            if pos >= len(buffer):
+                if eof:
+                    break
+                data = f.read(read_size)
+                eof = not data
+                buffer, pos = buffer[pos:] + data, 0
+                continue
+
+            try:
+                sample, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # 对象跨越了读取边界，读入更多数据
+                data = f.read(read_size)
+                eof = not data
+                buffer, pos = buffer[pos:] + data, 0
+                continue
+
+            pos = end
+            chunk.append(sample)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class StreamingFeatureExtractor:
+    """
+    分块特征提取器
+
+    特征顺序与 CTRModel.extract_features 一致。历史CTR特征只使用当前样本之前的数据：
+    块内按时间戳稳定排序后累积，统计量跨块保留，无需一次性加载全部样本。
+    DataService按展示时间追加样本，文件整体有序时结果与 extract_features 完全一致。
+    位置衰减特征使用传入的位置倾向性表（为空时为 1/(position+1)）。
+    处理完成后 history 即全部样本的历史点击统计，随模型保存供增量训练和预测使用。
+    """
+
+    def __init__(self, propensities: Optional[Dict[int, float]] = None,
+                 history: Optional[Dict[str, Dict[str, List[int]]]] = None):
+        self.propensities = propensities or {}
+        self.history = history if history is not None else new_history_stats()
+        self.query_stats = self.history['query']  # 查询 -> [展示数, 点击数]
+        self.doc_stats = self.history['doc']      # 文档 -> [展示数, 点击数]
+
+    def transform(self, samples: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        提取一块样本的特征
+
+        Returns:
+            features: (n, 12) float32 特征矩阵
+            labels: (n,) float32 标签
+        """
+        features = np.zeros((len(samples), FEATURE_DIM), dtype=np.float32)
+        labels = np.zeros(len(samples), dtype=np.float32)
+
+        # 与 CTRModel.extract_features 相同，按时间戳稳定排序累积历史统计
+        order = sorted(range(len(samples)), key=lambda i: str(samples[i].get('timestamp', '')))
+        for i in order:
+            sample = samples[i]
+            query = str(sample.get('query', ''))
+            doc_id = str(sample.get('doc_id', ''))
+            summary = str(sample.get('summary', ''))
+            position = float(sample.get('position', 1))
+            clicked = 1 if sample.get('clicked', 0) else 0
+
+            query_words = jieba.lcut(query)
+            summary_words = jieba.lcut(summary)
+            query_set = set(query_words)
+            match_ratio = len(query_set & set(summary_words)) / len(query_set) if query_set else 0.0
+            time_value = sum(ord(c) for c in str(sample.get('timestamp', ''))) % 1000
+
+            features[i] = (
+                position,                                       # 位置特征
+                len(summary),                                   # 文档长度特征
+                len(query),                                     # 查询长度特征
+                len(summary),                                   # 摘要长度特征
+                match_ratio,                                    # 查询匹配度特征
+                history_ctr(self.query_stats, query),           # 查询历史CTR特征
+                history_ctr(self.doc_stats, doc_id),            # 文档历史CTR特征
+                position_decay(position, self.propensities),    # 位置衰减特征
+                len(query_words),                               # 查询词数量特征
+                len(summary_words),                             # 摘要词数量特征
+                time_value,                                     # 时间特征
+                float(sample.get('score', 0.0))                 # 原始相似度分数特征
+            )
+            labels[i] = clicked
+
+            update_history(self.history, query, doc_id, clicked)
+
+        return features, labels
+
+
+def is_validation_sample(sample: Dict[str, Any], validation_split: float) -> bool:
+    """按请求ID哈希划分验证集，同一次请求的展示落在同一侧，划分结果稳定可复现"""
+    request_id = str(sample.get('request_id', ''))
+    return (zlib.crc32(request_id.encode('utf-8')) % 10000) < validation_split * 10000
+
+
+def build_feature_cache(filepath: str, cache_path: str, chunk_size: int = 10000,
+                        validation_split: float = 0.3,
+                        propensities: Optional[Dict[int, float]] = None) -> Dict[str, Any]:
+    """
+    第一遍：流式提取特征，增量拟合标准化器，并把特征写入磁盘缓存
+
+    Args:
+        filepath: CTR样本文件
+        cache_path: 特征缓存文件（float32二进制）
+        chunk_size: 每块样本数
+        validation_split: 验证集比例
+        propensities: 位置倾向性表（位置衰减特征）
+
+    Returns:
+        包含scaler、样本统计、历史点击统计和最新样本更新时间的字典
+    """
+    scaler = StandardScaler()
+    extractor = StreamingFeatureExtractor(propensities)
+    trained_until = ""
+    stats = {'total_samples': 0, 'click_samples': 0, 'train_samples': 0,
+             'test_samples': 0, 'train_clicks': 0, 'test_clicks': 0}
+
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    with open(cache_path, 'wb') as cache:
+        for chunk in iter_ctr_samples(filepath, chunk_size):
+            features, labels = extractor.transform(chunk)
+            is_val = np.array([is_validation_sample(s, validation_split) for s in chunk],
+                              dtype=np.float32)
+
+            scaler.partial_fit(features[is_val == 0] if np.any(is_val == 0) else features)
+            np.hstack([features, labels[:, None], is_val[:, None]]).astype(np.float32).tofile(cache)
+
+            trained_until = max([trained_until] + [sample_updated_at(s) for s in chunk])
+            stats['total_samples'] += len(chunk)
+            stats['click_samples'] += int(labels.sum())
+            stats['test_samples'] += int(is_val.sum())
+            stats['test_clicks'] += int(labels[is_val == 1].sum())
+
+    stats['train_samples'] = stats['total_samples'] - stats['test_samples']
+    stats['train_clicks'] = stats['click_samples'] - stats['test_clicks']
+    return {'scaler': scaler, 'stats': stats, 'history': extractor.history, 'trained_until': trained_until}
+
+
+def make_dataset(cache_path: str, scaler: StandardScaler, validation: bool,
+                 batch_size: int = 32, chunk_rows: int = 8192,
+                 shuffle_buffer: int = 10000) -> tf.data.Dataset:
+    """
+    第二遍：从特征缓存构建 tf.data.Dataset
+
+    缓存通过内存映射按块读取，标准化在 map 中并行执行，内存占用与样本总数无关。
+
+    Args:
+        cache_path: 特征缓存文件
+        scaler: 第一遍拟合的标准化器
+        validation: True返回验证集，False返回训练集
+        batch_size: 批次大小
+        chunk_rows: 每次从缓存读取的行数
+        shuffle_buffer: 训练集打乱缓冲区大小
+    """
+    flag = 1.0 if validation else 0.0
+
+    def generator():
+        rows = np.memmap(cache_path, dtype=np.float32, mode='r').reshape(-1, CACHE_ROW_DIM)
+        for start in range(0, len(rows), chunk_rows):
+            block = np.asarray(rows[start:start + chunk_rows])
+            block = block[block[:, -1] == flag]
+            if len(block):
+                yield block[:, :FEATURE_DIM], block[:, FEATURE_DIM]
+
+    mean = tf.constant(scaler.mean_, dtype=tf.float32)
+    scale = tf.constant(scaler.scale_, dtype=tf.float32)
+
+    dataset = tf.data.Dataset.from_generator(
+        generator,
+        output_signature=(
+            tf.TensorSpec(shape=(None, FEATURE_DIM), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )
+    )
+    dataset = dataset.map(lambda x, y: ((x - mean) / scale, y),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.unbatch()
+    if not validation:
+        dataset = dataset.shuffle(shuffle_buffer)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
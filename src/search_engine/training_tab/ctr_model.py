@@ -22,12 +22,17 @@ import numpy as np
 # from sklearn.metrics import classification_report, roc_auc_score
 import pickle
 import os
-from typing import List, Dict, Any, Tuple
+import copy
+import tempfile
+from typing import List, Dict, Any, Optional, Tuple
 import jieba
 from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, roc_auc_score
 from .ctr_config import CTRFeatureConfig, CTRTrainingConfig, ctr_feature_config, ctr_training_config
+from .ctr_data_pipeline import (build_feature_cache, history_ctr, is_validation_sample, make_dataset,
+                                new_history_stats, sample_updated_at, update_history)
+from ..click_model import get_propensities, position_decay, position_decay_array
 
 # 新增TensorFlow相关导入
 import tensorflow as tf
@@ -64,7 +69,10 @@ class CTRModel:
         self.model = None          # Wide & Deep模型
         self.scaler = None         # 特征标准化器
         self.is_trained = False    # 训练状态标志
+        self.trained_until = ""    # 已训练样本的最新更新时间（增量训练检查点）
         self.feature_dim = 12      # 特征维度（根据extract_features中的特征数量）
+        self.position_propensities = {}  # 训练时使用的位置倾向性表（位置衰减特征），随模型保存
+        self.history_stats = new_history_stats()  # 已训练样本的查询/文档历史点击统计，随检查点保存
         self.wide_columns = []     # Wide部分特征列（预留）
         self.deep_columns = []     # Deep部分特征列（预留）
         
@@ -163,13 +171,16 @@ class CTRModel:
         
         return model
 
-    def extract_features(self, ctr_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    def extract_features(self, ctr_data: List[Dict[str, Any]],
+                         history: Optional[Dict[str, Dict[str, List[int]]]] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         从CTR数据中提取特征
         
         Args:
             ctr_data: CTR数据列表，每个元素包含query, doc_id, position, summary, 
                      score, clicked, timestamp等字段
+            history: 之前样本的历史点击统计，历史CTR特征在此基础上累积，
+                     ctr_data的统计会原地累加进去；为None时只使用ctr_data自身的历史
         
         Returns:
             features: 特征矩阵 (样本数, 特征数)
@@ -219,42 +230,20 @@ class CTRModel:
         
         # ========== 历史特征提取（避免数据泄露） ==========
         
-        # 按时间戳排序，确保历史特征只使用过去的数据
-        df_sorted = df.sort_values('timestamp').reset_index(drop=True)
+        # 按时间戳稳定排序后逐条累积，确保历史特征只使用过去的数据
+        if history is None:
+            history = new_history_stats()
         
-        query_ctr_features = []  # 查询历史CTR
-        doc_ctr_features = []    # 文档历史CTR
+        queries = df['query'].astype(str).values
+        doc_ids = df['doc_id'].astype(str).values
+        clicks = df['clicked'].values
+        query_ctr_features = np.zeros((len(df), 1))  # 查询历史CTR
+        doc_ctr_features = np.zeros((len(df), 1))    # 文档历史CTR
         
-        for idx, row in df_sorted.iterrows():
-            # 查询历史CTR - 只使用当前样本之前的数据
-            query = row['query']
-            query_history = df_sorted.loc[:idx-1]  # 不包括当前样本
-            query_history_filtered = query_history[query_history['query'] == query]
-            
-            if len(query_history_filtered) > 0:
-                query_ctr = query_history_filtered['clicked'].mean()
-            else:
-                query_ctr = 0.1  # 默认值
-            query_ctr_features.append(query_ctr)
-            
-            # 文档历史CTR - 只使用当前样本之前的数据
-            doc_id = row['doc_id']
-            doc_history = df_sorted.loc[:idx-1]  # 不包括当前样本
-            doc_history_filtered = doc_history[doc_history['doc_id'] == doc_id]
-            
-            if len(doc_history_filtered) > 0:
-                doc_ctr = doc_history_filtered['clicked'].mean()
-            else:
-                doc_ctr = 0.1  # 默认值
-            doc_ctr_features.append(doc_ctr)
-        
-        # 按原始顺序重新排列特征
-        original_order = df.index
-        query_ctr_features = [query_ctr_features[i] for i in original_order]
-        doc_ctr_features = [doc_ctr_features[i] for i in original_order]
-        
-        query_ctr_features = np.array(query_ctr_features).reshape(-1, 1)
-        doc_ctr_features = np.array(doc_ctr_features).reshape(-1, 1)
+        for i in np.argsort(df['timestamp'].astype(str).values, kind='stable'):
+            query_ctr_features[i, 0] = history_ctr(history['query'], queries[i])
+            doc_ctr_features[i, 0] = history_ctr(history['doc'], doc_ids[i])
+            update_history(history, queries[i], doc_ids[i], 1 if clicks[i] else 0)
         
         # ========== 扩展特征提取 ==========
         
@@ -284,8 +273,8 @@ class CTRModel:
                 time_features.append(0)
         time_features = np.array(time_features).reshape(-1, 1)
         
-        # 10. 位置衰减特征 - 位置越靠前，权重越高
-        position_decay = 1.0 / (position_features + 1)  # 避免除零
+        # 10. 位置衰减特征 - 位置越靠前，权重越高（有位置倾向性表时使用估计值）
+        position_decay_features = position_decay_array(position_features, self.position_propensities)
         
         # ========== 特征组合 ==========
         
@@ -298,7 +287,7 @@ class CTRModel:
             match_scores,                # 查询匹配度特征
             query_ctr_features,          # 查询历史CTR特征
             doc_ctr_features,            # 文档历史CTR特征
-            position_decay,              # 位置衰减特征
+            position_decay_features,     # 位置衰减特征
             query_word_counts,           # 查询词数量特征
             summary_word_counts,         # 摘要词数量特征
             time_features,               # 时间特征
@@ -386,7 +375,9 @@ class CTRModel:
         
         try:
             # ========== 特征提取 ==========
-            features, labels = self.extract_features(ctr_data)
+            self.position_propensities = get_propensities()
+            history = new_history_stats()
+            features, labels = self.extract_features(ctr_data, history)
             if len(features) == 0:
                 return self._empty_metrics('特征提取失败')
             
@@ -486,6 +477,8 @@ class CTRModel:
             
             # ========== 保存模型 ==========
             self.is_trained = True
+            self.trained_until = max(sample_updated_at(sample) for sample in ctr_data)
+            self.history_stats = history
             self.save_model()
             
             # ========== 特征权重分析（简化版本） ==========
@@ -525,6 +518,232 @@ class CTRModel:
         except Exception as e:
             return self._empty_metrics(f'训练失败: {str(e)}')
     
+    def train_streaming(self, data_file: str, chunk_size: int = 10000,
+                        cache_dir: str = None) -> Dict[str, Any]:
+        """
+        流式训练Wide & Deep CTR模型（内存占用与样本总数无关）
+        
+        Args:
+            data_file: CTR样本文件（DataService持久化的JSON文件）
+            chunk_size: 每块读取的样本数
+            cache_dir: 特征缓存目录，默认使用系统临时目录
+        
+        Returns:
+            训练结果字典
+        
+        训练流程：
+        1. 第一遍：分块读取样本、提取特征、partial_fit标准化器，特征写入磁盘缓存
+        2. 第二遍：tf.data从缓存流式读取，并行标准化并预取，送入model.fit
+        3. 在验证集上流式预测并计算评估指标
+        """
+        if not os.path.exists(data_file):
+            return self._empty_metrics(f'CTR数据文件不存在: {data_file}')
+        
+        cache_fd, cache_path = tempfile.mkstemp(suffix='.features', dir=cache_dir)
+        os.close(cache_fd)
+        
+        try:
+            # ========== 第一遍：特征缓存 + 标准化统计 ==========
+            propensities = get_propensities()
+            cache = build_feature_cache(
+                data_file, cache_path, chunk_size=chunk_size,
+                validation_split=CTRTrainingConfig.STREAMING_VALIDATION_SPLIT,
+                propensities=propensities
+            )
+            stats = cache['stats']
+            
+            min_samples = CTRTrainingConfig.MIN_SAMPLES
+            if stats['total_samples'] < min_samples:
+                return self._empty_metrics(f"数据量不足，需要至少{min_samples}条记录，当前只有{stats['total_samples']}条")
+            if stats['train_clicks'] < 1 or stats['test_clicks'] < 1:
+                return self._empty_metrics('训练集或测试集缺少点击样本')
+            if stats['train_samples'] - stats['train_clicks'] < 1 or stats['test_samples'] - stats['test_clicks'] < 1:
+                return self._empty_metrics('训练集或测试集缺少未点击样本')
+            
+            scaler = cache['scaler']
+            
+            # ========== 第二遍：流式训练 ==========
+            train_ds = make_dataset(cache_path, scaler, validation=False, batch_size=self.batch_size)
+            val_ds = make_dataset(cache_path, scaler, validation=True, batch_size=self.batch_size)
+            
+            model = self._build_wide_deep_model(input_dim=self.feature_dim)
+            callbacks = [
+                EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True, verbose=1),
+                ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-6, verbose=1)
+            ]
+            
+            print("\n开始流式训练Wide & Deep模型...")
+            model.fit(train_ds, validation_data=val_ds, epochs=self.epochs,
+                      callbacks=callbacks, verbose=1)
+            
+            # ========== 模型评估 ==========
+            y_true, y_pred_proba = [], []
+            for x_batch, y_batch in val_ds:
+                y_true.append(y_batch.numpy())
+                y_pred_proba.append(model(x_batch, training=False).numpy().flatten())
+            y_true = np.concatenate(y_true)
+            y_pred_proba = np.concatenate(y_pred_proba)
+            y_pred = (y_pred_proba > 0.5).astype(int)
+            
+            try:
+                auc = roc_auc_score(y_true, y_pred_proba)
+            except Exception as e:
+                print(f"AUC计算失败: {e}")
+                auc = 0.0
+            
+            tp = np.sum((y_pred == 1) & (y_true == 1))
+            fp = np.sum((y_pred == 1) & (y_true == 0))
+            fn = np.sum((y_pred == 0) & (y_true == 1))
+            precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
+            recall = tp / (tp + fn) if (tp + fn) > 0 else 0.0
+            f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0.0
+            
+            train_score = model.evaluate(train_ds, verbose=0)[1]
+            test_score = model.evaluate(val_ds, verbose=0)[1]
+            
+            # ========== 保存模型 ==========
+            self.model = model
+            self.scaler = scaler
+            self.is_trained = True
+            self.trained_until = cache['trained_until']
+            self.history_stats = cache['history']
+            self.position_propensities = propensities
+            self.save_model()
+            
+            return {
+                'success': True,
+                'mode': 'streaming',
+                'accuracy': round(float((y_pred == y_true).mean()), 4),
+                'auc': round(float(auc), 4),
+                'precision': round(float(precision), 4),
+                'recall': round(float(recall), 4),
+                'f1': round(float(f1), 4),
+                'train_samples': stats['train_samples'],
+                'test_samples': stats['test_samples'],
+                'train_score': round(float(train_score), 4),
+                'test_score': round(float(test_score), 4),
+                'feature_weights': {},
+                'data_quality': {
+                    'total_samples': stats['total_samples'],
+                    'click_rate': round(stats['click_samples'] / stats['total_samples'], 4)
+                }
+            }
+        except Exception as e:
+            return self._empty_metrics(f'流式训练失败: {str(e)}')
+        finally:
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+    
+    def clone(self) -> 'CTRModel':
+        """
+        复制当前模型（权重、标准化器、检查点和历史点击统计）
+        
+        Returns:
+            独立的CTRModel副本，在副本上训练不会影响正在服务的模型
+        """
+        cloned = CTRModel()
+        cloned.feature_dim = self.feature_dim
+        cloned.is_trained = self.is_trained
+        cloned.trained_until = self.trained_until
+        cloned.position_propensities = dict(self.position_propensities)
+        cloned.history_stats = copy.deepcopy(self.history_stats)
+        cloned.scaler = copy.deepcopy(self.scaler)
+        
+        if self.model is not None:
+            cloned.model = keras.models.clone_model(self.model)
+            cloned.model.set_weights(self.model.get_weights())
+            cloned.model.compile(
+                optimizer=Adam(learning_rate=cloned.learning_rate),
+                loss='binary_crossentropy',
+                metrics=['accuracy', 'AUC']
+            )
+        
+        return cloned
+    
+    def train_incremental(self, ctr_data: List[Dict[str, Any]], epochs: int = None) -> Dict[str, Any]:
+        """
+        增量训练：基于已训练模型，只用新样本继续训练
+        
+        Args:
+            ctr_data: 上次检查点之后的新CTR样本
+            epochs: 训练轮数，默认使用CTRTrainingConfig.INCREMENTAL_EPOCHS
+        
+        Returns:
+            训练结果字典，loss/accuracy在留出的新样本上计算（eval_set='holdout'）；
+            新样本太少无法留出时在训练样本上计算（eval_set='train'）
+        
+        训练流程：
+        1. 在检查点保存的历史点击统计基础上提取新样本特征（与全量训练一致）
+        2. 按请求ID哈希留出一部分新样本用于评估
+        3. 用训练样本的统计量更新标准化器（partial_fit）
+        4. 从现有权重出发训练少量轮次（warm start）
+        5. 推进检查点到新样本的最新更新时间
+        """
+        if not self.is_trained or self.model is None:
+            return self._empty_metrics('模型未训练，无法增量训练')
+        
+        min_samples = CTRTrainingConfig.INCREMENTAL_MIN_SAMPLES
+        if len(ctr_data) < min_samples:
+            return self._empty_metrics(f'新样本不足，需要至少{min_samples}条，当前只有{len(ctr_data)}条')
+        
+        try:
+            history = copy.deepcopy(self.history_stats)
+            features, labels = self.extract_features(ctr_data, history)
+            if len(features) == 0:
+                return self._empty_metrics('特征提取失败')
+            
+            # ========== 留出评估样本 ==========
+            is_holdout = np.array([
+                is_validation_sample(sample, CTRTrainingConfig.INCREMENTAL_VALIDATION_SPLIT)
+                for sample in ctr_data
+            ])
+            if is_holdout.all() or not is_holdout.any():
+                is_holdout[:] = False
+                eval_set = 'train'
+            else:
+                eval_set = 'holdout'
+            train_mask = ~is_holdout
+            eval_mask = is_holdout if eval_set == 'holdout' else train_mask
+            
+            # ========== 更新标准化器 ==========
+            if self.scaler is None:
+                self.scaler = StandardScaler()
+            self.scaler.partial_fit(features[train_mask])
+            features_scaled = self.scaler.transform(features)
+            X_train, y_train = features_scaled[train_mask], labels[train_mask]
+            X_eval, y_eval = features_scaled[eval_mask], labels[eval_mask]
+            
+            # ========== 热启动训练 ==========
+            loss_before, accuracy_before = self.model.evaluate(X_eval, y_eval, verbose=0)[:2]
+            self.model.fit(
+                X_train, y_train,
+                epochs=epochs or CTRTrainingConfig.INCREMENTAL_EPOCHS,
+                batch_size=self.batch_size,
+                verbose=0
+            )
+            loss_after, accuracy_after = self.model.evaluate(X_eval, y_eval, verbose=0)[:2]
+            
+            self.history_stats = history
+            self.trained_until = max(
+                self.trained_until, max(sample_updated_at(sample) for sample in ctr_data)
+            )
+            
+            return {
+                'success': True,
+                'mode': 'incremental',
+                'train_samples': int(train_mask.sum()),
+                'eval_samples': int(eval_mask.sum()),
+                'eval_set': eval_set,
+                'click_rate': round(float(np.mean(labels)), 4),
+                'loss_before': round(float(loss_before), 4),
+                'loss_after': round(float(loss_after), 4),
+                'accuracy': round(float(accuracy_after), 4),
+                'accuracy_before': round(float(accuracy_before), 4),
+                'trained_until': self.trained_until
+            }
+        except Exception as e:
+            return self._empty_metrics(f'增量训练失败: {str(e)}')
+    
     def predict_ctr(self, query: str, doc_id: str, position: int, score: float, summary: str) -> float:
         """
         预测CTR分数
@@ -566,12 +785,12 @@ class CTRModel:
                 match_ratio = 0
             match_score = np.array([[match_ratio]])
             
-            # 历史CTR特征（简化版本，实际应用中需要从数据库获取）
-            query_ctr = np.array([[0.1]])  # 默认值
-            doc_ctr = np.array([[0.1]])    # 默认值
+            # 历史CTR特征（训练样本累积的历史点击统计，没有历史时为默认值）
+            query_ctr = np.array([[history_ctr(self.history_stats['query'], query)]])
+            doc_ctr = np.array([[history_ctr(self.history_stats['doc'], doc_id)]])
             
             # 位置衰减特征
-            position_decay = np.array([[1.0 / (position + 1)]])
+            position_decay_feature = np.array([[position_decay(position, self.position_propensities)]])
             
             # ========== 组合特征 ==========
             features = np.hstack([
@@ -582,7 +801,7 @@ class CTRModel:
                 match_score,           # 查询匹配度特征
                 query_ctr,             # 查询历史CTR特征
                 doc_ctr,               # 文档历史CTR特征
-                position_decay,        # 位置衰减特征
+                position_decay_feature,  # 位置衰减特征
                 np.array([[len(jieba.lcut(query))]]),  # 查询词数量特征
                 np.array([[len(jieba.lcut(summary))]]), # 摘要词数量特征
                 np.array([[0]]),       # 时间特征（预测时设为0）
@@ -630,7 +849,10 @@ class CTRModel:
             model_info = {
                 'scaler': self.scaler,
                 'is_trained': self.is_trained,
-                'feature_dim': self.feature_dim
+                'feature_dim': self.feature_dim,
+                'trained_until': self.trained_until,
+                'position_propensities': self.position_propensities,
+                'history_stats': self.history_stats
             }
             with open(scaler_filepath, 'wb') as f:
                 pickle.dump(model_info, f)
@@ -668,6 +890,9 @@ class CTRModel:
                     self.scaler = model_info['scaler']
                     self.is_trained = model_info['is_trained']
                     self.feature_dim = model_info.get('feature_dim', 12)
+                    self.trained_until = model_info.get('trained_until', '')
+                    self.position_propensities = model_info.get('position_propensities', {})
+                    self.history_stats = model_info.get('history_stats') or new_history_stats()
                 
                 print(f"Wide & Deep CTR模型已从 {filepath} 加载")
                 return True
@@ -681,4 +906,7 @@ class CTRModel:
         self.model = None
         self.scaler = None
         self.is_trained = False
+        self.trained_until = ""
+        self.position_propensities = {}
+        self.history_stats = new_history_stats()
         print("Wide & Deep CTR模型已重置")
\ No newline at end of file
@@ -1,12 +1,15 @@
 import gradio as gr
 from datetime import datetime
+from html import escape
 from ..data_utils import (
     get_data_statistics,
     get_ctr_dataframe,
     clear_all_data,
     export_ctr_data,
     import_ctr_data,
-    analyze_click_patterns
+    analyze_click_patterns,
+    get_position_ctr_curve,
+    get_top_queries
 )
 
 def get_history_html(ctr_collector):
@@ -111,6 +114,8 @@ def build_training_tab(model_service, data_service):
         with gr.Row():
             with gr.Column(scale=2):
                 train_btn = gr.Button("🚀 开始训练", variant="primary")
+                incremental_train_btn = gr.Button("⚡ 增量训练", variant="secondary")
+                fit_click_model_btn = gr.Button("📐 估计位置偏差", variant="secondary")
                 clear_data_btn = gr.Button("🗑️ 清空数据", variant="secondary")
                 export_data_btn = gr.Button("📤 导出数据", variant="secondary")
                 import_data_btn = gr.Button("📥 导入数据", variant="secondary")
@@ -150,6 +155,14 @@ def build_training_tab(model_service, data_service):
             
             # 如果有点击模式分析结果，添加到显示中
             if 'error' not in patterns:
+                position_items = ''.join(
+                    f"<li>位置{row['position']}: {row['ctr']:.2%}（{row['clicks']}/{row['impressions']}）</li>"
+                    for row in get_position_ctr_curve()[:10]
+                )
+                query_items = ''.join(
+                    f"<li>{escape(str(row['key']))}: 展示{row['impressions']}，CTR {row['ctr']:.2%}</li>"
+                    for row in get_top_queries(5)
+                )
                 html += f"""
                 <div style="background-color: #e8f5e8; padding: 15px; border-radius: 8px; margin-top: 10px;">
                     <h4 style="margin: 0 0 10px 0; color: #333;">🔍 点击模式分析</h4>
@@ -158,14 +171,16 @@ def build_training_tab(model_service, data_service):
                         <li><strong>总展示数:</strong> {patterns['total_impressions']}</li>
                         <li><strong>总点击数:</strong> {patterns['total_clicks']}</li>
                     </ul>
+                    <h5 style="margin: 10px 0 5px 0; color: #333;">📈 位置CTR</h5>
+                    <ul style="margin: 0; padding-left: 20px;">{position_items}</ul>
+                    <h5 style="margin: 10px 0 5px 0; color: #333;">🔥 热门查询</h5>
+                    <ul style="margin: 0; padding-left: 20px;">{query_items}</ul>
                 </div>
                 """
             
             return html
         
-        def train_model():
-            result = model_service.train_model(data_service)
-            
+        def render_train_result(result):
             if result.get('success', False):
                 html = f"""
                 <div style="background-color: #d4edda; color: #155724; padding: 15px; border-radius: 8px; border: 1px solid #c3e6cb;">
@@ -189,6 +204,66 @@ def build_training_tab(model_service, data_service):
             
             return html
         
+        def train_model():
+            return render_train_result(model_service.train_model(data_service))
+        
+        def train_model_incremental():
+            result = model_service.train_model(data_service, mode="incremental")
+            
+            if not result.get('success', False):
+                return f"""
+                <div style="background-color: #f8d7da; color: #721c24; padding: 15px; border-radius: 8px; border: 1px solid #f5c6cb;">
+                    <h4 style="margin: 0 0 10px 0;">❌ 增量训练失败</h4>
+                    <p style="margin: 0;">{result.get('error', '未知错误')}</p>
+                </div>
+                """
+            
+            if result.get('mode') != 'incremental':
+                # 模型尚未训练时会退化为全量训练
+                return render_train_result(result)
+            
+            # 新样本太少无法留出时，指标在训练样本上计算
+            eval_label = "留出样本" if result.get('eval_set') == 'holdout' else "训练样本"
+            
+            return f"""
+            <div style="background-color: #d4edda; color: #155724; padding: 15px; border-radius: 8px; border: 1px solid #c3e6cb;">
+                <h4 style="margin: 0 0 10px 0;">✅ 增量训练成功</h4>
+                <ul style="margin: 0; padding-left: 20px;">
+                    <li><strong>训练样本数:</strong> {result.get('train_samples', 0)}</li>
+                    <li><strong>评估样本数:</strong> {result.get('eval_samples', 0)}（{eval_label}）</li>
+                    <li><strong>{eval_label}损失:</strong> {result.get('loss_before', 0):.4f} → {result.get('loss_after', 0):.4f}</li>
+                    <li><strong>{eval_label}准确率:</strong> {result.get('accuracy_before', 0):.4f} → {result.get('accuracy', 0):.4f}</li>
+                    <li><strong>检查点:</strong> {result.get('trained_until', '')}</li>
+                </ul>
+            </div>
+            """
+        
+        def fit_click_model():
+            result = model_service.fit_click_model(data_service)
+            
+            if not result.get('success', False):
+                return f"""
+                <div style="background-color: #f8d7da; color: #721c24; padding: 15px; border-radius: 8px; border: 1px solid #f5c6cb;">
+                    <h4 style="margin: 0 0 10px 0;">❌ 位置偏差估计失败</h4>
+                    <p style="margin: 0;">{result.get('error', '未知错误')}</p>
+                </div>
+                """
+            
+            position_items = ''.join(
+                f"<li>位置{position}: 倾向性 {value:.4f}（展示{result['support'][position]}）</li>"
+                for position, value in sorted(result['propensities'].items())[:10]
+            )
+            return f"""
+            <div style="background-color: #d4edda; color: #155724; padding: 15px; border-radius: 8px; border: 1px solid #c3e6cb;">
+                <h4 style="margin: 0 0 10px 0;">✅ 位置倾向性表已更新（下次训练生效）</h4>
+                <ul style="margin: 0; padding-left: 20px;">
+                    <li><strong>展示数:</strong> {result['impressions']}，<strong>查询-文档对:</strong> {result['pairs']}</li>
+                    <li><strong>迭代:</strong> {result['iterations']} 轮，{'已收敛' if result['converged'] else '未收敛'}，耗时 {result['elapsed_s']:.2f}s</li>
+                </ul>
+                <ul style="margin: 10px 0 0 0; padding-left: 20px;">{position_items}</ul>
+            </div>
+            """
+        
         def clear_data():
             # 使用新的工具函数
             clear_all_data()
@@ -223,6 +298,8 @@ def build_training_tab(model_service, data_service):
         
         # 绑定事件
         train_btn.click(fn=train_model, outputs=training_output)
+        incremental_train_btn.click(fn=train_model_incremental, outputs=training_output)
+        fit_click_model_btn.click(fn=fit_click_model, outputs=training_output)
         clear_data_btn.click(fn=clear_data, outputs=training_output)
         export_data_btn.click(fn=export_data, outputs=training_output)
         
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步LLM客户端测试用例（本地模拟HTTP服务）
+"""
+
+import unittest
+import asyncio
+import json
+import threading
+import time
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.async_llm_client import AsyncLLMClient, LLMRequestError
+from search_engine.rag_service import RAGService, RAGConfig
+from search_engine.metrics import get_histogram
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """模拟 /chat/completions 接口"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length))
+        prompt = payload['messages'][0]['content']
+
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            fail = server.fail_remaining > 0
+            if fail:
+                server.fail_remaining -= 1
+
+        time.sleep(server.delay)
+        if payload.get('stream') and server.truncate_stream:
+            # 输出第一块后断开连接（声明的长度大于实际发送的内容）
+            chunk = f"data: {json.dumps({'choices': [{'delta': {'content': '流式'}}]})}\n\n".encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Content-Length', str(len(chunk) + 100))
+            self.end_headers()
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if fail:
+            body, status = b'{"error": "busy"}', 503
+        elif payload.get('stream'):
+            chunks = [{'choices': [{'delta': {'content': piece}}]} for piece in ("流式", "回答")]
+            body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            body, status = body.encode('utf-8'), 200
+        else:
+            answer = {'choices': [{'message': {'content': f"回答:{len(prompt)}"}}]}
+            body, status = json.dumps(answer).encode('utf-8'), 200
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAsyncLLMClient(unittest.TestCase):
+    """异步LLM客户端测试类"""
+
+    def setUp(self):
+        """启动模拟服务"""
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockLLMHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.connections = set()
+        self.server.fail_remaining = 0
+        self.server.truncate_stream = False
+        self.server.delay = 0.05
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def tearDown(self):
+        """关闭模拟服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _client(self, **kwargs):
+        params = dict(base_url=self.base_url, api_key="test", model_name="mock",
+                      max_connections=4, max_concurrency=4, retry_backoff=0.01)
+        params.update(kwargs)
+        return AsyncLLMClient(**params)
+
+    def test_single_flight_and_connection_pool(self):
+        """测试100个并发请求的单飞合并和连接数上限"""
+        client = self._client()
+        prompts = [f"问题{i % 10}" for i in range(100)]
+
+        async def run():
+            return await asyncio.gather(*(client.agenerate(p) for p in prompts))
+
+        answers = asyncio.run(run())
+        client.close()
+
+        self.assertEqual(len(answers), 100)
+        self.assertEqual(answers[0], answers[10])
+        self.assertEqual(self.server.requests, 10)
+        self.assertLessEqual(len(self.server.connections), 4)
+
+        stats = client.get_stats()
+        self.assertEqual(stats['requests'], 100)
+        self.assertEqual(stats['coalesced'], 90)
+        self.assertLessEqual(stats['peak_in_flight'], 4)
+
+    def test_single_flight_leader_cancelled(self):
+        """测试发起请求的调用方被取消时，合并等待的请求结束而不是永久挂起"""
+        self.server.delay = 0.5
+        client = self._client()
+
+        async def run():
+            leader = asyncio.ensure_future(client.agenerate("问题"))
+            await asyncio.sleep(0.1)
+            follower = asyncio.ensure_future(client.agenerate("问题"))
+            await asyncio.sleep(0.1)
+            leader.cancel()
+            with self.assertRaises(LLMRequestError):
+                await asyncio.wait_for(follower, timeout=2)
+            # 取消后相同提示词可以重新发起
+            return await asyncio.wait_for(client.agenerate("问题"), timeout=2)
+
+        self.assertTrue(asyncio.run(run()).startswith("回答"))
+        self.assertEqual(client.get_stats()['coalesced'], 1)
+        client.close()
+
+    def test_retry_on_server_error(self):
+        """测试5xx错误重试"""
+        self.server.fail_remaining = 2
+        client = self._client(max_retries=2)
+        self.assertTrue(client.generate("问题").startswith("回答"))
+        self.assertEqual(client.get_stats()['retries'], 2)
+        client.close()
+
+        self.server.fail_remaining = 5
+        client = self._client(max_retries=1)
+        with self.assertRaises(LLMRequestError):
+            client.generate("问题")
+        client.close()
+
+    def test_stream(self):
+        """测试SSE流式输出"""
+        client = self._client()
+        self.assertEqual(list(client.generate_stream("问题")), ["流式", "回答"])
+        client.close()
+
+    def test_stream_interrupted_after_output(self):
+        """测试开始输出后连接中断不重试，避免调用方重复收到已输出的内容"""
+        self.server.truncate_stream = True
+        client = self._client(max_retries=2)
+        received = []
+        with self.assertRaises(LLMRequestError):
+            for piece in client.generate_stream("问题"):
+                received.append(piece)
+        client.close()
+
+        self.assertEqual(received, ["流式"])
+        self.assertEqual(self.server.requests, 1)
+
+    def test_rag_service_concurrent_requests(self):
+        """测试RAG服务并发请求共享异步客户端"""
+        config = RAGConfig(deepseek_api_key="test", deepseek_base_url=self.base_url,
+                           llm_max_connections=4, cache_enabled=False)
+        rag_service = RAGService(config)
+        results = [("doc1", 0.9, "人工智能摘要")]
+
+        async def run():
+            return await asyncio.gather(*(
+                rag_service.aenhance_search_results("人工智能", results) for _ in range(100)
+            ))
+
+        answers = asyncio.run(run())
+        rag_service.llm_client.close()
+
+        self.assertEqual(len(set(answers)), 1)
+        self.assertEqual(self.server.requests, 1)
+
+
+    def test_rag_stream_metrics(self):
+        """测试流式RAG回答计入阶段耗时、首块耗时和错误数"""
+        config = RAGConfig(deepseek_api_key="test", deepseek_base_url=self.base_url,
+                           llm_max_retries=0, cache_enabled=False)
+        rag_service = RAGService(config)
+        results = [("doc1", 0.9, "人工智能摘要")]
+        stage, first_token = get_histogram("rag.enhance_search_results"), get_histogram("rag.first_token")
+        before = stage.snapshot(), first_token.snapshot()
+
+        self.assertEqual("".join(rag_service.enhance_search_results_stream("人工智能", results)), "流式回答")
+        self.server.fail_remaining = 1
+        answer = "".join(rag_service.enhance_search_results_stream("人工智能", results))
+        rag_service.llm_client.close()
+
+        self.assertIn("RAG功能暂时不可用", answer)
+        self.assertEqual(stage.snapshot()['requests'] - before[0]['requests'], 2)
+        self.assertEqual(stage.snapshot()['errors'] - before[0]['errors'], 1)
+        self.assertEqual(first_token.snapshot()['requests'] - before[1]['requests'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+布尔查询测试用例
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.boolean_query import (
+    BooleanQueryParser, QuerySyntaxError, gallop, intersect_sorted, difference_sorted
+)
+
+
+class TestSortedOperations(unittest.TestCase):
+    """有序数组运算测试类"""
+    
+    def test_gallop(self):
+        """测试倍增查找"""
+        values = list(range(0, 100, 3))
+        for target in (-1, 0, 4, 50, 99, 200):
+            for lo in (0, 5):
+                expected = next((i for i in range(lo, len(values)) if values[i] >= target), len(values))
+                self.assertEqual(gallop(values, target, lo), expected)
+    
+    def test_intersect_and_difference(self):
+        """测试求交和求差"""
+        a, b, c = list(range(0, 1000, 2)), list(range(0, 1000, 3)), [6, 12, 13, 600]
+        self.assertEqual(intersect_sorted([a, b, c]), [6, 12, 600])
+        self.assertEqual(intersect_sorted([a, []]), [])
+        self.assertEqual(difference_sorted(c, a), [13])
+
+
+class TestBooleanSearch(unittest.TestCase):
+    """布尔检索测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.index = InvertedIndex()
+        documents = {
+            "d1": "机器学习是人工智能的核心技术。",
+            "d2": "深度学习使用神经网络进行学习。",
+            "d3": "工厂里的机器完成装配工作。",
+            "d4": "自然语言处理研究文本理解。",
+            "d5": "处理自然语言需要大量语料。"
+        }
+        for doc_id, content in documents.items():
+            self.index.add_document(doc_id, content)
+    
+    def _ids(self, query):
+        return sorted(doc_id for doc_id, _, _ in self.index.search(query, 10, mode="boolean"))
+    
+    def test_operators(self):
+        """测试AND/OR/NOT和括号"""
+        self.assertEqual(self._ids("机器 AND 学习"), ["d1"])
+        self.assertEqual(self._ids("机器 OR 深度"), ["d1", "d2", "d3"])
+        self.assertEqual(self._ids("学习 NOT 深度"), ["d1"])
+        self.assertEqual(self._ids("(机器 OR 深度) AND 学习"), ["d1", "d2"])
+        self.assertEqual(self._ids("NOT 学习"), ["d3", "d4", "d5"])
+    
+    def test_modifiers_and_phrase(self):
+        """测试+必须、-排除和短语"""
+        self.assertEqual(self._ids("+机器 学习"), ["d1", "d3"])
+        self.assertEqual(self._ids("机器 -学习"), ["d3"])
+        self.assertEqual(self._ids("-(机器 OR 学习)"), ["d4", "d5"])
+        self.assertEqual(self._ids('"自然语言处理"'), ["d4"])
+        self.assertEqual(self._ids("自然语言处理"), ["d4", "d5"])
+        
+        # 必须子句决定匹配，可选子句只影响分数
+        results = self.index.search("+机器 学习", 10, mode="boolean")
+        self.assertEqual(results[0][0], "d1")
+    
+    def test_syntax_errors(self):
+        """测试语法错误"""
+        parser = BooleanQueryParser(self.index)
+        for query in ("(机器 AND 学习", "机器 NOT", "机器 )"):
+            with self.assertRaises(QuerySyntaxError):
+                parser.parse(query)
+        self.assertIsNone(parser.parse("的 了"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有界缓存测试用例
+"""
+
+import unittest
+import tempfile
+import time
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.cache import LRUTTLCache
+
+
+class TestLRUTTLCache(unittest.TestCase):
+    """LRU + TTL 缓存测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_lru_eviction_by_entries(self):
+        """测试按条目数淘汰最久未使用的条目"""
+        cache = LRUTTLCache(max_entries=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        self.assertEqual(cache.get("a"), "1")  # a 变为最近使用
+        cache.set("c", "3")
+        
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+    
+    def test_eviction_by_bytes(self):
+        """测试按字节数淘汰"""
+        cache = LRUTTLCache(max_entries=100, max_bytes=10, ttl=60)
+        cache.set("a", "12345")
+        cache.set("b", "12345")
+        cache.set("c", "12345")
+        
+        stats = cache.get_stats()
+        self.assertLessEqual(stats['bytes'], 10)
+        self.assertNotIn("a", cache)
+        
+        cache.set("big", "x" * 11)  # 超过总上限的值不缓存
+        self.assertNotIn("big", cache)
+    
+    def test_ttl_expiry_and_sweep(self):
+        """测试过期条目的惰性删除和主动清扫"""
+        cache = LRUTTLCache(max_entries=10, ttl=0.05)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        time.sleep(0.1)
+        
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.sweep_expired(), 1)
+        self.assertEqual(len(cache), 0)
+        
+        stats = cache.get_stats()
+        self.assertEqual(stats['expirations'], 2)
+        self.assertEqual(stats['misses'], 1)
+    
+    def test_persistence(self):
+        """测试SQLite持久化后重启恢复"""
+        path = os.path.join(self.temp_dir, "cache.db")
+        cache = LRUTTLCache(max_entries=10, ttl=60, persist_path=path)
+        cache.set("a", "回答A")
+        cache.set("b", {"answer": "回答B"})
+        cache.delete("b")
+        cache.close()
+        
+        restored = LRUTTLCache(max_entries=10, ttl=60, persist_path=path)
+        self.assertEqual(restored.get("a"), "回答A")
+        self.assertIsNone(restored.get("b"))
+        self.assertTrue(restored.get_stats()['persistent'])
+        restored.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
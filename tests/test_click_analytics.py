@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点击分析立方体测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import random
+import os
+import sys
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.click_analytics import ClickAnalytics
+from search_engine.data_service import DataService
+
+
+def legacy_click_patterns(samples):
+    """原 analyze_click_patterns 的DataFrame实现，作为对照"""
+    df = pd.DataFrame(samples)
+    stats = lambda column: df.groupby(column).agg({'clicked': ['count', 'sum', 'mean']}).round(4)
+    return {
+        'total_impressions': len(df),
+        'total_clicks': df['clicked'].sum(),
+        'overall_ctr': df['clicked'].sum() / len(df),
+        'position_analysis': stats('position').to_dict(),
+        'query_analysis': stats('query').head(10).to_dict(),
+        'doc_analysis': stats('doc_id').head(10).to_dict()
+    }
+
+
+def make_samples(count, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        position = rng.randint(1, 10)
+        samples.append({
+            'query': f"查询{rng.randint(0, 30)}",
+            'doc_id': f"doc_{rng.randint(0, 50)}",
+            'position': position,
+            'request_id': f"req_{i // 10}",
+            'timestamp': f"2026-10-{rng.randint(10, 14)}T12:00:00",
+            'clicked': 1 if rng.random() < 0.5 / position else 0
+        })
+    return samples
+
+
+class TestClickAnalytics(unittest.TestCase):
+    """点击分析测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.samples = make_samples(2000)
+
+    def assert_patterns_equal(self, actual, expected):
+        for key in ('total_impressions', 'total_clicks'):
+            self.assertEqual(actual[key], expected[key])
+        self.assertAlmostEqual(actual['overall_ctr'], expected['overall_ctr'])
+        for section in ('position_analysis', 'query_analysis', 'doc_analysis'):
+            self.assertEqual(list(actual[section]), list(expected[section]))
+            for column, values in expected[section].items():
+                self.assertEqual(list(actual[section][column]), list(values))
+                for key, value in values.items():
+                    self.assertAlmostEqual(actual[section][column][key], value, places=4)
+
+    def test_matches_legacy_dataframe_analysis(self):
+        """测试增量立方体与原DataFrame分析结果一致（含后续点击）"""
+        analytics = ClickAnalytics()
+        for sample in self.samples:
+            sample = dict(sample, clicked=0) if sample['request_id'] == 'req_3' else sample
+            analytics.add(sample)
+        for sample in self.samples:
+            if sample['request_id'] == 'req_3' and sample['clicked']:
+                analytics.mark_click(sample)
+        self.assert_patterns_equal(analytics.analyze_click_patterns(), legacy_click_patterns(self.samples))
+
+    def test_rebuild_matches_incremental(self):
+        """测试向量化重算与增量维护结果一致"""
+        incremental = ClickAnalytics()
+        for sample in self.samples:
+            incremental.add(sample)
+        rebuilt = ClickAnalytics()
+        rebuilt.rebuild(self.samples)
+        self.assertEqual({k: dict(v) for k, v in rebuilt.cubes.items()},
+                         {k: dict(v) for k, v in incremental.cubes.items()})
+        self.assertEqual(rebuilt.total_clicks, incremental.total_clicks)
+        rebuilt.rebuild([])
+        self.assertEqual(rebuilt.analyze_click_patterns(), {'error': '没有数据可分析'})
+
+    def test_position_curve_and_top(self):
+        """测试位置CTR曲线、热门查询和按日期过滤"""
+        analytics = ClickAnalytics()
+        analytics.rebuild(self.samples)
+        curve = analytics.position_ctr()
+        self.assertEqual([row['position'] for row in curve], list(range(1, 11)))
+        self.assertGreater(curve[0]['ctr'], curve[-1]['ctr'])
+        self.assertEqual(sum(row['impressions'] for row in curve), len(self.samples))
+
+        top = analytics.top('query', n=3)
+        counts = pd.Series([s['query'] for s in self.samples]).value_counts()
+        self.assertEqual(top[0]['impressions'], counts.iloc[0])
+
+        day_total = sum(row['impressions'] for row in analytics.position_ctr('2026-10-12', '2026-10-12'))
+        self.assertEqual(day_total, sum(1 for s in self.samples if s['timestamp'].startswith('2026-10-12')))
+        self.assertEqual(analytics.days(), [f"2026-10-{d}" for d in range(10, 15)])
+
+
+class TestDataServiceClickAnalytics(unittest.TestCase):
+    """数据服务点击分析集成测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_service = DataService(auto_save_interval=3600, batch_size=100000)
+        self.data_service.data_file = os.path.join(self.temp_dir, "test_ctr_data.json")
+        self.data_service.ctr_data = []
+        self.data_service._rebuild_ingest_state()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_patterns_follow_writes(self):
+        """测试写入展示和点击后分析结果与原始样本一致"""
+        for r in range(5):
+            for position in range(1, 6):
+                self.data_service.record_impression(f"查询{r % 2}", f"doc_{position}", position,
+                                                    0.5, "摘要", f"req_{r}")
+        self.data_service.record_click("doc_1", "req_0")
+        self.data_service.record_click("doc_1", "req_0")
+        self.data_service.batch_record_clicks([{'doc_id': 'doc_2', 'request_id': 'req_1'}])
+
+        patterns = self.data_service.get_click_patterns()
+        legacy = legacy_click_patterns(self.data_service.get_all_samples())
+        self.assertEqual(patterns['total_clicks'], 2)
+        self.assertEqual(patterns['position_analysis'], legacy['position_analysis'])
+        self.assertEqual(self.data_service.get_top_queries(1)[0]['key'], "查询0")
+        self.assertEqual(self.data_service.get_position_ctr()[0]['clicks'], 1)
+
+        before = self.data_service.get_click_patterns()
+        self.data_service.rebuild_click_analytics()
+        self.assertEqual(self.data_service.get_click_patterns(), before)
+
+        self.data_service.clear_data()
+        self.assertIn('error', self.data_service.get_click_patterns())
+
+
+if __name__ == '__main__':
+    unittest.main()
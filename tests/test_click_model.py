@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+位置偏差点击模型测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from search_engine.click_model import (PropensityStore, fit_pbm, fit_pbm_from_samples, position_decay,
+                                       position_decay_array)
+from search_engine.training_tab.ctr_model import CTRModel
+
+
+class TestClickModel(unittest.TestCase):
+    """点击模型测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_recovers_propensities(self):
+        """测试从随机位置的合成点击日志中还原位置倾向性"""
+        rng = np.random.default_rng(0)
+        num_impressions, num_pairs, num_positions = 200000, 2000, 5
+        true_theta = 0.9 / np.arange(1, num_positions + 1) ** 0.7
+        relevance = rng.beta(2, 3, num_pairs)
+        pairs = rng.integers(0, num_pairs, num_impressions)
+        positions = rng.integers(1, num_positions + 1, num_impressions)
+        clicks = (rng.random(num_impressions) < true_theta[positions - 1] * relevance[pairs]).astype(float)
+
+        result = fit_pbm(positions, clicks, pairs)
+        expected = true_theta / true_theta[0]
+        for k in range(1, num_positions + 1):
+            self.assertAlmostEqual(result['propensities'][k], expected[k - 1], delta=0.05)
+        self.assertEqual(result['impressions'], num_impressions)
+        self.assertEqual(result['clicks'], int(clicks.sum()))
+
+    def test_fit_from_samples_and_store(self):
+        """测试从CTR样本拟合并读写倾向性表"""
+        samples = []
+        for i in range(60):
+            for position in (1, 2, 3):
+                samples.append({'query': f"q{i % 6}", 'doc_id': f"d{(i + position) % 9}", 'position': position,
+                                'clicked': 1 if (i + position) % (position + 1) == 0 else 0})
+        result = fit_pbm_from_samples(samples, min_support=10)
+        self.assertEqual(sorted(result['propensities']), [1, 2, 3])
+        self.assertEqual(result['propensities'][1], 1.0)
+
+        store = PropensityStore(os.path.join(self.temp_dir, "propensities.json"))
+        self.assertEqual(store.get_propensities(), {})
+        store.save(result)
+        self.assertEqual(store.get_propensities(), result['propensities'])
+        self.assertEqual(store.load_result()['impressions'], len(samples))
+        store.clear()
+        self.assertEqual(store.get_propensities(), {})
+
+    def test_position_decay(self):
+        """测试位置衰减的回退公式和表外外推"""
+        self.assertAlmostEqual(position_decay(3), 0.25)
+        table = {1: 1.0, 2: 0.6, 4: 0.3}
+        decay = position_decay_array(np.array([[1], [2], [3], [4], [9]]), table)
+        self.assertEqual(decay.shape, (5, 1))
+        self.assertAlmostEqual(decay[2, 0], 0.6 * 3 / 4)
+        self.assertAlmostEqual(decay[3, 0], 0.3)
+        self.assertAlmostEqual(decay[4, 0], 0.3 * 5 / 10)
+
+        # 缺少位置1时以1.0为基准，保持单调
+        decay = position_decay_array(np.array([1, 2, 3, 4]), {2: 0.6, 3: 0.5})
+        np.testing.assert_allclose(decay, [1.0, 0.6, 0.5, 0.5 * 4 / 5])
+
+    def test_ctr_model_uses_propensities(self):
+        """测试CTR模型特征使用模型自身保存的倾向性表"""
+        samples = [{'query': "机器学习", 'doc_id': f"d{p}", 'position': p, 'summary': "机器学习入门",
+                    'score': 0.5, 'clicked': 0, 'timestamp': ""} for p in (1, 2, 3)]
+        model = CTRModel()
+        features, _ = model.extract_features(samples)
+        self.assertAlmostEqual(features[2, 7], 0.25)
+
+        model.position_propensities = {1: 1.0, 2: 0.7, 3: 0.5}
+        features, _ = model.extract_features(samples)
+        self.assertAlmostEqual(features[2, 7], 0.5)
+        self.assertEqual(model.clone().position_propensities, model.position_propensities)
+
+
+if __name__ == '__main__':
+    unittest.main()
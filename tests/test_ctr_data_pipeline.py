@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR流式训练数据管道测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import random
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from search_engine.training_tab.ctr_data_pipeline import (CACHE_ROW_DIM, FEATURE_DIM, StreamingFeatureExtractor,
+                                                          build_feature_cache, is_validation_sample,
+                                                          iter_ctr_samples)
+from search_engine.training_tab.ctr_model import CTRModel
+
+
+def make_samples(count: int):
+    """构造按时间顺序写入的CTR样本"""
+    return [{
+        'request_id': f"req_{i // 5}",
+        'query': ("机器学习", "深度学习", "搜索引擎")[i % 3],
+        'doc_id': f"doc{i % 7}",
+        'position': i % 5 + 1,
+        'summary': f"关于机器学习和搜索引擎的文档{i % 4}",
+        'score': round(0.1 * (i % 9), 2),
+        'clicked': 1 if i % 4 == 0 else 0,
+        'timestamp': f"2024-01-01T10:{i // 60:02d}:{i % 60:02d}",
+        'click_time': f"2024-01-01T11:00:{i % 60:02d}" if i % 4 == 0 else None
+    } for i in range(count)]
+
+
+class TestCTRDataPipeline(unittest.TestCase):
+    """CTR数据管道测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.samples = make_samples(50)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name: str, samples, json_lines: bool = False) -> str:
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            if json_lines:
+                for sample in samples:
+                    f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+            else:
+                json.dump(samples, f, ensure_ascii=False, indent=2)
+        return path
+
+    def test_iter_ctr_samples(self):
+        """测试JSON数组和JSON Lines分块读取，对象跨越读取边界时仍能完整解析"""
+        for path in (self._write("data.json", self.samples),
+                     self._write("data.jsonl", self.samples, json_lines=True)):
+            chunks = list(iter_ctr_samples(path, chunk_size=16, read_size=37))
+            self.assertEqual([len(c) for c in chunks], [16, 16, 16, 2])
+            self.assertEqual([s for c in chunks for s in c], self.samples)
+
+        self.assertEqual(list(iter_ctr_samples(self._write("empty.json", []))), [])
+
+        broken = os.path.join(self.temp_dir, "broken.json")
+        with open(broken, 'w', encoding='utf-8') as f:
+            f.write('[{"query": "机器学习"}, {"query": ')
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_ctr_samples(broken, read_size=8))
+
+    def test_streaming_matches_extract_features(self):
+        """测试分块流式特征与CTRModel.extract_features在同一日志上一致"""
+        model = CTRModel()
+        model.position_propensities = {1: 1.0, 2: 0.6, 3: 0.45}
+        expected, expected_labels = model.extract_features(self.samples)
+
+        extractor = StreamingFeatureExtractor(model.position_propensities)
+        parts = [extractor.transform(chunk) for chunk in iter_ctr_samples(self._write("data.json", self.samples),
+                                                                          chunk_size=7)]
+        features = np.vstack([p[0] for p in parts])
+        self.assertEqual(features.shape, (len(self.samples), FEATURE_DIM))
+        np.testing.assert_allclose(features, expected, rtol=1e-5)
+        np.testing.assert_array_equal(np.concatenate([p[1] for p in parts]), expected_labels)
+
+        # 块内乱序时同样按时间戳累积历史统计
+        shuffled = list(self.samples)
+        random.Random(0).shuffle(shuffled)
+        expected, _ = model.extract_features(shuffled)
+        features, _ = StreamingFeatureExtractor(model.position_propensities).transform(shuffled)
+        np.testing.assert_allclose(features, expected, rtol=1e-5)
+
+    def test_is_validation_sample(self):
+        """测试按请求ID哈希稳定划分验证集"""
+        flags = [is_validation_sample(s, 0.3) for s in self.samples]
+        self.assertEqual(flags, [is_validation_sample(s, 0.3) for s in self.samples])
+        # 同一请求的展示落在同一侧
+        for i in range(0, len(self.samples), 5):
+            self.assertEqual(len(set(flags[i:i + 5])), 1)
+        self.assertFalse(any(is_validation_sample(s, 0.0) for s in self.samples))
+        self.assertTrue(all(is_validation_sample(s, 1.0) for s in self.samples))
+
+    def test_build_feature_cache(self):
+        """测试特征缓存布局、标准化统计、样本统计和检查点"""
+        data_file = self._write("data.json", self.samples)
+        cache_path = os.path.join(self.temp_dir, "cache", "features.bin")
+        cache = build_feature_cache(data_file, cache_path, chunk_size=8, validation_split=0.3)
+
+        rows = np.fromfile(cache_path, dtype=np.float32).reshape(-1, CACHE_ROW_DIM)
+        self.assertEqual(len(rows), len(self.samples))
+        expected, labels = CTRModel().extract_features(self.samples)
+        np.testing.assert_allclose(rows[:, :FEATURE_DIM], expected, rtol=1e-5)
+        np.testing.assert_array_equal(rows[:, FEATURE_DIM], labels)
+        is_val = np.array([is_validation_sample(s, 0.3) for s in self.samples], dtype=np.float32)
+        np.testing.assert_array_equal(rows[:, -1], is_val)
+
+        stats = cache['stats']
+        self.assertEqual(stats['total_samples'], len(self.samples))
+        self.assertEqual(stats['click_samples'], int(labels.sum()))
+        self.assertEqual(stats['test_samples'], int(is_val.sum()))
+        self.assertEqual(stats['train_samples'] + stats['test_samples'], len(self.samples))
+        self.assertEqual(stats['train_clicks'] + stats['test_clicks'], stats['click_samples'])
+        # 标准化器只使用训练集样本
+        np.testing.assert_allclose(cache['scaler'].mean_, expected[is_val == 0].mean(axis=0), rtol=1e-4)
+        # 检查点包含晚于展示到达的点击时间
+        self.assertEqual(cache['trained_until'], "2024-01-01T11:00:48")
+        self.assertEqual(sum(entry[0] for entry in cache['history']['query'].values()), len(self.samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
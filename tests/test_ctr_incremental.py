@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CTR模型增量训练测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from search_engine.model_service import ModelService
+from search_engine.training_tab.ctr_model import CTRModel
+from search_engine.training_tab.ctr_data_pipeline import new_history_stats, sample_updated_at
+
+
+def make_samples(day: int, count: int):
+    """构造某一天的CTR样本（每条样本一个请求ID）"""
+    return [{
+        'request_id': f"req_{day}_{i}",
+        'query': f"查询{i % 4}",
+        'doc_id': f"doc{i % 6}",
+        'position': i % 5 + 1,
+        'summary': "机器学习入门教程",
+        'score': 0.5,
+        'clicked': 1 if i % 3 == 0 else 0,
+        'timestamp': f"2024-02-{day:02d}T10:00:{i:02d}"
+    } for i in range(count)]
+
+
+def make_trained_model(history_samples) -> CTRModel:
+    """构造一个无需训练的小模型，检查点和历史统计来自history_samples"""
+    model = CTRModel()
+    model.model = model._build_wide_deep_model(input_dim=model.feature_dim)
+    model.history_stats = new_history_stats()
+    features, _ = model.extract_features(history_samples, model.history_stats)
+    model.scaler = StandardScaler().fit(features)
+    model.is_trained = True
+    model.trained_until = max(sample_updated_at(s) for s in history_samples)
+    return model
+
+
+class FakeDataService:
+    """只提供get_all_samples的数据服务"""
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def get_all_samples(self):
+        return list(self.samples)
+
+
+class TestCTRIncremental(unittest.TestCase):
+    """CTR增量训练测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.old_samples = make_samples(1, 30)
+        self.new_samples = make_samples(2, 40)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_history_features(self):
+        """测试历史CTR特征按时间顺序累积，并在传入的历史统计基础上继续计算"""
+        samples = [
+            {'query': "q", 'doc_id': "d2", 'position': 1, 'summary': "s", 'score': 0.1, 'clicked': 0,
+             'timestamp': "2024-01-01T00:00:02"},
+            {'query': "q", 'doc_id': "d1", 'position': 2, 'summary': "s", 'score': 0.1, 'clicked': 1,
+             'timestamp': "2024-01-01T00:00:01"},
+        ]
+        model = CTRModel()
+        features, _ = model.extract_features(samples)
+        # 第二条样本时间更早，没有历史；第一条样本看到它的点击
+        self.assertAlmostEqual(features[1, 5], 0.1)
+        self.assertAlmostEqual(features[0, 5], 1.0)
+
+        history = {'query': {"q": [4, 1]}, 'doc': {"d1": [2, 2]}}
+        features, _ = model.extract_features(samples, history)
+        self.assertAlmostEqual(features[1, 5], 0.25)
+        self.assertAlmostEqual(features[1, 6], 1.0)
+        self.assertAlmostEqual(features[0, 5], 2 / 5)
+        self.assertAlmostEqual(features[0, 6], 0.1)
+        self.assertEqual(history['query']["q"], [6, 2])
+
+    def test_train_incremental(self):
+        """测试增量训练推进检查点、累积历史统计并在留出样本上评估"""
+        model = make_trained_model(self.old_samples)
+        checkpoint = model.trained_until
+        query_impressions = sum(entry[0] for entry in model.history_stats['query'].values())
+
+        # 样本不足时失败，模型状态不变
+        result = model.train_incremental(self.new_samples[:2], epochs=1)
+        self.assertNotIn('success', result)
+        self.assertEqual(model.trained_until, checkpoint)
+
+        result = model.train_incremental(self.new_samples, epochs=1)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['eval_set'], 'holdout')
+        self.assertEqual(result['train_samples'] + result['eval_samples'], len(self.new_samples))
+        self.assertGreater(result['eval_samples'], 0)
+        self.assertEqual(model.trained_until, max(sample_updated_at(s) for s in self.new_samples))
+        self.assertEqual(result['trained_until'], model.trained_until)
+        self.assertEqual(sum(entry[0] for entry in model.history_stats['query'].values()),
+                         query_impressions + len(self.new_samples))
+
+        # 历史统计随模型保存和加载
+        path = os.path.join(self.temp_dir, "ctr_model.h5")
+        model.save_model(path)
+        loaded = CTRModel()
+        self.assertTrue(loaded.load_model(path))
+        self.assertEqual(loaded.history_stats, model.history_stats)
+        self.assertEqual(loaded.trained_until, model.trained_until)
+
+    def test_service_incremental_swap(self):
+        """测试服务增量训练只使用检查点之后的样本，并在副本上训练后原子替换"""
+        service = ModelService(model_file=os.path.join(self.temp_dir, "ctr_model.pkl"),
+                               registry_dir=os.path.join(self.temp_dir, "registry"))
+        serving = make_trained_model(self.old_samples)
+        service.ctr_model = serving
+        checkpoint = serving.trained_until
+        weights = [w.copy() for w in serving.model.get_weights()]
+
+        # 检查点之后没有新样本：训练失败，服务模型不变
+        result = service.train_model(FakeDataService(self.old_samples), mode="incremental")
+        self.assertFalse(result['success'])
+        self.assertIs(service.ctr_model, serving)
+
+        result = service.train_model(FakeDataService(self.old_samples + self.new_samples), mode="incremental")
+        self.assertTrue(result['success'])
+        self.assertEqual(result['train_samples'] + result['eval_samples'], len(self.new_samples))
+        self.assertIsNot(service.ctr_model, serving)
+        self.assertEqual(service.current_version, result['version'])
+        self.assertGreater(service.ctr_model.trained_until, checkpoint)
+
+        # 原服务模型未被修改，可用于回滚
+        self.assertEqual(serving.trained_until, checkpoint)
+        for expected, actual in zip(weights, serving.model.get_weights()):
+            np.testing.assert_array_equal(expected, actual)
+        self.assertTrue(service.rollback())
+        self.assertIs(service.ctr_model, serving)
+
+
+if __name__ == '__main__':
+    unittest.main()
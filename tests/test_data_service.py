@@ -8,9 +8,11 @@ import unittest
 import tempfile
 import os
 import sys
+from unittest.mock import patch
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from search_engine.data_service import DataService
+from search_engine.impression_dedup import DedupConfig, ImpressionDeduplicator
 import json
 
 
@@ -222,6 +224,73 @@ class TestDataService(unittest.TestCase):
         # 点击率低应该有警告
         self.assertIn('点击率过低', str(health['data_issues']))
     
+    def test_health_counters_incremental(self):
+        """测试健康检查计数器在写入时增量维护"""
+        self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        self.data_service.record_impression("查询", "doc2", 2, 0.7, "摘要", "req1")
+        self.data_service.record_click("doc2", "req1")
+        
+        health = self.data_service.get_data_health_check()
+        self.assertEqual(health['counters']['total_samples'], 3)
+        self.assertEqual(health['counters']['duplicate_samples'], 1)
+        self.assertEqual(health['counters']['clicked_samples'], 1)
+        self.assertIn('发现1条重复记录', health['data_issues'])
+    
+    def test_query_counts_incremental(self):
+        """测试查询搜索次数按不同request_id增量统计"""
+        self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        self.data_service.record_impression("查询", "doc2", 2, 0.7, "摘要", "req1")
+        self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req2")
+        self.data_service.record_impression("其他查询", "doc1", 1, 0.8, "摘要", "req3")
+        self.assertEqual(self.data_service.get_query_counts(), {"查询": 2, "其他查询": 1})
+        
+        self.data_service.clear_data()
+        self.assertEqual(self.data_service.get_query_counts(), {})
+    
+    def test_dedup_drop_duplicates(self):
+        """测试配置丢弃时重复展示被计数并丢弃"""
+        service = DataService(dedup_config=DedupConfig(drop_duplicates=True))
+        service.data_file = os.path.join(self.temp_dir, "dedup_ctr_data.json")
+        
+        first = service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        retried = service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        service.record_impression("查询", "doc1", 2, 0.8, "摘要", "req1")
+        
+        self.assertIs(retried, first)
+        self.assertEqual(len(service.get_all_samples()), 2)
+        stats = service.get_dedup_stats()
+        self.assertEqual(stats['duplicates'], 1)
+        self.assertEqual(stats['dropped'], 1)
+    
+    def test_full_audit(self):
+        """测试后台全量审计"""
+        self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        self.data_service.record_impression("查询", "doc2", 2, 0.7, "摘要", "req1")
+        
+        self.data_service.start_full_audit()
+        self.data_service._audit_thread.join(timeout=5)
+        
+        status = self.data_service.get_audit_status()
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['progress'], 1.0)
+        self.assertTrue(status['counters_consistent'])
+        self.assertEqual(status['result']['total_samples'], 2)
+    
+    def test_probable_duplicate_not_counted(self):
+        """测试布隆过滤器误判的疑似重复不计入重复样本，增量计数器与全量审计一致"""
+        deduplicator = self.data_service._deduplicator
+        with patch.object(deduplicator, 'observe',
+                          return_value=(ImpressionDeduplicator.PROBABLE_DUPLICATE, None)):
+            self.data_service.record_impression("查询", "doc1", 1, 0.8, "摘要", "req1")
+        
+        self.assertEqual(self.data_service._health_counters['total_samples'], 1)
+        self.assertEqual(self.data_service._health_counters['duplicate_samples'], 0)
+        
+        self.data_service.start_full_audit()
+        self.data_service._audit_thread.join(timeout=5)
+        self.assertTrue(self.data_service.get_audit_status()['counters_consistent'])
+    
     def test_time_range_query(self):
         """测试时间范围查询"""
         # 添加测试数据
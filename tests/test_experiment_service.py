@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实验服务测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import sqlite3
+import time
+import os
+import sys
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.experiment_service import ExperimentService, ExperimentConfig
+from search_engine.metrics import get_histogram
+
+
+class TestExperimentService(unittest.TestCase):
+    """实验服务测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.temp_dir, "experiments.json")
+        self.services = []
+
+    def tearDown(self):
+        """测试后清理"""
+        for service in self.services:
+            service.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _service(self, **kwargs) -> ExperimentService:
+        service = ExperimentService(data_file=self.data_file, **kwargs)
+        self.services.append(service)
+        return service
+
+    def _config(self, name: str) -> ExperimentConfig:
+        return ExperimentConfig(name=name, description=f"{name}描述", algorithms=["tfidf", "ctr"],
+                                metrics=["ndcg"], duration_days=7, traffic_split=0.5)
+
+    def test_lifecycle_and_persistence(self):
+        """测试实验状态流转和重启后恢复"""
+        service = self._service()
+        experiment_id = service.create_experiment(self._config("排序实验"))
+        draft_id = service.create_experiment(self._config("草稿实验"))
+        self.assertTrue(service.start_experiment(experiment_id))
+        self.assertFalse(service.start_experiment(experiment_id))
+        self.assertTrue(service.record_result(experiment_id, "ctr", {'ndcg': 0.5}, 10, 2))
+        self.assertFalse(service.record_result("missing", "ctr", {'ndcg': 0.5}, 10, 2))
+        self.assertTrue(service.stop_experiment(experiment_id))
+        service.close()
+
+        reopened = self._service()
+        self.assertEqual(reopened.experiments[experiment_id]['status'], 'completed')
+        self.assertEqual(len(reopened.get_experiment_results(experiment_id)), 1)
+        # 未启动的实验排在最后
+        listed = reopened.list_experiments()
+        self.assertEqual([s['experiment_id'] for s in listed], [experiment_id, draft_id])
+        self.assertEqual([s['experiment_id'] for s in reopened.list_experiments(status='draft')], [draft_id])
+
+    def test_batched_writes_and_aggregates(self):
+        """测试批量写入与汇总表结果和逐条计算一致"""
+        service = self._service(batch_size=50, flush_interval=3600)
+        experiment_id = service.create_experiment(self._config("批量实验"))
+        expected = {}
+        for i in range(120):
+            algorithm = ("tfidf", "ctr", "bm25")[i % 3]
+            samples, clicks, ndcg = 10 + i % 7, i % 4, (i % 10) / 10
+            service.record_result(experiment_id, algorithm, {'ndcg': ndcg}, samples, clicks)
+            entry = expected.setdefault(algorithm, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += samples
+            entry[2] += clicks
+            entry[3] += ndcg
+
+        # 两批已落盘，剩余20条仍在缓冲中
+        with sqlite3.connect(service.db_file) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM results").fetchone()[0], 100)
+        self.assertEqual(service.get_experiment_stats()['total_results'], 120)
+
+        comparison = service.compare_algorithms(experiment_id)
+        for algorithm, (count, samples, clicks, ndcg_sum) in expected.items():
+            stats = comparison[algorithm]
+            self.assertEqual(stats['result_count'], count)
+            self.assertEqual(stats['total_samples'], samples)
+            self.assertEqual(stats['total_clicks'], clicks)
+            self.assertAlmostEqual(stats['avg_click_rate'], clicks / samples)
+            self.assertAlmostEqual(stats['avg_metrics']['ndcg'], ndcg_sum / count)
+
+        results = service.get_experiment_results(experiment_id)
+        self.assertEqual(len(results), 120)
+        self.assertEqual(results[0]['algorithm'], "tfidf")
+        summary = service.get_experiment_summary(experiment_id)
+        self.assertEqual(summary['total_results'], 120)
+        self.assertEqual(summary['algorithms_tested'], 3)
+
+        self.assertTrue(service.delete_experiment(experiment_id))
+        self.assertEqual(service.get_experiment_results(experiment_id), [])
+        self.assertEqual(service.get_experiment_stats()['total_results'], 0)
+
+    def test_invalid_results(self):
+        """测试非数值指标被拒绝，无法写入的结果不会阻塞后续批次"""
+        service = self._service(batch_size=10, flush_interval=3600)
+        experiment_id = service.create_experiment(self._config("校验实验"))
+        self.assertFalse(service.record_result(experiment_id, "ctr", {'ndcg': "高"}, 10, 2))
+        self.assertFalse(service.record_result(experiment_id, "ctr", {'ndcg': float('nan')}, 10, 2))
+        self.assertTrue(service.record_result(experiment_id, "ctr", {'ndcg': "0.5"}, 10, 2))
+        self.assertEqual(service._pending[0]['metrics'], {'ndcg': 0.5})
+
+        # 绕过校验写入缓冲的坏结果在落盘时被移出，其余结果正常写入
+        service._pending.append(dict(service._pending[0], metrics={'ndcg': "高"}))
+        service.record_result(experiment_id, "tfidf", {'ndcg': 0.3}, 10, 1)
+        self.assertEqual(service.flush(), 2)
+        self.assertEqual(service._pending, [])
+        self.assertEqual(len(service._rejected), 1)
+        self.assertEqual(service.flush(), 0)
+
+        comparison = service.compare_algorithms(experiment_id)
+        self.assertEqual(comparison['ctr']['result_count'], 1)
+        self.assertAlmostEqual(comparison['ctr']['avg_metrics']['ndcg'], 0.5)
+        self.assertEqual(comparison['tfidf']['result_count'], 1)
+
+    def test_flush_error_counted_once(self):
+        """测试数据库暂时不可用时保留缓冲，每次失败的落盘只计一次错误"""
+        service = self._service(batch_size=10, flush_interval=3600)
+        experiment_id = service.create_experiment(self._config("故障实验"))
+        service.record_result(experiment_id, "ctr", {'ndcg': 0.5}, 10, 2)
+        histogram = get_histogram("experiment.save")
+        before = histogram.snapshot()
+
+        with mock.patch.object(service, '_insert_results', side_effect=sqlite3.OperationalError("database is locked")):
+            self.assertEqual(service.flush(), 0)
+        after = histogram.snapshot()
+        self.assertEqual(after['requests'] - before['requests'], 1)
+        self.assertEqual(after['errors'] - before['errors'], 1)
+        self.assertEqual(len(service._pending), 1)
+
+        self.assertEqual(service.flush(), 1)
+        self.assertEqual(service._pending, [])
+
+    def test_timer_flush(self):
+        """测试没有新结果时后台定时器也会落盘缓冲中的结果"""
+        service = self._service(batch_size=100, flush_interval=0.2)
+        experiment_id = service.create_experiment(self._config("定时实验"))
+        service.record_result(experiment_id, "ctr", {'ndcg': 0.5}, 10, 2)
+        self.assertEqual(len(service._pending), 1)
+        deadline = time.time() + 2
+        while service._pending and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(service._pending, [])
+        with sqlite3.connect(service.db_file) as db:
+            self.assertEqual(db.execute("SELECT COUNT(*) FROM results").fetchone()[0], 1)
+
+    def test_migrate_json(self):
+        """测试首次启动时导入旧版JSON数据且只导入一次"""
+        legacy = {
+            'experiments': {
+                'exp_old': {'id': 'exp_old', 'config': {'name': "旧实验", 'description': "", 'duration_days': 7},
+                            'created_time': "2024-01-01T00:00:00", 'status': 'running',
+                            'start_time': "2024-01-01T00:00:00"}
+            },
+            'results': {
+                f"exp_old_ctr_{i}": {'experiment_id': 'exp_old', 'algorithm': 'ctr', 'metrics': {'ndcg': 0.4},
+                                     'sample_count': 10, 'click_count': 1, 'click_rate': 0.1,
+                                     'timestamp': f"2024-01-01T00:00:0{i}"}
+                for i in range(3)
+            }
+        }
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, ensure_ascii=False)
+
+        service = self._service()
+        self.assertEqual(service.get_experiment_summary('exp_old')['total_results'], 3)
+        self.assertTrue(os.path.exists(self.data_file))
+        service.close()
+
+        reopened = self._service()
+        self.assertEqual(len(reopened.get_experiment_results('exp_old')), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
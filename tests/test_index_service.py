@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+倒排索引服务测试用例
+"""
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.index_service import InvertedIndexService
+
+
+class TestInvertedIndexService(unittest.TestCase):
+    """倒排索引服务测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.service = InvertedIndexService(os.path.join(self.temp_dir, "index.json"))
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_query_cache_hit(self):
+        """测试规范化后相同的查询命中缓存"""
+        first = self.service.search("机器学习", top_k=5)
+        second = self.service.search("  机器学习 ", top_k=5)
+        self.assertEqual(first, second)
+        
+        stats = self.service.get_stats()['query_cache']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        
+        # top_k不同视为不同查询
+        self.service.search("机器学习", top_k=3)
+        self.assertEqual(self.service.get_stats()['query_cache']['misses'], 2)
+    
+    def test_cache_invalidated_by_index_changes(self):
+        """测试文档增删和清空索引使缓存失效"""
+        before = self.service.search("拓扑绝缘体", top_k=5)
+        self.assertEqual(before, [])
+        
+        self.service.add_document("topology", "拓扑绝缘体是一种特殊材料")
+        self.assertEqual(self.service.search("拓扑绝缘体", top_k=5)[0][0], "topology")
+        
+        self.service.delete_document("topology")
+        self.assertEqual(self.service.search("拓扑绝缘体", top_k=5), [])
+        
+        generation = self.service.generation
+        self.service.clear_index()
+        self.assertGreater(self.service.generation, generation)
+        self.assertEqual(self.service.search("机器学习", top_k=5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
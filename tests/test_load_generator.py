@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开环负载生成器测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import time
+import threading
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'tools'))
+
+from load_generator import (ZipfQueryMix, LoadGenerator, load_query_counts, record_corrected,
+                            find_max_qps, meets_slo)
+from search_engine.metrics import LatencyHistogram
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """负载生成器测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_query_mix_from_ctr_log(self):
+        """测试按不同请求数统计查询热度并做Zipf抽样"""
+        samples = []
+        for query, requests in (("机器学习", 5), ("深度学习", 2), ("搜索引擎", 1)):
+            for r in range(requests):
+                for position in (1, 2, 3):
+                    samples.append({'query': query, 'request_id': f"{query}_{r}", 'position': position})
+        path = os.path.join(self.temp_dir, "ctr_data.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(samples, f, ensure_ascii=False)
+
+        self.assertEqual(load_query_counts(path)["机器学习"], 5)
+        mix = ZipfQueryMix.from_ctr_log(path, s=1.0, seed=1)
+        self.assertEqual(mix.queries, ["机器学习", "深度学习", "搜索引擎"])
+        drawn = [mix.sample() for _ in range(6000)]
+        # 权重 1 : 1/2 : 1/3
+        self.assertAlmostEqual(drawn.count("机器学习") / 6000, 6 / 11, delta=0.03)
+        self.assertAlmostEqual(drawn.count("搜索引擎") / 6000, 2 / 11, delta=0.03)
+
+        self.assertTrue(ZipfQueryMix.from_ctr_log(os.path.join(self.temp_dir, "missing.json")).queries)
+
+    def test_record_corrected(self):
+        """测试按期望间隔回填被遗漏的样本"""
+        histogram = LatencyHistogram("test")
+        record_corrected(histogram, 1.0, 0.1)
+        # 1.0, 0.9, ..., 0.1 共10个样本
+        self.assertEqual(histogram.snapshot()['requests'], 10)
+        record_corrected(histogram, 0.05, 0.1)
+        self.assertEqual(histogram.snapshot()['requests'], 11)
+
+    def test_open_loop_counts_queueing_delay(self):
+        """测试开环模式下单次停顿造成的排队延迟计入响应时间"""
+        stalled = threading.Event()
+
+        def target(query):
+            if not stalled.is_set():
+                stalled.set()
+                time.sleep(0.3)
+
+        generator = LoadGenerator(target, ZipfQueryMix(["q"]), workers=1, seed=3)
+        report = generator.run_open_loop(qps=200, duration=1.0)
+        self.assertGreater(report['sent'], 120)
+        self.assertEqual(report['errors'], 0)
+        # 停顿期间计划发送的约60个请求都在排队，p90以上的响应时间远大于服务时间
+        self.assertGreater(report['latency']['max_ms'], 250)
+        self.assertGreater(report['latency']['p90_ms'], 50)
+        self.assertLess(report['service_time']['p90_ms'], 5)
+
+    def test_closed_loop_correction(self):
+        """测试闭环模式下校正后的分位数高于原始分位数"""
+        calls = []
+
+        def target(query):
+            calls.append(query)
+            if len(calls) == 5:
+                time.sleep(0.3)
+
+        generator = LoadGenerator(target, ZipfQueryMix(["q"]), workers=1)
+        report = generator.run_closed_loop(qps=100, duration=0.8)
+        self.assertLess(report['latency_uncorrected']['p90_ms'], 5)
+        self.assertGreater(report['latency']['p90_ms'], report['latency_uncorrected']['p90_ms'] + 50)
+
+    def test_errors_counted(self):
+        """测试目标函数抛出异常计为错误"""
+        def target(query):
+            raise RuntimeError("boom")
+
+        report = LoadGenerator(target, ZipfQueryMix(["q"]), workers=2).run_open_loop(qps=100, duration=0.3)
+        self.assertEqual(report['errors'], report['completed'])
+        self.assertFalse(meets_slo(report, slo_p99_ms=1000))
+
+    def test_find_max_qps(self):
+        """测试倍增 + 二分搜索最大可持续QPS"""
+        def fake_run(qps):
+            p99 = 10.0 if qps <= 130 else 500.0
+            return {'target_qps': qps, 'achieved_qps': qps, 'error_rate': 0.0, 'latency': {'p99_ms': p99}}
+
+        result = find_max_qps(fake_run, slo_p99_ms=100, start_qps=10, precision=0.05, log=lambda _: None)
+        self.assertLessEqual(result['max_qps'], 130)
+        self.assertGreater(result['max_qps'], 130 * 0.95)
+        self.assertEqual(result['steps'][0]['target_qps'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
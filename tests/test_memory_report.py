@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存统计测试用例
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.memory_report import MemoryAccountant, deep_sizeof
+from search_engine.cache import LRUTTLCache
+from search_engine.index_tab.offline_index import InvertedIndex
+
+
+class TestDeepSizeof(unittest.TestCase):
+    """deep_sizeof测试类"""
+
+    def test_sampled_estimate_close_to_exact(self):
+        """测试抽样估算与精确遍历接近"""
+        data = {f"term_{i}": {f"doc_{j}": j for j in range(i % 20 + 1)} for i in range(5000)}
+        exact = deep_sizeof(data, sample_size=0)
+        estimate = deep_sizeof(data, sample_size=100)
+        self.assertAlmostEqual(estimate / exact, 1.0, delta=0.1)
+        self.assertEqual(estimate, deep_sizeof(data, sample_size=100))
+
+    def test_shared_objects_counted_once(self):
+        """测试同一对象只计一次"""
+        payload = "内容" * 1000
+        single = deep_sizeof([payload])
+        self.assertLess(deep_sizeof([payload, payload]) - single, sys.getsizeof(payload))
+
+    def test_numpy_and_objects(self):
+        """测试numpy数组按数据字节计入，普通对象按属性计入"""
+        matrix = np.zeros((1000, 64), dtype=np.float32)
+        self.assertGreaterEqual(deep_sizeof(matrix), matrix.nbytes)
+        self.assertGreaterEqual(deep_sizeof(matrix[:500]), matrix[:500].nbytes)
+
+        class Holder:
+            def __init__(self):
+                self.items = list(range(10000))
+
+        self.assertGreater(deep_sizeof(Holder()), sys.getsizeof(list(range(10000))))
+
+
+class TestMemoryAccountant(unittest.TestCase):
+    """MemoryAccountant测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.accountant = MemoryAccountant()
+        self.data = []
+        self.accountant.register_source("test", lambda: {'test.data': deep_sizeof(self.data)})
+
+    def tearDown(self):
+        """测试后清理"""
+        self.accountant.stop_tracemalloc()
+
+    def test_growth_tracking(self):
+        """测试多次采集后按组件报告增长"""
+        first = self.accountant.measure()
+        self.data.extend(str(i) * 20 for i in range(10000))
+        self.accountant.measure()
+        growth = self.accountant.growth()
+        self.assertEqual(growth[0]['component'], 'test.data')
+        self.assertGreater(growth[0]['delta_total'], 10000 * 20)
+        self.assertEqual(growth[0]['delta_total'], growth[0]['delta_last'])
+        self.assertEqual(len(self.accountant.get_history()), 2)
+        self.assertEqual(first['errors'], {})
+
+        families = self.accountant._collect_metrics()
+        self.assertEqual(families[0].name, 'search_memory_bytes')
+        self.assertEqual(families[0].samples[0][1], {'component': 'test.data'})
+
+    def test_failing_source(self):
+        """测试回调异常时记录错误，不影响其他组件"""
+        def broken():
+            raise RuntimeError("boom")
+
+        self.accountant.register_source("broken", broken)
+        report = self.accountant.measure()
+        self.assertIn('test.data', report['components'])
+        self.assertEqual(report['errors'], {'broken': 'boom'})
+
+    def test_tracemalloc_top(self):
+        """测试tracemalloc定位增长的代码行"""
+        self.assertEqual(self.accountant.tracemalloc_top(), [])
+        self.accountant.start_tracemalloc()
+        self.data.extend(bytearray(1000) for _ in range(2000))
+        top = self.accountant.tracemalloc_top(5)
+        self.assertTrue(top[0]['location'].startswith(__file__.rstrip('c')))
+        self.assertGreater(top[0]['size_diff'], 2000 * 1000)
+
+
+class TestSubsystemMemoryUsage(unittest.TestCase):
+    """各子系统内存估算测试类"""
+
+    def test_index_memory_usage(self):
+        """测试倒排索引各结构的内存估算"""
+        index = InvertedIndex()
+        before = index.get_memory_usage()
+        for i in range(50):
+            index.add_document(f"doc_{i}", f"人工智能与机器学习是第{i}个测试文档的主要内容")
+        after = index.get_memory_usage()
+        for key in ('index.postings', 'index.term_freq', 'index.documents', 'index.positions'):
+            self.assertGreater(after[key], before[key])
+
+    def test_cache_memory_usage(self):
+        """测试缓存条目的内存估算随条目增加"""
+        cache = LRUTTLCache(max_entries=100, ttl=None)
+        empty = cache.get_memory_usage()
+        for i in range(50):
+            cache.set(f"key_{i}", f"回答{i}" * 200)
+        self.assertGreater(cache.get_memory_usage() - empty, 50 * 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
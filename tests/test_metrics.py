@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内指标测试用例
+"""
+
+import unittest
+import random
+import threading
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine import metrics
+from search_engine.metrics import LatencyHistogram, bucket_index, bucket_bounds, BUCKET_COUNT
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """延迟直方图测试类"""
+    
+    def test_bucket_layout(self):
+        """测试分桶连续且覆盖取值"""
+        for i in range(BUCKET_COUNT - 1):
+            self.assertEqual(bucket_bounds(i)[1] + 1, bucket_bounds(i + 1)[0])
+        for micros in (0, 1, 127, 128, 255, 256, 999, 123456, 10 ** 9):
+            low, high = bucket_bounds(bucket_index(micros))
+            self.assertTrue(low <= micros <= high)
+            self.assertLessEqual(high - low, max(1, micros // 64))
+    
+    def test_percentiles_across_threads(self):
+        """测试多线程写入后的分位数精度"""
+        histogram = LatencyHistogram("test")
+        random.seed(7)
+        values = [random.expovariate(100) for _ in range(40000)]
+        
+        threads = [threading.Thread(target=lambda chunk: [histogram.record(v) for v in chunk],
+                                    args=(values[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        snap = histogram.snapshot()
+        self.assertEqual(snap['requests'], 40000)
+        ordered = sorted(values)
+        for key, q in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            exact = ordered[int(q * len(ordered)) - 1] * 1000
+            self.assertAlmostEqual(snap[key], exact, delta=exact * 0.02 + 0.002)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """阶段埋点测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        metrics.reset()
+    
+    def test_instrument_and_errors(self):
+        """测试装饰器、上下文管理器和错误计数"""
+        @metrics.instrument("test.stage")
+        def work(fail=False):
+            if fail:
+                raise RuntimeError("boom")
+            return 1
+        
+        work()
+        with self.assertRaises(RuntimeError):
+            work(fail=True)
+        with metrics.track("test.stage"):
+            pass
+        metrics.record_error("test.stage")
+        
+        snap = metrics.snapshot(["test.stage"])[0]
+        self.assertEqual(snap['requests'], 3)
+        self.assertEqual(snap['errors'], 2)
+        
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(["test.stage"])[0]['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
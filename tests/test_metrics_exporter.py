@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标注册表与OpenMetrics端点测试用例
+"""
+
+import unittest
+import urllib.request
+import urllib.error
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine import metrics_exporter
+from search_engine.metrics import MetricsRegistry, gauge_family, counter_family
+
+try:
+    from prometheus_client.openmetrics.parser import text_string_to_metric_families
+    HAS_PROMETHEUS_CLIENT = True
+except ImportError:
+    HAS_PROMETHEUS_CLIENT = False
+
+
+def parse_samples(text: str) -> dict:
+    """解析样本行为 {样本名{标签}: 值}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+class TestMetricsExporter(unittest.TestCase):
+    """指标暴露测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.registry = MetricsRegistry()
+        histogram = self.registry.histogram("index.retrieve")
+        for seconds in (0.0002, 0.003, 0.003, 0.04, 2.0):
+            histogram.record(seconds)
+        histogram.record_error()
+        self.registry.counter("search_requests", "搜索请求数").inc(3, mode="tfidf")
+        self.registry.gauge("search_queue_depth", "队列深度").set(7)
+        self.registry.register_collector("svc", lambda: [
+            gauge_family('search_cache_hit_ratio', '命中率', 0.25),
+            counter_family('search_cache_requests', '查找次数', [({'result': 'hit'}, 1), ({'result': 'miss'}, 3)])
+        ])
+
+    def tearDown(self):
+        """测试后清理"""
+        metrics_exporter.stop_metrics_server()
+
+    def test_render_openmetrics(self):
+        """测试OpenMetrics文本格式"""
+        text = metrics_exporter.render(self.registry)
+        self.assertTrue(text.endswith('# EOF\n'))
+        self.assertIn('# TYPE search_requests counter', text)
+        self.assertIn('# TYPE search_stage_latency_seconds histogram', text)
+
+        samples = parse_samples(text)
+        self.assertEqual(samples['search_requests_total{mode="tfidf"}'], 3)
+        self.assertEqual(samples['search_queue_depth'], 7)
+        self.assertEqual(samples['search_cache_hit_ratio'], 0.25)
+        self.assertEqual(samples['search_cache_requests_total{result="miss"}'], 3)
+        self.assertEqual(samples['search_stage_errors_total{stage="index.retrieve"}'], 1)
+
+        # 直方图分桶累计且 +Inf 桶等于总数
+        buckets = [(k, v) for k, v in samples.items() if k.startswith('search_stage_latency_seconds_bucket')]
+        counts = [v for _, v in buckets]
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(samples['search_stage_latency_seconds_bucket{stage="index.retrieve",le="0.005"}'], 3)
+        self.assertEqual(samples['search_stage_latency_seconds_bucket{stage="index.retrieve",le="+Inf"}'], 5)
+        self.assertEqual(samples['search_stage_latency_seconds_count{stage="index.retrieve"}'], 5)
+        self.assertAlmostEqual(samples['search_stage_latency_seconds_sum{stage="index.retrieve"}'], 2.0462, places=3)
+
+    def test_prometheus_text_format(self):
+        """测试旧版文本格式中计数器的HELP/TYPE使用完整样本名"""
+        text = metrics_exporter.render(self.registry, openmetrics=False)
+        self.assertIn('# TYPE search_requests_total counter', text)
+        self.assertNotIn('# EOF', text)
+
+    @unittest.skipUnless(HAS_PROMETHEUS_CLIENT, "需要 prometheus-client")
+    def test_parseable_by_prometheus_parser(self):
+        """测试输出能被OpenMetrics解析器解析"""
+        families = {f.name: f for f in text_string_to_metric_families(metrics_exporter.render(self.registry))}
+        self.assertEqual(families['search_stage_latency_seconds'].type, 'histogram')
+        self.assertEqual(families['search_requests'].type, 'counter')
+
+    def test_failing_collector_isolated(self):
+        """测试单个采集回调失败不影响其它指标"""
+        def broken():
+            raise RuntimeError("boom")
+        self.registry.register_collector("broken", broken)
+        samples = parse_samples(metrics_exporter.render(self.registry))
+        self.assertEqual(samples['search_queue_depth'], 7)
+
+    def test_http_scrape(self):
+        """测试HTTP抓取端点"""
+        server = metrics_exporter.start_metrics_server(port=0, host='127.0.0.1', registry=self.registry)
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+
+        request = urllib.request.Request(url, headers={'Accept': 'application/openmetrics-text; version=1.0.0'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('application/openmetrics-text'))
+            body = response.read().decode('utf-8')
+        self.assertIn('search_queue_depth 7', body)
+        self.assertTrue(body.endswith('# EOF\n'))
+
+        with urllib.request.urlopen(url, timeout=5) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/other", timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
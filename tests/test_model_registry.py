@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型注册表与模型切换测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from search_engine.model_registry import ModelRegistry
+from search_engine.model_service import ModelService
+from search_engine.training_tab.ctr_model import CTRModel
+
+
+def make_tiny_model(seed: int = 0) -> CTRModel:
+    """构造一个无需训练的小模型（随机权重 + 已拟合的标准化器）"""
+    model = CTRModel()
+    model.model = model._build_wide_deep_model(input_dim=model.feature_dim)
+    model.scaler = StandardScaler().fit(np.random.default_rng(seed).normal(size=(20, model.feature_dim)))
+    model.is_trained = True
+    model.trained_until = f"2024-01-0{seed + 1}T00:00:00"
+    model.position_propensities = {1: 1.0, 2: 0.6}
+    return model
+
+
+class TestModelRegistry(unittest.TestCase):
+    """模型注册表测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry_dir = os.path.join(self.temp_dir, "registry")
+        self.registry = ModelRegistry(self.registry_dir)
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_publish_verify_load(self):
+        """测试发布、内容哈希校验和加载"""
+        model = make_tiny_model()
+        version = self.registry.publish(model, {'auc': 0.7}, version="v1")
+        self.assertTrue(self.registry.verify(version))
+        self.assertEqual(self.registry.get_metrics(version), {'auc': 0.7})
+        self.assertEqual(self.registry.get_manifest(version)['trained_until'], model.trained_until)
+        self.assertEqual([m['version'] for m in self.registry.list_versions()], ["v1"])
+        with self.assertRaises(ValueError):
+            self.registry.publish(model, version="v1")
+
+        loaded = self.registry.load(version)
+        self.assertEqual(loaded.trained_until, model.trained_until)
+        self.assertEqual(loaded.position_propensities, model.position_propensities)
+        for expected, actual in zip(model.model.get_weights(), loaded.model.get_weights()):
+            np.testing.assert_allclose(expected, actual)
+
+        # 产物被修改后校验失败，拒绝加载
+        with open(os.path.join(self.registry_dir, version, "metrics.json"), 'w', encoding='utf-8') as f:
+            json.dump({'auc': 0.99}, f)
+        self.assertFalse(self.registry.verify(version))
+        with self.assertRaises(ValueError):
+            self.registry.load(version)
+        self.assertFalse(self.registry.verify("missing"))
+
+    def test_current_version_and_history(self):
+        """测试CURRENT和部署历史"""
+        self.assertIsNone(self.registry.get_current_version())
+        for version in ("v1", "v2"):
+            self.registry.publish(make_tiny_model(), version=version)
+            self.registry.set_current_version(version)
+        self.assertEqual(self.registry.get_current_version(), "v2")
+        self.assertEqual(self.registry.get_previous_version(), "v1")
+        self.assertEqual([d['version'] for d in self.registry.get_deployments()], ["v1", "v2"])
+
+        self.registry.set_current_version(None)
+        self.assertIsNone(self.registry.get_current_version())
+
+    def test_swap_and_rollback(self):
+        """测试原子替换与回滚（包括回滚到未发布的旧模型时清除CURRENT）"""
+        service = ModelService(model_file=os.path.join(self.temp_dir, "ctr_model.pkl"),
+                               registry_dir=self.registry_dir)
+        legacy_model = service.ctr_model
+
+        first = make_tiny_model(0)
+        result = {'success': True}
+        service._publish_and_swap(first, result)
+        self.assertIs(service.ctr_model, first)
+        self.assertEqual(self.registry.get_current_version(), result['version'])
+
+        second = make_tiny_model(1)
+        service._publish_and_swap(second, {'success': True})
+        self.assertTrue(service.rollback())
+        self.assertIs(service.ctr_model, first)
+        self.assertEqual(self.registry.get_current_version(), result['version'])
+
+        # 再次回滚到旧模型文件（没有版本号），重启后不应再加载被替换掉的版本
+        service._swap_model(first, result['version'])
+        service._previous_model = (None, legacy_model)
+        self.assertTrue(service.rollback())
+        self.assertIsNone(service.current_version)
+        self.assertIsNone(self.registry.get_current_version())
+
+
+if __name__ == '__main__':
+    unittest.main()
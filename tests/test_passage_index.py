@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+段落索引测试用例
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.passage_index import PassageIndex
+
+
+class TestPassageIndex(unittest.TestCase):
+    """段落索引测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.index = PassageIndex(InvertedIndex().preprocess_text, chunk_chars=40, overlap_chars=10)
+        self.long_doc = "天气晴朗适合出游。" * 6 + "深度学习使用多层神经网络学习特征表示。" + "城市交通拥堵问题。" * 6
+        self.index.add_document("long", self.long_doc)
+        self.index.add_document("short", "机器学习是人工智能的一个分支。")
+    
+    def test_split_with_overlap(self):
+        """测试段落覆盖全文且相邻段落有重叠"""
+        spans = self.index.split(self.long_doc)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(self.long_doc))
+        for (_, prev_end), (start, _) in zip(spans, spans[1:]):
+            self.assertLess(start, prev_end)
+            self.assertLessEqual(prev_end - start, 10)
+    
+    def test_search_returns_relevant_passage(self):
+        """测试检索返回长文档中的相关段落而非整篇文档"""
+        results = self.index.search("神经网络", top_k=3)
+        self.assertTrue(results)
+        chunk_id, doc_id, score, text = results[0]
+        self.assertEqual(doc_id, "long")
+        self.assertIn("神经网络", text)
+        self.assertLess(len(text), len(self.long_doc))
+        
+        # 同一文档中互相重叠的段落只返回分数最高的一个
+        spans = [self.index.chunks[r[0]][1:3] for r in results if r[1] == "long"]
+        for i, (s1, e1) in enumerate(spans):
+            for s2, e2 in spans[i + 1:]:
+                self.assertFalse(s1 < e2 and s2 < e1)
+    
+    def test_delete_document(self):
+        """测试删除文档后段落和倒排表同步清理"""
+        self.assertTrue(self.index.delete_document("short"))
+        self.assertEqual(self.index.search("机器"), [])
+        self.assertFalse(any(chunk[0] == "short" for chunk in self.index.chunks.values()))
+        self.assertFalse(self.index.delete_document("short"))
+
+
+if __name__ == '__main__':
+    unittest.main()
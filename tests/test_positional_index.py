@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+位置倒排与短语/邻近检索测试用例
+"""
+
+import unittest
+import tempfile
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.offline_index import InvertedIndex
+from search_engine.index_tab.positions import (
+    encode_positions, decode_positions, count_phrase_matches, min_cover_span
+)
+
+
+class TestPositionCodec(unittest.TestCase):
+    """位置列表编码测试类"""
+    
+    def test_roundtrip(self):
+        """测试差分变长编码往返"""
+        positions = [0, 3, 127, 128, 300, 70000]
+        data = encode_positions(positions)
+        self.assertEqual(decode_positions(data), positions)
+        self.assertLess(len(encode_positions([2, 5, 9, 14])), 5)
+    
+    def test_phrase_and_span(self):
+        """测试短语匹配和最小覆盖跨度"""
+        self.assertEqual(count_phrase_matches([[0, 10, 20], [4, 30]], [0, 4]), 1)
+        self.assertEqual(count_phrase_matches([[0], []], [0, 4]), 0)
+        self.assertEqual(min_cover_span([[0, 50], [10, 56]], [4, 2]), 8)
+
+
+class TestPositionalIndex(unittest.TestCase):
+    """位置倒排检索测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index = InvertedIndex()
+        self.index.add_document("near", "自然语言处理是人工智能的重要分支。")
+        self.index.add_document("far", "自然语言是人类交流的工具。很多数据需要整理和处理。")
+        self.index.add_document("other", "计算机视觉研究图像识别。")
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_phrase_mode(self):
+        """测试短语模式只返回相邻出现的文档"""
+        tfidf_ids = [doc_id for doc_id, _, _ in self.index.search("自然语言处理", 5)]
+        self.assertEqual(set(tfidf_ids), {"near", "far"})
+        phrase = self.index.search("自然语言处理", 5, mode="phrase")
+        self.assertEqual([doc_id for doc_id, _, _ in phrase], ["near"])
+    
+    def test_proximity_mode(self):
+        """测试邻近模式给紧凑命中更高加成"""
+        tfidf = {doc_id: score for doc_id, score, _ in self.index.search("自然语言处理", 5)}
+        proximity = {doc_id: score for doc_id, score, _ in self.index.search("自然语言处理", 5, mode="proximity")}
+        self.assertAlmostEqual(proximity["near"], tfidf["near"] * 2)
+        self.assertLess(proximity["far"] / tfidf["far"], 2)
+        with self.assertRaises(ValueError):
+            self.index.search("自然语言", 5, mode="unknown")
+    
+    def test_summary_from_positions(self):
+        """测试摘要按位置定位到命中窗口"""
+        content = "无关内容。" * 60 + "深度学习模型需要大量数据。" + "其他内容。" * 60
+        self.index.add_document("long", content)
+        summary = self.index.generate_summary("long", ["深度", "学习"], max_length=50)
+        self.assertIn("深度", summary)
+        self.assertLess(len(summary.replace('<span style="background-color: yellow; font-weight: bold;">', '')
+                               .replace('</span>', '')), 51)
+    
+    def test_persistence_and_delete(self):
+        """测试位置倒排的保存、加载和删除"""
+        path = os.path.join(self.temp_dir, "index.json")
+        self.index.save_to_file(path)
+        loaded = InvertedIndex()
+        loaded.load_from_file(path)
+        self.assertEqual(loaded.get_positions("处理", "near"), [4])
+        
+        loaded.delete_document("near")
+        self.assertEqual(loaded.get_positions("处理", "near"), [])
+        self.assertNotIn("near", loaded.positions.get("自然语言", {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
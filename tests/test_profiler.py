@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采样分析器测试用例
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.profiler import SamplingProfiler
+
+
+def busy_hot_function(stop_event):
+    """持续占用CPU的热点函数"""
+    total = 0
+    while not stop_event.is_set():
+        total += sum(range(1000))
+    return total
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """采样分析器测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.stop_event = threading.Event()
+        self.worker = threading.Thread(target=busy_hot_function, args=(self.stop_event,), name="HotWorker")
+        self.worker.start()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.stop_event.set()
+        self.worker.join()
+        shutil.rmtree(self.temp_dir)
+
+    def test_sample_and_top_functions(self):
+        """测试采样结果包含热点函数，且采样线程自身不出现在栈中"""
+        profiler = SamplingProfiler(interval=0.005, window=0, output_dir=self.temp_dir)
+        profiler.start()
+        time.sleep(0.3)
+        top = profiler.top_functions(50)
+        self.assertTrue(profiler.is_running())
+
+        hot = [item for item in top if item['function'].startswith('busy_hot_function (test_profiler.py:')]
+        self.assertEqual(len(hot), 1)
+        self.assertGreater(hot[0]['self'], 10)
+        self.assertTrue(all('SamplingProfiler' not in line.split(';')[0] for line in profiler.collapsed()))
+
+        status = profiler.get_status()
+        self.assertGreater(status['samples'], 10)
+        self.assertLess(status['overhead_ratio'], 0.5)
+
+        path = profiler.stop()
+        self.assertFalse(profiler.is_running())
+        self.assertTrue(path.startswith(self.temp_dir))
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        # 折叠栈格式：线程名;外层;...;内层 样本数
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any(line.startswith('HotWorker;') and 'busy_hot_function' in line for line in lines))
+
+    def test_window_rotation(self):
+        """测试窗口结束时自动写出文件并开始新窗口"""
+        profiler = SamplingProfiler(interval=0.005, window=0.1, output_dir=self.temp_dir)
+        profiler.start()
+        time.sleep(0.35)
+        profiler.stop()
+        self.assertGreaterEqual(len(os.listdir(self.temp_dir)), 2)
+        self.assertEqual(profiler.collapsed(), [])
+
+    def test_dump_empty_window(self):
+        """测试没有样本时不写文件"""
+        profiler = SamplingProfiler(output_dir=self.temp_dir)
+        self.assertIsNone(profiler.dump())
+        self.assertIsNone(profiler.stop())
+        profiler.sample()
+        self.assertIsNotNone(profiler.dump())
+
+
+if __name__ == '__main__':
+    unittest.main()
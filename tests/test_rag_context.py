@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RAG上下文构建测试用例
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.rag_context import ContextPacker, TokenEstimator, knapsack_select, split_passages
+
+
+class TestRAGContext(unittest.TestCase):
+    """上下文打包测试类"""
+    
+    def test_token_estimator(self):
+        """测试中文按字符换算不再被低估"""
+        estimator = TokenEstimator()
+        chinese = "人工智能是计算机科学的一个分支"
+        self.assertGreater(estimator.count(chinese), len(chinese) // 4)
+        self.assertEqual(estimator.count(""), 0)
+        
+        estimator.count(chinese)
+        self.assertEqual(estimator.cache_info().hits, 1)
+    
+    def test_split_passages(self):
+        """测试按句子边界切分段落"""
+        text = "第一句。第二句！" + "长" * 25
+        passages = split_passages(text, max_chars=10)
+        self.assertEqual(passages[0], "第一句。第二句！")
+        self.assertTrue(all(len(p) <= 10 for p in passages))
+        self.assertEqual("".join(passages), text)
+    
+    def test_knapsack_select(self):
+        """测试背包选择价值最高的组合"""
+        # 贪心按价值会选0号（10），最优是1号+2号（12）
+        self.assertEqual(knapsack_select([10, 5, 5], [10, 6, 6], 10), [1, 2])
+        self.assertEqual(knapsack_select([20], [1.0], 10), [])
+    
+    def test_pack_within_budget(self):
+        """测试在预算内优先选择相关段落"""
+        estimator = TokenEstimator()
+        packer = ContextPacker(estimator, passage_chars=40)
+        documents = {
+            'doc1': "天气晴朗适合出游。" * 4 + "机器学习让计算机从数据中学习规律。",
+            'doc2': "深度学习是机器学习的一个分支。"
+        }
+        results = [('doc1', 0.9, '摘要1'), ('doc2', 0.5, '摘要2')]
+        fetch = lambda ids: {doc_id: documents.get(doc_id) for doc_id in ids}
+        
+        context = packer.pack("机器学习", results, fetch, max_tokens=60)
+        self.assertLessEqual(estimator.count(context), 60)
+        self.assertIn("机器学习让计算机", context)
+        self.assertIn("深度学习", context)
+        self.assertNotIn("天气晴朗", context)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询补全索引测试用例
+"""
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.suggest_index import CompletionTrie, SuggestIndex
+
+
+class TestCompletionTrie(unittest.TestCase):
+    """带权前缀树测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.trie = CompletionTrie(cache_k=3)
+        for key, weight in {"机器学习": 5, "机器翻译": 3, "机器人": 8, "机械": 1, "深度学习": 4}.items():
+            self.trie.set(key, weight)
+    
+    def test_complete_by_weight(self):
+        """测试按权重返回前缀补全"""
+        self.assertEqual([k for k, _ in self.trie.complete("机器")], ["机器人", "机器学习", "机器翻译"])
+        self.assertEqual([k for k, _ in self.trie.complete("机", 2)], ["机器人", "机器学习"])
+        self.assertEqual(self.trie.complete("量子"), [])
+        # 超过缓存容量时遍历子树
+        self.assertEqual(len(self.trie.complete("机", 10)), 4)
+    
+    def test_incremental_update(self):
+        """测试增量更新使路径缓存失效"""
+        self.trie.complete("机器")
+        self.trie.add("机器翻译", 10)
+        self.assertEqual(self.trie.complete("机器", 1), [("机器翻译", 13.0)])
+        
+        self.assertTrue(self.trie.remove("机器翻译"))
+        self.assertNotIn("机器翻译", self.trie)
+        self.assertEqual(self.trie.complete("机器", 1)[0][0], "机器人")
+        self.assertEqual(len(self.trie), 4)
+        
+        # 权重为0等同删除，空分支被剪掉
+        self.trie.set("深度学习", 0)
+        self.assertNotIn("深", self.trie.root.children)
+
+
+class TestSuggestIndex(unittest.TestCase):
+    """查询补全索引测试类"""
+    
+    def test_queries_before_terms(self):
+        """测试历史查询优先、词项补齐"""
+        index = SuggestIndex()
+        index.rebuild_terms({"机器": 6, "机器学习": 2, "深度": 3})
+        index.rebuild_queries({"机器学习 入门": 4})
+        index.record_query("  机器学习   入门 ")
+        
+        suggestions = index.suggest("机器", 3)
+        self.assertEqual(suggestions[0], ("机器学习 入门", 5.0, "query"))
+        self.assertEqual([s[0] for s in suggestions[1:]], ["机器", "机器学习"])
+        self.assertEqual(index.suggest("  "), [])
+        
+        index.update_terms({"机器学习": 2}, ["机器"])
+        self.assertEqual(index.get_stats(), {'suggest_terms': 2, 'suggest_queries': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
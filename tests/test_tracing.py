@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求追踪测试用例
+"""
+
+import unittest
+import contextvars
+import time
+from unittest import mock
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine import tracing
+from search_engine.metrics import instrument
+from search_engine.monitoring_tab.monitoring_tab import render_traces
+from search_engine.search_tab import search_tab
+
+
+class TestTracing(unittest.TestCase):
+    """请求追踪测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.original = tracing.get_config()
+        tracing.configure(sample_rate=1.0, slow_threshold_ms=10_000)
+        tracing.clear()
+
+    def tearDown(self):
+        """测试后清理"""
+        tracing.configure(sample_rate=self.original['sample_rate'],
+                          slow_threshold_ms=self.original['slow_threshold_ms'])
+        tracing.clear()
+
+    def test_span_tree(self):
+        """测试span嵌套关系、深度和instrument埋点"""
+        @instrument("test.tracing.stage")
+        def stage():
+            with tracing.span("inner", k=1) as inner:
+                inner.set_attribute('hit', True)
+
+        with tracing.trace("req-1", "perform_search", query="机器学习"):
+            self.assertEqual(tracing.current_request_id(), "req-1")
+            with tracing.span("outer"):
+                stage()
+            with tracing.span("sibling"):
+                pass
+        self.assertIsNone(tracing.current_request_id())
+
+        trace = tracing.get_trace("req-1")
+        self.assertIsNotNone(trace)
+        spans = trace['spans']
+        self.assertEqual([s['name'] for s in spans], ["outer", "test.tracing.stage", "inner", "sibling"])
+        self.assertEqual([s['depth'] for s in spans], [0, 1, 2, 0])
+        self.assertEqual([s['parent'] for s in spans], [-1, 0, 1, -1])
+        self.assertEqual(spans[2]['attributes'], {'k': 1, 'hit': True})
+        self.assertEqual(trace['attributes']['query'], "机器学习")
+        for s in spans:
+            self.assertLessEqual(s['start_ms'] + s['duration_ms'], trace['duration_ms'] + 1e-6)
+
+    def test_span_without_trace(self):
+        """测试没有活动trace时span为空操作"""
+        with tracing.span("orphan") as orphan:
+            orphan.set_attribute('x', 1)
+        self.assertEqual(tracing.get_recent_traces(), [])
+
+    def test_error_marks_span(self):
+        """测试异常标记span和trace为失败"""
+        with self.assertRaises(ValueError):
+            with tracing.trace("req-err"):
+                with tracing.span("boom"):
+                    raise ValueError("x")
+        trace = tracing.get_trace("req-err")
+        self.assertTrue(trace['error'])
+        self.assertTrue(trace['spans'][0]['error'])
+
+    def test_slow_traces_kept_when_not_sampled(self):
+        """测试采样率为0时慢请求仍被保留"""
+        tracing.configure(sample_rate=0.0, slow_threshold_ms=5)
+        with tracing.trace("req-fast"):
+            pass
+        with tracing.trace("req-slow"):
+            time.sleep(0.01)
+        self.assertEqual(tracing.get_recent_traces(), [])
+        self.assertEqual([t['request_id'] for t in tracing.get_slow_traces()], ["req-slow"])
+        self.assertIsNone(tracing.get_trace("req-fast"))
+
+    def test_span_limit(self):
+        """测试单个trace的span数量上限"""
+        with tracing.trace("req-many"):
+            for _ in range(tracing.MAX_SPANS_PER_TRACE + 10):
+                with tracing.span("s"):
+                    pass
+        trace = tracing.get_trace("req-many")
+        self.assertEqual(len(trace['spans']), tracing.MAX_SPANS_PER_TRACE)
+        self.assertEqual(trace['dropped_spans'], 10)
+
+
+    def test_deferred_trace_resumed_across_yields(self):
+        """测试延迟完成的trace可在生成器中跨 yield 追加span（每次取值在不同上下文中执行）"""
+        with tracing.trace("req-defer", "perform_search", defer_finish=True):
+            with tracing.span("retrieve"):
+                pass
+        self.assertIsNone(tracing.get_trace("req-defer"))
+
+        def stream():
+            with tracing.resumed_span("req-defer", "rag.stream") as rag_span:
+                for i in range(3):
+                    time.sleep(0.005)
+                    yield i
+                rag_span.set_attribute('pieces', 3)
+
+        generator = stream()
+        while True:
+            try:
+                contextvars.copy_context().run(next, generator)
+            except StopIteration:
+                break
+
+        trace = tracing.get_trace("req-defer")
+        self.assertEqual([s['name'] for s in trace['spans']], ["retrieve", "rag.stream"])
+        rag = trace['spans'][1]
+        self.assertEqual((rag['depth'], rag['parent']), (0, -1))
+        self.assertEqual(rag['attributes'], {'pieces': 3})
+        self.assertGreaterEqual(rag['duration_ms'], 15)
+        self.assertLessEqual(rag['start_ms'] + rag['duration_ms'], trace['duration_ms'] + 1e-6)
+
+        # 不需要追加阶段时直接完成；没有待完成trace时为空操作
+        with tracing.trace("req-plain", defer_finish=True):
+            pass
+        tracing.finish_deferred("req-plain")
+        tracing.finish_deferred("missing")
+        self.assertEqual(tracing.get_trace("req-plain")['spans'], [])
+
+    def test_rag_stream_span_in_waterfall(self):
+        """测试流式RAG阶段出现在同一请求的追踪瀑布图中"""
+        fake_rag = mock.Mock()
+        fake_rag.enhance_search_results_stream.return_value = iter(["流式", "回答"])
+        docs_info = [{'doc_id': "doc1", 'tfidf_score': 0.9, 'summary': "摘要"}]
+
+        with tracing.trace("req-rag", "perform_search", defer_finish=True, query="机器学习"):
+            with tracing.span("retrieve"):
+                pass
+        with mock.patch.object(search_tab, 'get_rag_service', return_value=fake_rag):
+            answers = list(search_tab.stream_rag_answer(None, "机器学习", docs_info, "req-rag"))
+
+        self.assertEqual(answers, ["流式", "流式回答"])
+        html = render_traces("req-rag")
+        self.assertIn("retrieve", html)
+        self.assertIn("rag.stream", html)
+        self.assertFalse(tracing.get_trace("req-rag")['error'])
+
+if __name__ == '__main__':
+    unittest.main()
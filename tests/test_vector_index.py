@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量索引测试用例
+"""
+
+import unittest
+import tempfile
+import os
+import sys
+from unittest import mock
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.index_tab.vector_index import HashingEmbedder, VectorIndex, reciprocal_rank_fusion
+from search_engine.index_tab.index_service import InvertedIndexService
+from search_engine.index_service import IndexService
+
+
+class TestVectorIndex(unittest.TestCase):
+    """向量索引测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(42)
+        vectors = rng.normal(size=(2000, 32)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.ids = [f"doc{i}" for i in range(len(self.vectors))]
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_hashing_embedder(self):
+        """测试哈希向量化器确定且相似文本更接近"""
+        embedder = HashingEmbedder(dim=128)
+        a, b, c = embedder.encode(["机器学习算法", "机器学习方法", "今天天气晴朗"])
+        np.testing.assert_allclose(embedder.encode(["机器学习算法"])[0], a)
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+        self.assertGreater(a @ b, a @ c)
+    
+    def test_exact_search_matches_brute_force(self):
+        """测试分块精确检索与全量排序结果一致"""
+        index = VectorIndex(32)
+        index.add(self.ids, self.vectors)
+        query = self.vectors[7]
+        
+        results = index.search(query, top_k=5, batch_rows=300)
+        expected = np.argsort(-(self.vectors @ query))[:5]
+        self.assertEqual([doc_id for doc_id, _ in results], [self.ids[i] for i in expected])
+        
+        index.remove("doc7")
+        self.assertNotIn("doc7", [doc_id for doc_id, _ in index.search(query, top_k=5)])
+    
+    def test_ivf_recall(self):
+        """测试IVF检索召回率"""
+        index = VectorIndex(32)
+        index.add(self.ids, self.vectors)
+        index.build_ivf(n_lists=32)
+        
+        recall = []
+        for q in range(20):
+            query = self.vectors[q]
+            exact = {doc_id for doc_id, _ in index.search(query, top_k=10)}
+            approx = {doc_id for doc_id, _ in index.search(query, top_k=10, n_probe=8)}
+            recall.append(len(exact & approx) / 10)
+        self.assertGreaterEqual(np.mean(recall), 0.6)
+        
+        # IVF构建后新增的向量也能被检索到
+        index.add(["new"], self.vectors[:1])
+        self.assertIn("new", [doc_id for doc_id, _ in index.search(self.vectors[0], top_k=2, n_probe=1)])
+    
+    def test_save_and_load_mmap(self):
+        """测试保存后以内存映射加载"""
+        index = VectorIndex(32, dtype="float16")
+        index.add(self.ids, self.vectors)
+        index.build_ivf(n_lists=16)
+        index.meta['embedder'] = 'test'
+        index.save(self.temp_dir)
+        
+        loaded = VectorIndex.load(self.temp_dir)
+        self.assertIsInstance(loaded.vectors, np.memmap)
+        self.assertEqual(loaded.meta['embedder'], 'test')
+        self.assertEqual(loaded.search(self.vectors[3], top_k=1, n_probe=4)[0][0], "doc3")
+    
+    def test_save_over_loaded_mmap(self):
+        """测试加载（内存映射）后保存回同一目录再加载"""
+        index = VectorIndex(32)
+        index.add(self.ids[:100], self.vectors[:100])
+        index.save(self.temp_dir)
+        
+        loaded = VectorIndex.load(self.temp_dir)
+        loaded.save(self.temp_dir)
+        loaded.add(["extra"], self.vectors[100:101])
+        loaded.save(self.temp_dir)
+        
+        reloaded = VectorIndex.load(self.temp_dir)
+        self.assertEqual(len(reloaded), 101)
+        np.testing.assert_allclose(np.asarray(reloaded.vectors[:100]), self.vectors[:100])
+        self.assertEqual(reloaded.search(self.vectors[100], top_k=1)[0][0], "extra")
+    
+    def test_save_keeps_ivf_lists(self):
+        """测试保存前压缩删除行时保留配置的IVF簇数"""
+        index = VectorIndex(32)
+        index.add(self.ids, self.vectors)
+        index.build_ivf(n_lists=16)
+        index.remove("doc0")
+        index.save(self.temp_dir)
+        
+        self.assertEqual(len(index.centroids), 16)
+        loaded = VectorIndex.load(self.temp_dir)
+        self.assertEqual(len(loaded.centroids), 16)
+        self.assertEqual(len(loaded), len(self.ids) - 1)
+    
+    def test_save_interrupted(self):
+        """测试保存中途失败时磁盘上仍是上一次完整保存的索引"""
+        index = VectorIndex(32)
+        index.add(self.ids[:100], self.vectors[:100])
+        index.build_ivf(n_lists=4)
+        index.save(self.temp_dir)
+        
+        index.add(["extra"], self.vectors[100:101])
+        with mock.patch("search_engine.index_tab.vector_index.json.dump", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                index.save(self.temp_dir)
+        
+        loaded = VectorIndex.load(self.temp_dir)
+        self.assertEqual(len(loaded), 100)
+        self.assertEqual(len(loaded.assignments), 100)
+        self.assertNotIn("extra", loaded.id_to_row)
+        
+        # 下一次成功保存后只保留当前版本的文件
+        index.save(self.temp_dir)
+        self.assertEqual(len(VectorIndex.load(self.temp_dir)), 101)
+        self.assertEqual(len([n for n in os.listdir(self.temp_dir) if n.endswith(('.npy', '.npz'))]), 2)
+    
+    def test_incremental_add(self):
+        """测试逐条添加与批量添加结果一致，缓冲按倍数增长"""
+        index = VectorIndex(32)
+        for i in range(300):
+            index.add([self.ids[i]], self.vectors[i:i + 1])
+        self.assertEqual(index.vectors.shape, (300, 32))
+        self.assertLess(len(index._vector_storage), 600)
+        np.testing.assert_allclose(index.vectors, self.vectors[:300])
+        
+        index.add(["doc5"], self.vectors[400:401])
+        self.assertEqual(len(index), 300)
+        self.assertEqual(index.search(self.vectors[400], top_k=1)[0][0], "doc5")
+    
+    def test_reciprocal_rank_fusion(self):
+        """测试RRF融合"""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        self.assertEqual(fused[0][0], "b")
+        self.assertEqual({doc_id for doc_id, _ in fused}, {"a", "b", "c", "d"})
+
+
+
+class TestIndexServiceVectors(unittest.TestCase):
+    """索引服务中的向量索引测试类"""
+    
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_file = os.path.join(self.temp_dir, "index.json")
+        self.vector_dir = os.path.join(self.temp_dir, "vectors")
+        inverted = InvertedIndexService(self.index_file)
+        inverted.batch_add_documents({"d1": "机器学习算法", "d2": "深度学习网络"})
+        inverted.save_index(self.index_file)
+        self.doc_count = len(inverted.get_all_documents())
+    
+    def tearDown(self):
+        """测试后清理"""
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _service(self):
+        return IndexService(self.index_file, vector_embedder="hashing-32", vector_dir=self.vector_dir)
+    
+    def test_save_after_loading_existing_vectors(self):
+        """测试加载已有向量索引后保存不会损坏向量文件"""
+        self._service()
+        service = self._service()
+        self.assertIsInstance(service.vector_index.vectors, np.memmap)
+        self.assertTrue(service.save_index(self.index_file))
+        self.assertEqual(len(self._service().vector_index), self.doc_count)
+    
+    def test_batch_add_skips_failed_documents(self):
+        """测试批量添加只为成功入索引的文档写入向量"""
+        service = self._service()
+        add_document = service.index_service.add_document
+        service.index_service.add_document = lambda doc_id, content: (
+            doc_id != "bad" and add_document(doc_id, content))
+        self.assertEqual(service.batch_add_documents({"d3": "搜索引擎排序", "bad": "失败文档"}), 1)
+        self.assertIn("d3", service.vector_index.id_to_row)
+        self.assertNotIn("bad", service.vector_index.id_to_row)
+    
+    def test_load_index_refreshes_vectors(self):
+        """测试加载其他索引文件后向量索引与新文档集一致"""
+        other_file = os.path.join(self.temp_dir, "other.json")
+        other = InvertedIndexService(other_file)
+        other.batch_add_documents({"x1": "自然语言处理", "x2": "计算机视觉", "x3": "强化学习"})
+        other.save_index(other_file)
+        
+        service = self._service()
+        self.assertTrue(service.load_index(other_file))
+        self.assertEqual(set(service.vector_index.ids), set(other.get_all_documents()))
+        self.assertIn("x1", service.vector_index.id_to_row)
+    
+    def test_hybrid_search_without_vectors(self):
+        """测试未启用向量检索时混合检索返回词法检索结果和分数"""
+        service = IndexService(self.index_file)
+        self.assertIsNone(service.vector_index)
+        self.assertEqual(service.hybrid_search("机器学习", top_k=5), service.search("机器学习", top_k=5))
+
+if __name__ == '__main__':
+    unittest.main()
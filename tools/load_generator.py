@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开环负载生成器
+以固定目标QPS按泊松到达发送请求，查询按CTR日志中的热度做Zipf抽样，
+延迟从"计划发送时间"开始计算（消除协调遗漏），并可搜索满足p99 SLO的最大可持续QPS
+
+用法：
+    python tools/load_generator.py --target index --qps 50 --duration 30
+    python tools/load_generator.py --target perform_search --find-max --slo-p99-ms 200
+    python tools/load_generator.py --target index --qps 50 --mode closed   # 闭环对照（带回填校正）
+
+协调遗漏（coordinated omission）：闭环压测中，慢请求会推迟后续请求的发送，
+恰好在系统变慢时少采样，分位数因此偏乐观。开环模式按预先生成的到达时间发送，
+发送落后时不跳过，延迟 = 完成时间 - 计划发送时间，排队等待全部计入；
+闭环模式按HdrHistogram的做法，用期望间隔回填被遗漏的样本。
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search_engine.metrics import LatencyHistogram
+
+QUANTILES = {'p50_ms': 0.5, 'p90_ms': 0.9, 'p99_ms': 0.99, 'p999_ms': 0.999}
+DEFAULT_QUERIES = ["人工智能", "机器学习", "深度学习", "自然语言处理", "计算机视觉", "搜索引擎", "推荐系统", "神经网络"]
+
+
+class ZipfQueryMix:
+    """按热度排名做Zipf抽样的查询集合"""
+
+    def __init__(self, queries: List[str], s: float = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            queries: 按热度从高到低排列的查询
+            s: Zipf指数，第k名的权重为 1/k^s
+            seed: 随机种子
+        """
+        if not queries:
+            raise ValueError("查询集合不能为空")
+        self.queries = list(queries)
+        self.s = s
+        self.cum_weights = list(accumulate(1.0 / (rank ** s) for rank in range(1, len(self.queries) + 1)))
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_ctr_log(cls, path: str, s: float = 1.0, seed: Optional[int] = None) -> 'ZipfQueryMix':
+        """从CTR日志按不同请求数统计查询热度；日志不存在或为空时使用内置查询"""
+        counts = load_query_counts(path)
+        queries = [query for query, _ in counts.most_common()] or DEFAULT_QUERIES
+        return cls(queries, s=s, seed=seed)
+
+    def sample(self) -> str:
+        with self.lock:
+            point = self.rng.random() * self.cum_weights[-1]
+        return self.queries[bisect.bisect_right(self.cum_weights, point)]
+
+
+def load_query_counts(path: str) -> Counter:
+    """CTR日志中每个查询的不同request_id数（一次搜索记一次）"""
+    if not path or not os.path.exists(path):
+        return Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+    seen = {(s.get('query'), s.get('request_id')) for s in samples if s.get('query')}
+    return Counter(query for query, _ in seen)
+
+
+def record_corrected(histogram: LatencyHistogram, seconds: float, expected_interval: float, error: bool = False):
+    """
+    记录一次延迟，并按期望发送间隔回填被遗漏的样本（HdrHistogram recordValueWithExpectedInterval）
+
+    一个请求耗时 seconds 时，闭环发送方在这期间本应再发出 seconds/expected_interval 个请求，
+    它们的延迟依次为 seconds - interval, seconds - 2*interval, ...
+    """
+    histogram.record(seconds, error=error)
+    if expected_interval <= 0:
+        return
+    missing = seconds - expected_interval
+    while missing >= expected_interval:
+        histogram.record(missing)
+        missing -= expected_interval
+
+
+def summarize(histogram: LatencyHistogram) -> Dict[str, float]:
+    """分位数摘要（毫秒）"""
+    snapshot = histogram.snapshot()
+    percentiles = histogram.percentiles_from_counts(histogram.merged_counts(), list(QUANTILES.values()))
+    # 分位数取桶上界，可能略大于实际最大值
+    summary = {name: min(value, snapshot['max_ms']) for name, value in zip(QUANTILES, percentiles)}
+    summary.update({'mean_ms': snapshot['mean_ms'], 'max_ms': snapshot['max_ms'], 'count': snapshot['requests']})
+    return summary
+
+
+class LoadGenerator:
+    """对单个目标函数施加负载"""
+
+    def __init__(self, target: Callable[[str], Any], query_mix: ZipfQueryMix, workers: int = 32,
+                 max_outstanding: int = 10000, seed: Optional[int] = None):
+        """
+        Args:
+            target: 被测函数，参数为查询，抛出异常视为错误
+            query_mix: 查询抽样
+            workers: 工作线程数（开环模式下只决定并发上限，不影响发送节奏）
+            max_outstanding: 最大未完成请求数，超过时丢弃新请求并计入错误，防止过载时无限排队
+            seed: 到达间隔的随机种子
+        """
+        self.target = target
+        self.query_mix = query_mix
+        self.workers = workers
+        self.max_outstanding = max_outstanding
+        self.rng = random.Random(seed)
+
+    def run_open_loop(self, qps: float, duration: float, warmup: float = 0.0) -> Dict[str, Any]:
+        """
+        按泊松到达以目标QPS发送请求
+
+        Args:
+            qps: 目标QPS
+            duration: 统计时长（秒）
+            warmup: 预热时长（秒），预热期间计划发送的请求不计入统计
+        """
+        response = LatencyHistogram("loadgen.response")  # 计划发送 -> 完成（已消除协调遗漏）
+        service = LatencyHistogram("loadgen.service")    # 实际开始 -> 完成
+        state = {'outstanding': 0, 'sent': 0, 'dropped': 0, 'max_lag': 0.0}
+        lock = threading.Lock()
+
+        def execute(query: str, intended: float, measured: bool):
+            started = time.perf_counter()
+            error = False
+            try:
+                self.target(query)
+            except Exception:
+                error = True
+            finished = time.perf_counter()
+            with lock:
+                state['outstanding'] -= 1
+            if measured:
+                response.record(finished - intended, error=error)
+                service.record(finished - started, error=error)
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="LoadGen")
+        start = time.perf_counter()
+        measure_from = start + warmup
+        end = measure_from + duration
+        intended = start
+        try:
+            while True:
+                intended += self.rng.expovariate(qps)
+                if intended >= end:
+                    break
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # 发送方自身落后：不跳过、不重排，延迟仍从计划时间算起
+                    state['max_lag'] = max(state['max_lag'], -delay)
+                measured = intended >= measure_from
+                with lock:
+                    if state['outstanding'] >= self.max_outstanding:
+                        if measured:
+                            state['dropped'] += 1
+                        continue
+                    state['outstanding'] += 1
+                if measured:
+                    state['sent'] += 1
+                executor.submit(execute, self.query_mix.sample(), intended, measured)
+        finally:
+            executor.shutdown(wait=True)
+        elapsed = time.perf_counter() - measure_from
+
+        errors = response.snapshot()['errors'] + state['dropped']
+        completed = response.snapshot()['requests']
+        return {
+            'mode': 'open',
+            'target_qps': qps,
+            'duration_s': duration,
+            'sent': state['sent'],
+            'completed': completed,
+            'errors': errors,
+            'dropped': state['dropped'],
+            'error_rate': errors / max(state['sent'] + state['dropped'], 1),
+            'achieved_qps': completed / elapsed if elapsed > 0 else 0.0,
+            'max_sender_lag_ms': state['max_lag'] * 1000,
+            'latency': summarize(response),
+            'service_time': summarize(service)
+        }
+
+    def run_closed_loop(self, qps: float, duration: float, warmup: float = 0.0) -> Dict[str, Any]:
+        """
+        闭环对照：每个工作线程按 workers/qps 的间隔串行发送，慢请求推迟后续发送
+
+        报告同时给出原始延迟和按期望间隔回填后的延迟，两者之差即协调遗漏造成的低估
+        """
+        interval = self.workers / qps
+        raw = LatencyHistogram("loadgen.raw")
+        corrected = LatencyHistogram("loadgen.corrected")
+        start = time.perf_counter()
+        measure_from = start + warmup
+        end = measure_from + duration
+
+        def user():
+            next_send = time.perf_counter()
+            while next_send < end:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                started = time.perf_counter()
+                error = False
+                try:
+                    self.target(self.query_mix.sample())
+                except Exception:
+                    error = True
+                latency = time.perf_counter() - started
+                if started >= measure_from:
+                    raw.record(latency, error=error)
+                    record_corrected(corrected, latency, interval, error=error)
+                next_send = max(next_send + interval, time.perf_counter())
+
+        threads = [threading.Thread(target=user, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - measure_from
+
+        snapshot = raw.snapshot()
+        return {
+            'mode': 'closed',
+            'target_qps': qps,
+            'duration_s': duration,
+            'sent': snapshot['requests'],
+            'completed': snapshot['requests'],
+            'errors': snapshot['errors'],
+            'dropped': 0,
+            'error_rate': snapshot['error_rate'],
+            'achieved_qps': snapshot['requests'] / elapsed if elapsed > 0 else 0.0,
+            'latency': summarize(corrected),
+            'latency_uncorrected': summarize(raw)
+        }
+
+
+def meets_slo(report: Dict[str, Any], slo_p99_ms: float, max_error_rate: float = 0.01,
+              min_throughput_ratio: float = 0.9) -> bool:
+    """p99、错误率和实际吞吐是否都达标"""
+    return (report['latency']['p99_ms'] <= slo_p99_ms and
+            report['error_rate'] <= max_error_rate and
+            report['achieved_qps'] >= report['target_qps'] * min_throughput_ratio)
+
+
+def find_max_qps(run: Callable[[float], Dict[str, Any]], slo_p99_ms: float, start_qps: float = 10.0,
+                 max_qps: float = 10000.0, precision: float = 0.1, max_error_rate: float = 0.01,
+                 log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """
+    搜索满足p99 SLO的最大可持续QPS：先倍增找到第一个不达标的QPS，再在区间内二分
+
+    Args:
+        run: 以给定QPS跑一轮负载并返回报告
+        slo_p99_ms: p99延迟目标（毫秒）
+        start_qps: 起始QPS
+        max_qps: QPS上限
+        precision: 二分结束条件，区间宽度不超过下界的该比例
+        max_error_rate: 允许的最大错误率
+    """
+    steps = []
+
+    def probe(qps: float) -> bool:
+        report = run(qps)
+        passed = meets_slo(report, slo_p99_ms, max_error_rate)
+        steps.append(dict(report, passed=passed))
+        log(f"{'✅' if passed else '❌'} {qps:8.1f} QPS -> 实际 {report['achieved_qps']:8.1f} QPS, "
+            f"p99 {report['latency']['p99_ms']:8.2f} ms, 错误率 {report['error_rate']:.2%}")
+        return passed
+
+    low, high = 0.0, None
+    qps = start_qps
+    while qps <= max_qps:
+        if not probe(qps):
+            high = qps
+            break
+        low = qps
+        qps *= 2
+    if high is None:
+        high = min(qps, max_qps)
+
+    while low > 0 and high - low > low * precision:
+        middle = (low + high) / 2
+        if probe(middle):
+            low = middle
+        else:
+            high = middle
+
+    return {'slo_p99_ms': slo_p99_ms, 'max_qps': low, 'first_failing_qps': high, 'steps': steps}
+
+
+def build_target(name: str, sort_mode: str = "tfidf") -> Callable[[str], Any]:
+    """
+    构造被测函数
+
+    - index: IndexService.search（倒排检索 + 摘要）
+    - perform_search: 在线搜索完整路径（召回、排序、展示记录），展示写入临时CTR文件，不污染真实日志
+    """
+    from search_engine.index_service import IndexService
+    index_service = IndexService()
+    if name == "index":
+        return lambda query: index_service.search(query, top_k=10)
+    if name == "perform_search":
+        from search_engine.data_service import DataService
+        from search_engine.search_tab.search_tab import perform_search
+        data_service = DataService()
+        data_service.data_file = os.path.join(tempfile.mkdtemp(prefix="loadgen_"), "ctr_data.json")
+        return lambda query: perform_search(index_service, data_service, query, sort_mode, with_rag=False)
+    raise ValueError(f"未知的压测目标: {name}")
+
+
+def print_report(report: Dict[str, Any]):
+    latency = report['latency']
+    print(f"\n📊 {report['mode']}-loop  目标 {report['target_qps']:.1f} QPS，实际 {report['achieved_qps']:.1f} QPS")
+    print(f"   发送 {report['sent']}，完成 {report['completed']}，错误 {report['errors']}（丢弃 {report['dropped']}）")
+    print(f"   延迟(ms)  p50 {latency['p50_ms']:.2f}  p90 {latency['p90_ms']:.2f}  p99 {latency['p99_ms']:.2f}  "
+          f"p99.9 {latency['p999_ms']:.2f}  max {latency['max_ms']:.2f}")
+    other = report.get('service_time') or report.get('latency_uncorrected')
+    if other:
+        label = "服务时间" if 'service_time' in report else "未校正"
+        print(f"   {label}(ms) p50 {other['p50_ms']:.2f}  p99 {other['p99_ms']:.2f}  max {other['max_ms']:.2f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="开环负载生成器")
+    parser.add_argument('--target', choices=['index', 'perform_search'], default='index')
+    parser.add_argument('--sort-mode', default='tfidf', help="perform_search 的排序模式")
+    parser.add_argument('--qps', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=30.0, help="每轮统计时长（秒）")
+    parser.add_argument('--warmup', type=float, default=5.0, help="每轮预热时长（秒）")
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open')
+    parser.add_argument('--ctr-log', default='models/ctr_data.json', help="用于统计查询热度的CTR日志")
+    parser.add_argument('--zipf', type=float, default=1.0, help="查询热度的Zipf指数")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--find-max', action='store_true', help="搜索满足SLO的最大QPS")
+    parser.add_argument('--slo-p99-ms', type=float, default=200.0)
+    parser.add_argument('--start-qps', type=float, default=10.0)
+    parser.add_argument('--max-qps', type=float, default=5000.0)
+    parser.add_argument('--output', help="报告JSON路径")
+    args = parser.parse_args()
+
+    print("🚦 开环负载生成器")
+    print("=" * 50)
+    query_mix = ZipfQueryMix.from_ctr_log(args.ctr_log, s=args.zipf, seed=args.seed)
+    print(f"查询集合: {len(query_mix.queries)}个（Zipf s={args.zipf}），前5: {query_mix.queries[:5]}")
+    generator = LoadGenerator(build_target(args.target, args.sort_mode), query_mix,
+                              workers=args.workers, seed=args.seed)
+    run = generator.run_open_loop if args.mode == 'open' else generator.run_closed_loop
+
+    if args.find_max:
+        result = find_max_qps(lambda qps: run(qps, args.duration, args.warmup), args.slo_p99_ms,
+                              start_qps=args.start_qps, max_qps=args.max_qps)
+        print(f"\n🏁 p99 <= {args.slo_p99_ms} ms 时最大可持续QPS: {result['max_qps']:.1f}")
+    else:
+        result = run(args.qps, args.duration, args.warmup)
+        print_report(result)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(result, target=args.target), f, ensure_ascii=False, indent=2)
+        print(f"✅ 报告已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()